@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Feed de alterações de ordens de serviço (quadro de programação)
+Cada commit que cria, remove ou muda status, prioridade, data programada ou
+responsável de uma OS gera deltas compactos, publicados por empresa num
+pub/sub em processo que alimenta as conexões Server-Sent Events do quadro.
+
+No PostgreSQL os deltas saem por NOTIFY dentro da própria transação (só
+chegam se o commit acontecer) e cada processo web tem uma thread em LISTEN
+que repassa ao pub/sub local: alterações feitas em outro worker ou no
+processo do scheduler chegam a todos os quadros. Fora do PostgreSQL a
+publicação é direta, só no processo que fez o commit.
+
+Escritas em lote pela tabela (insert(OrdemServico), SQL texto) não passam
+pelo flush: quem as faz chama registrar_os_alteradas com os IDs.
+
+O mesmo stream leva as épocas de geração de OS (evento "epoca"), para que
+cada aba do quadro mantenha uma única conexão SSE. Com o worker gthread cada
+conexão aberta ocupa uma thread enquanto durar: GUNICORN_THREADS (Procfile)
+precisa cobrir as abas abertas por worker mais as requisições comuns. Uma
+conexão do pool do banco (config.py) só é usada durante a verificação de
+época.
+"""
+
+import json
+import time
+import queue
+import select
+import logging
+import threading
+from uuid import uuid4
+from collections import deque, defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import event, select as sql_select, text, inspect
+from sqlalchemy.orm import Session
+
+from assets_models import OrdemServico
+
+logger = logging.getLogger(__name__)
+
+CANAL_NOTIFY = 'os_alteracoes'
+
+# Campos do delta (além de id); são também os que disparam o delta numa alteração
+CAMPOS_DELTA = ('status', 'prioridade', 'data_programada', 'usuario_responsavel')
+
+# Payload do NOTIFY tem limite de 8000 bytes
+TAMANHO_MAXIMO_NOTIFY = 7000
+
+# Acima disso, num mesmo commit, a empresa recebe só "recarregar" (ex.: geração em lote)
+LIMITE_DELTAS_COMMIT = 500
+
+FILA_MAXIMA_ASSINANTE = 1000
+HISTORICO_EVENTOS = 500
+HEARTBEAT_SSE_SEGUNDOS = 15
+INTERVALO_EPOCA_SEGUNDOS = 5
+DURACAO_MAXIMA_SSE_SEGUNDOS = 300
+RETRY_SSE_MS = 3000
+
+# Chaves da sessão: deltas do flush {id: delta} e IDs de escritas em lote {id: nova}
+_CHAVE_DELTAS = 'os_alteracoes_deltas'
+_CHAVE_IDS = 'os_alteracoes_ids'
+_CHAVE_PUBLICAR = 'os_alteracoes_publicar'
+
+
+# ---------- Pub/sub em processo ----------
+class Assinatura:
+    """Fila de eventos de uma conexão SSE; transbordou indica eventos perdidos"""
+
+    def __init__(self, empresa):
+        self.empresa = empresa
+        self.fila = queue.Queue(maxsize=FILA_MAXIMA_ASSINANTE)
+        self.transbordou = False
+
+    def entregar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            self.transbordou = True
+
+
+class CanalAlteracoesOS:
+    """
+    Pub/sub em processo das alterações de OS
+
+    Cada evento recebe um número sequencial do processo; os últimos ficam num
+    histórico curto para a retomada com Last-Event-ID. O token identifica o
+    processo: um ID de outro processo não pode ser retomado aqui.
+    """
+
+    def __init__(self):
+        self.token = uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._assinaturas = set()
+        self._historico = deque(maxlen=HISTORICO_EVENTOS)
+        self._sequencia = 0
+
+    def publicar(self, empresa, deltas=None, recarregar=False):
+        """
+        Publica as alterações de uma empresa para as assinaturas
+
+        Args:
+            empresa (str): Empresa das OS
+            deltas (list): Deltas compactos
+            recarregar (bool): O quadro deve recarregar a lista inteira
+        """
+        with self._lock:
+            self._sequencia += 1
+            evento = {
+                'seq': self._sequencia,
+                'empresa': empresa,
+                'tipo': 'recarregar' if recarregar else 'os',
+                'dados': {'recarregar': True} if recarregar else deltas
+            }
+            self._historico.append(evento)
+            for assinatura in self._assinaturas:
+                if assinatura.empresa is None or assinatura.empresa == empresa:
+                    assinatura.entregar(evento)
+
+    def assinar(self, empresa):
+        assinatura = Assinatura(empresa)
+        with self._lock:
+            self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def eventos_desde(self, evento_id, empresa):
+        """
+        Eventos posteriores a um ID, para a retomada
+
+        Returns:
+            list ou None: None quando não dá para retomar (outro processo ou
+                          histórico já descartado): o quadro deve recarregar
+        """
+        try:
+            token, seq = evento_id.rsplit('-', 1)
+            seq = int(seq)
+        except (AttributeError, ValueError):
+            return None
+        if token != self.token:
+            return None
+
+        with self._lock:
+            historico = list(self._historico)
+            atual = self._sequencia
+        if seq < atual and (not historico or historico[0]['seq'] > seq + 1):
+            return None
+        return [
+            evento for evento in historico
+            if evento['seq'] > seq and (empresa is None or evento['empresa'] == empresa)
+        ]
+
+    @property
+    def total_assinaturas(self):
+        with self._lock:
+            return len(self._assinaturas)
+
+
+canal_alteracoes_os = CanalAlteracoesOS()
+
+
+# ---------- Fan-out entre processos (LISTEN/NOTIFY) ----------
+def _publicar_payload(payload):
+    """Repassa ao canal local uma mensagem recebida por NOTIFY"""
+    mensagem = json.loads(payload)
+    canal_alteracoes_os.publicar(
+        mensagem['e'], mensagem.get('d'), recarregar=mensagem.get('r', False)
+    )
+
+
+class OuvinteNotify(threading.Thread):
+    """Thread com conexão própria em LISTEN, que repassa os NOTIFY ao canal local"""
+
+    def __init__(self, engine):
+        super().__init__(name='ouvinte-os-alteracoes', daemon=True)
+        self.engine = engine
+
+    def run(self):
+        while True:
+            conexao = None
+            try:
+                # Conexão fora do pool: fica dedicada ao LISTEN enquanto o processo viver
+                conexao = self.engine.raw_connection()
+                conexao.detach()
+                driver = conexao.driver_connection
+                driver.autocommit = True
+                with driver.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL_NOTIFY}")
+                logger.info(f"📡 Ouvindo {CANAL_NOTIFY} para o feed de OS")
+
+                while True:
+                    if select.select([driver], [], [], 60) == ([], [], []):
+                        continue
+                    driver.poll()
+                    while driver.notifies:
+                        notificacao = driver.notifies.pop(0)
+                        try:
+                            _publicar_payload(notificacao.payload)
+                        except (ValueError, KeyError) as e:
+                            logger.warning(f"⚠️ Notificação de OS inválida: {e}")
+            except Exception as e:
+                logger.warning(f"⚠️ LISTEN {CANAL_NOTIFY} interrompido: {e}; nova tentativa em 5s")
+                time.sleep(5)
+            finally:
+                if conexao is not None:
+                    try:
+                        conexao.close()
+                    except Exception:
+                        pass
+
+
+_ouvinte = None
+_ouvinte_guarda = threading.Lock()
+
+
+def garantir_ouvinte(engine):
+    """Inicia (uma vez por processo) a thread em LISTEN, se o banco for PostgreSQL"""
+    global _ouvinte
+    if engine.dialect.name != 'postgresql' or _ouvinte is not None:
+        return
+    with _ouvinte_guarda:
+        if _ouvinte is None:
+            _ouvinte = OuvinteNotify(engine)
+            _ouvinte.start()
+
+
+# ---------- Deltas ----------
+def _valor(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _delta(objeto, **marcas):
+    delta = {'id': objeto.id, 'empresa': objeto.empresa}
+    for campo in CAMPOS_DELTA:
+        delta[campo] = _valor(getattr(objeto, campo))
+    delta.update(marcas)
+    return delta
+
+
+def _anotar(session, delta):
+    deltas = session.info.setdefault(_CHAVE_DELTAS, {})
+    anterior = deltas.get(delta['id'])
+    if anterior and anterior.get('nova'):
+        delta['nova'] = True
+    deltas[delta['id']] = delta
+
+
+def registrar_os_alteradas(session, ids, nova=False):
+    """
+    Anota OS alteradas por escrita em lote, para o feed no commit
+
+    Os campos do delta são lidos numa consulta no commit.
+
+    Args:
+        session: Sessão que fará o commit
+        ids (iterable): IDs das OS
+        nova (bool): OS recém-criadas (o quadro busca a OS completa)
+    """
+    anotadas = session.info.setdefault(_CHAVE_IDS, {})
+    for os_id in ids:
+        anotadas[os_id] = anotadas.get(os_id, False) or nova
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_alteracoes_flush(session, flush_context):
+    """Deltas das OS criadas, removidas ou com campos do quadro alterados no flush"""
+    for objeto in session.new:
+        if isinstance(objeto, OrdemServico):
+            _anotar(session, _delta(objeto, nova=True))
+
+    for objeto in session.dirty:
+        if isinstance(objeto, OrdemServico):
+            estado = inspect(objeto)
+            if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_DELTA):
+                _anotar(session, _delta(objeto))
+
+    for objeto in session.deleted:
+        if isinstance(objeto, OrdemServico):
+            _anotar(session, {'id': objeto.id, 'empresa': objeto.empresa, 'removida': True})
+
+
+def _carregar_deltas_lote(session, anotadas):
+    colunas = [OrdemServico.id, OrdemServico.empresa] + [getattr(OrdemServico, c) for c in CAMPOS_DELTA]
+    ids = list(anotadas)
+    for inicio in range(0, len(ids), 1000):
+        lote = ids[inicio:inicio + 1000]
+        for linha in session.execute(sql_select(*colunas).where(OrdemServico.id.in_(lote))):
+            delta = {'id': linha.id, 'empresa': linha.empresa}
+            for campo in CAMPOS_DELTA:
+                delta[campo] = _valor(getattr(linha, campo))
+            if anotadas[linha.id]:
+                delta['nova'] = True
+            _anotar(session, delta)
+
+
+def _mensagens_notify(empresa, deltas):
+    """Payloads JSON do NOTIFY de uma empresa, cada um abaixo do limite"""
+    if len(deltas) > LIMITE_DELTAS_COMMIT:
+        return [json.dumps({'e': empresa, 'r': True})]
+
+    mensagens = []
+    lote = []
+    tamanho = 0
+    for delta in deltas:
+        tamanho_delta = len(json.dumps(delta, separators=(',', ':'))) + 1
+        if lote and tamanho + tamanho_delta > TAMANHO_MAXIMO_NOTIFY:
+            mensagens.append(json.dumps({'e': empresa, 'd': lote}, separators=(',', ':')))
+            lote, tamanho = [], 0
+        lote.append(delta)
+        tamanho += tamanho_delta
+    if lote:
+        mensagens.append(json.dumps({'e': empresa, 'd': lote}, separators=(',', ':')))
+    return mensagens
+
+
+def _agrupar_por_empresa(deltas):
+    por_empresa = defaultdict(list)
+    for delta in deltas.values():
+        delta = dict(delta)
+        por_empresa[delta.pop('empresa')].append(delta)
+    return por_empresa
+
+
+@event.listens_for(Session, 'before_commit')
+def _notificar_antes_commit(session):
+    # O flush do commit só acontece depois deste evento: antecipá-lo garante
+    # que after_flush já anotou os deltas das alterações pendentes
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+
+    anotadas = session.info.pop(_CHAVE_IDS, None)
+    if anotadas:
+        _carregar_deltas_lote(session, anotadas)
+
+    deltas = session.info.pop(_CHAVE_DELTAS, None)
+    if not deltas:
+        return
+
+    por_empresa = _agrupar_por_empresa(deltas)
+    if session.get_bind().dialect.name != 'postgresql':
+        session.info[_CHAVE_PUBLICAR] = por_empresa
+        return
+
+    # Na transação: o NOTIFY só é entregue se o commit acontecer
+    for empresa, deltas_empresa in por_empresa.items():
+        for mensagem in _mensagens_notify(empresa, deltas_empresa):
+            session.execute(text("SELECT pg_notify(:canal, :mensagem)"),
+                            {'canal': CANAL_NOTIFY, 'mensagem': mensagem})
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_apos_commit(session):
+    por_empresa = session.info.pop(_CHAVE_PUBLICAR, None)
+    if not por_empresa:
+        return
+    for empresa, deltas in por_empresa.items():
+        if len(deltas) > LIMITE_DELTAS_COMMIT:
+            canal_alteracoes_os.publicar(empresa, recarregar=True)
+        else:
+            canal_alteracoes_os.publicar(empresa, deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_apos_rollback(session):
+    for chave in (_CHAVE_DELTAS, _CHAVE_IDS, _CHAVE_PUBLICAR):
+        session.info.pop(chave, None)
+
+
+# ---------- Server-Sent Events ----------
+def _evento_sse(evento):
+    return (f"event: {evento['tipo']}\n"
+            f"id: {canal_alteracoes_os.token}-{evento['seq']}\n"
+            f"data: {json.dumps(evento['dados'], separators=(',', ':'))}\n\n")
+
+
+def _evento_recarregar():
+    return f"event: recarregar\ndata: {json.dumps({'recarregar': True})}\n\n"
+
+
+def _evento_epoca(dados):
+    # Sem id: o Last-Event-ID do navegador continua sendo o do feed de OS
+    return f"event: epoca\ndata: {json.dumps(dados, default=str, separators=(',', ':'))}\n\n"
+
+
+def eventos_alteracoes_os(empresa=None, ultimo_evento=None, verificar_epoca=None):
+    """
+    Stream Server-Sent Events das alterações de OS da empresa
+
+    Eventos "os" trazem uma lista de deltas (id, status, prioridade,
+    data_programada, usuario_responsavel; nova/removida quando for o caso);
+    "recarregar" pede a lista inteira (retomada impossível ou fila
+    transbordada). Os deltas vêm do canal em processo, sem usar o banco.
+
+    Com verificar_epoca, a cada INTERVALO_EPOCA_SEGUNDOS o stream também
+    envia um evento "epoca" quando há época de geração nova (a primeira
+    verificação, ao conectar, envia o estado atual).
+
+    Args:
+        empresa (str): Empresa do usuário (None = todas)
+        ultimo_evento (str): Last-Event-ID enviado pelo navegador na reconexão
+        verificar_epoca (callable): Recebe a última época enviada e retorna
+                                    (época, dados) ou None se não mudou
+
+    Yields:
+        str: Eventos no formato text/event-stream
+    """
+    assinatura = canal_alteracoes_os.assinar(empresa)
+    ultima_seq = 0
+    ultima_epoca = None
+    try:
+        yield f"retry: {RETRY_SSE_MS}\n\n"
+
+        if ultimo_evento:
+            pendentes = canal_alteracoes_os.eventos_desde(ultimo_evento, empresa)
+            if pendentes is None:
+                yield _evento_recarregar()
+            else:
+                for evento in pendentes:
+                    ultima_seq = evento['seq']
+                    yield _evento_sse(evento)
+
+        inicio = time.monotonic()
+        ultimo_envio = inicio
+        proxima_epoca = inicio
+        while time.monotonic() - inicio < DURACAO_MAXIMA_SSE_SEGUNDOS:
+            agora = time.monotonic()
+            if verificar_epoca is not None and agora >= proxima_epoca:
+                proxima_epoca = agora + INTERVALO_EPOCA_SEGUNDOS
+                nova_epoca = verificar_epoca(ultima_epoca)
+                if nova_epoca is not None:
+                    ultima_epoca, dados = nova_epoca
+                    ultimo_envio = agora
+                    yield _evento_epoca(dados)
+
+            espera = ultimo_envio + HEARTBEAT_SSE_SEGUNDOS - agora
+            if verificar_epoca is not None:
+                espera = min(espera, proxima_epoca - agora)
+            try:
+                evento = assinatura.fila.get(timeout=max(espera, 0.1))
+            except queue.Empty:
+                if time.monotonic() - ultimo_envio >= HEARTBEAT_SSE_SEGUNDOS:
+                    ultimo_envio = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+
+            if assinatura.transbordou:
+                # Eventos perdidos: esvazia a fila e pede a lista inteira
+                ultima_seq = max(ultima_seq, evento['seq'])
+                while not assinatura.fila.empty():
+                    ultima_seq = max(ultima_seq, assinatura.fila.get_nowait()['seq'])
+                assinatura.transbordou = False
+                ultimo_envio = time.monotonic()
+                yield _evento_recarregar()
+                continue
+
+            # Já enviado na retomada
+            if evento['seq'] <= ultima_seq:
+                continue
+            ultima_seq = evento['seq']
+            ultimo_envio = time.monotonic()
+            yield _evento_sse(evento)
+    finally:
+        canal_alteracoes_os.cancelar(assinatura)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Analytics de PMP/OS (dashboard e relatório mensal)
+Cada visão sai de uma única consulta agrupada de OS de PMP, por dia de
+criação (só no período analisado) x status x frequência canônica da PMP,
+com contagem, OS concluídas e soma do tempo de execução; todas as métricas
+são consolidadas dessas poucas linhas em uma passada, sem carregar as OS.
+As métricas de PMP do dashboard vêm de outra consulta agrupada.
+
+O resultado fica em cache por (empresa, mês, ano) no relatório e por
+(empresa, dia) no dashboard, e é descartado quando um commit altera OS da
+empresa (mesma invalidação de estatisticas_agregadas) ou qualquer PMP
+(criação, ativação, exclusão; a PMP não guarda a empresa, então todas as
+empresas são descartadas). O TTL (ANALYTICS_CACHE_TTL) só limita a
+defasagem entre processos.
+"""
+
+import os
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import event, select, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from models import db
+from cache_ttl import CacheTTL
+from assets_models import OrdemServico, Equipamento
+from models.pmp_limpo import PMP
+from estatisticas_agregadas import ao_invalidar
+
+logger = logging.getLogger(__name__)
+
+STATUS_CONCLUIDA = 'concluida'
+STATUS_PENDENTES = ('aberta', 'programada')
+FREQUENCIA_INDEFINIDA = 'indefinida'
+
+# Janelas do dashboard
+DIAS_PERFORMANCE = 30
+DIAS_TENDENCIA = 7
+TOTAL_FREQUENCIAS_POPULARES = 5
+
+_cache_analytics = CacheTTL(ttl=int(os.environ.get('ANALYTICS_CACHE_TTL', 300)), maxsize=256)
+
+# Chave da sessão marcada quando PMPs são alteradas desde o último commit
+_CHAVE_SESSAO = 'analytics_pmps_alteradas'
+
+
+@ao_invalidar
+def invalidar_analytics(empresa=None):
+    """Descarta as visões em cache da empresa (None = todas)"""
+    if empresa is None:
+        _cache_analytics.invalidar()
+    else:
+        _cache_analytics.invalidar(lambda chave: chave[1] in (empresa, None))
+
+
+# ---------- Invalidação no commit de PMPs ----------
+@event.listens_for(Session, 'after_flush')
+def _registrar_pmps_flush(session, flush_context):
+    """Marca a sessão quando PMPs são inseridas, alteradas ou removidas no flush"""
+    if any(isinstance(objeto, PMP) for objeto in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info[_CHAVE_SESSAO] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_pmps_execute(orm_execute_state):
+    """Escritas em lote em PMPs (insert/update/delete ORM ou SQL texto) também marcam a sessão"""
+    statement = orm_execute_state.statement
+
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is PMP:
+            orm_execute_state.session.info[_CHAVE_SESSAO] = True
+
+    elif isinstance(statement, TextClause):
+        sql = statement.text.lstrip().lower()
+        if sql.startswith(('insert', 'update', 'delete')) and PMP.__tablename__ in sql:
+            orm_execute_state.session.info[_CHAVE_SESSAO] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_apos_commit(session):
+    if session.info.pop(_CHAVE_SESSAO, None):
+        invalidar_analytics()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_apos_rollback(session):
+    session.info.pop(_CHAVE_SESSAO, None)
+
+
+def duracao_segundos(fim, inicio):
+    """Diferença entre dois timestamps em segundos, no dialeto do banco"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.extract('epoch', fim - inicio)
+    return (func.julianday(fim) - func.julianday(inicio)) * 86400
+
+
+def _como_data(valor):
+    """date() do banco: date no PostgreSQL, texto YYYY-MM-DD no SQLite"""
+    if valor is None or isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def _agregar_os(empresa, dias_desde, inicio=None, fim=None):
+    """
+    Consulta agrupada das OS de PMP
+
+    Args:
+        empresa (str): Empresa (None = todas as empresas)
+        dias_desde (date): OS criadas a partir desta data são separadas por dia;
+                           as anteriores ficam com dia None
+        inicio, fim (date): Filtro opcional de data de criação [inicio, fim)
+
+    Returns:
+        list: (dia, status, frequencia, total, concluidas_com_data, segundos_execucao)
+    """
+    desde = datetime.combine(dias_desde, time.min)
+    dia = case((OrdemServico.data_criacao >= desde, func.date(OrdemServico.data_criacao)), else_=None)
+    frequencia = func.coalesce(PMP.frequencia_canonica, FREQUENCIA_INDEFINIDA)
+    concluida = OrdemServico.data_conclusao.isnot(None)
+
+    consulta = (
+        select(
+            dia, OrdemServico.status, frequencia,
+            func.count(OrdemServico.id),
+            func.count(case((concluida, 1), else_=None)),
+            func.sum(case((concluida, duracao_segundos(OrdemServico.data_conclusao, OrdemServico.data_criacao)),
+                          else_=None))
+        )
+        .outerjoin(PMP, PMP.id == OrdemServico.pmp_id)
+        .where(OrdemServico.pmp_id.isnot(None))
+        .group_by(dia, OrdemServico.status, frequencia)
+    )
+    if empresa is not None:
+        consulta = consulta.where(OrdemServico.empresa == empresa)
+    if inicio is not None:
+        consulta = consulta.where(OrdemServico.data_criacao >= datetime.combine(inicio, time.min))
+    if fim is not None:
+        consulta = consulta.where(OrdemServico.data_criacao < datetime.combine(fim, time.min))
+
+    return [
+        (_como_data(dia_linha), status, freq, total, concluidas or 0, float(segundos or 0))
+        for dia_linha, status, freq, total, concluidas, segundos in db.session.execute(consulta)
+    ]
+
+
+def _calcular_dashboard(empresa, hoje):
+    inicio_mes = hoje.replace(day=1)
+    inicio_performance = hoje - timedelta(days=DIAS_PERFORMANCE)
+    inicio_tendencia = hoje - timedelta(days=DIAS_TENDENCIA - 1)
+    linhas = _agregar_os(empresa, min(inicio_mes, inicio_performance))
+
+    total_os = 0
+    os_mes_atual = 0
+    por_status = defaultdict(int)
+    performance = defaultdict(lambda: [0, 0.0])
+    tendencia = dict.fromkeys((inicio_tendencia + timedelta(days=i) for i in range(DIAS_TENDENCIA)), 0)
+
+    for dia, status, frequencia, total, concluidas, segundos in linhas:
+        total_os += total
+        por_status[status] += total
+        if dia is None:
+            continue
+        if dia >= inicio_mes:
+            os_mes_atual += total
+        if dia >= inicio_performance and concluidas:
+            performance[frequencia][0] += concluidas
+            performance[frequencia][1] += segundos
+        if dia in tendencia:
+            tendencia[dia] += total
+
+    consulta_pmps = select(
+        PMP.frequencia_canonica, PMP.data_inicio_plano.isnot(None), func.count(PMP.id)
+    ).group_by(PMP.frequencia_canonica, PMP.data_inicio_plano.isnot(None))
+    if empresa is not None:
+        consulta_pmps = consulta_pmps.join(Equipamento, Equipamento.id == PMP.equipamento_id) \
+            .where(Equipamento.empresa == empresa)
+
+    total_pmps = 0
+    pmps_ativas = 0
+    por_frequencia = defaultdict(int)
+    for frequencia, ativa, total in db.session.execute(consulta_pmps):
+        total_pmps += total
+        if ativa:
+            pmps_ativas += total
+        if frequencia is not None:
+            por_frequencia[frequencia] += total
+
+    frequencias_populares = sorted(por_frequencia.items(), key=lambda item: item[1], reverse=True)
+
+    return {
+        'data_geracao': hoje.isoformat(),
+        'metricas_gerais': {
+            'total_pmps': total_pmps,
+            'pmps_ativas': pmps_ativas,
+            'total_os_geradas': total_os,
+            'os_mes_atual': os_mes_atual,
+            'taxa_ativacao': round((pmps_ativas / total_pmps * 100) if total_pmps > 0 else 0, 1)
+        },
+        'os_por_status': [{'status': status, 'quantidade': total} for status, total in por_status.items()],
+        'frequencias_populares': [
+            {'frequencia': frequencia, 'quantidade': total}
+            for frequencia, total in frequencias_populares[:TOTAL_FREQUENCIAS_POPULARES]
+        ],
+        'performance_frequencia': [
+            {
+                'frequencia': frequencia,
+                'total_os': total,
+                'tempo_medio_horas': round(segundos / total / 3600, 2)
+            } for frequencia, (total, segundos) in performance.items()
+        ],
+        'tendencia_7_dias': [{'data': dia.isoformat(), 'os_geradas': total} for dia, total in tendencia.items()]
+    }
+
+
+def _calcular_relatorio_mensal(empresa, mes, ano):
+    inicio_mes = date(ano, mes, 1)
+    proximo_mes = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    linhas = _agregar_os(empresa, inicio_mes, inicio_mes, proximo_mes)
+
+    total_os = 0
+    os_finalizadas = 0
+    os_pendentes = 0
+    freq_stats = {}
+    distribuicao_diaria = defaultdict(int)
+
+    for dia, status, frequencia, total, concluidas, segundos in linhas:
+        total_os += total
+        distribuicao_diaria[dia.day] += total
+
+        stats = freq_stats.setdefault(frequencia, {'total': 0, 'finalizadas': 0, 'tempo_total': 0})
+        stats['total'] += total
+        if status == STATUS_CONCLUIDA:
+            os_finalizadas += total
+            stats['finalizadas'] += total
+            stats['tempo_total'] += segundos / 3600
+        elif status in STATUS_PENDENTES:
+            os_pendentes += total
+
+    for stats in freq_stats.values():
+        stats['taxa_conclusao'] = round(
+            (stats['finalizadas'] / stats['total'] * 100) if stats['total'] > 0 else 0, 1
+        )
+        stats['tempo_medio_horas'] = round(
+            (stats['tempo_total'] / stats['finalizadas']) if stats['finalizadas'] > 0 else 0, 2
+        )
+        stats['tempo_total'] = round(stats['tempo_total'], 2)
+
+    return {
+        'periodo': {
+            'mes': mes,
+            'ano': ano,
+            'inicio': inicio_mes.isoformat(),
+            'fim': (proximo_mes - timedelta(days=1)).isoformat()
+        },
+        'resumo_geral': {
+            'total_os_geradas': total_os,
+            'os_finalizadas': os_finalizadas,
+            'os_pendentes': os_pendentes,
+            'taxa_conclusao_geral': round((os_finalizadas / total_os * 100) if total_os > 0 else 0, 1)
+        },
+        'performance_por_frequencia': freq_stats,
+        'distribuicao_diaria': dict(sorted(distribuicao_diaria.items())),
+        'data_geracao': date.today().isoformat()
+    }
+
+
+def dashboard_pmp(empresa, hoje=None):
+    """
+    Métricas do dashboard de analytics (em cache até a próxima escrita de OS)
+
+    Args:
+        empresa (str): Empresa (None = todas as empresas)
+        hoje (date): Data de referência
+
+    Returns:
+        dict: metricas_gerais, os_por_status, frequencias_populares,
+              performance_frequencia e tendencia_7_dias
+    """
+    hoje = hoje or date.today()
+    return _cache_analytics.obter_ou_calcular(
+        ('dashboard', empresa, hoje),
+        lambda: _calcular_dashboard(empresa, hoje)
+    )
+
+
+def relatorio_mensal_pmp(empresa, mes, ano):
+    """
+    Relatório mensal das OS de PMP criadas no mês (em cache por empresa, mês e ano)
+
+    Args:
+        empresa (str): Empresa (None = todas as empresas)
+        mes (int): Mês (1 a 12)
+        ano (int): Ano
+
+    Returns:
+        dict: periodo, resumo_geral, performance_por_frequencia e distribuicao_diaria
+
+    Raises:
+        ValueError: Mês ou ano inválido
+    """
+    date(ano, mes, 1)
+    return _cache_analytics.obter_ou_calcular(
+        ('mensal', empresa, mes, ano),
+        lambda: _calcular_relatorio_mensal(empresa, mes, ano)
+    )
@@ -2,7 +2,6 @@ import os
 from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from models import db, User
-from auth import auth_bp
 from datetime import datetime
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
@@ -61,337 +60,11 @@ def create_app():
     def load_user(user_id):
         return User.query.get(int(user_id))
     
-    # Registro de blueprints
-    app.register_blueprint(auth_bp)
+    # Registro das blueprints do ambiente (manifesto_blueprints.py)
+    from manifesto_blueprints import registrar_blueprints
+    registrar_blueprints(app)
     
-    # Importar e registrar blueprint de ativos após inicialização do app
-    try:
-        from routes.assets import assets_bp
-        app.register_blueprint(assets_bp)
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar assets_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de ativos.")
-    
-    # Importar e registrar blueprint de chamados
-    try:
-        from routes.chamados import chamados_bp
-        app.register_blueprint(chamados_bp)
-        print("Blueprint de chamados registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar chamados_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de chamados.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de chamados: {e}")
-        print("Sistema funcionará sem funcionalidades de chamados.")
-    
-    # Importar e registrar blueprint de ordens de serviço
-    try:
-        from routes.ordens_servico import ordens_servico_bp
-        app.register_blueprint(ordens_servico_bp)
-        print("Blueprint de ordens de serviço registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar ordens_servico_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de OS.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de ordens de serviço: {e}")
-        print("Sistema funcionará sem funcionalidades de OS.")
-    
-    # Importar e registrar blueprint de desprogramação de OS
-    try:
-        from routes.ordens_servico_desprogramar import ordens_servico_desprogramar_bp
-        app.register_blueprint(ordens_servico_desprogramar_bp)
-        print("Blueprint de desprogramação de OS registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar ordens_servico_desprogramar_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de desprogramação de OS.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de desprogramação de OS: {e}")
-        print("Sistema funcionará sem funcionalidades de desprogramação de OS.")
-    
-    # Importar e registrar blueprint de execução de OS
-    try:
-        from routes.execucao_os import execucao_bp
-        app.register_blueprint(execucao_bp)
-        print("Blueprint de execução de OS registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar execucao_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de execução de OS.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de execução de OS: {e}")
-        print("Sistema funcionará sem funcionalidades de execução de OS.")
-    
-    # Importar e registrar blueprint de plano mestre
-    try:
-        from routes.plano_mestre import plano_mestre_bp
-        app.register_blueprint(plano_mestre_bp)
-        print("Blueprint de plano mestre registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar plano_mestre_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de plano mestre.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de plano mestre: {e}")
-        print("Sistema funcionará sem funcionalidades de plano mestre.")
-    
-    # Importar e registrar blueprint de debug do plano mestre
-    try:
-        from routes.plano_mestre_debug import plano_mestre_debug_bp
-        app.register_blueprint(plano_mestre_debug_bp)
-        print("Blueprint de debug do plano mestre registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar plano_mestre_debug_bp: {e}")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de debug do plano mestre: {e}")
-    
-    # Importar e registrar blueprint de PMP LIMPO
-    try:
-        from routes.pmp_limpo import pmp_limpo_bp
-        app.register_blueprint(pmp_limpo_bp)
-        print("Blueprint de PMP LIMPO registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar pmp_limpo_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de PMP.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de PMP LIMPO: {e}")
-        print("Sistema funcionará sem funcionalidades de PMP.")
-    
-    # Importar e registrar blueprint de geração de OS baseada em PMP
-    try:
-        from routes.pmp_os_generator import pmp_os_generator_bp
-        app.register_blueprint(pmp_os_generator_bp)
-        print("Blueprint de geração de OS PMP registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar pmp_os_generator_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de geração automática de OS.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de geração de OS PMP: {e}")
-        print("Sistema funcionará sem funcionalidades de geração automática de OS.")
-    
-    # 🚨 BLUEPRINT SIMPLES DE EMERGÊNCIA PARA RESOLVER ERRO 404
-    try:
-        from routes.pmp_simple_api import pmp_simple_api_bp
-        app.register_blueprint(pmp_simple_api_bp)
-        print("✅ Blueprint SIMPLES de PMP registrado com sucesso (versão de emergência)")
-    except ImportError as e:
-        print(f"❌ Erro ao importar pmp_simple_api_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint simples: {e}")
-    
-    # 🧹 BLUEPRINT DE LIMPEZA E MANUTENÇÃO
-    try:
-        from routes.pmp_cleanup_api import pmp_cleanup_api_bp
-        app.register_blueprint(pmp_cleanup_api_bp)
-        print("✅ Blueprint de LIMPEZA PMP registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar pmp_cleanup_api_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de limpeza: {e}")
-    
-    # 👤 BLUEPRINT DE TESTE DE USUÁRIOS
-    try:
-        from routes.usuario_test_api import usuario_test_api_bp
-        app.register_blueprint(usuario_test_api_bp)
-        print("✅ Blueprint de TESTE DE USUÁRIOS registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar usuario_test_api_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de usuários: {e}")
-    
-    # 🔍 BLUEPRINT DE DEBUG DE USUÁRIOS
-    try:
-        from routes.debug_users_api import debug_users_api_bp
-        app.register_blueprint(debug_users_api_bp)
-        print("✅ Blueprint de DEBUG DE USUÁRIOS registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar debug_users_api_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de debug: {e}")
-    
-    # 🔧 BLUEPRINT DE DEBUG DE ATIVIDADES
-    try:
-        from routes.debug_atividades_api import debug_atividades_api_bp
-        app.register_blueprint(debug_atividades_api_bp)
-        print("✅ Blueprint de DEBUG DE ATIVIDADES registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar debug_atividades_api_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de debug atividades: {e}")
-    
-    # 🔍 BLUEPRINT DE DEBUG DE OS ATIVIDADES
-    try:
-        from routes.debug_os_atividades import debug_os_atividades_bp
-        app.register_blueprint(debug_os_atividades_bp)
-        print("✅ Blueprint de DEBUG DE OS ATIVIDADES registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar debug_os_atividades_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de debug OS atividades: {e}")
-    
-    # Importar e registrar blueprint de API aprimorada (como backup)
-    try:
-        from routes.pmp_os_api import pmp_os_api_bp
-        app.register_blueprint(pmp_os_api_bp)
-        print("Blueprint de API aprimorada PMP OS registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar pmp_os_api_bp: {e}")
-        print("Sistema funcionará com API simples de PMP.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de API aprimorada PMP OS: {e}")
-        print("Sistema funcionará com API simples de PMP.")
-    
-    # Importar e registrar blueprint de status automático (como backup)
-    try:
-        from routes.pmp_auto_status import pmp_auto_status_bp
-        app.register_blueprint(pmp_auto_status_bp)
-        print("Blueprint de status automático PMP registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar pmp_auto_status_bp: {e}")
-        print("Sistema funcionará com status simples de PMP.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de status automático: {e}")
-        print("Sistema funcionará com status simples de PMP.")
-    
-    # Importar e registrar blueprint de debug (apenas em desenvolvimento)
-    try:
-        from routes.debug_routes import debug_routes_bp
-        app.register_blueprint(debug_routes_bp)
-        print("Blueprint de debug registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar debug_routes_bp: {e}")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de debug: {e}")
-    
-    # 🔧 REGISTRO MANUAL FORÇADO DAS BLUEPRINTS PMP (para resolver erro 404)
-    print("🔧 Forçando registro manual das blueprints PMP...")
-    
-    # Registro forçado da blueprint pmp_os_api
-    try:
-        from routes.pmp_os_api import pmp_os_api_bp
-        if 'pmp_os_api' not in app.blueprints:
-            app.register_blueprint(pmp_os_api_bp)
-            print("✅ pmp_os_api_bp registrada manualmente")
-        else:
-            print("⚠️ pmp_os_api_bp já estava registrada")
-    except Exception as e:
-        print(f"❌ Erro ao registrar pmp_os_api_bp manualmente: {e}")
-    
-    # Registro forçado da blueprint pmp_auto_status
-    try:
-        from routes.pmp_auto_status import pmp_auto_status_bp
-        if 'pmp_auto_status' not in app.blueprints:
-            app.register_blueprint(pmp_auto_status_bp)
-            print("✅ pmp_auto_status_bp registrada manualmente")
-        else:
-            print("⚠️ pmp_auto_status_bp já estava registrada")
-    except Exception as e:
-        print(f"❌ Erro ao registrar pmp_auto_status_bp manualmente: {e}")
-    
-    # Verificar rotas após registro manual
-    try:
-        pmp_routes = [r.rule for r in app.url_map.iter_rules() if '/api/pmp/' in r.rule]
-        print(f"📊 Total de rotas PMP registradas: {len(pmp_routes)}")
-        
-        # Verificar rotas específicas que estavam falhando
-        target_routes = ['/api/pmp/os/verificar-pendencias', '/api/pmp/os/gerar-todas', '/api/pmp/os/executar-automatico']
-        for target in target_routes:
-            found = any(r.rule == target for r in app.url_map.iter_rules())
-            status = "✅" if found else "❌"
-            print(f"   {status} {target}")
-    except Exception as e:
-        print(f"❌ Erro ao verificar rotas: {e}")
-    
-    # Importar e registrar blueprint de agendamento por frequência
-    try:
-        from routes.pmp_scheduler import pmp_scheduler_bp
-        app.register_blueprint(pmp_scheduler_bp)
-        print("Blueprint de agendamento PMP registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar pmp_scheduler_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de agendamento.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de agendamento PMP: {e}")
-        print("Sistema funcionará sem funcionalidades de agendamento.")
-    
-    # Importar e registrar blueprint de API de programação
-    try:
-        from routes.programacao_api import programacao_api_bp
-        app.register_blueprint(programacao_api_bp)
-        print("Blueprint de API de programação registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar programacao_api_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de programação via API.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de API de programação: {e}")
-        print("Sistema funcionará sem funcionalidades de programação via API.")
-    
-    # Importar e registrar blueprint de analytics PMP
-    try:
-        from routes.pmp_analytics import pmp_analytics_bp
-        app.register_blueprint(pmp_analytics_bp)
-        print("Blueprint de analytics PMP registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar pmp_analytics_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de analytics.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de analytics PMP: {e}")
-        print("Sistema funcionará sem funcionalidades de analytics.")
-
-    
-    # Importar e registrar a blueprint de atividades da os
-    try:
-        from routes.atividades_os import atividades_os_bp
-        app.register_blueprint(atividades_os_bp)
-        print("Blueprint de atividades da os registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar atividades_os_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de atividades da OS.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de atividades_os_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de atividades da OS.")
-        
-    # Importar e registrar a blueprint do relatório de 52 semanas
-    try:
-        from routes.relatorio_52_semanas import relatorio_52_semanas_bp
-        app.register_blueprint(relatorio_52_semanas_bp)
-        print("Blueprint do relatório de 52 semanas registrado com sucesso")
-    except ImportError as e:
-        print(f"Aviso: Não foi possível importar relatorio_52_semanas_bp: {e}")
-        print("Sistema funcionará sem funcionalidades de relatório de 52 semanas.")
-    except Exception as e:
-        print(f"Erro ao registrar blueprint de relatório de 52 semanas: {e}")
-        print("Sistema funcionará sem funcionalidades de relatório de 52 semanas.")
-    
-    # 🔄 BLUEPRINT DE ATIVIDADES COM FALLBACK
-    try:
-        from routes.atividades_os_com_fallback import atividades_os_fallback_bp
-        app.register_blueprint(atividades_os_fallback_bp)
-        print("✅ Blueprint de ATIVIDADES COM FALLBACK registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar atividades_os_fallback_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de atividades fallback: {e}")
-    '''
-    # 📊 BLUEPRINT DE STATUS DA TRANSFERÊNCIA AUTOMÁTICA
-    try:
-        from routes.auto_transfer_status import auto_transfer_status_bp
-        app.register_blueprint(auto_transfer_status_bp)
-        print("✅ Blueprint de STATUS TRANSFERÊNCIA AUTOMÁTICA registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar auto_transfer_status_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de status transferência: {e}")
-    '''
-    
-    # 📦 BLUEPRINT DE MATERIAIS
-    try:
-        from routes.materiais_api import materiais_bp
-        app.register_blueprint(materiais_bp)
-        print("✅ Blueprint de materiais registrado com sucesso")
-    except ImportError as e:
-        print(f"❌ Erro ao importar materiais_bp: {e}")
-    except Exception as e:
-        print(f"❌ Erro ao registrar blueprint de materiais: {e}")
-    
-        # Rotas para arquivos estáticos
+    # Rotas para arquivos estáticos
     @app.route('/')
     def index():
         return send_from_directory('static', 'index.html')
@@ -944,50 +617,11 @@ def create_app():
                 'message': str(e)
             }), 500
 
-    # Inicializar scheduler automático de PMPs
-    try:
-        from pmp_scheduler_automatico import iniciar_scheduler
-        
-        # Inicializar em thread separada para não bloquear a aplicação
-        import threading
-        def init_scheduler():
-            try:
-                iniciar_scheduler()
-                print("✅ Scheduler automático de PMPs iniciado com sucesso")
-            except Exception as e:
-                print(f"❌ Erro ao iniciar scheduler automático: {e}")
-        
-        # Aguardar um pouco para a aplicação inicializar completamente
-        timer = threading.Timer(10.0, init_scheduler)
-        timer.daemon = True
-        timer.start()
-        
-    except ImportError as e:
-        print(f"Aviso: Scheduler automático não disponível: {e}")
-    except Exception as e:
-        print(f"Erro ao configurar scheduler automático: {e}")
+    # O scheduler automático de PMPs roda em processo próprio
+    # (processo "scheduler" do Procfile: python pmp_scheduler_automatico.py)
     
-    # 🚀 EXECUTAR TRANSFERÊNCIA DE ATIVIDADES NA INICIALIZAÇÃO
-    try:
-        import subprocess
-        import threading
-        
-        def executar_transferencia():
-            try:
-                print("🚀 Iniciando transferência de atividades em background...")
-                subprocess.run(['python3', 'transferir_atividades.py'], 
-                             cwd='/app', capture_output=True, text=True)
-                print("✅ Transferência de atividades concluída")
-            except Exception as e:
-                print(f"⚠️ Erro na transferência: {e}")
-        
-        # Executar em thread separada para não bloquear a inicialização
-        thread = threading.Thread(target=executar_transferencia)
-        thread.daemon = True
-        thread.start()
-        
-    except Exception as e:
-        print(f"⚠️ Erro ao inicializar transferência: {e}")
+    # Atividades das OS: gravadas na criação da OS e completadas pelo job
+    # reconciliacao_atividades do scheduler (auto_transferir_atividades.py)
     
     return app
 
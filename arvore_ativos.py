@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Árvore de ativos (filiais > setores > equipamentos)
+A árvore completa sai de três consultas planas (filiais, setores dessas
+filiais, equipamentos desses setores) montadas em memória, sem carregar
+relacionamentos. Cada empresa tem um contador de versão na tabela
+versoes_ativos, incrementado no commit de qualquer escrita em filiais,
+setores ou equipamentos; a versão compõe o ETag da rota /api/arvore-ativos.
+"""
+
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, select, func, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from models import db
+from assets_models import Filial, Setor, Equipamento, VersaoAtivos
+
+# Versão das escritas em lote, que não dizem a empresa (vale para todas)
+EMPRESA_TODAS = '*'
+
+# Chave da sessão com as empresas alteradas desde o último commit (None = todas)
+_CHAVE_SESSAO = 'arvore_empresas_alteradas'
+_MODELOS_MONITORADOS = (Filial, Setor, Equipamento)
+_TABELAS_MONITORADAS = ('filiais', 'setores', 'equipamentos')
+
+_tabela_verificada = False
+_tabela_guarda = threading.Lock()
+
+
+def _garantir_tabela():
+    global _tabela_verificada
+    if _tabela_verificada:
+        return
+    with _tabela_guarda:
+        if not _tabela_verificada:
+            VersaoAtivos.__table__.create(db.engine, checkfirst=True)
+            _tabela_verificada = True
+
+
+def _tabela_existe():
+    # Só o "existe" fica em cache: a tabela pode ser criada por outro processo
+    global _tabela_verificada
+    if not _tabela_verificada and db.inspect(db.engine).has_table(VersaoAtivos.__tablename__):
+        _tabela_verificada = True
+    return _tabela_verificada
+
+
+# ---------- Versão / ETag ----------
+def versao_arvore(empresa=None):
+    """
+    Versão atual da árvore de ativos
+
+    Args:
+        empresa (str): Empresa do usuário; None = todas (usuário master)
+
+    Returns:
+        str: Identificador da versão (muda a cada commit que altera ativos)
+    """
+    _garantir_tabela()
+
+    tabela = VersaoAtivos.__table__
+    if empresa is None:
+        # Soma dos contadores (só crescem) e quantidade de empresas registradas
+        total, quantidade = db.session.execute(
+            select(func.coalesce(func.sum(tabela.c.versao), 0), func.count())
+        ).one()
+        return f"{quantidade}.{total}"
+
+    versoes = dict(db.session.execute(
+        select(tabela.c.empresa, tabela.c.versao)
+        .where(tabela.c.empresa.in_([empresa, EMPRESA_TODAS]))
+    ).all())
+    return f"{versoes.get(empresa, 0)}.{versoes.get(EMPRESA_TODAS, 0)}"
+
+
+def etag_arvore(empresa, parametros=''):
+    """ETag da árvore para a empresa e os parâmetros da consulta"""
+    escopo = hashlib.md5(f"{empresa or ''}|{parametros}".encode('utf-8')).hexdigest()[:12]
+    return f"arvore-{versao_arvore(empresa)}-{escopo}"
+
+
+def _upsert_dialeto(session):
+    """Insert com ON CONFLICT do banco atual (ou None)"""
+    dialeto = session.get_bind().dialect.name
+
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    return insert(VersaoAtivos.__table__)
+
+
+def incrementar_versoes(session, empresas):
+    """
+    Incrementa a versão das empresas na transação da sessão
+
+    Args:
+        session: Sessão que está fazendo commit
+        empresas (set): Empresas alteradas; None no conjunto = escrita em lote
+    """
+    tabela = VersaoAtivos.__table__
+    agora = datetime.utcnow()
+    empresas = {EMPRESA_TODAS if empresa is None else empresa for empresa in empresas}
+    insert_base = _upsert_dialeto(session)
+
+    for empresa in sorted(empresas):
+        if insert_base is not None:
+            session.execute(
+                insert_base.values(empresa=empresa, versao=1, atualizado_em=agora)
+                .on_conflict_do_update(
+                    index_elements=[tabela.c.empresa],
+                    set_={'versao': tabela.c.versao + 1, 'atualizado_em': agora}
+                )
+            )
+            continue
+
+        atualizadas = session.execute(
+            update(tabela).where(tabela.c.empresa == empresa)
+            .values(versao=tabela.c.versao + 1, atualizado_em=agora)
+        ).rowcount
+        if not atualizadas:
+            session.execute(tabela.insert().values(empresa=empresa, versao=1, atualizado_em=agora))
+
+
+# ---------- Incremento automático no commit ----------
+def _marcar_empresa(session, empresa):
+    alteradas = session.info.setdefault(_CHAVE_SESSAO, set())
+    alteradas.add(empresa)
+
+
+def registrar_alteracao_empresa(session, empresa):
+    """
+    Anota a empresa para o incremento de versão no commit
+
+    Para escritas em lote pela tabela (Core), que não passam pelo flush nem
+    identificam a empresa; assim só a versão dessa empresa muda.
+    """
+    _marcar_empresa(session, empresa)
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_alteracoes_flush(session, flush_context):
+    """Anota as empresas de filiais/setores/equipamentos inseridos, alterados ou removidos"""
+    for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(objeto, _MODELOS_MONITORADOS):
+            _marcar_empresa(session, getattr(objeto, 'empresa', None))
+            # Ativo que mudou de empresa: a árvore da empresa anterior também muda
+            for empresa_anterior in db.inspect(objeto).attrs.empresa.history.deleted:
+                _marcar_empresa(session, empresa_anterior)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_alteracoes_execute(orm_execute_state):
+    """Escritas em lote (insert/update/delete ORM ou SQL texto) marcam todas as empresas"""
+    statement = orm_execute_state.statement
+
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in _MODELOS_MONITORADOS:
+            _marcar_empresa(orm_execute_state.session, None)
+
+    elif isinstance(statement, TextClause):
+        sql = statement.text.lstrip().lower()
+        if sql.startswith(('insert', 'update', 'delete')) and any(t in sql for t in _TABELAS_MONITORADAS):
+            _marcar_empresa(orm_execute_state.session, None)
+
+
+@event.listens_for(Session, 'before_commit')
+def _incrementar_antes_commit(session):
+    # O flush do commit só acontece depois deste evento: antecipá-lo garante
+    # que after_flush já anotou as empresas das alterações pendentes
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+
+    alteradas = session.info.pop(_CHAVE_SESSAO, None)
+    if not alteradas:
+        return
+
+    if not _tabela_existe():
+        # Ninguém leu a árvore ainda: não há ETag emitido a invalidar
+        return
+
+    # Na mesma transação: se o incremento falhar, o commit dos ativos também falha
+    incrementar_versoes(session, alteradas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_apos_rollback(session):
+    session.info.pop(_CHAVE_SESSAO, None)
+
+
+# ---------- Consultas ----------
+def _filiais_query(empresa):
+    query = select(*Filial.__table__.c)
+    if empresa is not None:
+        query = query.where(Filial.empresa == empresa)
+    return query
+
+
+def _ids_filiais(empresa):
+    query = select(Filial.id)
+    if empresa is not None:
+        query = query.where(Filial.empresa == empresa)
+    return query
+
+
+def _ids_setores(empresa):
+    return select(Setor.id).where(Setor.filial_id.in_(_ids_filiais(empresa)))
+
+
+def _data_iso(valor):
+    return valor.isoformat() if valor else None
+
+
+def _filial_dict(linha):
+    """Mesmas chaves de Filial.to_dict()"""
+    return {
+        'id': linha.id,
+        'tag': linha.tag,
+        'descricao': linha.descricao,
+        'endereco': linha.endereco,
+        'cidade': linha.cidade,
+        'estado': linha.estado,
+        'email': linha.email,
+        'telefone': linha.telefone,
+        'cnpj': linha.cnpj,
+        'empresa': linha.empresa,
+        'data_criacao': _data_iso(linha.data_criacao),
+        'usuario_criacao': linha.usuario_criacao
+    }
+
+
+def _setor_dict(linha, filial):
+    """Mesmas chaves de Setor.to_dict(), com a filial vinda do mapa em memória"""
+    return {
+        'id': linha.id,
+        'tag': linha.tag,
+        'descricao': linha.descricao,
+        'filial_id': linha.filial_id,
+        'filial_tag': filial['tag'] if filial else None,
+        'filial_descricao': filial['descricao'] if filial else None,
+        'empresa': linha.empresa,
+        'data_criacao': _data_iso(linha.data_criacao),
+        'usuario_criacao': linha.usuario_criacao
+    }
+
+
+def _equipamento_dict(linha, setor):
+    """Mesmas chaves de Equipamento.to_dict(), com setor e filial vindos do mapa em memória"""
+    return {
+        'id': linha.id,
+        'tag': linha.tag,
+        'descricao': linha.descricao,
+        'setor_id': linha.setor_id,
+        'setor_tag': setor['tag'] if setor else None,
+        'setor_descricao': setor['descricao'] if setor else None,
+        'filial_id': setor['filial_id'] if setor else None,
+        'filial_tag': setor['filial_tag'] if setor else None,
+        'filial_descricao': setor['filial_descricao'] if setor else None,
+        'foto': linha.foto,
+        'empresa': linha.empresa,
+        'data_criacao': _data_iso(linha.data_criacao),
+        'usuario_criacao': linha.usuario_criacao
+    }
+
+
+def montar_arvore(empresa=None):
+    """
+    Árvore completa com três consultas planas
+
+    Args:
+        empresa (str): Empresa do usuário; None = todas (usuário master)
+
+    Returns:
+        list: Filiais, cada uma com 'setores', cada setor com 'equipamentos'
+    """
+    filiais = [_filial_dict(linha) for linha in
+               db.session.execute(_filiais_query(empresa).order_by(Filial.id))]
+    filiais_por_id = {filial['id']: filial for filial in filiais}
+
+    setores_linhas = db.session.execute(
+        select(*Setor.__table__.c)
+        .where(Setor.filial_id.in_(_ids_filiais(empresa)))
+        .order_by(Setor.id)
+    )
+    setores_por_id = {}
+    setores_por_filial = defaultdict(list)
+    for linha in setores_linhas:
+        setor = _setor_dict(linha, filiais_por_id.get(linha.filial_id))
+        setor['equipamentos'] = []
+        setores_por_id[setor['id']] = setor
+        setores_por_filial[setor['filial_id']].append(setor)
+
+    equipamentos_linhas = db.session.execute(
+        select(*Equipamento.__table__.c)
+        .where(Equipamento.setor_id.in_(_ids_setores(empresa)))
+        .order_by(Equipamento.id)
+    )
+    for linha in equipamentos_linhas:
+        setor = setores_por_id.get(linha.setor_id)
+        if setor is not None:
+            setor['equipamentos'].append(_equipamento_dict(linha, setor))
+
+    for filial in filiais:
+        filial['setores'] = setores_por_filial.get(filial['id'], [])
+
+    return filiais
+
+
+# ---------- Expansão sob demanda (um nível por requisição) ----------
+def listar_filiais(empresa=None):
+    """Filiais com a quantidade de setores de cada uma"""
+    totais = dict(db.session.execute(
+        select(Setor.filial_id, func.count())
+        .where(Setor.filial_id.in_(_ids_filiais(empresa)))
+        .group_by(Setor.filial_id)
+    ).all())
+
+    filiais = []
+    for linha in db.session.execute(_filiais_query(empresa).order_by(Filial.id)):
+        filial = _filial_dict(linha)
+        filial['total_setores'] = totais.get(filial['id'], 0)
+        filiais.append(filial)
+    return filiais
+
+
+def listar_setores(filial_id, empresa=None):
+    """
+    Setores de uma filial com a quantidade de equipamentos de cada um
+
+    Returns:
+        list ou None: None se a filial não existe (ou é de outra empresa)
+    """
+    filial_linha = db.session.execute(_filiais_query(empresa).where(Filial.id == filial_id)).first()
+    if filial_linha is None:
+        return None
+    filial = _filial_dict(filial_linha)
+
+    ids_setores = select(Setor.id).where(Setor.filial_id == filial_id)
+    totais = dict(db.session.execute(
+        select(Equipamento.setor_id, func.count())
+        .where(Equipamento.setor_id.in_(ids_setores))
+        .group_by(Equipamento.setor_id)
+    ).all())
+
+    setores = []
+    for linha in db.session.execute(
+        select(*Setor.__table__.c).where(Setor.filial_id == filial_id).order_by(Setor.id)
+    ):
+        setor = _setor_dict(linha, filial)
+        setor['total_equipamentos'] = totais.get(setor['id'], 0)
+        setores.append(setor)
+    return setores
+
+
+def listar_equipamentos(setor_id, empresa=None):
+    """
+    Equipamentos de um setor
+
+    Returns:
+        list ou None: None se o setor não existe (ou é de outra empresa)
+    """
+    setor_linha = db.session.execute(
+        select(*Setor.__table__.c)
+        .where(Setor.id == setor_id, Setor.filial_id.in_(_ids_filiais(empresa)))
+    ).first()
+    if setor_linha is None:
+        return None
+
+    filial_linha = db.session.execute(_filiais_query(None).where(Filial.id == setor_linha.filial_id)).first()
+    setor = _setor_dict(setor_linha, _filial_dict(filial_linha) if filial_linha else None)
+
+    return [
+        _equipamento_dict(linha, setor) for linha in db.session.execute(
+            select(*Equipamento.__table__.c).where(Equipamento.setor_id == setor_id).order_by(Equipamento.id)
+        )
+    ]
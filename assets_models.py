@@ -93,6 +93,14 @@ class Equipamento(db.Model):
             'usuario_criacao': self.usuario_criacao
         }
 
+class VersaoAtivos(db.Model):
+    """Contador de versão da árvore de ativos por empresa (ETag de /api/arvore-ativos)"""
+    __tablename__ = 'versoes_ativos'
+
+    empresa = db.Column(db.String(100), primary_key=True)  # '*' = escritas em lote sem empresa conhecida
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Categoria(db.Model):
     __tablename__ = 'categorias'
     
@@ -116,6 +124,9 @@ class Categoria(db.Model):
 
 class Chamado(db.Model):
     __tablename__ = 'chamados'
+    __table_args__ = (
+        db.Index('idx_chamados_empresa_status', 'empresa', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.Text, nullable=False)
@@ -158,8 +169,30 @@ class Chamado(db.Model):
         }
 
 
+def _data_ocorrencia_padrao(context):
+    # A ocorrência da PMP é a data programada com que a OS nasce (inclusive em inserts em lote)
+    return context.get_current_parameters().get('data_programada')
+
+
 class OrdemServico(db.Model):
     __tablename__ = 'ordens_servico'
+    __table_args__ = (
+        # Listagens e estatísticas por empresa
+        db.Index('idx_os_empresa_status', 'empresa', 'status'),
+        db.Index('idx_os_empresa_data_criacao', 'empresa', 'data_criacao', 'id'),
+        # Uma única OS por ocorrência da PMP: chave do INSERT ... ON CONFLICT
+        # DO NOTHING da geração de OS (data_ocorrencia não muda ao reprogramar)
+        db.Index('uq_os_pmp_ocorrencia', 'pmp_id', 'data_ocorrencia', unique=True,
+                 postgresql_where=db.text('pmp_id IS NOT NULL AND data_ocorrencia IS NOT NULL'),
+                 sqlite_where=db.text('pmp_id IS NOT NULL AND data_ocorrencia IS NOT NULL')),
+        # Uma PMP não tem duas OS programadas no mesmo dia, nem duas com a mesma sequência
+        db.Index('uq_os_pmp_data_programada', 'pmp_id', 'data_programada', unique=True,
+                 postgresql_where=db.text('pmp_id IS NOT NULL AND data_programada IS NOT NULL'),
+                 sqlite_where=db.text('pmp_id IS NOT NULL AND data_programada IS NOT NULL')),
+        db.Index('uq_os_pmp_sequencia', 'pmp_id', 'numero_sequencia', unique=True,
+                 postgresql_where=db.text('pmp_id IS NOT NULL'),
+                 sqlite_where=db.text('pmp_id IS NOT NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     chamado_id = db.Column(db.Integer, db.ForeignKey('chamados.id'), nullable=True)  # Pode ser criada sem chamado
@@ -188,6 +221,8 @@ class OrdemServico(db.Model):
     data_proxima_geracao = db.Column(db.Date, nullable=True)
     frequencia_origem = db.Column(db.String(20), nullable=True)
     numero_sequencia = db.Column(db.Integer, nullable=False, default=1)
+    # Data da ocorrência da PMP que originou a OS; fixa, ao contrário de data_programada
+    data_ocorrencia = db.Column(db.Date, nullable=True, default=_data_ocorrencia_padrao)
     
     # Datas
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
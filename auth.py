@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, redirect, url_for, render_template
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User, db
+from routes.usuario_helper import invalidar_cache_usuario
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api')
 
@@ -20,14 +21,6 @@ def login():
             
         login_user(user)
         
-        # 🚀 EXECUTAR TRANSFERÊNCIA AUTOMÁTICA DE ATIVIDADES APÓS LOGIN
-        try:
-            from auto_transferir_atividades import executar_apos_login
-            executar_apos_login()
-        except Exception as e:
-            # Não falhar o login se a transferência der erro
-            print(f"⚠️ Erro na transferência automática: {e}")
-        
         return jsonify({
             'success': True, 
             'message': 'Login realizado com sucesso',
@@ -132,6 +125,7 @@ def create_user():
     try:
         db.session.add(new_user)
         db.session.commit()
+        invalidar_cache_usuario(new_user.id)
         return jsonify({
             'success': True, 
             'message': 'Usuário criado com sucesso',
@@ -193,6 +187,7 @@ def update_user(user_id):
     
     try:
         db.session.commit()
+        invalidar_cache_usuario(user_id)
         return jsonify({
             'success': True, 
             'message': 'Usuário atualizado com sucesso',
@@ -241,6 +236,7 @@ def delete_user(user_id):
     try:
         db.session.delete(user_to_delete)
         db.session.commit()
+        invalidar_cache_usuario(user_id)
         return jsonify({
             'success': True, 
             'message': 'Usuário excluído com sucesso'
@@ -1,135 +1,132 @@
 """
-Sistema de transferência automática de atividades após login
+Transferência de atividades das PMPs para as OS
+
+As atividades são gravadas quando a OS é criada (criar_atividades_os). As OS
+que ficarem sem atividades (criadas por rotinas antigas ou por SQL direto)
+são cobertas pelo reconciliador, um job do scheduler que olha apenas os IDs
+acima da marca d'água gravada na última execução. Nada disso roda no login.
 """
 
-from flask import current_app
+import json
+from datetime import datetime
+from sqlalchemy import text, bindparam
 from models import db
-import threading
-import time
-from datetime import datetime, timedelta
-
-
-class AutoTransferirAtividades:
-    def __init__(self):
-        self.ultima_execucao = None
-        self.executando = False
-        self.intervalo_minimo = 300  # 5 minutos entre execuções
-    
-    def deve_executar(self):
-        """Verifica se deve executar a transferência"""
-        if self.executando:
-            return False
-        
-        if self.ultima_execucao is None:
-            return True
-        
-        agora = datetime.now()
-        if (agora - self.ultima_execucao).seconds > self.intervalo_minimo:
-            return True
-        
-        return False
-
-    def executar_transferencia(self, app):
-        """Executa a transferência de atividades (dentro do contexto Flask)"""
-        with app.app_context():
-            if not self.deve_executar():
-                app.logger.info("🔄 Transferência de atividades: muito recente, pulando")
-                return
-
-            self.executando = True
-            self.ultima_execucao = datetime.now()
-
-            try:
-                app.logger.info("🚀 Iniciando transferência automática de atividades")
-                
-                # Verificar quantas OS precisam de transferência
-                result = db.engine.execute('''
-                    SELECT COUNT(*) 
-                    FROM ordens_servico os 
-                    WHERE os.pmp_id IS NOT NULL 
-                    AND os.id NOT IN (SELECT DISTINCT os_id FROM atividades_os WHERE os_id IS NOT NULL)
-                ''')
-                total_pendentes = result.fetchone()[0]
-                
-                if total_pendentes == 0:
-                    app.logger.info("✅ Todas as OS já têm atividades - nada para transferir")
-                    return
-                
-                app.logger.info(f"📊 Encontradas {total_pendentes} OS que precisam de atividades")
-                
-                # Executar transferência
-                db.engine.execute('''
-                    INSERT INTO atividades_os (os_id, atividade_pmp_id, descricao, ordem, status, data_criacao, data_atualizacao)
-                    SELECT 
-                        os.id as os_id,
-                        ap.id as atividade_pmp_id,
-                        ap.descricao,
-                        ap.ordem,
-                        'pendente' as status,
-                        NOW() as data_criacao,
-                        NOW() as data_atualizacao
-                    FROM ordens_servico os
-                    INNER JOIN atividades_pmp ap ON os.pmp_id = ap.pmp_id
-                    WHERE os.pmp_id IS NOT NULL
-                    AND os.id NOT IN (SELECT DISTINCT os_id FROM atividades_os WHERE os_id IS NOT NULL)
-                ''')
-                
-                db.session.commit()
-                
-                result = db.engine.execute('SELECT COUNT(*) FROM atividades_os')
-                total_atividades = result.fetchone()[0]
-                
-                app.logger.info(f"✅ Transferência concluída! Total de atividades_os: {total_atividades}")
-            
-            except Exception as e:
-                app.logger.error(f"❌ Erro na transferência automática: {e}")
-                db.session.rollback()
-            finally:
-                self.executando = False
-
-    def executar_em_background(self, app):
-        """Executa a transferência em thread separada"""
-        thread = threading.Thread(target=self.executar_transferencia, args=(app,))
-        thread.daemon = True
-        thread.start()
-
-
-# Instância global
-auto_transferir = AutoTransferirAtividades()
-
-
-def executar_apos_login():
-    """Função para ser chamada após login bem-sucedido"""
-    try:
-        app = current_app._get_current_object()
-        app.logger.info("🔄 Login detectado - verificando necessidade de transferência de atividades")
-        auto_transferir.executar_em_background(app)
-    except Exception as e:
-        current_app.logger.error(f"❌ Erro ao iniciar transferência automática: {e}")
 
+NOME_JOB = 'reconciliacao_atividades'
+
+# IDs de OS por INSERT do reconciliador
+LOTE_RECONCILIACAO = 5000
+
+# A marca recua um pouco a cada execução: uma transação que pegou um ID menor
+# pode ter feito commit depois da execução anterior
+JANELA_SEGURANCA = 500
+
+SQL_INSERIR_ATIVIDADES = """
+    INSERT INTO atividades_os (os_id, atividade_pmp_id, descricao, ordem, status, data_criacao, data_atualizacao)
+    SELECT os.id, ap.id, ap.descricao, ap.ordem, 'pendente', :agora, :agora
+    FROM ordens_servico os
+    JOIN atividades_pmp ap ON ap.pmp_id = os.pmp_id
+    WHERE os.pmp_id IS NOT NULL
+      AND ap.status = 'ativo'
+      AND {filtro}
+      AND NOT EXISTS (SELECT 1 FROM atividades_os a WHERE a.os_id = os.id)
+"""
+
+
+def criar_atividades_os(os_ids):
+    """
+    Copia as atividades ativas da PMP para as OS informadas (que ainda não têm atividades)
 
-def executar_na_inicializacao():
-    """Função para ser chamada na inicialização do app"""
+    Um único INSERT ... SELECT; o commit fica com o chamador.
+
+    Args:
+        os_ids (list): IDs das OS recém-criadas
+
+    Returns:
+        int: Número de atividades criadas
+    """
+    os_ids = [os_id for os_id in os_ids if os_id]
+    if not os_ids:
+        return 0
+
+    sql = text(SQL_INSERIR_ATIVIDADES.format(filtro='os.id IN :ids')).bindparams(
+        bindparam('ids', expanding=True)
+    )
+    return db.session.execute(sql, {'ids': os_ids, 'agora': datetime.utcnow()}).rowcount
+
+
+def ler_marca():
+    """ID da última OS verificada pelo reconciliador (0 se nunca executou)"""
+    from models.execucao_job import ExecucaoJob
+
+    if not db.inspect(db.engine).has_table(ExecucaoJob.__tablename__):
+        return 0
+
+    ultima = ExecucaoJob.query.filter_by(nome=NOME_JOB, status='sucesso')\
+                              .order_by(ExecucaoJob.id.desc()).first()
     try:
-        app = current_app._get_current_object()
-        app.logger.info("🚀 Inicialização do app - verificando atividades pendentes")
+        return int(json.loads(ultima.resultado)['ultimo_os_id']) if ultima and ultima.resultado else 0
+    except (TypeError, ValueError, KeyError):
+        return 0
+
 
-        def delayed_execution():
-            time.sleep(5)
-            auto_transferir.executar_transferencia(app)
-        
-        thread = threading.Thread(target=delayed_execution)
-        thread.daemon = True
-        thread.start()
-        
-    except Exception as e:
-        current_app.logger.error(f"❌ Erro na inicialização automática: {e}")
+def reconciliar_atividades_os(desde=None):
+    """
+    Cria as atividades das OS de PMP que estão sem nenhuma
+
+    Percorre apenas os IDs acima da marca d'água (menos a janela de
+    segurança), em lotes, com anti-join (NOT EXISTS) em atividades_os.
+
+    Args:
+        desde (int): ID inicial; None usa a marca da última execução
+
+    Returns:
+        dict: ultimo_os_id (nova marca), verificado_desde e atividades_criadas
+    """
+    marca = ler_marca() if desde is None else desde
+    maximo = db.session.execute(text("SELECT MAX(id) FROM ordens_servico")).scalar() or 0
+    inicio = max(0, min(marca, maximo) - JANELA_SEGURANCA)
+
+    sql = text(SQL_INSERIR_ATIVIDADES.format(filtro='os.id > :de AND os.id <= :ate'))
+    criadas = 0
+
+    for de in range(inicio, maximo, LOTE_RECONCILIACAO):
+        ate = min(de + LOTE_RECONCILIACAO, maximo)
+        criadas += db.session.execute(sql, {'de': de, 'ate': ate, 'agora': datetime.utcnow()}).rowcount
+        db.session.commit()
+
+    return {
+        'ultimo_os_id': maximo,
+        'verificado_desde': inicio,
+        'atividades_criadas': criadas
+    }
+
+
+def executar_reconciliacao(desde=None):
+    """
+    Executa o reconciliador como job registrado (advisory lock + execucoes_job)
+
+    Returns:
+        str: Resultado de executar_job ('sucesso', 'erro', 'ignorado'...)
+    """
+    from execucao_jobs import executar_job
+
+    return executar_job(NOME_JOB, lambda: reconciliar_atividades_os(desde))
 
 
 def verificar_status():
-    """Retorna status da transferência automática"""
+    """Retorna status do reconciliador de atividades (última execução registrada)"""
+    from models.execucao_job import ExecucaoJob
+
+    if not db.inspect(db.engine).has_table(ExecucaoJob.__tablename__):
+        return {'ultima_execucao': None, 'executando': False, 'ultimo_os_id': 0}
+
+    ultima = ExecucaoJob.query.filter_by(nome=NOME_JOB).order_by(ExecucaoJob.id.desc()).first()
+
     return {
-        'ultima_execucao': auto_transferir.ultima_execucao.isoformat() if auto_transferir.ultima_execucao else None,
-        'executando': auto_transferir.executando,
-        'intervalo_minimo': auto_transferir.intervalo_minimo
+        'ultima_execucao': ultima.iniciado_em.isoformat() if ultima else None,
+        'executando': bool(ultima and ultima.status == 'executando'),
+        'ultimo_status': ultima.status if ultima else None,
+        'ultimo_os_id': ler_marca(),
+        'execucao': ultima.to_dict() if ultima else None
     }
@@ -0,0 +1,281 @@
+"""
+Benchmark dos índices de desempenho
+Popula um banco de teste com dados sintéticos, mede as principais rotas e
+consultas sem os índices dos modelos e depois de criá-los com
+criar_indices_desempenho.py, e imprime a comparação.
+
+Uso:
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmark_indices.py [--os 50000] [--repeticoes 20]
+
+Sem BENCHMARK_DATABASE_URL usa um SQLite temporário. O banco é recriado do
+zero, por isso o script se recusa a rodar em um banco que já tenha OS.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, date, timedelta
+
+# Medir o banco, não o cache em memória das estatísticas/contagens
+os.environ['ESTATISTICAS_CACHE_TTL'] = '0'
+os.environ['OS_CONTAGEM_CACHE_TTL'] = '0'
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask_login import LoginManager
+from sqlalchemy import insert, inspect, text
+
+from models import db, User
+from assets_models import Filial, Setor, Equipamento, Chamado, OrdemServico
+from models.pmp_limpo import PMP, AtividadePMP
+from models.plano_mestre import PlanoMestre, AtividadePlanoMestre
+from models.atividade_os import AtividadeOS
+from criar_indices_desempenho import listar_indices_modelos, criar_indices
+
+STATUS_OS = ['aberta', 'programada', 'em_andamento', 'concluida', 'cancelada']
+PRIORIDADES = ['baixa', 'media', 'alta', 'seguranca', 'preventiva']
+OFICINAS = ['mecanica', 'eletrica', 'automacao', 'operacional']
+
+
+def criar_app_benchmark(database_url):
+    """App mínima com as blueprints medidas (sem scheduler nem tarefas de inicialização)"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = 'benchmark'
+    db.init_app(app)
+
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        return db.session.get(User, int(user_id))
+
+    from routes.ordens_servico import ordens_servico_bp
+    from routes.chamados import chamados_bp
+    from routes.programacao_api import programacao_api_bp
+    app.register_blueprint(ordens_servico_bp)
+    app.register_blueprint(chamados_bp)
+    app.register_blueprint(programacao_api_bp)
+    return app
+
+
+def inserir_lote(modelo, linhas, tamanho=5000):
+    for inicio in range(0, len(linhas), tamanho):
+        db.session.execute(insert(modelo), linhas[inicio:inicio + tamanho])
+
+
+def popular_banco(args):
+    """
+    Cria o esquema e insere os dados sintéticos
+
+    Returns:
+        dict: IDs usados nas medições (usuário, PMPs, OS, datas)
+    """
+    db.drop_all()
+    db.create_all()
+    rnd = random.Random(42)
+    empresas = [f"Empresa {i}" for i in range(1, args.empresas + 1)]
+
+    inserir_lote(User, [{
+        'id': 1, 'email': 'benchmark@ativus', 'password_hash': 'x',
+        'profile': 'admin', 'name': 'Benchmark', 'company': empresas[0], 'status': 'active'
+    }])
+    inserir_lote(Filial, [{
+        'id': i, 'tag': f'F{i}', 'descricao': f'Filial {i}', 'endereco': '-', 'cidade': '-',
+        'estado': 'SP', 'email': '-', 'telefone': '-', 'cnpj': str(i), 'empresa': empresa,
+        'usuario_criacao': 'benchmark'
+    } for i, empresa in enumerate(empresas, 1)])
+    inserir_lote(Setor, [{
+        'id': i, 'tag': f'S{i}', 'descricao': f'Setor {i}', 'filial_id': i, 'empresa': empresa,
+        'usuario_criacao': 'benchmark'
+    } for i, empresa in enumerate(empresas, 1)])
+
+    equipamentos = []
+    for i in range(1, args.equipamentos + 1):
+        indice_empresa = i % len(empresas)
+        equipamentos.append({
+            'id': i, 'tag': f'EQ{i}', 'descricao': f'Equipamento {i}',
+            'setor_id': indice_empresa + 1, 'empresa': empresas[indice_empresa],
+            'usuario_criacao': 'benchmark'
+        })
+    inserir_lote(Equipamento, equipamentos)
+
+    inserir_lote(PlanoMestre, [{'id': 1, 'equipamento_id': 1, 'nome': 'Plano', 'criado_por': 1}])
+    inserir_lote(AtividadePlanoMestre, [{'id': 1, 'plano_mestre_id': 1, 'descricao': 'Atividade', 'criado_por': 1}])
+
+    pmps = [{
+        'id': i, 'codigo': f'PMP-{i:05d}', 'descricao': f'PMP {i}',
+        'equipamento_id': rnd.randint(1, args.equipamentos), 'frequencia': 'semanal',
+        'status': 'ativo', 'criado_por': 1, 'data_inicio_plano': date(2024, 1, 1)
+    } for i in range(1, args.pmps + 1)]
+    inserir_lote(PMP, pmps)
+    inserir_lote(AtividadePMP, [{
+        'pmp_id': pmp['id'], 'atividade_plano_mestre_id': 1, 'ordem': ordem, 'descricao': f'Atividade {ordem}'
+    } for pmp in pmps for ordem in range(1, 4)])
+
+    equipamentos_por_id = {e['id']: e for e in equipamentos}
+    sequencias = {}
+    ordens = []
+    inicio = datetime(2024, 1, 1)
+    for i in range(1, args.os + 1):
+        pmp = pmps[i % len(pmps)]
+        equipamento = equipamentos_por_id[pmp['equipamento_id']]
+        sequencias[pmp['id']] = sequencias.get(pmp['id'], 0) + 1
+        ordens.append({
+            'id': i, 'descricao': f'OS {i}', 'tipo_manutencao': 'preventiva',
+            'oficina': rnd.choice(OFICINAS), 'condicao_ativo': 'funcionando',
+            'qtd_pessoas': 1, 'horas': 1.0, 'hh': 1.0,
+            'prioridade': rnd.choice(PRIORIDADES), 'status': rnd.choice(STATUS_OS),
+            'filial_id': equipamento['setor_id'], 'setor_id': equipamento['setor_id'],
+            'equipamento_id': equipamento['id'], 'empresa': equipamento['empresa'],
+            'usuario_criacao': 'benchmark', 'pmp_id': pmp['id'],
+            'numero_sequencia': sequencias[pmp['id']],
+            'data_programada': date(2024, 1, 1) + timedelta(weeks=sequencias[pmp['id']]),
+            'data_criacao': inicio + timedelta(minutes=i)
+        })
+    inserir_lote(OrdemServico, ordens)
+    inserir_lote(AtividadeOS, [{
+        'os_id': ordem['id'], 'descricao': f'Atividade {n}', 'ordem': n, 'status': 'pendente'
+    } for ordem in ordens for n in range(1, 4)])
+
+    inserir_lote(Chamado, [{
+        'descricao': f'Chamado {i}', 'filial_id': 1, 'setor_id': 1, 'equipamento_id': 1,
+        'prioridade': rnd.choice(PRIORIDADES[:4]), 'status': rnd.choice(['aberto', 'em_andamento', 'resolvido', 'fechado']),
+        'solicitante': 'benchmark', 'empresa': empresas[i % len(empresas)], 'usuario_criacao': 'benchmark'
+    } for i in range(1, args.os // 5 + 1)])
+
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('ANALYZE'))
+
+    amostra = rnd.sample(ordens, min(200, len(ordens)))
+    return {
+        'consultas_os': [(o['pmp_id'], o['data_programada']) for o in amostra],
+        'ids_os': [o['id'] for o in amostra],
+        'ids_pmp': [o['pmp_id'] for o in amostra],
+        'ids_equipamento': [e['id'] for e in equipamentos[:200]]
+    }
+
+
+def medir(funcao, repeticoes):
+    """Mediana (ms) de `repeticoes` execuções, após uma execução de aquecimento"""
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def cenarios(app, amostra):
+    """Lista de (nome, função) medidos"""
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = '1'
+        sessao['_fresh'] = True
+
+    def rota(url):
+        def executar():
+            resposta = cliente.get(url)
+            assert resposta.status_code == 200, f"{url}: {resposta.status_code}"
+        return executar
+
+    def os_por_pmp_data():
+        for pmp_id, data_programada in amostra['consultas_os']:
+            OrdemServico.query.filter_by(pmp_id=pmp_id, data_programada=data_programada).first()
+
+    def ultima_sequencia_pmp():
+        for pmp_id in amostra['ids_pmp']:
+            OrdemServico.query.filter_by(pmp_id=pmp_id).order_by(OrdemServico.numero_sequencia.desc()).first()
+
+    def atividades_da_os():
+        for os_id in amostra['ids_os']:
+            AtividadeOS.query.filter_by(os_id=os_id).all()
+
+    def atividades_da_pmp():
+        for pmp_id in amostra['ids_pmp']:
+            AtividadePMP.query.filter_by(pmp_id=pmp_id).all()
+
+    def pmps_do_equipamento():
+        for equipamento_id in amostra['ids_equipamento']:
+            PMP.query.filter_by(equipamento_id=equipamento_id).all()
+
+    return [
+        ('GET /api/ordens-servico (página 100)', rota('/api/ordens-servico?status=abertas&limit=100&fields=id,status,descricao')),
+        ('GET /api/ordens-servico/estatisticas', rota('/api/ordens-servico/estatisticas')),
+        ('GET /api/chamados/estatisticas', rota('/api/chamados/estatisticas')),
+        ('GET /api/programacao/estatisticas', rota('/api/programacao/estatisticas')),
+        ('OS por (pmp_id, data_programada) x200', os_por_pmp_data),
+        ('Última sequência da PMP x200', ultima_sequencia_pmp),
+        ('Atividades da OS x200', atividades_da_os),
+        ('Atividades da PMP x200', atividades_da_pmp),
+        ('PMPs do equipamento x200', pmps_do_equipamento),
+    ]
+
+
+def remover_indices():
+    """Remove os índices dos modelos (cenário 'antes')"""
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for indice in listar_indices_modelos():
+            conn.execute(text(f'DROP INDEX IF EXISTS "{indice.name}"'))
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('ANALYZE'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos índices de desempenho')
+    parser.add_argument('--empresas', type=int, default=5)
+    parser.add_argument('--equipamentos', type=int, default=500)
+    parser.add_argument('--pmps', type=int, default=2000)
+    parser.add_argument('--os', type=int, default=50000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--recriar', action='store_true',
+                        help='Apaga e recria o banco mesmo que ele já tenha OS')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        arquivo = os.path.join(tempfile.gettempdir(), 'benchmark_ativus.db')
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+        database_url = f"sqlite:///{arquivo}"
+
+    app = criar_app_benchmark(database_url)
+
+    with app.app_context():
+        if inspect(db.engine).has_table('ordens_servico') and not args.recriar:
+            existentes = db.session.execute(text('SELECT COUNT(*) FROM ordens_servico')).scalar()
+            if existentes:
+                print(f"❌ O banco já tem {existentes} OS; use um banco exclusivo (ou --recriar)")
+                sys.exit(1)
+
+        print(f"🌱 Populando {database_url} ({args.os} OS, {args.pmps} PMPs)...")
+        amostra = popular_banco(args)
+        medicoes = cenarios(app, amostra)
+
+        remover_indices()
+        antes = {nome: medir(funcao, args.repeticoes) for nome, funcao in medicoes}
+
+        criar_indices()
+        depois = {nome: medir(funcao, args.repeticoes) for nome, funcao in medicoes}
+
+    print(f"\n📊 MEDIANA DE {args.repeticoes} EXECUÇÕES (ms)")
+    print(f"{'Cenário':<45}{'Antes':>10}{'Depois':>10}{'Ganho':>9}")
+    print("-" * 74)
+    for nome, _ in medicoes:
+        ganho = antes[nome] / depois[nome] if depois[nome] else float('inf')
+        print(f"{nome:<45}{antes[nome]:>10.1f}{depois[nome]:>10.1f}{ganho:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark da serialização de OS
+Compara, para N OS de uma empresa, o caminho ORM (objetos com joinedload,
+OrdemServico.to_dict() e jsonify) com o de serializacao_os (tuplas de uma
+consulta com junções, perfil compilado e resposta_json), com e sem a
+consulta, e imprime a comparação.
+
+Uso:
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmark_serializacao_os.py [--os 10000] [--repeticoes 10]
+
+Sem BENCHMARK_DATABASE_URL usa um SQLite temporário. O banco é recriado do
+zero (mesmos dados sintéticos de benchmark_indices.py), por isso o script se
+recusa a rodar em um banco que já tenha OS.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import jsonify
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import joinedload
+
+from models import db
+from assets_models import OrdemServico
+from benchmark_indices import criar_app_benchmark, popular_banco, medir
+from serializacao_os import perfil_os, resposta_json, orjson
+
+
+def cenarios(empresa):
+    """Lista de (nome, função) medidos"""
+
+    def consulta_orm():
+        return OrdemServico.query.filter_by(empresa=empresa).options(
+            joinedload(OrdemServico.filial_os),
+            joinedload(OrdemServico.setor_os),
+            joinedload(OrdemServico.equipamento_os)
+        ).order_by(OrdemServico.id).all()
+
+    def consulta_linhas(perfil):
+        return db.session.execute(
+            perfil.consulta().where(OrdemServico.empresa == empresa).order_by(OrdemServico.id)
+        ).all()
+
+    # Objetos e linhas pré-carregados para medir só a serialização
+    objetos = consulta_orm()
+    detalhe = perfil_os('detalhe')
+    lista = perfil_os('lista')
+    linhas_detalhe = consulta_linhas(detalhe)
+    linhas_lista = consulta_linhas(lista)
+
+    def orm_completo():
+        try:
+            jsonify({'ordens_servico': [ordem.to_dict() for ordem in consulta_orm()]})
+        finally:
+            # Sem identity map reaproveitado entre execuções
+            db.session.remove()
+
+    def linhas_completo(perfil):
+        def executar():
+            try:
+                resposta_json({'ordens_servico': perfil.serializar_linhas(consulta_linhas(perfil))})
+            finally:
+                db.session.remove()
+        return executar
+
+    return [
+        ('to_dict() (sem consulta)', lambda: [ordem.to_dict() for ordem in objetos]),
+        ('Perfil detalhe (sem consulta)', lambda: detalhe.serializar_linhas(linhas_detalhe)),
+        ('Perfil lista (sem consulta)', lambda: lista.serializar_linhas(linhas_lista)),
+        ('ORM + to_dict() + jsonify', orm_completo),
+        ('Linhas + detalhe + resposta_json', linhas_completo(detalhe)),
+        ('Linhas + lista + resposta_json', linhas_completo(lista)),
+    ], len(objetos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da serialização de OS')
+    parser.add_argument('--os', type=int, default=10000)
+    parser.add_argument('--equipamentos', type=int, default=500)
+    parser.add_argument('--pmps', type=int, default=500)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--recriar', action='store_true',
+                        help='Apaga e recria o banco mesmo que ele já tenha OS')
+    args = parser.parse_args()
+    # Uma única empresa: todas as OS entram na mesma resposta
+    args.empresas = 1
+
+    database_url = os.environ.get('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        arquivo = os.path.join(tempfile.gettempdir(), 'benchmark_serializacao_ativus.db')
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+        database_url = f"sqlite:///{arquivo}"
+
+    app = criar_app_benchmark(database_url)
+
+    with app.app_context():
+        if inspect(db.engine).has_table('ordens_servico') and not args.recriar:
+            existentes = db.session.execute(text('SELECT COUNT(*) FROM ordens_servico')).scalar()
+            if existentes:
+                print(f"❌ O banco já tem {existentes} OS; use um banco exclusivo (ou --recriar)")
+                sys.exit(1)
+
+        print(f"🌱 Populando {database_url} ({args.os} OS)...")
+        popular_banco(args)
+        medicoes, total = cenarios('Empresa 1')
+        tempos = {nome: medir(funcao, args.repeticoes) for nome, funcao in medicoes}
+
+    referencias = {
+        'Perfil detalhe (sem consulta)': 'to_dict() (sem consulta)',
+        'Perfil lista (sem consulta)': 'to_dict() (sem consulta)',
+        'Linhas + detalhe + resposta_json': 'ORM + to_dict() + jsonify',
+        'Linhas + lista + resposta_json': 'ORM + to_dict() + jsonify',
+    }
+
+    print(f"\n📊 {total} OS, MEDIANA DE {args.repeticoes} EXECUÇÕES (ms) - codificador: {'orjson' if orjson else 'json'}")
+    print(f"{'Cenário':<40}{'Tempo':>10}{'Ganho':>9}")
+    print("-" * 59)
+    for nome, _ in medicoes:
+        referencia = referencias.get(nome)
+        ganho = f"{tempos[referencia] / tempos[nome]:>8.1f}x" if referencia and tempos[nome] else ''
+        print(f"{nome:<40}{tempos[nome]:>10.1f}{ganho:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cache em memória com TTL e limite de tamanho (LRU)
+Usado para contagens e agregações caras que podem ficar alguns segundos
+desatualizadas. Cada processo do gunicorn tem o seu próprio cache.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """
+    Cache thread-safe: entradas expiram após `ttl` segundos e as menos
+    usadas são descartadas quando o cache passa de `maxsize` entradas.
+    """
+
+    def __init__(self, ttl=60, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, padrao=None):
+        """Retorna o valor em cache (ou `padrao` se ausente/expirado)"""
+        with self._lock:
+            item = self._dados.get(chave, _AUSENTE)
+            if item is _AUSENTE:
+                return padrao
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return padrao
+            self._dados.move_to_end(chave)
+            return valor
+
+    def definir(self, chave, valor):
+        """Grava o valor no cache"""
+        with self._lock:
+            self._dados[chave] = (time.monotonic() + self.ttl, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def obter_ou_calcular(self, chave, calcular):
+        """
+        Retorna o valor em cache ou calcula, grava e retorna
+
+        Args:
+            chave: Chave hashable
+            calcular (callable): Função sem argumentos chamada em caso de falta
+
+        Returns:
+            Valor em cache ou recém-calculado
+        """
+        valor = self.obter(chave, _AUSENTE)
+        if valor is _AUSENTE:
+            valor = calcular()
+            self.definir(chave, valor)
+        return valor
+
+    def invalidar(self, filtro=None):
+        """
+        Remove entradas do cache
+
+        Args:
+            filtro (callable): Recebe a chave e retorna True para remover;
+                               sem filtro, limpa o cache inteiro
+
+        Returns:
+            int: Quantidade de entradas removidas
+        """
+        with self._lock:
+            if filtro is None:
+                removidas = len(self._dados)
+                self._dados.clear()
+                return removidas
+            chaves = [chave for chave in self._dados if filtro(chave)]
+            for chave in chaves:
+                del self._dados[chave]
+            return len(chaves)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dados)
@@ -34,6 +34,22 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = get_database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Pool de conexões por processo do gunicorn: até uma conexão por thread
+    # (GUNICORN_THREADS, mesmo valor do Procfile), DB_POOL_SIZE mantidas abertas
+    # e o resto em overflow. Streams SSE só usam conexão durante a verificação
+    # de época e o LISTEN fica fora do pool. Somando todos os processos web
+    # (WEB_CONCURRENCY x GUNICORN_THREADS), mais 1 LISTEN por processo e o
+    # scheduler, o total deve caber no limite de conexões do plano do Postgres.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 32))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max(GUNICORN_THREADS - DB_POOL_SIZE, 0))),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': 1800,
+        'pool_pre_ping': True
+    }
     
     # Configuração do SendGrid
     SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
@@ -58,6 +74,7 @@ class TestingConfig(Config):
     """Configuração para testes"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
 
 # Mapeamento de configurações
 config = {
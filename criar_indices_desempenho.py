@@ -0,0 +1,189 @@
+"""
+Cria os índices de desempenho declarados nos modelos em um banco já existente
+Usa CREATE INDEX CONCURRENTLY no PostgreSQL (sem bloquear escritas) e pode ser
+executado várias vezes: índices válidos são mantidos, índices inválidos
+(de um CONCURRENTLY interrompido) são recriados.
+
+Uso:
+    python criar_indices_desempenho.py                     # cria os índices
+    python criar_indices_desempenho.py --verificar         # só mostra o estado
+    python criar_indices_desempenho.py --limpar-duplicatas # remove OS duplicadas de PMP antes
+"""
+
+import os
+import sys
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from models import db
+    from assets_models import OrdemServico, Chamado
+    from models.atividade_os import AtividadeOS
+    from models.pmp_limpo import PMP, AtividadePMP
+    from routes.verificador_duplicatas_os import limpar_os_duplicadas_pmp
+except ImportError as e:
+    print(f"❌ Erro ao importar modelos: {e}")
+    sys.exit(1)
+
+MODELOS_INDEXADOS = [OrdemServico, Chamado, AtividadeOS, AtividadePMP, PMP]
+
+# Índices únicos que exigem checagem de duplicatas antes da criação
+SQL_GRUPOS_DUPLICADOS = """
+    SELECT COUNT(*) FROM (
+        SELECT pmp_id, {chave}
+        FROM ordens_servico
+        WHERE pmp_id IS NOT NULL AND {chave} IS NOT NULL
+        GROUP BY pmp_id, {chave}
+        HAVING COUNT(*) > 1
+    ) duplicadas
+"""
+
+VERIFICACAO_DUPLICATAS = {
+    'uq_os_pmp_ocorrencia': SQL_GRUPOS_DUPLICADOS.format(chave='data_ocorrencia'),
+    'uq_os_pmp_data_programada': SQL_GRUPOS_DUPLICADOS.format(chave='data_programada'),
+    'uq_os_pmp_sequencia': SQL_GRUPOS_DUPLICADOS.format(chave='numero_sequencia')
+}
+
+# Índices substituídos por outros declarados nos modelos
+INDICES_OBSOLETOS = {
+    'idx_os_pmp_sequencia': 'uq_os_pmp_sequencia'
+}
+
+
+def listar_indices_modelos():
+    """Retorna os índices declarados nos modelos, em ordem estável"""
+    indices = []
+    for modelo in MODELOS_INDEXADOS:
+        indices.extend(sorted(modelo.__table__.indexes, key=lambda indice: indice.name))
+    return indices
+
+
+def gerar_ddl(indice, dialeto):
+    """
+    Gera o CREATE INDEX do índice para o dialeto
+
+    No PostgreSQL o comando usa CONCURRENTLY, que não pode rodar dentro de transação.
+    """
+    ddl = str(CreateIndex(indice, if_not_exists=True).compile(dialect=dialeto))
+    if dialeto.name == 'postgresql':
+        ddl = ddl.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+        ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+    return ddl
+
+
+def estado_indice(conn, nome):
+    """
+    Estado do índice no banco
+
+    Returns:
+        str: 'ausente', 'valido' ou 'invalido'
+    """
+    if conn.dialect.name == 'postgresql':
+        row = conn.execute(text("""
+            SELECT i.indisvalid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = :nome
+        """), {'nome': nome}).fetchone()
+    elif conn.dialect.name == 'sqlite':
+        row = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :nome"
+        ), {'nome': nome}).fetchone()
+    else:
+        row = None
+
+    if not row:
+        return 'ausente'
+    return 'valido' if row[0] else 'invalido'
+
+
+def criar_indices(somente_verificar=False, limpar_duplicatas=False):
+    """
+    Cria os índices dos modelos que ainda não existem
+
+    Args:
+        somente_verificar (bool): Apenas lista o estado, sem criar nada
+        limpar_duplicatas (bool): Remove OS duplicadas de PMP antes de criar
+                                  os índices únicos
+
+    Returns:
+        bool: True se todos os índices ficaram válidos
+    """
+    print("\n🚀 ÍNDICES DE DESEMPENHO")
+    print("=" * 50)
+
+    indices = listar_indices_modelos()
+    ok = 0
+
+    if limpar_duplicatas and not somente_verificar:
+        removidas = limpar_os_duplicadas_pmp(None, OrdemServico, db)
+        print(f"🧹 {removidas} OS duplicadas removidas")
+
+    # AUTOCOMMIT: CREATE/DROP INDEX CONCURRENTLY não roda dentro de transação
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for indice in indices:
+            nome = indice.name
+            estado = estado_indice(conn, nome)
+
+            if estado == 'valido':
+                print(f"✅ {nome} - já existe")
+                ok += 1
+                continue
+
+            if somente_verificar:
+                print(f"⚠️ {nome} - {estado}")
+                continue
+
+            if estado == 'invalido':
+                print(f"🔄 {nome} - inválido (build interrompido), recriando")
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{nome}"'))
+
+            if nome in VERIFICACAO_DUPLICATAS:
+                duplicadas = conn.execute(text(VERIFICACAO_DUPLICATAS[nome])).scalar()
+                if duplicadas:
+                    print(f"❌ {nome} - {duplicadas} grupos duplicados; execute com --limpar-duplicatas")
+                    continue
+
+            try:
+                conn.execute(text(gerar_ddl(indice, conn.dialect)))
+                print(f"✅ {nome} - criado")
+                ok += 1
+            except Exception as e:
+                print(f"❌ {nome} - Erro: {e}")
+
+        if not somente_verificar:
+            for obsoleto, substituto in INDICES_OBSOLETOS.items():
+                if estado_indice(conn, obsoleto) != 'ausente' and estado_indice(conn, substituto) == 'valido':
+                    conn.execute(text(f'DROP INDEX {"CONCURRENTLY " if conn.dialect.name == "postgresql" else ""}IF EXISTS "{obsoleto}"'))
+                    print(f"🗑️ {obsoleto} - removido (substituído por {substituto})")
+
+    print(f"\n📊 RESULTADO: {ok}/{len(indices)} índices válidos")
+    return ok == len(indices)
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            sucesso = criar_indices(
+                somente_verificar='--verificar' in sys.argv,
+                limpar_duplicatas='--limpar-duplicatas' in sys.argv
+            )
+
+            if sucesso:
+                print("\n🎉 TODOS OS ÍNDICES ESTÃO CRIADOS!")
+            else:
+                print("\n⚠️ VERIFICAR ÍNDICES PENDENTES")
+                sys.exit(1)
+
+        except Exception as e:
+            print(f"\n❌ ERRO CRÍTICO: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
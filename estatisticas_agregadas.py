@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Serviço de estatísticas agregadas de OS e chamados
+Uma única consulta agrupada por tabela alimenta todos os contadores do
+dashboard (status, prioridade, oficina, usuário responsável, PMP). O
+resultado fica em cache por empresa por alguns segundos e é invalidado
+quando um commit altera OS ou chamados da empresa.
+"""
+
+import os
+import logging
+from collections import defaultdict
+from sqlalchemy import event, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from models import db
+from cache_ttl import CacheTTL
+from assets_models import OrdemServico, Chamado
+
+logger = logging.getLogger(__name__)
+
+NAO_INFORMADO = 'nao_informado'
+
+_cache_estatisticas = CacheTTL(ttl=int(os.environ.get('ESTATISTICAS_CACHE_TTL', 5)), maxsize=1024)
+
+# Chave da sessão com as empresas alteradas desde o último commit (None = todas)
+_CHAVE_SESSAO = 'estatisticas_empresas_alteradas'
+_TABELAS_MONITORADAS = ('ordens_servico', 'chamados')
+
+# Funções chamadas a cada invalidação (caches derivados, ver ao_invalidar)
+_ouvintes_invalidacao = []
+
+
+def _contar(destino, chave, total):
+    destino[chave if chave is not None else NAO_INFORMADO] += total
+
+
+def _para_dict(valor):
+    """Converte defaultdicts aninhados em dicts comuns (para jsonify)"""
+    if isinstance(valor, dict):
+        return {chave: _para_dict(item) for chave, item in valor.items()}
+    return valor
+
+
+def _calcular_estatisticas_os(empresa):
+    """
+    Executa a consulta agrupada de OS e consolida os contadores em memória.
+
+    O GROUP BY é feito sobre a combinação (status, prioridade, oficina,
+    usuario_responsavel, é PMP): são poucas centenas de linhas por empresa,
+    e todas as quebras saem dessas linhas sem nova ida ao banco.
+    """
+    de_pmp = case((OrdemServico.pmp_id.isnot(None), 1), else_=0)
+    colunas = (
+        OrdemServico.status,
+        OrdemServico.prioridade,
+        OrdemServico.oficina,
+        OrdemServico.usuario_responsavel,
+        de_pmp
+    )
+
+    query = db.session.query(*colunas, func.count(OrdemServico.id))
+    if empresa is not None:
+        query = query.filter(OrdemServico.empresa == empresa)
+    linhas = query.group_by(*colunas).all()
+
+    estatisticas = {
+        'total': 0,
+        'por_status': defaultdict(int),
+        'por_prioridade': defaultdict(int),
+        'por_oficina': defaultdict(int),
+        'por_status_prioridade': defaultdict(lambda: defaultdict(int)),
+        'por_status_usuario': defaultdict(lambda: defaultdict(int)),
+        'pmp_por_status': defaultdict(int)
+    }
+
+    for status, prioridade, oficina, usuario, eh_pmp, total in linhas:
+        status = status or NAO_INFORMADO
+        estatisticas['total'] += total
+        _contar(estatisticas['por_status'], status, total)
+        _contar(estatisticas['por_prioridade'], prioridade, total)
+        _contar(estatisticas['por_oficina'], oficina, total)
+        _contar(estatisticas['por_status_prioridade'][status], prioridade, total)
+        if usuario:
+            estatisticas['por_status_usuario'][status][usuario] += total
+        if eh_pmp:
+            estatisticas['pmp_por_status'][status] += total
+
+    return _para_dict(estatisticas)
+
+
+def _calcular_estatisticas_chamados(empresa):
+    """Executa a consulta agrupada de chamados (status x prioridade)"""
+    colunas = (Chamado.status, Chamado.prioridade)
+
+    query = db.session.query(*colunas, func.count(Chamado.id))
+    if empresa is not None:
+        query = query.filter(Chamado.empresa == empresa)
+    linhas = query.group_by(*colunas).all()
+
+    estatisticas = {
+        'total': 0,
+        'por_status': defaultdict(int),
+        'por_prioridade': defaultdict(int)
+    }
+
+    for status, prioridade, total in linhas:
+        estatisticas['total'] += total
+        _contar(estatisticas['por_status'], status, total)
+        _contar(estatisticas['por_prioridade'], prioridade, total)
+
+    return _para_dict(estatisticas)
+
+
+def estatisticas_os(empresa):
+    """
+    Estatísticas de OS da empresa (em cache por ESTATISTICAS_CACHE_TTL segundos)
+
+    Args:
+        empresa (str): Empresa (None = todas as empresas)
+
+    Returns:
+        dict: total, por_status, por_prioridade, por_oficina,
+              por_status_prioridade, por_status_usuario e pmp_por_status
+    """
+    return _cache_estatisticas.obter_ou_calcular(
+        ('os', empresa),
+        lambda: _calcular_estatisticas_os(empresa)
+    )
+
+
+def estatisticas_chamados(empresa):
+    """
+    Estatísticas de chamados da empresa (em cache por ESTATISTICAS_CACHE_TTL segundos)
+
+    Args:
+        empresa (str): Empresa (None = todas as empresas)
+
+    Returns:
+        dict: total, por_status e por_prioridade
+    """
+    return _cache_estatisticas.obter_ou_calcular(
+        ('chamados', empresa),
+        lambda: _calcular_estatisticas_chamados(empresa)
+    )
+
+
+def ao_invalidar(funcao):
+    """
+    Registra funcao(empresa) para descartar caches derivados de OS/chamados
+    junto com as estatísticas (empresa None = todas as empresas)
+    """
+    _ouvintes_invalidacao.append(funcao)
+    return funcao
+
+
+def invalidar_estatisticas(empresa=None):
+    """
+    Descarta as estatísticas em cache (e os caches registrados em ao_invalidar)
+
+    Args:
+        empresa (str): Empresa alterada; None descarta todas as empresas
+    """
+    if empresa is None:
+        _cache_estatisticas.invalidar()
+    else:
+        # Entradas "todas as empresas" (empresa None) também ficam desatualizadas
+        _cache_estatisticas.invalidar(lambda chave: chave[1] in (empresa, None))
+
+    for funcao in _ouvintes_invalidacao:
+        funcao(empresa)
+
+
+# ---------- Invalidação automática no commit ----------
+def _marcar_empresa(session, empresa):
+    alteradas = session.info.setdefault(_CHAVE_SESSAO, set())
+    alteradas.add(empresa)
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_alteracoes_flush(session, flush_context):
+    """Anota as empresas de OS/chamados inseridos, alterados ou removidos no flush"""
+    for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(objeto, (OrdemServico, Chamado)):
+            _marcar_empresa(session, getattr(objeto, 'empresa', None))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_alteracoes_execute(orm_execute_state):
+    """Escritas em lote (insert/update/delete ORM ou SQL texto) invalidam todas as empresas"""
+    statement = orm_execute_state.statement
+
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (OrdemServico, Chamado):
+            _marcar_empresa(orm_execute_state.session, None)
+
+    elif isinstance(statement, TextClause):
+        sql = statement.text.lstrip().lower()
+        if sql.startswith(('insert', 'update', 'delete')) and any(t in sql for t in _TABELAS_MONITORADAS):
+            _marcar_empresa(orm_execute_state.session, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_apos_commit(session):
+    alteradas = session.info.pop(_CHAVE_SESSAO, None)
+    if not alteradas:
+        return
+    if None in alteradas:
+        invalidar_estatisticas()
+    else:
+        for empresa in alteradas:
+            invalidar_estatisticas(empresa)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_apos_rollback(session):
+    session.info.pop(_CHAVE_SESSAO, None)
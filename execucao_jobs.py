@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Execução de jobs agendados com lock distribuído e registro em banco
+Cada job roda sob um advisory lock do PostgreSQL: se outro processo (outro
+dyno do scheduler, ou uma execução anterior ainda em andamento) já tem o
+lock, a execução é ignorada. Cada execução fica registrada na tabela
+execucoes_job com duração e resultado, e é dela (e de pg_locks) que sai o
+status do sistema automático, válido para todo o cluster.
+"""
+
+import os
+import json
+import time
+import socket
+import zlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import text, func
+
+from models import db
+from models.execucao_job import ExecucaoJob
+
+logger = logging.getLogger('pmp_scheduler')
+
+# Primeira chave dos advisory locks do scheduler (a segunda identifica o job)
+NAMESPACE_LOCK = 734201
+CHAVE_LIDER = 0
+
+# Fora do PostgreSQL (desenvolvimento) os locks valem só dentro do processo
+_locks_locais = {}
+_locks_locais_guarda = threading.Lock()
+
+HOST = os.environ.get('DYNO') or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def garantir_tabela():
+    """Cria a tabela execucoes_job se ainda não existir"""
+    ExecucaoJob.__table__.create(db.engine, checkfirst=True)
+
+
+def chave_job(nome):
+    """Segunda chave do advisory lock de um job (int4 estável entre processos)"""
+    return zlib.crc32(nome.encode('utf-8')) & 0x7fffffff or 1
+
+
+def _usa_advisory_lock():
+    return db.engine.dialect.name == 'postgresql'
+
+
+@contextmanager
+def advisory_lock(chave):
+    """
+    Tenta obter o advisory lock (sem esperar)
+
+    O lock é de sessão e fica numa conexão dedicada: se o processo morrer, a
+    conexão cai e o PostgreSQL libera o lock.
+
+    Yields:
+        bool: True se o lock foi obtido
+    """
+    if not _usa_advisory_lock():
+        with _locks_locais_guarda:
+            lock = _locks_locais.setdefault(chave, threading.Lock())
+        obtido = lock.acquire(blocking=False)
+        try:
+            yield obtido
+        finally:
+            if obtido:
+                lock.release()
+        return
+
+    conn = db.engine.connect()
+    obtido = False
+    try:
+        obtido = conn.execute(
+            text("SELECT pg_try_advisory_lock(:ns, :chave)"),
+            {'ns': NAMESPACE_LOCK, 'chave': chave}
+        ).scalar()
+        conn.commit()
+        yield bool(obtido)
+    finally:
+        try:
+            if obtido:
+                conn.execute(
+                    text("SELECT pg_advisory_unlock(:ns, :chave)"),
+                    {'ns': NAMESPACE_LOCK, 'chave': chave}
+                )
+                conn.commit()
+        finally:
+            conn.close()
+
+
+def _iniciar_registro(nome):
+    # Com o lock obtido, execuções anteriores ainda "executando" foram interrompidas
+    ExecucaoJob.query.filter_by(nome=nome, status='executando').update(
+        {'status': 'interrompido', 'finalizado_em': datetime.utcnow()},
+        synchronize_session=False
+    )
+    execucao = ExecucaoJob(nome=nome, status='executando', host=HOST, iniciado_em=datetime.utcnow())
+    db.session.add(execucao)
+    db.session.commit()
+    return execucao.id
+
+
+def _finalizar_registro(execucao_id, status, inicio, resultado=None, erro=None):
+    db.session.rollback()
+    execucao = db.session.get(ExecucaoJob, execucao_id)
+    if not execucao:
+        return
+    execucao.status = status
+    execucao.finalizado_em = datetime.utcnow()
+    execucao.duracao_segundos = round(time.monotonic() - inicio, 3)
+    if resultado is not None:
+        execucao.resultado = json.dumps(resultado, default=str)
+    execucao.erro = erro
+    db.session.commit()
+
+
+def executar_job(nome, funcao, intervalo_minimo=None):
+    """
+    Executa um job sob advisory lock e registra a execução
+
+    Args:
+        nome (str): Nome do job
+        funcao (callable): Função sem argumentos; o retorno (dict) vai para o registro
+        intervalo_minimo (timedelta): Não executa se houve sucesso há menos que isso
+                                      (evita repetir o mesmo horário em dois processos)
+
+    Returns:
+        str: 'sucesso', 'erro', 'ignorado' (lock ocupado) ou 'recente'
+    """
+    with advisory_lock(chave_job(nome)) as obtido:
+        if not obtido:
+            logger.info(f"⏭️ Job {nome} já está em execução em outro processo")
+            return 'ignorado'
+
+        if intervalo_minimo:
+            limite = datetime.utcnow() - intervalo_minimo
+            recente = ExecucaoJob.query.filter(
+                ExecucaoJob.nome == nome,
+                ExecucaoJob.status == 'sucesso',
+                ExecucaoJob.iniciado_em >= limite
+            ).first()
+            if recente:
+                logger.info(f"⏭️ Job {nome} já executado às {recente.iniciado_em} ({recente.host})")
+                return 'recente'
+
+        from logs_pmp import registrar_evento
+
+        execucao_id = _iniciar_registro(nome)
+        inicio = time.monotonic()
+        logger.info(f"▶️ Job {nome} iniciado (execução {execucao_id})")
+        registrar_evento('job_iniciado', f"Job {nome} iniciado", dados={'job': nome, 'execucao_id': execucao_id})
+
+        try:
+            resultado = funcao()
+        except Exception as e:
+            logger.error(f"❌ Job {nome} falhou: {e}")
+            _finalizar_registro(execucao_id, 'erro', inicio, erro=str(e))
+            registrar_evento('job_erro', f"Job {nome} falhou: {e}", nivel='ERROR',
+                             dados={'job': nome, 'execucao_id': execucao_id})
+            return 'erro'
+
+        duracao = round(time.monotonic() - inicio, 3)
+        _finalizar_registro(execucao_id, 'sucesso', inicio, resultado=resultado)
+        logger.info(f"✅ Job {nome} concluído em {duracao:.1f}s")
+        registrar_evento('job_concluido', f"Job {nome} concluído em {duracao:.1f}s",
+                         dados={'job': nome, 'execucao_id': execucao_id, 'duracao_segundos': duracao, 'resultado': resultado})
+        return 'sucesso'
+
+
+def limpar_execucoes_antigas(dias=90):
+    """Remove registros de execução e eventos com mais de `dias` dias"""
+    from logs_pmp import limpar_eventos_antigos
+
+    limite = datetime.utcnow() - timedelta(days=dias)
+    removidas = ExecucaoJob.query.filter(ExecucaoJob.iniciado_em < limite).delete(synchronize_session=False)
+    db.session.commit()
+    return {'removidas': removidas, 'eventos_removidos': limpar_eventos_antigos(dias)}
+
+
+def scheduler_ativo():
+    """
+    Indica se algum processo do cluster está com o lock de líder do scheduler
+
+    Returns:
+        bool ou None: None quando o banco não tem advisory locks (desenvolvimento)
+    """
+    if not _usa_advisory_lock():
+        return None
+
+    return bool(db.session.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_locks
+            WHERE locktype = 'advisory' AND granted
+              AND classid = :ns AND objid = :chave AND objsubid = 2
+        )
+    """), {'ns': NAMESPACE_LOCK, 'chave': CHAVE_LIDER}).scalar())
+
+
+def ultimas_execucoes():
+    """
+    Última execução de cada job
+
+    Returns:
+        dict: {nome: ExecucaoJob.to_dict()}
+    """
+    ultimas_ids = db.session.query(func.max(ExecucaoJob.id)).group_by(ExecucaoJob.nome)
+    execucoes = ExecucaoJob.query.filter(ExecucaoJob.id.in_(ultimas_ids)).all()
+    return {execucao.nome: execucao.to_dict() for execucao in execucoes}
+
+
+def contar_execucoes(nome, desde):
+    """Quantidade de execuções com sucesso do job desde a data"""
+    return ExecucaoJob.query.filter(
+        ExecucaoJob.nome == nome,
+        ExecucaoJob.status == 'sucesso',
+        ExecucaoJob.iniciado_em >= desde
+    ).count()
@@ -0,0 +1,289 @@
+"""
+Exportação de ordens de serviço em CSV / XLSX, em streaming
+As linhas saem de um cursor do servidor (yield_per) direto para a resposta,
+em blocos: a memória fica constante qualquer que seja o número de OS.
+O XLSX é montado sem biblioteca externa: um zip gravado em sequência, com a
+planilha escrita linha a linha (strings inline, sem tabela compartilhada).
+"""
+
+import io
+import re
+import csv
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from models import db
+from assets_models import OrdemServico, Filial, Setor, Equipamento
+
+# Linhas buscadas por vez no cursor do servidor
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+# Linhas acumuladas antes de enviar um bloco da resposta
+LINHAS_POR_BLOCO = 500
+
+# Separador do CSV (padrão do Excel em pt-BR)
+SEPARADOR_CSV = ';'
+
+FORMATOS_EXPORTACAO = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+_filial = aliased(Filial)
+_setor = aliased(Setor)
+_equipamento = aliased(Equipamento)
+
+# (cabeçalho, coluna) na ordem da planilha
+COLUNAS_EXPORTACAO = [
+    ('ID', OrdemServico.id),
+    ('Descrição', OrdemServico.descricao),
+    ('Status', OrdemServico.status),
+    ('Prioridade', OrdemServico.prioridade),
+    ('Tipo de manutenção', OrdemServico.tipo_manutencao),
+    ('Oficina', OrdemServico.oficina),
+    ('Condição do ativo', OrdemServico.condicao_ativo),
+    ('Qtd. pessoas', OrdemServico.qtd_pessoas),
+    ('Horas', OrdemServico.horas),
+    ('HH', OrdemServico.hh),
+    ('Filial', _filial.tag),
+    ('Setor', _setor.tag),
+    ('Equipamento', _equipamento.tag),
+    ('Descrição do equipamento', _equipamento.descricao),
+    ('PMP', OrdemServico.pmp_id),
+    ('Frequência', OrdemServico.frequencia_origem),
+    ('Criada por', OrdemServico.usuario_criacao),
+    ('Responsável', OrdemServico.usuario_responsavel),
+    ('Data de criação', OrdemServico.data_criacao),
+    ('Data programada', OrdemServico.data_programada),
+    ('Início', OrdemServico.data_inicio),
+    ('Conclusão', OrdemServico.data_conclusao)
+]
+
+
+def consulta_exportacao(empresa, status_list=None, prioridade=None):
+    """
+    Consulta das OS a exportar (colunas planas, sem objetos ORM)
+
+    Args:
+        empresa (str): Empresa do usuário
+        status_list (list): Status aceitos (None = todos), como em expandir_filtro_status
+        prioridade (str): Filtro de prioridade
+
+    Returns:
+        Select: Mesma ordenação da listagem de OS
+    """
+    consulta = select(*[coluna for _, coluna in COLUNAS_EXPORTACAO]).select_from(OrdemServico).outerjoin(
+        _filial, _filial.id == OrdemServico.filial_id
+    ).outerjoin(
+        _setor, _setor.id == OrdemServico.setor_id
+    ).outerjoin(
+        _equipamento, _equipamento.id == OrdemServico.equipamento_id
+    ).where(OrdemServico.empresa == empresa)
+
+    if status_list is not None:
+        consulta = consulta.where(OrdemServico.status.in_(status_list))
+    if prioridade:
+        consulta = consulta.where(OrdemServico.prioridade == prioridade)
+
+    return consulta.order_by(
+        OrdemServico.data_criacao.desc().nulls_last(),
+        OrdemServico.id.desc()
+    )
+
+
+def linhas_exportacao(consulta):
+    """Linhas da consulta lidas por um cursor do servidor, em lotes"""
+    resultado = db.session.execute(consulta.execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO))
+    try:
+        yield from resultado
+    finally:
+        resultado.close()
+
+
+def _valor_csv(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, float):
+        # repr: todos os dígitos (o formato :g arredondava a 6 algarismos)
+        texto = repr(valor)
+        return (texto[:-2] if texto.endswith('.0') else texto).replace('.', ',')
+    if isinstance(valor, str) and valor.startswith(('=', '+', '-', '@')):
+        # Evita que o Excel interprete o texto como fórmula
+        return "'" + valor
+    return '' if valor is None else valor
+
+
+def gerar_csv(linhas):
+    """
+    Gera o CSV em blocos de texto
+
+    Args:
+        linhas: Iterável de linhas na ordem de COLUNAS_EXPORTACAO
+
+    Yields:
+        str: Bloco do arquivo (o primeiro traz BOM e cabeçalho para o Excel)
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=SEPARADOR_CSV)
+
+    buffer.write('\ufeff')
+    escritor.writerow([titulo for titulo, _ in COLUNAS_EXPORTACAO])
+
+    for numero, linha in enumerate(linhas, 1):
+        escritor.writerow([_valor_csv(valor) for valor in linha])
+        if numero % LINHAS_POR_BLOCO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+# ---------- XLSX ----------
+
+_XLSX_ARQUIVOS_FIXOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Ordens de Serviço" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Estilos: 0 = padrão, 1 = data, 2 = data e hora, 3 = cabeçalho em negrito
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+        '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    )
+}
+
+_XLSX_INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/></sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+_XLSX_FIM_PLANILHA = '</sheetData></worksheet>'
+
+_DATA_BASE_EXCEL = datetime(1899, 12, 30)
+
+
+class _SaidaZip:
+    """Destino sem seek para o zipfile: acumula o que foi gravado até ser drenado"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+# Caracteres proibidos no XML 1.0 (o Excel recusa a planilha inteira)
+_CARACTERES_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+def _celula_xlsx(valor, estilo=None):
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, datetime):
+        serial = (valor - _DATA_BASE_EXCEL).total_seconds() / 86400
+        return f'<c s="2"><v>{serial:.6f}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="1"><v>{(valor - _DATA_BASE_EXCEL.date()).days}</v></c>'
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    atributo_estilo = f' s="{estilo}"' if estilo else ''
+    texto = escape(_CARACTERES_INVALIDOS_XML.sub('', str(valor)))
+    return f'<c t="inlineStr"{atributo_estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def gerar_xlsx(linhas):
+    """
+    Gera o XLSX em blocos de bytes
+
+    Args:
+        linhas: Iterável de linhas na ordem de COLUNAS_EXPORTACAO
+
+    Yields:
+        bytes: Bloco do arquivo zip
+    """
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in _XLSX_ARQUIVOS_FIXOS.items():
+            arquivo_zip.writestr(nome, conteudo)
+        yield saida.drenar()
+
+        with arquivo_zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            cabecalho = ''.join(_celula_xlsx(titulo, estilo=3) for titulo, _ in COLUNAS_EXPORTACAO)
+            planilha.write(f'{_XLSX_INICIO_PLANILHA}<row>{cabecalho}</row>'.encode('utf-8'))
+
+            bloco = []
+            for numero, linha in enumerate(linhas, 1):
+                bloco.append(f"<row>{''.join(_celula_xlsx(valor) for valor in linha)}</row>")
+                if numero % LINHAS_POR_BLOCO == 0:
+                    planilha.write(''.join(bloco).encode('utf-8'))
+                    bloco = []
+                    yield saida.drenar()
+
+            bloco.append(_XLSX_FIM_PLANILHA)
+            planilha.write(''.join(bloco).encode('utf-8'))
+
+    yield saida.drenar()
+
+
+def gerar_exportacao(formato, linhas):
+    """Gerador do arquivo no formato pedido ('csv' ou 'xlsx')"""
+    if formato == 'xlsx':
+        return gerar_xlsx(linhas)
+    return gerar_csv(linhas)
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Geração de PMPs a partir do plano mestre, em lote
+As atividades do plano mestre de cada equipamento são agrupadas por
+oficina + frequência + tipo de manutenção + condição; cada grupo vira uma
+PMP. Os planos, atividades e PMPs existentes de um lote de equipamentos
+são lidos de uma vez, as diferenças são calculadas em memória e aplicadas
+com inserts/updates/deletes em lote, com um commit por lote de equipamentos.
+As atividades de PMPs existentes são sincronizadas por
+atividade_plano_mestre_id: um plano sem alterações não gera escrita.
+
+Uso:
+    python geracao_pmps_lote.py --equipamentos 1 2 3
+    python geracao_pmps_lote.py --setor 5
+    python geracao_pmps_lote.py --filial 2 [--empresa ACME] [--lote 100]
+"""
+
+import sys
+import logging
+from collections import defaultdict, Counter
+from sqlalchemy import select, insert, update, delete, values, column, bindparam, cast, Integer, or_
+
+from models import db
+from models.pmp_limpo import PMP, AtividadePMP, HistoricoExecucaoPMP
+from models.atividade_os import AtividadeOS
+from models.plano_mestre import PlanoMestre, AtividadePlanoMestre
+from assets_models import Equipamento, Setor
+
+logger = logging.getLogger(__name__)
+
+# Equipamentos por transação
+TAMANHO_LOTE_EQUIPAMENTOS = 100
+
+# Linhas por INSERT em lote
+TAMANHO_LOTE_INSERCAO = 1000
+
+# Valores padrão de PMP nova (personalizados depois pelo usuário); uma PMP
+# órfã que ainda tem esses valores pode ser removida
+PADROES_PMP = {
+    'status': 'ativo',
+    'num_pessoas': 2,
+    'dias_antecipacao': 2,
+    'tempo_pessoa': 5.0,
+    'forma_impressao': 'digital'
+}
+
+CAMPOS_ATIVIDADE = ('descricao', 'oficina', 'frequencia', 'tipo_manutencao', 'conjunto',
+                    'ponto_controle', 'valor_frequencia', 'condicao')
+
+CAMPOS_RESUMO = ('criadas', 'preservadas', 'removidas', 'orfas_mantidas', 'atividades_criadas',
+                 'atividades_alteradas', 'atividades_removidas', 'atividades_reordenadas')
+
+
+def chave_grupo(atividade):
+    """Chave de agrupamento de uma atividade do plano mestre"""
+    return (
+        atividade.oficina or 'Não definida',
+        atividade.frequencia or 'Não definida',
+        atividade.tipo_manutencao or 'Não definida',
+        atividade.condicao or 'funcionando'
+    )
+
+
+def chave_pmp(pmp):
+    """Chave de agrupamento de uma PMP existente"""
+    return (pmp.oficina, pmp.frequencia, pmp.tipo, pmp.condicao)
+
+
+def pmp_personalizada(pmp):
+    """Indica se a PMP tem dados definidos pelo usuário (não pode ser removida)"""
+    return bool(
+        pmp.data_inicio_plano or
+        pmp.usuarios_responsaveis or
+        pmp.num_pessoas != PADROES_PMP['num_pessoas'] or
+        pmp.dias_antecipacao != PADROES_PMP['dias_antecipacao']
+    )
+
+
+def linhas_atividades_pmp(pmp_id, atividades_grupo, ordem_inicial=1):
+    """Linhas de AtividadePMP copiadas das atividades do plano mestre (ordem sequencial)"""
+    return [
+        dict(
+            pmp_id=pmp_id,
+            atividade_plano_mestre_id=atividade.id,
+            ordem=ordem,
+            status='ativo',
+            **{campo: getattr(atividade, campo) for campo in CAMPOS_ATIVIDADE}
+        )
+        for ordem, atividade in enumerate(atividades_grupo, start=ordem_inicial)
+    ]
+
+
+def diferenca_atividades(pmp_id, existentes, atividades_grupo):
+    """
+    Diferença entre as atividades da PMP e as do grupo no plano mestre
+
+    A chave é atividade_plano_mestre_id: atividades que continuam no plano
+    mantêm o id (e as referências de atividades_os), só mudam os campos
+    alterados e a ordem.
+
+    Args:
+        pmp_id (int): PMP
+        existentes (list): Linhas atuais de AtividadePMP da PMP (ordem de id)
+        atividades_grupo (list): Atividades do plano mestre, na ordem desejada
+
+    Returns:
+        tuple: (linhas a inserir, {id: campos alterados}, {id: nova ordem}, ids a remover)
+    """
+    por_atividade_plano = {}
+    remover = []
+    for existente in existentes:
+        if existente.atividade_plano_mestre_id in por_atividade_plano:
+            remover.append(existente.id)  # cópia duplicada da mesma atividade
+        else:
+            por_atividade_plano[existente.atividade_plano_mestre_id] = existente
+
+    inserir = []
+    alterar = {}
+    reordenar = {}
+    for ordem, atividade in enumerate(atividades_grupo, start=1):
+        existente = por_atividade_plano.pop(atividade.id, None)
+        if existente is None:
+            inserir += linhas_atividades_pmp(pmp_id, [atividade], ordem_inicial=ordem)
+            continue
+
+        campos = {campo: getattr(atividade, campo) for campo in CAMPOS_ATIVIDADE
+                  if getattr(existente, campo) != getattr(atividade, campo)}
+        if campos:
+            alterar[existente.id] = campos
+        if existente.ordem != ordem:
+            reordenar[existente.id] = ordem
+
+    remover += [existente.id for existente in por_atividade_plano.values()]
+    return inserir, alterar, reordenar, remover
+
+
+def resolver_equipamentos(equipamento_ids=None, setor_id=None, filial_id=None, empresa=None):
+    """
+    IDs dos equipamentos a processar
+
+    Args:
+        equipamento_ids (list): IDs informados diretamente
+        setor_id (int): Todos os equipamentos do setor
+        filial_id (int): Todos os equipamentos dos setores da filial
+        empresa (str): Restringe à empresa (None = sem restrição)
+
+    Returns:
+        list: IDs existentes, em ordem crescente
+    """
+    query = select(Equipamento.id)
+    if equipamento_ids is not None:
+        query = query.where(Equipamento.id.in_(equipamento_ids))
+    if setor_id is not None:
+        query = query.where(Equipamento.setor_id == setor_id)
+    if filial_id is not None:
+        query = query.where(Equipamento.setor_id.in_(select(Setor.id).where(Setor.filial_id == filial_id)))
+    if empresa is not None:
+        query = query.where(Equipamento.empresa == empresa)
+
+    return list(db.session.execute(query.order_by(Equipamento.id)).scalars())
+
+
+def _em_lotes(itens, tamanho):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def _novo_resumo(status='ok'):
+    resumo = dict.fromkeys(CAMPOS_RESUMO, 0)
+    resumo['status'] = status
+    resumo['pmp_ids'] = []
+    return resumo
+
+
+class _Plano:
+    """Alterações calculadas para um lote de equipamentos"""
+
+    def __init__(self):
+        self.resumos = {}
+        self.pmps_novas = []              # (equipamento_id, linha da PMP, atividades do grupo)
+        self.remover_pmp_ids = []
+        self.inserir_atividades = []      # linhas de AtividadePMP de PMPs existentes
+        self.alterar_atividades = {}      # {id: campos alterados}
+        self.reordenar_atividades = {}    # {id: nova ordem}
+        self.remover_atividade_ids = []
+
+
+def _carregar_lote(equipamento_ids):
+    """Lê tudo que o lote precisa com uma consulta por tabela"""
+    equipamentos = dict(db.session.execute(
+        select(Equipamento.id, Equipamento.tag).where(Equipamento.id.in_(equipamento_ids))
+    ).all())
+
+    planos = dict(db.session.execute(
+        select(PlanoMestre.equipamento_id, PlanoMestre.id).where(PlanoMestre.equipamento_id.in_(equipamento_ids))
+    ).all())
+
+    atividades_por_plano = defaultdict(list)
+    if planos:
+        colunas = [AtividadePlanoMestre.id, AtividadePlanoMestre.plano_mestre_id] + \
+                  [getattr(AtividadePlanoMestre, campo) for campo in CAMPOS_ATIVIDADE]
+        for atividade in db.session.execute(
+            select(*colunas)
+            .where(AtividadePlanoMestre.plano_mestre_id.in_(list(planos.values())))
+            .order_by(AtividadePlanoMestre.id)
+        ):
+            atividades_por_plano[atividade.plano_mestre_id].append(atividade)
+
+    pmps_por_equipamento = defaultdict(list)
+    for pmp in db.session.execute(
+        select(PMP.id, PMP.codigo, PMP.equipamento_id, PMP.oficina, PMP.frequencia, PMP.tipo, PMP.condicao,
+               PMP.data_inicio_plano, PMP.usuarios_responsaveis, PMP.num_pessoas, PMP.dias_antecipacao)
+        .where(PMP.equipamento_id.in_(equipamento_ids))
+        .order_by(PMP.id)
+    ):
+        pmps_por_equipamento[pmp.equipamento_id].append(pmp)
+
+    pmp_ids = [pmp.id for pmps in pmps_por_equipamento.values() for pmp in pmps]
+    atividades_por_pmp = defaultdict(list)
+    colunas = [AtividadePMP.id, AtividadePMP.pmp_id, AtividadePMP.atividade_plano_mestre_id, AtividadePMP.ordem] + \
+              [getattr(AtividadePMP, campo) for campo in CAMPOS_ATIVIDADE]
+    for ids in _em_lotes(pmp_ids, TAMANHO_LOTE_INSERCAO):
+        for atividade in db.session.execute(
+            select(*colunas).where(AtividadePMP.pmp_id.in_(ids)).order_by(AtividadePMP.id)
+        ):
+            atividades_por_pmp[atividade.pmp_id].append(atividade)
+
+    # Códigos seguem o padrão PMP-NN-<tag>; a tag pode se repetir entre equipamentos
+    tags = {tag for tag in equipamentos.values() if tag}
+    codigos_em_uso = set()
+    if tags:
+        codigos_em_uso = set(db.session.execute(
+            select(PMP.codigo).where(or_(*[PMP.codigo.like(f"PMP-%-{tag}") for tag in tags]))
+        ).scalars())
+
+    return equipamentos, planos, atividades_por_plano, pmps_por_equipamento, atividades_por_pmp, codigos_em_uso
+
+
+def _planejar(equipamento_ids, dados, criado_por):
+    """Calcula em memória o que criar, alterar e remover em cada equipamento"""
+    equipamentos, planos, atividades_por_plano, pmps_por_equipamento, atividades_por_pmp, codigos_em_uso = dados
+    plano = _Plano()
+
+    for equipamento_id in equipamento_ids:
+        if equipamento_id not in equipamentos:
+            plano.resumos[equipamento_id] = _novo_resumo('equipamento_nao_encontrado')
+            continue
+        if equipamento_id not in planos:
+            plano.resumos[equipamento_id] = _novo_resumo('sem_plano_mestre')
+            continue
+
+        atividades = atividades_por_plano.get(planos[equipamento_id], [])
+        if not atividades:
+            plano.resumos[equipamento_id] = _novo_resumo('sem_atividades')
+            continue
+
+        resumo = plano.resumos[equipamento_id] = _novo_resumo()
+        tag = equipamentos[equipamento_id]
+
+        grupos = {}
+        for atividade in atividades:
+            grupos.setdefault(chave_grupo(atividade), []).append(atividade)
+
+        existentes = pmps_por_equipamento.get(equipamento_id, [])
+        existentes_por_chave = {chave_pmp(pmp): pmp for pmp in existentes}
+        contador = len(existentes) + 1
+
+        for chave, atividades_grupo in grupos.items():
+            existente = existentes_por_chave.get(chave)
+            if existente is not None:
+                # PMP já existe: dados personalizados preservados, só as atividades podem mudar
+                resumo['preservadas'] += 1
+                resumo['pmp_ids'].append(existente.id)
+                inserir, alterar, reordenar, remover = diferenca_atividades(
+                    existente.id, atividades_por_pmp.get(existente.id, []), atividades_grupo
+                )
+                plano.inserir_atividades += inserir
+                plano.alterar_atividades.update(alterar)
+                plano.reordenar_atividades.update(reordenar)
+                plano.remover_atividade_ids += remover
+                resumo['atividades_criadas'] += len(inserir)
+                resumo['atividades_alteradas'] += len(alterar)
+                resumo['atividades_reordenadas'] += len(reordenar)
+                resumo['atividades_removidas'] += len(remover)
+                continue
+
+            oficina, frequencia, tipo_manutencao, condicao = chave
+            codigo = f"PMP-{contador:02d}-{tag}"
+            while codigo in codigos_em_uso:
+                contador += 1
+                codigo = f"PMP-{contador:02d}-{tag}"
+            codigos_em_uso.add(codigo)
+            contador += 1
+
+            linha = dict(
+                PADROES_PMP,
+                equipamento_id=equipamento_id,
+                codigo=codigo,
+                descricao=f"PREVENTIVA {frequencia.upper()} - {oficina.upper()}",
+                tipo=tipo_manutencao,
+                oficina=oficina,
+                frequencia=frequencia,
+                condicao=condicao,
+                criado_por=criado_por
+            )
+            plano.pmps_novas.append((equipamento_id, linha, atividades_grupo))
+            resumo['criadas'] += 1
+
+        # PMPs sem grupo correspondente no plano mestre
+        for existente in existentes:
+            if chave_pmp(existente) in grupos:
+                continue
+            if pmp_personalizada(existente):
+                resumo['orfas_mantidas'] += 1
+                resumo['pmp_ids'].append(existente.id)
+            else:
+                plano.remover_pmp_ids.append(existente.id)
+                resumo['removidas'] += 1
+
+    return plano
+
+
+def _atualizar_por_id(tabela, colunas, linhas):
+    """
+    UPDATE em lote das colunas, casando pelo id
+
+    No PostgreSQL é um único UPDATE ... FROM (VALUES ...) por lote; nos
+    demais bancos, um executemany.
+    """
+    if not linhas:
+        return
+
+    if db.session.get_bind().dialect.name != 'postgresql':
+        db.session.execute(
+            update(tabela).where(tabela.c.id == bindparam('b_id'))
+            .values({coluna: bindparam(f"b_{coluna}") for coluna in colunas}),
+            [dict({'b_id': linha['id']}, **{f"b_{coluna}": linha[coluna] for coluna in colunas}) for linha in linhas]
+        )
+        return
+
+    for lote in _em_lotes(linhas, TAMANHO_LOTE_INSERCAO):
+        valores = values(
+            column('id', Integer), *[column(coluna, tabela.c[coluna].type) for coluna in colunas], name='v'
+        ).data([(linha['id'], *[linha[coluna] for coluna in colunas]) for linha in lote])
+
+        # CAST: uma coluna só com NULL no VALUES seria inferida como text
+        db.session.execute(
+            update(tabela).where(tabela.c.id == valores.c.id)
+            .values({coluna: cast(valores.c[coluna], tabela.c[coluna].type) for coluna in colunas})
+        )
+
+
+def _aplicar(plano):
+    """Aplica as alterações do lote na transação atual (sem commit)"""
+    tabela = AtividadePMP.__table__
+
+    # Atividades de OS já geradas mantêm a cópia dos dados, sem a referência removida
+    for ids in _em_lotes(plano.remover_atividade_ids, TAMANHO_LOTE_INSERCAO):
+        db.session.execute(
+            update(AtividadeOS).where(AtividadeOS.atividade_pmp_id.in_(ids)).values(atividade_pmp_id=None)
+        )
+        db.session.execute(delete(AtividadePMP).where(AtividadePMP.id.in_(ids)))
+
+    for ids in _em_lotes(plano.remover_pmp_ids, TAMANHO_LOTE_INSERCAO):
+        db.session.execute(
+            update(AtividadeOS)
+            .where(AtividadeOS.atividade_pmp_id.in_(select(AtividadePMP.id).where(AtividadePMP.pmp_id.in_(ids))))
+            .values(atividade_pmp_id=None)
+        )
+        db.session.execute(delete(AtividadePMP).where(AtividadePMP.pmp_id.in_(ids)))
+        db.session.execute(delete(HistoricoExecucaoPMP).where(HistoricoExecucaoPMP.pmp_id.in_(ids)))
+        db.session.execute(delete(PMP).where(PMP.id.in_(ids)))
+
+    # Campos alterados: um UPDATE por combinação de colunas
+    por_colunas = defaultdict(list)
+    for atividade_id, campos in plano.alterar_atividades.items():
+        por_colunas[tuple(sorted(campos))].append(dict(campos, id=atividade_id))
+    for colunas, linhas in por_colunas.items():
+        _atualizar_por_id(tabela, colunas, linhas)
+
+    _atualizar_por_id(tabela, ('ordem',), [
+        {'id': atividade_id, 'ordem': ordem} for atividade_id, ordem in plano.reordenar_atividades.items()
+    ])
+
+    ids_por_codigo = {}
+    for lote in _em_lotes([linha for _, linha, _ in plano.pmps_novas], TAMANHO_LOTE_INSERCAO):
+        for pmp_id, codigo in db.session.execute(insert(PMP).returning(PMP.id, PMP.codigo), lote):
+            ids_por_codigo[codigo] = pmp_id
+
+    linhas_atividades = list(plano.inserir_atividades)
+    for equipamento_id, linha, atividades_grupo in plano.pmps_novas:
+        pmp_id = ids_por_codigo[linha['codigo']]
+        linhas_atividades += linhas_atividades_pmp(pmp_id, atividades_grupo)
+        plano.resumos[equipamento_id]['atividades_criadas'] += len(atividades_grupo)
+        plano.resumos[equipamento_id]['pmp_ids'].append(pmp_id)
+
+    for lote in _em_lotes(linhas_atividades, TAMANHO_LOTE_INSERCAO):
+        db.session.execute(insert(AtividadePMP), lote)
+
+
+def _processar_lote(equipamento_ids, criado_por):
+    plano = _planejar(equipamento_ids, _carregar_lote(equipamento_ids), criado_por)
+    _aplicar(plano)
+    db.session.commit()
+    return plano.resumos
+
+
+def gerar_pmps_equipamentos(equipamento_ids, criado_por=1, tamanho_lote=TAMANHO_LOTE_EQUIPAMENTOS):
+    """
+    Gera/atualiza as PMPs dos equipamentos a partir dos planos mestre
+
+    Cada lote de equipamentos é uma transação. Se o lote falhar, os
+    equipamentos dele são refeitos um a um, para que só o que falhou fique
+    com erro no resumo.
+
+    Args:
+        equipamento_ids (list): IDs dos equipamentos
+        criado_por (int): ID do usuário gravado nas PMPs novas
+        tamanho_lote (int): Equipamentos por transação
+
+    Returns:
+        dict: 'equipamentos' ({id: resumo}) e 'totais'
+    """
+    equipamento_ids = list(dict.fromkeys(equipamento_ids))
+    resumos = {}
+
+    for lote in _em_lotes(equipamento_ids, tamanho_lote):
+        try:
+            resumos.update(_processar_lote(lote, criado_por))
+            continue
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ Lote de {len(lote)} equipamentos falhou ({e}); reprocessando individualmente")
+
+        for equipamento_id in lote:
+            try:
+                resumos.update(_processar_lote([equipamento_id], criado_por))
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ Erro ao gerar PMPs do equipamento {equipamento_id}: {e}")
+                resumo = _novo_resumo('erro')
+                resumo['erro'] = str(e)
+                resumos[equipamento_id] = resumo
+
+    totais = {campo: sum(resumo[campo] for resumo in resumos.values()) for campo in CAMPOS_RESUMO}
+    totais['equipamentos'] = len(resumos)
+    totais['por_status'] = dict(Counter(resumo['status'] for resumo in resumos.values()))
+
+    return {'equipamentos': resumos, 'totais': totais}
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Gera as PMPs de vários equipamentos a partir dos planos mestre')
+    parser.add_argument('--equipamentos', type=int, nargs='+', help='IDs dos equipamentos')
+    parser.add_argument('--setor', type=int, help='Todos os equipamentos do setor')
+    parser.add_argument('--filial', type=int, help='Todos os equipamentos da filial')
+    parser.add_argument('--empresa', help='Restringe aos equipamentos da empresa')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_EQUIPAMENTOS, help='Equipamentos por transação')
+    parser.add_argument('--criado-por', type=int, default=1, help='ID do usuário gravado nas PMPs novas')
+    args = parser.parse_args()
+
+    if args.equipamentos is None and args.setor is None and args.filial is None:
+        parser.error('informe --equipamentos, --setor ou --filial')
+
+    app = create_app()
+
+    with app.app_context():
+        ids = resolver_equipamentos(args.equipamentos, args.setor, args.filial, args.empresa)
+        print(f"🔧 Gerando PMPs de {len(ids)} equipamentos (lotes de {args.lote})")
+
+        resultado = gerar_pmps_equipamentos(ids, criado_por=args.criado_por, tamanho_lote=args.lote)
+
+        for equipamento_id, resumo in resultado['equipamentos'].items():
+            if resumo['status'] == 'ok':
+                print(f"  ✅ {equipamento_id}: {resumo['criadas']} criadas, {resumo['preservadas']} preservadas, "
+                      f"{resumo['removidas']} removidas")
+            else:
+                print(f"  ⚠️ {equipamento_id}: {resumo['status']} {resumo.get('erro', '')}".rstrip())
+
+        print(f"\n📊 RESULTADO: {resultado['totais']}")
+        sys.exit(1 if resultado['totais']['por_status'].get('erro') else 0)
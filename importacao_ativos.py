@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Importação em lote de filiais, setores e equipamentos (CSV ou JSON)
+O arquivo inteiro é validado antes de qualquer escrita: campos obrigatórios,
+tamanhos, tags repetidas e referências ao pai (filial_tag / setor_tag,
+resolvidas em memória contra o próprio arquivo e os ativos já cadastrados).
+Havendo qualquer erro nada é gravado e o relatório aponta a linha de cada
+um. Sem erros, os registros entram em INSERTs de várias linhas, em blocos,
+numa única transação. Em simulação só o relatório é gerado.
+
+Uso:
+    python importacao_ativos.py --empresa ACME --filiais filiais.csv --setores setores.csv --equipamentos equipamentos.csv
+    python importacao_ativos.py --empresa ACME --json ativos.json [--simular] [--ignorar-existentes]
+"""
+
+import io
+import csv
+import sys
+import json
+import logging
+from sqlalchemy import select, insert
+
+from models import db
+from assets_models import Filial, Setor, Equipamento
+
+logger = logging.getLogger(__name__)
+
+TIPOS_ATIVO = ('filiais', 'setores', 'equipamentos')
+
+# Registros por INSERT de várias linhas
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+# Erros listados no relatório (o total é sempre informado)
+LIMITE_ERROS_RELATORIO = 500
+
+MODELOS_IMPORTACAO = {
+    'filiais': Filial,
+    'setores': Setor,
+    'equipamentos': Equipamento
+}
+
+CAMPOS_IMPORTACAO = {
+    'filiais': ['tag', 'descricao', 'endereco', 'cidade', 'estado', 'email', 'telefone', 'cnpj'],
+    'setores': ['tag', 'descricao'],
+    'equipamentos': ['tag', 'descricao', 'foto']
+}
+
+CAMPOS_OPCIONAIS = {'foto'}
+
+# tipo -> (tipo do pai, coluna do id do pai, campo da tag do pai no arquivo)
+PAIS = {
+    'setores': ('filiais', 'filial_id', 'filial_tag'),
+    'equipamentos': ('setores', 'setor_id', 'setor_tag')
+}
+
+
+def ler_registros(conteudo, nome_arquivo=''):
+    """
+    Lê os registros de um arquivo CSV ou JSON
+
+    O CSV aceita ';' ou ',' como separador; o JSON é uma lista de objetos.
+
+    Args:
+        conteudo (str | bytes): Conteúdo do arquivo
+        nome_arquivo (str): Nome do arquivo (a extensão .json indica JSON)
+
+    Returns:
+        list: Dicts com os campos e '_linha' (linha do CSV ou posição no JSON)
+
+    Raises:
+        ValueError: Arquivo ilegível
+    """
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode('utf-8-sig')
+
+    texto = conteudo.lstrip()
+    if nome_arquivo.lower().endswith('.json') or texto.startswith('['):
+        try:
+            registros = json.loads(texto)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'JSON inválido: {e}')
+        return _numerar_json(registros)
+
+    primeira_linha = texto.split('\n', 1)[0]
+    separador = ';' if primeira_linha.count(';') >= primeira_linha.count(',') else ','
+    leitor = csv.DictReader(io.StringIO(texto), delimiter=separador)
+    if not leitor.fieldnames:
+        raise ValueError('CSV sem cabeçalho')
+    leitor.fieldnames = [campo.strip().lower() for campo in leitor.fieldnames]
+
+    # Linha 1 é o cabeçalho
+    return [dict(registro, _linha=numero) for numero, registro in enumerate(leitor, 2)]
+
+
+def _numerar_json(registros, tipo=None):
+    if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+        raise ValueError(f'{tipo or "O JSON"} deve ser uma lista de objetos')
+    return [dict(registro, _linha=numero) for numero, registro in enumerate(registros, 1)]
+
+
+def registros_por_tipo(objeto):
+    """
+    Separa o JSON único {"filiais": [...], "setores": [...], "equipamentos": [...]}
+
+    Raises:
+        ValueError: Estrutura inválida
+    """
+    if not isinstance(objeto, dict):
+        raise ValueError('O JSON deve ser um objeto com filiais, setores e/ou equipamentos')
+    return {tipo: _numerar_json(objeto.get(tipo) or [], tipo) for tipo in TIPOS_ATIVO}
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _inteiro(valor):
+    try:
+        return int(str(valor).strip()) if _texto(valor) is not None else None
+    except ValueError:
+        return None
+
+
+def _tamanhos(modelo):
+    return {
+        coluna.name: coluna.type.length
+        for coluna in modelo.__table__.columns
+        if getattr(coluna.type, 'length', None)
+    }
+
+
+class _Validacao:
+    """Resultado da validação: linhas a inserir por tipo, ignoradas e erros"""
+
+    def __init__(self):
+        self.linhas = {tipo: [] for tipo in TIPOS_ATIVO}
+        self.recebidas = {tipo: 0 for tipo in TIPOS_ATIVO}
+        self.ignoradas = {tipo: 0 for tipo in TIPOS_ATIVO}
+        self.erros = []
+
+    def erro(self, tipo, registro, mensagens):
+        self.erros.append({
+            'tipo': tipo,
+            'linha': registro.get('_linha'),
+            'tag': _texto(registro.get('tag')),
+            'erros': mensagens
+        })
+
+
+def _carregar_existentes(empresa):
+    """Tags e ids já cadastrados da empresa: {tipo: {tag: id}}"""
+    existentes = {}
+    for tipo, modelo in MODELOS_IMPORTACAO.items():
+        linhas = db.session.execute(
+            select(modelo.tag, modelo.id).where(modelo.empresa == empresa)
+        ).all()
+        existentes[tipo] = {tag: id_ for tag, id_ in linhas}
+    return existentes
+
+
+def validar_importacao(dados, empresa, ignorar_existentes=False):
+    """
+    Valida todos os registros sem gravar nada
+
+    Args:
+        dados (dict): {tipo: [registros]} com tipo em TIPOS_ATIVO
+        empresa (str): Empresa dos ativos importados
+        ignorar_existentes (bool): Tag já cadastrada é ignorada em vez de erro
+
+    Returns:
+        _Validacao: Linhas prontas (pai ainda por tag quando vem do arquivo) e erros
+    """
+    validacao = _Validacao()
+    existentes = _carregar_existentes(empresa)
+    ids_existentes = {tipo: set(tags.values()) for tipo, tags in existentes.items()}
+    tags_arquivo = {tipo: set() for tipo in TIPOS_ATIVO}
+
+    # Na ordem da hierarquia: o pai de cada tipo já foi validado
+    for tipo in TIPOS_ATIVO:
+        tamanhos = _tamanhos(MODELOS_IMPORTACAO[tipo])
+
+        for registro in dados.get(tipo) or []:
+            validacao.recebidas[tipo] += 1
+            mensagens = []
+            linha = {}
+
+            for campo in CAMPOS_IMPORTACAO[tipo]:
+                valor = _texto(registro.get(campo))
+                if valor is None and campo not in CAMPOS_OPCIONAIS:
+                    mensagens.append(f'Campo {campo} é obrigatório')
+                elif valor is not None and campo in tamanhos and len(valor) > tamanhos[campo]:
+                    mensagens.append(f'Campo {campo} excede {tamanhos[campo]} caracteres')
+                linha[campo] = valor
+
+            tag = linha['tag']
+            if tag is not None:
+                if tag in tags_arquivo[tipo]:
+                    mensagens.append('Tag repetida no arquivo')
+                elif tag in existentes[tipo]:
+                    if ignorar_existentes and not mensagens:
+                        validacao.ignoradas[tipo] += 1
+                        tags_arquivo[tipo].add(tag)
+                        continue
+                    mensagens.append('Tag já existe nesta empresa')
+                tags_arquivo[tipo].add(tag)
+
+            if tipo in PAIS:
+                tipo_pai, coluna_pai, campo_tag_pai = PAIS[tipo]
+                tag_pai = _texto(registro.get(campo_tag_pai))
+                id_pai = _inteiro(registro.get(coluna_pai))
+
+                if tag_pai is not None:
+                    if tag_pai in existentes[tipo_pai]:
+                        linha[coluna_pai] = existentes[tipo_pai][tag_pai]
+                    elif tag_pai in tags_arquivo[tipo_pai]:
+                        linha[campo_tag_pai] = tag_pai
+                    else:
+                        mensagens.append(f'{campo_tag_pai} "{tag_pai}" não encontrada')
+                elif id_pai is not None:
+                    if id_pai in ids_existentes[tipo_pai]:
+                        linha[coluna_pai] = id_pai
+                    else:
+                        mensagens.append(f'{coluna_pai} {id_pai} não encontrado nesta empresa')
+                else:
+                    mensagens.append(f'Informe {campo_tag_pai} ou {coluna_pai}')
+
+            if mensagens:
+                validacao.erro(tipo, registro, mensagens)
+            else:
+                validacao.linhas[tipo].append(linha)
+
+    return validacao
+
+
+def _inserir_em_lotes(tipo, linhas, tamanho_lote):
+    """INSERTs de várias linhas; retorna {tag: id} dos registros criados"""
+    tabela = MODELOS_IMPORTACAO[tipo].__table__
+    ids = {}
+    for inicio in range(0, len(linhas), tamanho_lote):
+        resultado = db.session.execute(
+            insert(tabela).returning(tabela.c.tag, tabela.c.id),
+            linhas[inicio:inicio + tamanho_lote]
+        )
+        ids.update(dict(resultado.all()))
+    return ids
+
+
+def importar_ativos(dados, empresa, usuario, simular=False, ignorar_existentes=False,
+                    tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """
+    Importa filiais, setores e equipamentos numa única transação
+
+    Args:
+        dados (dict): {tipo: [registros]} com tipo em TIPOS_ATIVO
+        empresa (str): Empresa dos ativos importados
+        usuario (str): Gravado em usuario_criacao
+        simular (bool): Só valida e informa o que seria importado
+        ignorar_existentes (bool): Tags já cadastradas são ignoradas em vez de erro
+        tamanho_lote (int): Registros por INSERT
+
+    Returns:
+        dict: success, simulacao, totais por tipo, total_erros e erros (por linha)
+    """
+    from arvore_ativos import registrar_alteracao_empresa
+
+    validacao = validar_importacao(dados, empresa, ignorar_existentes)
+    totais = {
+        tipo: {
+            'recebidas': validacao.recebidas[tipo],
+            'validas': len(validacao.linhas[tipo]),
+            'ignoradas': validacao.ignoradas[tipo],
+            'importadas': 0
+        }
+        for tipo in TIPOS_ATIVO
+    }
+    resultado = {
+        'success': not validacao.erros,
+        'simulacao': simular,
+        'totais': totais,
+        'total_erros': len(validacao.erros),
+        'erros': validacao.erros[:LIMITE_ERROS_RELATORIO]
+    }
+
+    if validacao.erros or simular:
+        # Encerra a transação aberta pelas leituras da validação
+        db.session.rollback()
+        return resultado
+
+    try:
+        ids_criados = {}
+        for tipo in TIPOS_ATIVO:
+            linhas = validacao.linhas[tipo]
+            if not linhas:
+                continue
+
+            if tipo in PAIS:
+                tipo_pai, coluna_pai, campo_tag_pai = PAIS[tipo]
+                for linha in linhas:
+                    if campo_tag_pai in linha:
+                        linha[coluna_pai] = ids_criados[tipo_pai][linha.pop(campo_tag_pai)]
+
+            for linha in linhas:
+                linha['empresa'] = empresa
+                linha['usuario_criacao'] = usuario
+
+            ids_criados[tipo] = _inserir_em_lotes(tipo, linhas, tamanho_lote)
+            totais[tipo]['importadas'] = len(ids_criados[tipo])
+
+        if ids_criados:
+            registrar_alteracao_empresa(db.session, empresa)
+        db.session.commit()
+
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"📥 Importação de ativos ({empresa}): " + ', '.join(
+        f"{totais[tipo]['importadas']} {tipo}" for tipo in TIPOS_ATIVO
+    ))
+    return resultado
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Importa filiais, setores e equipamentos de arquivos CSV/JSON')
+    parser.add_argument('--empresa', required=True, help='Empresa dos ativos importados')
+    parser.add_argument('--filiais', help='Arquivo de filiais (CSV ou JSON)')
+    parser.add_argument('--setores', help='Arquivo de setores (filial_tag ou filial_id)')
+    parser.add_argument('--equipamentos', help='Arquivo de equipamentos (setor_tag ou setor_id)')
+    parser.add_argument('--json', help='Arquivo JSON único: {"filiais": [...], "setores": [...], "equipamentos": [...]}')
+    parser.add_argument('--usuario', default='importacao', help='Gravado em usuario_criacao')
+    parser.add_argument('--simular', action='store_true', help='Só valida, sem gravar')
+    parser.add_argument('--ignorar-existentes', action='store_true', help='Ignora tags já cadastradas')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_IMPORTACAO, help='Registros por INSERT')
+    args = parser.parse_args()
+
+    dados = {}
+    try:
+        if args.json:
+            with open(args.json, encoding='utf-8-sig') as arquivo:
+                dados = registros_por_tipo(json.load(arquivo))
+        for tipo in TIPOS_ATIVO:
+            caminho = getattr(args, tipo)
+            if caminho:
+                with open(caminho, 'rb') as arquivo:
+                    dados[tipo] = ler_registros(arquivo.read(), caminho)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if not any(dados.values()):
+        parser.error('informe --json ou ao menos um de --filiais, --setores, --equipamentos')
+
+    app = create_app()
+
+    with app.app_context():
+        resultado = importar_ativos(
+            dados, args.empresa, args.usuario,
+            simular=args.simular,
+            ignorar_existentes=args.ignorar_existentes,
+            tamanho_lote=args.lote
+        )
+
+        for tipo, total in resultado['totais'].items():
+            print(f"  {tipo}: {total['recebidas']} recebidas, {total['validas']} válidas, "
+                  f"{total['ignoradas']} ignoradas, {total['importadas']} importadas")
+
+        for erro in resultado['erros']:
+            print(f"  ❌ {erro['tipo']} linha {erro['linha']} ({erro['tag'] or '-'}): {'; '.join(erro['erros'])}")
+        if resultado['total_erros'] > len(resultado['erros']):
+            print(f"  ... e mais {resultado['total_erros'] - len(resultado['erros'])} erros")
+
+        if not resultado['success']:
+            print("\n⚠️ NADA FOI IMPORTADO: corrija os erros acima")
+            sys.exit(1)
+        print("\n🔍 SIMULAÇÃO CONCLUÍDA" if args.simular else "\n🎉 IMPORTAÇÃO CONCLUÍDA!")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Logs e eventos do sistema automático de PMPs
+
+- Arquivo de log do scheduler com rotação por tamanho (RotatingFileHandler)
+- Leitura das últimas linhas por busca reversa em blocos: lê só os bytes
+  necessários, qualquer que seja o tamanho do arquivo
+- Eventos estruturados (execuções de jobs, gerações de OS) gravados na tabela
+  eventos_pmp, consultáveis por período e nível de forma paginada; o
+  scheduler roda em outro dyno, então o arquivo local não seria visível
+  pelos processos web
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import insert
+
+from models import db
+from models.evento_pmp import EventoPMP
+
+logger = logging.getLogger('pmp_scheduler')
+
+LOG_ARQUIVO = os.environ.get('PMP_LOG_ARQUIVO', 'pmp_scheduler.log')
+LOG_MAX_BYTES = int(os.environ.get('PMP_LOG_MAX_BYTES', 5 * 1024 * 1024))
+LOG_BACKUPS = int(os.environ.get('PMP_LOG_BACKUPS', 5))
+
+TAMANHO_BLOCO_LEITURA = 8192
+
+NIVEIS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+_tabela_verificada = False
+_tabela_guarda = threading.Lock()
+
+
+def configurar_log_scheduler(nivel=logging.INFO):
+    """Configura o logging do processo scheduler: arquivo rotativo + stdout"""
+    arquivo = RotatingFileHandler(LOG_ARQUIVO, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+    logging.basicConfig(
+        level=nivel,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[arquivo, logging.StreamHandler()]
+    )
+
+
+def ler_ultimas_linhas(caminho, quantidade=50, tamanho_bloco=TAMANHO_BLOCO_LEITURA):
+    """
+    Retorna as últimas linhas do arquivo lendo blocos a partir do fim
+
+    Args:
+        caminho (str): Arquivo de log
+        quantidade (int): Número de linhas
+        tamanho_bloco (int): Bytes lidos por vez
+
+    Returns:
+        list: Linhas (sem quebra de linha), da mais antiga para a mais recente
+    """
+    if quantidade <= 0 or not os.path.exists(caminho):
+        return []
+
+    with open(caminho, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        posicao = f.tell()
+        dados = b''
+
+        # Uma quebra de linha a mais que o pedido garante a primeira linha inteira
+        while posicao > 0 and dados.count(b'\n') <= quantidade:
+            leitura = min(tamanho_bloco, posicao)
+            posicao -= leitura
+            f.seek(posicao)
+            dados = f.read(leitura) + dados
+
+    linhas = dados.decode('utf-8', errors='replace').splitlines()
+    return linhas[-quantidade:]
+
+
+def _garantir_tabela():
+    global _tabela_verificada
+    if _tabela_verificada:
+        return
+    with _tabela_guarda:
+        if not _tabela_verificada:
+            EventoPMP.__table__.create(db.engine, checkfirst=True)
+            _tabela_verificada = True
+
+
+def registrar_evento(tipo, mensagem=None, nivel='INFO', dados=None):
+    """
+    Grava um evento estruturado
+
+    Usa conexão e transação próprias: o evento fica registrado mesmo que a
+    sessão do chamador seja desfeita. Falhas ao gravar só vão para o log.
+
+    Args:
+        tipo (str): Tipo do evento (ex.: job_concluido, geracao_os)
+        mensagem (str): Texto do evento
+        nivel (str): DEBUG, INFO, WARNING ou ERROR
+        dados (dict): Dados estruturados (gravados como JSON)
+    """
+    from execucao_jobs import HOST
+
+    try:
+        _garantir_tabela()
+        with db.engine.begin() as conn:
+            conn.execute(insert(EventoPMP.__table__).values(
+                data_evento=datetime.utcnow(),
+                nivel=nivel if nivel in NIVEIS else 'INFO',
+                tipo=tipo,
+                mensagem=mensagem,
+                dados=json.dumps(dados, default=str) if dados is not None else None,
+                host=HOST
+            ))
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível registrar evento {tipo}: {e}")
+
+
+def consultar_eventos(inicio=None, fim=None, niveis=None, tipo=None, antes_id=None, limite=50):
+    """
+    Eventos mais recentes primeiro, com paginação por cursor (id)
+
+    Args:
+        inicio (datetime): Eventos a partir desta data
+        fim (datetime): Eventos até esta data
+        niveis (list): Níveis aceitos (None = todos)
+        tipo (str): Tipo do evento
+        antes_id (int): Cursor; retorna eventos com id menor
+        limite (int): Tamanho da página
+
+    Returns:
+        tuple: (lista de EventoPMP, próximo cursor ou None)
+    """
+    if not db.inspect(db.engine).has_table(EventoPMP.__tablename__):
+        return [], None
+
+    query = EventoPMP.query
+    if inicio:
+        query = query.filter(EventoPMP.data_evento >= inicio)
+    if fim:
+        query = query.filter(EventoPMP.data_evento <= fim)
+    if niveis:
+        query = query.filter(EventoPMP.nivel.in_(niveis))
+    if tipo:
+        query = query.filter(EventoPMP.tipo == tipo)
+    if antes_id:
+        query = query.filter(EventoPMP.id < antes_id)
+
+    eventos = query.order_by(EventoPMP.id.desc()).limit(limite + 1).all()
+    proximo = eventos[limite - 1].id if len(eventos) > limite else None
+    return eventos[:limite], proximo
+
+
+def limpar_eventos_antigos(dias=90):
+    """Remove eventos com mais de `dias` dias"""
+    if not db.inspect(db.engine).has_table(EventoPMP.__tablename__):
+        return 0
+    limite = datetime.utcnow() - timedelta(days=dias)
+    removidos = EventoPMP.query.filter(EventoPMP.data_evento < limite).delete(synchronize_session=False)
+    db.session.commit()
+    return removidos
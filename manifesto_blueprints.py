@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Manifesto das blueprints da aplicação
+Declara, na ordem de registro, o módulo e o objeto de cada blueprint e em
+quais ambientes ela é carregada. Módulos fora do ambiente nem são
+importados: as blueprints de debug/teste ficam fora da produção. O import e
+o registro de cada uma são cronometrados, e o relatório vai para o log na
+inicialização (e fica em app.extensions) para acompanhar o tempo de boot.
+
+A ordem importa: quando duas blueprints declaram a mesma rota, vale a
+registrada primeiro.
+
+Uso:
+    python manifesto_blueprints.py   # monta a app e imprime o relatório de inicialização
+"""
+
+import os
+import sys
+import time
+import logging
+import importlib
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+PRODUCAO = 'production'
+DESENVOLVIMENTO = 'development'
+TESTES = 'testing'
+
+TODOS_AMBIENTES = (PRODUCAO, DESENVOLVIMENTO, TESTES)
+SOMENTE_DEBUG = (DESENVOLVIMENTO, TESTES)
+
+# Força as blueprints de debug em qualquer ambiente (diagnóstico pontual)
+VARIAVEL_DEBUG = 'CARREGAR_BLUEPRINTS_DEBUG'
+
+ENTRADA_RELATORIO = 'blueprints_inicializacao'
+
+EntradaBlueprint = namedtuple('EntradaBlueprint', ['modulo', 'atributo', 'ambientes', 'descricao'])
+
+MANIFESTO_BLUEPRINTS = [
+    EntradaBlueprint('auth', 'auth_bp', TODOS_AMBIENTES, 'autenticação'),
+    EntradaBlueprint('routes.assets', 'assets_bp', TODOS_AMBIENTES, 'ativos'),
+    EntradaBlueprint('routes.chamados', 'chamados_bp', TODOS_AMBIENTES, 'chamados'),
+    EntradaBlueprint('routes.ordens_servico', 'ordens_servico_bp', TODOS_AMBIENTES, 'ordens de serviço'),
+    EntradaBlueprint('routes.ordens_servico_desprogramar', 'ordens_servico_desprogramar_bp', TODOS_AMBIENTES,
+                     'desprogramação de OS'),
+    EntradaBlueprint('routes.execucao_os', 'execucao_bp', TODOS_AMBIENTES, 'execução de OS'),
+    EntradaBlueprint('routes.plano_mestre', 'plano_mestre_bp', TODOS_AMBIENTES, 'plano mestre'),
+    EntradaBlueprint('routes.plano_mestre_debug', 'plano_mestre_debug_bp', SOMENTE_DEBUG, 'debug do plano mestre'),
+    EntradaBlueprint('routes.pmp_limpo', 'pmp_limpo_bp', TODOS_AMBIENTES, 'PMP'),
+    EntradaBlueprint('routes.pmp_os_generator', 'pmp_os_generator_bp', TODOS_AMBIENTES, 'geração de OS PMP'),
+    EntradaBlueprint('routes.pmp_simple_api', 'pmp_simple_api_bp', TODOS_AMBIENTES, 'API simples de PMP'),
+    EntradaBlueprint('routes.pmp_cleanup_api', 'pmp_cleanup_api_bp', TODOS_AMBIENTES, 'limpeza de PMP'),
+    EntradaBlueprint('routes.usuario_test_api', 'usuario_test_api_bp', SOMENTE_DEBUG, 'teste de usuários'),
+    EntradaBlueprint('routes.debug_users_api', 'debug_users_api_bp', SOMENTE_DEBUG, 'debug de usuários'),
+    EntradaBlueprint('routes.debug_atividades_api', 'debug_atividades_api_bp', SOMENTE_DEBUG, 'debug de atividades'),
+    EntradaBlueprint('routes.debug_os_atividades', 'debug_os_atividades_bp', SOMENTE_DEBUG, 'debug de atividades da OS'),
+    EntradaBlueprint('routes.pmp_os_api', 'pmp_os_api_bp', TODOS_AMBIENTES, 'API aprimorada de PMP/OS'),
+    EntradaBlueprint('routes.pmp_auto_status', 'pmp_auto_status_bp', TODOS_AMBIENTES, 'status automático PMP'),
+    EntradaBlueprint('routes.debug_routes', 'debug_routes_bp', SOMENTE_DEBUG, 'debug de rotas'),
+    EntradaBlueprint('routes.pmp_scheduler', 'pmp_scheduler_bp', TODOS_AMBIENTES, 'agendamento PMP'),
+    EntradaBlueprint('routes.programacao_api', 'programacao_api_bp', TODOS_AMBIENTES, 'API de programação'),
+    EntradaBlueprint('routes.pmp_analytics', 'pmp_analytics_bp', TODOS_AMBIENTES, 'analytics PMP'),
+    EntradaBlueprint('routes.atividades_os', 'atividades_os_bp', TODOS_AMBIENTES, 'atividades da OS'),
+    EntradaBlueprint('routes.relatorio_52_semanas', 'relatorio_52_semanas_bp', TODOS_AMBIENTES, 'relatório de 52 semanas'),
+    EntradaBlueprint('routes.relatorio_jobs', 'relatorio_jobs_bp', TODOS_AMBIENTES, 'jobs de relatórios'),
+    EntradaBlueprint('routes.atividades_os_com_fallback', 'atividades_os_fallback_bp', TODOS_AMBIENTES,
+                     'atividades com fallback'),
+    EntradaBlueprint('routes.auto_transfer_status', 'auto_transfer_status_bp', TODOS_AMBIENTES,
+                     'status da transferência automática'),
+    EntradaBlueprint('routes.materiais_api', 'materiais_bp', TODOS_AMBIENTES, 'materiais'),
+]
+
+# Blueprints que o app.py registrava antes do manifesto: todas precisam ter
+# entrada (tirar uma delas deve ser decisão explícita, não esquecimento)
+BLUEPRINTS_APP_ANTERIOR = (
+    ('auth', 'auth_bp'),
+    ('routes.assets', 'assets_bp'),
+    ('routes.chamados', 'chamados_bp'),
+    ('routes.ordens_servico', 'ordens_servico_bp'),
+    ('routes.ordens_servico_desprogramar', 'ordens_servico_desprogramar_bp'),
+    ('routes.execucao_os', 'execucao_bp'),
+    ('routes.plano_mestre', 'plano_mestre_bp'),
+    ('routes.plano_mestre_debug', 'plano_mestre_debug_bp'),
+    ('routes.pmp_limpo', 'pmp_limpo_bp'),
+    ('routes.pmp_os_generator', 'pmp_os_generator_bp'),
+    ('routes.pmp_simple_api', 'pmp_simple_api_bp'),
+    ('routes.pmp_cleanup_api', 'pmp_cleanup_api_bp'),
+    ('routes.usuario_test_api', 'usuario_test_api_bp'),
+    ('routes.debug_users_api', 'debug_users_api_bp'),
+    ('routes.debug_atividades_api', 'debug_atividades_api_bp'),
+    ('routes.debug_os_atividades', 'debug_os_atividades_bp'),
+    ('routes.pmp_os_api', 'pmp_os_api_bp'),
+    ('routes.pmp_auto_status', 'pmp_auto_status_bp'),
+    ('routes.debug_routes', 'debug_routes_bp'),
+    ('routes.pmp_scheduler', 'pmp_scheduler_bp'),
+    ('routes.programacao_api', 'programacao_api_bp'),
+    ('routes.pmp_analytics', 'pmp_analytics_bp'),
+    ('routes.atividades_os', 'atividades_os_bp'),
+    ('routes.relatorio_52_semanas', 'relatorio_52_semanas_bp'),
+    ('routes.relatorio_jobs', 'relatorio_jobs_bp'),
+    ('routes.atividades_os_com_fallback', 'atividades_os_fallback_bp'),
+    ('routes.auto_transfer_status', 'auto_transfer_status_bp'),
+    ('routes.materiais_api', 'materiais_bp'),
+)
+
+
+def blueprints_fora_do_manifesto():
+    """
+    Blueprints do app.py anterior sem entrada no manifesto
+
+    Returns:
+        list: (modulo, atributo) ausentes; vazia quando o manifesto está completo
+    """
+    declaradas = {(entrada.modulo, entrada.atributo) for entrada in MANIFESTO_BLUEPRINTS}
+    return [blueprint for blueprint in BLUEPRINTS_APP_ANTERIOR if blueprint not in declaradas]
+
+
+def ambiente_atual():
+    """Ambiente da configuração (FLASK_CONFIG), como em create_app"""
+    ambiente = os.environ.get('FLASK_CONFIG', PRODUCAO)
+    return DESENVOLVIMENTO if ambiente == 'default' else ambiente
+
+
+def blueprints_do_ambiente(ambiente):
+    """Entradas do manifesto carregadas no ambiente, na ordem de registro"""
+    incluir_debug = os.environ.get(VARIAVEL_DEBUG, '').lower() in ('1', 'true', 'yes')
+    return [
+        entrada for entrada in MANIFESTO_BLUEPRINTS
+        if ambiente in entrada.ambientes or (incluir_debug and entrada.ambientes == SOMENTE_DEBUG)
+    ]
+
+
+def registrar_blueprints(app, ambiente=None):
+    """
+    Importa e registra as blueprints do ambiente, cronometrando cada uma
+
+    Uma blueprint que falha no import ou no registro é ignorada (com aviso)
+    e a aplicação sobe sem ela, como antes.
+
+    Args:
+        app: Aplicação Flask
+        ambiente (str): Ambiente; padrão FLASK_CONFIG
+
+    Returns:
+        dict: Relatório (ambiente, total_ms, blueprints, ignoradas), também em
+              app.extensions['blueprints_inicializacao']
+    """
+    ambiente = ambiente or ambiente_atual()
+    carregadas = blueprints_do_ambiente(ambiente)
+
+    ausentes = blueprints_fora_do_manifesto()
+    for modulo, atributo in ausentes:
+        logger.error(f"❌ Blueprint {modulo}.{atributo} (registrada pelo app.py anterior) fora do manifesto")
+    blueprints = []
+    inicio_total = time.perf_counter()
+
+    for entrada in carregadas:
+        modulos_antes = len(sys.modules)
+        inicio = time.perf_counter()
+        registro = {'modulo': entrada.modulo, 'descricao': entrada.descricao, 'status': 'ok'}
+
+        try:
+            blueprint = getattr(importlib.import_module(entrada.modulo), entrada.atributo)
+            registro['import_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+            if blueprint.name in app.blueprints:
+                registro['status'] = 'duplicada'
+            else:
+                app.register_blueprint(blueprint)
+        except Exception as e:
+            registro['status'] = 'erro'
+            registro['erro'] = f"{type(e).__name__}: {e}"
+            logger.warning(f"⚠️ Blueprint de {entrada.descricao} ({entrada.modulo}) não registrada: {e}")
+
+        registro['total_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+        registro.setdefault('import_ms', registro['total_ms'])
+        registro['modulos_novos'] = len(sys.modules) - modulos_antes
+        blueprints.append(registro)
+
+    relatorio = {
+        'ambiente': ambiente,
+        'total_ms': round((time.perf_counter() - inicio_total) * 1000, 1),
+        'blueprints': blueprints,
+        'ignoradas': [entrada.modulo for entrada in MANIFESTO_BLUEPRINTS if entrada not in carregadas],
+        'fora_do_manifesto': [f"{modulo}.{atributo}" for modulo, atributo in ausentes]
+    }
+    app.extensions[ENTRADA_RELATORIO] = relatorio
+
+    registradas = sum(1 for registro in blueprints if registro['status'] == 'ok')
+    logger.info(f"🧩 {registradas}/{len(blueprints)} blueprints registradas em {relatorio['total_ms']:.0f}ms "
+                f"(ambiente {ambiente}, {len(relatorio['ignoradas'])} fora do ambiente)")
+    for registro in sorted(blueprints, key=lambda r: r['total_ms'], reverse=True):
+        logger.info(f"   {registro['total_ms']:>8.1f}ms  {registro['modulos_novos']:>4} módulos  "
+                    f"{registro['status']:<9} {registro['modulo']}")
+
+    return relatorio
+
+
+if __name__ == "__main__":
+    inicio = time.perf_counter()
+    from app import create_app
+
+    app = create_app()
+    relatorio = app.extensions[ENTRADA_RELATORIO]
+
+    print(f"\n📊 INICIALIZAÇÃO ({relatorio['ambiente']}): create_app em "
+          f"{(time.perf_counter() - inicio) * 1000:.0f}ms, blueprints em {relatorio['total_ms']:.0f}ms")
+    print(f"{'Blueprint':<45}{'Import':>10}{'Total':>10}{'Módulos':>9}  Status")
+    print("-" * 84)
+    for registro in sorted(relatorio['blueprints'], key=lambda r: r['total_ms'], reverse=True):
+        print(f"{registro['modulo']:<45}{registro['import_ms']:>10.1f}{registro['total_ms']:>10.1f}"
+              f"{registro['modulos_novos']:>9}  {registro['status']}")
+    if relatorio['ignoradas']:
+        print(f"\nFora do ambiente: {', '.join(relatorio['ignoradas'])}")
+    if relatorio['fora_do_manifesto']:
+        print(f"\n❌ Fora do manifesto (registradas pelo app.py anterior): {', '.join(relatorio['fora_do_manifesto'])}")
+
+    sys.exit(1 if relatorio['fora_do_manifesto'] or any(r['status'] == 'erro' for r in relatorio['blueprints']) else 0)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Migração da frequência canônica das PMPs
+Cria as colunas pmps.frequencia_canonica / pmps.frequencia_intervalo e
+preenche as PMPs existentes. O texto livre de cada frequência distinta é
+interpretado uma única vez e gravado com um UPDATE por valor distinto.
+PMPs novas ou alteradas já são gravadas com a frequência canônica.
+
+Uso:
+    python migrar_frequencia_canonica.py              # cria colunas e preenche as vazias
+    python migrar_frequencia_canonica.py --recalcular # recalcula todas
+    python migrar_frequencia_canonica.py --verificar  # só mostra o que falta
+"""
+
+import sys
+from sqlalchemy import text, inspect
+
+from models import db
+from recorrencia_pmp import interpretar_frequencia
+
+COLUNAS = {
+    'frequencia_canonica': 'VARCHAR(20)',
+    'frequencia_intervalo': 'INTEGER'
+}
+
+
+def adicionar_colunas(conn):
+    """Adiciona as colunas que ainda não existem em pmps"""
+    existentes = {coluna['name'] for coluna in inspect(conn).get_columns('pmps')}
+    for nome, tipo in COLUNAS.items():
+        if nome in existentes:
+            print(f"✅ pmps.{nome} - já existe")
+            continue
+        conn.execute(text(f"ALTER TABLE pmps ADD COLUMN {nome} {tipo}"))
+        print(f"✅ pmps.{nome} - criada")
+
+
+def preencher_frequencias(conn, recalcular=False):
+    """
+    Preenche a frequência canônica das PMPs
+
+    Args:
+        conn: Conexão (em transação)
+        recalcular (bool): Recalcula também as já preenchidas
+
+    Returns:
+        dict: pmps_atualizadas e frequencias_nao_reconhecidas ({texto: quantidade})
+    """
+    filtro = "" if recalcular else "AND frequencia_canonica IS NULL"
+    distintas = conn.execute(text(f"""
+        SELECT frequencia, COUNT(*) FROM pmps
+        WHERE frequencia IS NOT NULL {filtro}
+        GROUP BY frequencia
+    """)).all()
+
+    atualizadas = 0
+    nao_reconhecidas = {}
+    for frequencia, quantidade in distintas:
+        canonica, intervalo = interpretar_frequencia(frequencia)
+        if canonica is None:
+            nao_reconhecidas[frequencia] = quantidade
+            continue
+        atualizadas += conn.execute(text(f"""
+            UPDATE pmps SET frequencia_canonica = :canonica, frequencia_intervalo = :intervalo
+            WHERE frequencia = :frequencia {filtro}
+        """), {'canonica': canonica, 'intervalo': intervalo, 'frequencia': frequencia}).rowcount
+
+    return {'pmps_atualizadas': atualizadas, 'frequencias_nao_reconhecidas': nao_reconhecidas}
+
+
+def migrar(recalcular=False, somente_verificar=False):
+    """Cria as colunas e preenche as PMPs; retorna True se todas ficaram reconhecidas"""
+    with db.engine.begin() as conn:
+        if somente_verificar:
+            existentes = {coluna['name'] for coluna in inspect(conn).get_columns('pmps')}
+            faltando = [nome for nome in COLUNAS if nome not in existentes]
+            if faltando:
+                print(f"❌ Colunas ausentes: {', '.join(faltando)}")
+                return False
+            pendentes = conn.execute(text(
+                "SELECT COUNT(*) FROM pmps WHERE frequencia IS NOT NULL AND frequencia_canonica IS NULL"
+            )).scalar()
+            print(f"📊 {pendentes} PMPs sem frequência canônica")
+            return pendentes == 0
+
+        adicionar_colunas(conn)
+        resultado = preencher_frequencias(conn, recalcular)
+
+    print(f"✅ {resultado['pmps_atualizadas']} PMPs preenchidas")
+    for frequencia, quantidade in resultado['frequencias_nao_reconhecidas'].items():
+        print(f"⚠️ Frequência não reconhecida: '{frequencia}' ({quantidade} PMPs)")
+
+    return not resultado['frequencias_nao_reconhecidas']
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            sucesso = migrar(
+                recalcular='--recalcular' in sys.argv,
+                somente_verificar='--verificar' in sys.argv
+            )
+
+            if sucesso:
+                print("\n🎉 FREQUÊNCIAS CANÔNICAS PREENCHIDAS!")
+            else:
+                print("\n⚠️ VERIFICAR FREQUÊNCIAS PENDENTES")
+                sys.exit(1)
+
+        except Exception as e:
+            print(f"\n❌ ERRO CRÍTICO: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Migração da data de ocorrência das OS de PMP
+Cria a coluna ordens_servico.data_ocorrencia, preenche as OS de PMP
+existentes (routes.verificador_duplicatas_os.preencher_data_ocorrencia) e
+cria o índice único uq_os_pmp_ocorrencia, chave da geração de OS. Deve rodar
+antes de publicar o código que deduplica por data_ocorrencia. OS novas já
+são gravadas com a data de ocorrência.
+
+Uso:
+    python migrar_ocorrencia_os_pmp.py                     # cria, preenche e indexa
+    python migrar_ocorrencia_os_pmp.py --limpar-duplicatas # remove antes as OS sem ocorrência livre
+    python migrar_ocorrencia_os_pmp.py --verificar         # só mostra o que falta
+"""
+
+import sys
+from sqlalchemy import text, inspect
+
+from models import db
+from assets_models import OrdemServico
+from routes.verificador_duplicatas_os import preencher_data_ocorrencia, limpar_os_duplicadas_pmp
+
+SQL_OS_SEM_OCORRENCIA = """
+    SELECT COUNT(*) FROM ordens_servico
+    WHERE pmp_id IS NOT NULL AND data_ocorrencia IS NULL
+"""
+
+
+def adicionar_coluna():
+    """Adiciona ordens_servico.data_ocorrencia se ainda não existir"""
+    with db.engine.begin() as conn:
+        existentes = {coluna['name'] for coluna in inspect(conn).get_columns('ordens_servico')}
+        if 'data_ocorrencia' in existentes:
+            print("✅ ordens_servico.data_ocorrencia - já existe")
+            return
+        conn.execute(text("ALTER TABLE ordens_servico ADD COLUMN data_ocorrencia DATE"))
+        print("✅ ordens_servico.data_ocorrencia - criada")
+
+
+def migrar(limpar_duplicatas=False, somente_verificar=False):
+    """Cria a coluna, preenche as OS e cria o índice; retorna True se o índice ficou válido"""
+    from criar_indices_desempenho import criar_indices
+
+    if somente_verificar:
+        with db.engine.connect() as conn:
+            existentes = {coluna['name'] for coluna in inspect(conn).get_columns('ordens_servico')}
+            if 'data_ocorrencia' not in existentes:
+                print("❌ Coluna ordens_servico.data_ocorrencia ausente")
+                return False
+            pendentes = conn.execute(text(SQL_OS_SEM_OCORRENCIA)).scalar()
+        print(f"📊 {pendentes} OS de PMP sem data de ocorrência")
+        return criar_indices(somente_verificar=True)
+
+    adicionar_coluna()
+
+    if limpar_duplicatas:
+        removidas = limpar_os_duplicadas_pmp(None, OrdemServico, db)
+        print(f"🧹 {removidas} OS duplicadas removidas")
+    else:
+        preenchidas = preencher_data_ocorrencia(None, OrdemServico, db)
+        db.session.commit()
+        print(f"✅ {preenchidas} OS preenchidas")
+
+    pendentes = db.session.execute(text(SQL_OS_SEM_OCORRENCIA)).scalar()
+    if pendentes:
+        print(f"⚠️ {pendentes} OS de PMP sem ocorrência livre (duplicatas ou PMP sem data de início)")
+
+    return criar_indices()
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            sucesso = migrar(
+                limpar_duplicatas='--limpar-duplicatas' in sys.argv,
+                somente_verificar='--verificar' in sys.argv
+            )
+
+            if sucesso:
+                print("\n🎉 DATAS DE OCORRÊNCIA MIGRADAS!")
+            else:
+                print("\n⚠️ VERIFICAR MIGRAÇÃO PENDENTE")
+                sys.exit(1)
+
+        except Exception as e:
+            print(f"\n❌ ERRO CRÍTICO: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
@@ -5,7 +5,7 @@ class AtividadeOS(db.Model):
     __tablename__ = 'atividades_os'
 
     id = db.Column(db.Integer, primary_key=True)
-    os_id = db.Column(db.Integer, db.ForeignKey('ordens_servico.id'), nullable=False)
+    os_id = db.Column(db.Integer, db.ForeignKey('ordens_servico.id'), nullable=False, index=True)
     atividade_pmp_id = db.Column(db.Integer, db.ForeignKey('atividades_pmp.id'), nullable=True)
     
     # Campos da atividade
@@ -0,0 +1,65 @@
+from models import db
+from datetime import datetime
+import json
+
+class EpocaGeracaoOS(db.Model):
+    """
+    Época de geração de OS de PMP: cada reconciliação que muda o estado
+    (OS novas ou pendências diferentes) abre uma época nova; as que não mudam
+    nada só atualizam verificada_em da época atual.
+    """
+    __tablename__ = 'epocas_geracao_os'
+
+    id = db.Column(db.Integer, primary_key=True)  # número da época, crescente
+    assinatura = db.Column(db.String(40), nullable=False)  # hash do resumo + última OS e total de OS de PMP
+    origem = db.Column(db.String(30), nullable=False)  # scheduler, manual
+    host = db.Column(db.String(100), nullable=True)
+
+    # Resultado da reconciliação
+    os_geradas = db.Column(db.Integer, default=0, nullable=False)
+    pmps_processadas = db.Column(db.Integer, default=0, nullable=False)
+    total_os_pendentes = db.Column(db.Integer, default=0, nullable=False)
+    total_pmps_com_pendencias = db.Column(db.Integer, default=0, nullable=False)
+    ultima_os_pmp_id = db.Column(db.Integer, nullable=True)
+    empresas_alteradas = db.Column(db.Text, nullable=True)  # JSON: empresas com OS novas ou pendências diferentes
+
+    aberta_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    verificada_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'epoca': self.id,
+            'origem': self.origem,
+            'host': self.host,
+            'os_geradas': self.os_geradas,
+            'pmps_processadas': self.pmps_processadas,
+            'total_os_pendentes': self.total_os_pendentes,
+            'total_pmps_com_pendencias': self.total_pmps_com_pendencias,
+            'empresas_alteradas': json.loads(self.empresas_alteradas) if self.empresas_alteradas else [],
+            'aberta_em': self.aberta_em.isoformat() if self.aberta_em else None,
+            'verificada_em': self.verificada_em.isoformat() if self.verificada_em else None
+        }
+
+
+class ResumoPendenciasOS(db.Model):
+    """Resumo materializado das pendências de OS de PMP por empresa, regravado a cada época"""
+    __tablename__ = 'resumo_pendencias_os'
+
+    empresa = db.Column(db.String(100), primary_key=True)
+    epoca_id = db.Column(db.Integer, nullable=False)
+    pmps_com_pendencias = db.Column(db.Integer, default=0, nullable=False)
+    os_pendentes = db.Column(db.Integer, default=0, nullable=False)
+    os_geradas_epoca = db.Column(db.Integer, default=0, nullable=False)
+    proxima_data_pendente = db.Column(db.Date, nullable=True)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'empresa': self.empresa,
+            'epoca': self.epoca_id,
+            'pmps_com_pendencias': self.pmps_com_pendencias,
+            'os_pendentes': self.os_pendentes,
+            'os_geradas_epoca': self.os_geradas_epoca,
+            'proxima_data_pendente': self.proxima_data_pendente.isoformat() if self.proxima_data_pendente else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
+        }
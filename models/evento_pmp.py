@@ -0,0 +1,34 @@
+from models import db
+from datetime import datetime
+import json
+
+class EventoPMP(db.Model):
+    __tablename__ = 'eventos_pmp'
+    __table_args__ = (
+        db.Index('idx_eventos_pmp_data', 'data_evento'),
+        db.Index('idx_eventos_pmp_nivel_data', 'nivel', 'data_evento'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    data_evento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    nivel = db.Column(db.String(10), default='INFO', nullable=False)  # DEBUG, INFO, WARNING, ERROR
+    tipo = db.Column(db.String(50), nullable=False)  # job_iniciado, job_concluido, geracao_os...
+    mensagem = db.Column(db.Text, nullable=True)
+    dados = db.Column(db.Text, nullable=True)  # JSON
+    host = db.Column(db.String(100), nullable=True)
+
+    def to_dict(self):
+        try:
+            dados = json.loads(self.dados) if self.dados else None
+        except (TypeError, ValueError):
+            dados = self.dados
+
+        return {
+            'id': self.id,
+            'data_evento': self.data_evento.isoformat() if self.data_evento else None,
+            'nivel': self.nivel,
+            'tipo': self.tipo,
+            'mensagem': self.mensagem,
+            'dados': dados,
+            'host': self.host
+        }
@@ -0,0 +1,41 @@
+from models import db
+from datetime import datetime
+import json
+
+class ExecucaoJob(db.Model):
+    __tablename__ = 'execucoes_job'
+    __table_args__ = (
+        db.Index('idx_execucoes_job_nome_inicio', 'nome', 'iniciado_em'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='executando', nullable=False)  # executando, sucesso, erro, interrompido
+    host = db.Column(db.String(100), nullable=True)  # dyno/processo que executou
+
+    # Tempos
+    iniciado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finalizado_em = db.Column(db.DateTime, nullable=True)
+    duracao_segundos = db.Column(db.Float, nullable=True)
+
+    # Resultado (JSON) ou mensagem de erro
+    resultado = db.Column(db.Text, nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        try:
+            resultado = json.loads(self.resultado) if self.resultado else None
+        except (TypeError, ValueError):
+            resultado = self.resultado
+
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'status': self.status,
+            'host': self.host,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'finalizado_em': self.finalizado_em.isoformat() if self.finalizado_em else None,
+            'duracao_segundos': self.duracao_segundos,
+            'resultado': resultado,
+            'erro': self.erro
+        }
@@ -1,8 +1,20 @@
 from datetime import datetime
 from models import db
 from datetime import datetime
+from sqlalchemy import event
+from recorrencia_pmp import interpretar_frequencia
 import json
 
+
+def _frequencia_canonica_padrao(context):
+    # Inserts em lote (Core) não passam pelo evento de atributo abaixo
+    return interpretar_frequencia(context.get_current_parameters().get('frequencia'))[0]
+
+
+def _frequencia_intervalo_padrao(context):
+    return interpretar_frequencia(context.get_current_parameters().get('frequencia'))[1]
+
+
 class PMP(db.Model):
     """Modelo para Procedimento de Manutenção Preventiva - Estrutura Real do Banco"""
     __tablename__ = 'pmps'
@@ -11,10 +23,14 @@ class PMP(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(50), nullable=False, unique=True)
     descricao = db.Column(db.Text, nullable=False)
-    equipamento_id = db.Column(db.Integer, nullable=False)
+    equipamento_id = db.Column(db.Integer, nullable=False, index=True)
     tipo = db.Column(db.String(100))
     oficina = db.Column(db.String(100))
     frequencia = db.Column(db.String(100))
+    # Derivadas de frequencia quando a PMP é gravada (recorrencia_pmp.FREQUENCIAS_CANONICAS);
+    # o intervalo só existe para 'dias'/'meses'
+    frequencia_canonica = db.Column(db.String(20), default=_frequencia_canonica_padrao)
+    frequencia_intervalo = db.Column(db.Integer, default=_frequencia_intervalo_padrao)
     condicao = db.Column(db.String(50))
     num_pessoas = db.Column(db.Integer, default=1)
     dias_antecipacao = db.Column(db.Integer, default=0)
@@ -41,6 +57,8 @@ class PMP(db.Model):
             'tipo': self.tipo,
             'oficina': self.oficina,
             'frequencia': self.frequencia,
+            'frequencia_canonica': self.frequencia_canonica,
+            'frequencia_intervalo': self.frequencia_intervalo,
             'condicao': self.condicao,
             'num_pessoas': self.num_pessoas,
             'dias_antecipacao': self.dias_antecipacao,
@@ -58,13 +76,18 @@ class PMP(db.Model):
             'materiais': json.loads(self.materiais) if self.materiais else []
         }
 
+@event.listens_for(PMP.frequencia, 'set')
+def _atualizar_frequencia_canonica(pmp, frequencia, anterior, initiator):
+    """Recalcula a frequência canônica sempre que o texto da frequência muda"""
+    pmp.frequencia_canonica, pmp.frequencia_intervalo = interpretar_frequencia(frequencia)
+
 class AtividadePMP(db.Model):
     """Modelo para Atividades de PMP - Estrutura Real do Banco"""
     __tablename__ = 'atividades_pmp'
     
     # Campos conforme estrutura real do banco
     id = db.Column(db.Integer, primary_key=True)
-    pmp_id = db.Column(db.Integer, db.ForeignKey('pmps.id'), nullable=False)
+    pmp_id = db.Column(db.Integer, db.ForeignKey('pmps.id'), nullable=False, index=True)
     atividade_plano_mestre_id = db.Column(db.Integer, db.ForeignKey('atividades_plano_mestre.id'), nullable=False)
     ordem = db.Column(db.Integer, default=1)
     status = db.Column(db.String(20), default='ativo')
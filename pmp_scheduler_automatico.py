@@ -1,276 +1,269 @@
 #!/usr/bin/env python3
 """
 Sistema de Scheduler Automático para Geração de OS baseado em PMPs
-Executa em background para gerar OS automaticamente sem intervenção manual
+Roda como processo próprio (processo "scheduler" do Procfile), fora dos
+workers web. Só um processo do cluster agenda por vez (advisory lock de
+líder); os demais ficam de reserva. Cada job roda sob o seu próprio lock e
+tem a execução registrada na tabela execucoes_job.
+
+Uso:
+    python pmp_scheduler_automatico.py
 """
 
 import os
 import sys
 import time
+import signal
 import logging
 import schedule
 from datetime import datetime, timedelta
-from threading import Thread
 
 # Adicionar o diretório atual ao path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('pmp_scheduler.log'),
-        logging.StreamHandler()
-    ]
-)
-
 logger = logging.getLogger('pmp_scheduler')
 
+# Agenda (horário do servidor)
+HORARIOS_GERACAO = ['06:00', '18:00']
+HORAS_VERIFICACAO = [8, 10, 12, 14, 16]
+HORARIO_LIMPEZA = '03:00'
+INTERVALO_RECONCILIACAO_OS_MINUTOS = 10
+INTERVALO_RECONCILIACAO_MINUTOS = 10
+
+# Espera entre tentativas de virar líder quando outro processo já agenda
+ESPERA_LIDER_SEGUNDOS = 60
+
+
+def criar_app_scheduler():
+    """App Flask mínima (só banco), sem blueprints nem rotinas de inicialização do web"""
+    from flask import Flask
+    from models import db
+    from config import config
+
+    app = Flask(__name__)
+    config_name = os.environ.get('FLASK_CONFIG', 'production')
+    app.config.from_object(config[config_name])
+    db.init_app(app)
+    return app
+
+
+def proxima_execucao_geracao(agora=None):
+    """Próximo horário agendado de geração automática de OS"""
+    agora = agora or datetime.now()
+    for dias in (0, 1):
+        dia = agora.date() + timedelta(days=dias)
+        for horario in sorted(HORARIOS_GERACAO):
+            hora, minuto = map(int, horario.split(':'))
+            candidato = datetime(dia.year, dia.month, dia.day, hora, minuto)
+            if candidato > agora:
+                return candidato
+    return None
+
+
 class PMPSchedulerAutomatico:
     """Scheduler automático para geração de OS baseado em PMPs"""
-    
-    def __init__(self):
+
+    def __init__(self, app):
+        self.app = app
         self.running = False
-        self.thread = None
-        self.last_execution = None
-        self.execution_count = 0
-        
+
+    def _no_contexto(self, funcao):
+        """Executa a função dentro do contexto da aplicação, com sessão limpa no fim"""
+        from models import db
+
+        with self.app.app_context():
+            try:
+                return funcao()
+            finally:
+                db.session.remove()
+
+    def _gerar_os(self):
+        """Geração de OS; o retorno resumido fica no registro do job"""
+        from sistema_geracao_os_pmp_aprimorado import gerar_todas_os_pmp
+
+        resultado = gerar_todas_os_pmp()
+        if not resultado['success']:
+            raise RuntimeError(resultado.get('error', 'Erro na geração de OS'))
+
+        stats = resultado['estatisticas']
+        logger.info(f"✅ Execução concluída: {stats['os_geradas']} OS geradas de {stats['pmps_processadas']} PMPs processadas")
+        return stats
+
+    def _verificar_pendencias(self):
+        from sistema_geracao_os_pmp_aprimorado import verificar_pendencias_os_pmp
+
+        resultado = verificar_pendencias_os_pmp()
+        if not resultado['success']:
+            raise RuntimeError(resultado.get('error', 'Erro ao verificar pendências'))
+
+        return {
+            'total_pmps_com_pendencias': resultado['total_pmps_com_pendencias'],
+            'total_os_pendentes': sum(p['os_pendentes'] for p in resultado['pendencias'])
+        }
+
     def executar_geracao_automatica(self):
         """Executa geração automática de OS"""
-        try:
-            logger.info("🤖 Iniciando execução automática de geração de OS")
-            
-            # Importar dentro da função para evitar problemas de contexto
-            from app import create_app
-            from sistema_geracao_os_pmp_aprimorado import gerar_todas_os_pmp
-            
-            # Criar contexto da aplicação
-            app = create_app()
-            
-            with app.app_context():
-                # Executar geração
-                resultado = gerar_todas_os_pmp()
-                
-                if resultado['success']:
-                    stats = resultado['estatisticas']
-                    os_geradas = stats['os_geradas']
-                    pmps_processadas = stats['pmps_processadas']
-                    
-                    logger.info(f"✅ Execução concluída: {os_geradas} OS geradas de {pmps_processadas} PMPs processadas")
-                    
-                    # Log detalhado se OS foram geradas
-                    if os_geradas > 0:
-                        logger.info(f"📋 Detalhes: {stats['os_ja_existentes']} OS já existiam, {stats['erros']} erros")
-                        
-                        # Log das OS geradas (primeiras 5)
-                        if 'os_geradas' in resultado and resultado['os_geradas']:
-                            logger.info("🆕 Novas OS geradas:")
-                            for i, os in enumerate(resultado['os_geradas'][:5], 1):
-                                logger.info(f"  {i}. OS #{os['id']}: {os['descricao']}")
-                            
-                            if len(resultado['os_geradas']) > 5:
-                                logger.info(f"  ... e mais {len(resultado['os_geradas']) - 5} OS")
-                    
-                    self.last_execution = datetime.now()
-                    self.execution_count += 1
-                    
-                else:
-                    logger.error(f"❌ Erro na execução automática: {resultado['error']}")
-                    
-        except Exception as e:
-            logger.error(f"❌ Erro crítico na execução automática: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-    
+        from execucao_jobs import executar_job
+
+        # O intervalo mínimo impede que um mesmo horário rode duas vezes
+        return self._no_contexto(
+            lambda: executar_job('geracao_os', self._gerar_os, intervalo_minimo=timedelta(minutes=10))
+        )
+
     def verificar_sistema(self):
         """Verifica status do sistema"""
-        try:
-            logger.info("🔍 Verificando status do sistema PMP")
-            
-            from app import create_app
-            from sistema_geracao_os_pmp_aprimorado import verificar_pendencias_os_pmp
-            
-            app = create_app()
-            
-            with app.app_context():
-                resultado = verificar_pendencias_os_pmp()
-                
-                if resultado['success']:
-                    total_pendencias = resultado['total_pmps_com_pendencias']
-                    total_os_pendentes = resultado['total_os_pendentes']
-                    
-                    if total_pendencias > 0:
-                        logger.info(f"⚠️ Sistema tem {total_pendencias} PMPs com {total_os_pendentes} OS pendentes")
-                    else:
-                        logger.info("✅ Sistema em dia - nenhuma pendência encontrada")
-                else:
-                    logger.warning(f"⚠️ Erro ao verificar pendências: {resultado['error']}")
-                    
-        except Exception as e:
-            logger.error(f"❌ Erro ao verificar sistema: {e}")
-    
+        from execucao_jobs import executar_job
+
+        return self._no_contexto(lambda: executar_job('verificacao_sistema', self._verificar_pendencias))
+
+    def reconciliar_pendencias_os(self):
+        """Gera as OS pendentes de PMP e abre uma época de geração se o estado mudou"""
+        from execucao_jobs import executar_job
+        from reconciliacao_os import reconciliar
+
+        return self._no_contexto(lambda: executar_job('reconciliacao_os', reconciliar))
+
+    def reconciliar_atividades(self):
+        """Cria as atividades das OS novas que ficaram sem nenhuma"""
+        from auto_transferir_atividades import executar_reconciliacao
+
+        return self._no_contexto(executar_reconciliacao)
+
+    def limpar_registros(self):
+        """Remove registros antigos de execução de jobs"""
+        from execucao_jobs import executar_job, limpar_execucoes_antigas
+
+        return self._no_contexto(lambda: executar_job('limpeza_execucoes', limpar_execucoes_antigas))
+
     def configurar_agendamentos(self):
         """Configura os agendamentos automáticos"""
         logger.info("📅 Configurando agendamentos automáticos")
-        
-        # Execução principal: todos os dias às 6h da manhã
-        schedule.every().day.at("06:00").do(self.executar_geracao_automatica)
-        logger.info("  ⏰ Geração automática agendada para 06:00 diariamente")
-        
-        # Execução adicional: todos os dias às 18h
-        schedule.every().day.at("18:00").do(self.executar_geracao_automatica)
-        logger.info("  ⏰ Geração automática agendada para 18:00 diariamente")
-        
+        schedule.clear()
+
+        for horario in HORARIOS_GERACAO:
+            schedule.every().day.at(horario).do(self.executar_geracao_automatica)
+        logger.info(f"  ⏰ Geração automática agendada para {', '.join(HORARIOS_GERACAO)} diariamente")
+
         # Verificação de sistema: a cada 2 horas durante horário comercial
-        for hora in [8, 10, 12, 14, 16]:
+        for hora in HORAS_VERIFICACAO:
             schedule.every().day.at(f"{hora:02d}:00").do(self.verificar_sistema)
         logger.info("  🔍 Verificações de sistema agendadas para horário comercial")
-        
-        # Execução de emergência: a cada 30 minutos durante horário comercial
-        # (apenas se houver pendências críticas)
-        schedule.every(30).minutes.do(self.verificar_e_executar_se_necessario)
-        logger.info("  🚨 Verificação de emergência a cada 30 minutos")
-    
-    def verificar_e_executar_se_necessario(self):
-        """Verifica se há pendências críticas e executa se necessário"""
-        try:
-            # Só executar durante horário comercial (7h às 19h)
-            agora = datetime.now()
-            if not (7 <= agora.hour <= 19):
-                return
-            
-            from app import create_app
-            from sistema_geracao_os_pmp_aprimorado import verificar_pendencias_os_pmp
-            
-            app = create_app()
-            
-            with app.app_context():
-                resultado = verificar_pendencias_os_pmp()
-                
-                if resultado['success']:
-                    total_os_pendentes = resultado['total_os_pendentes']
-                    
-                    # Executar se há mais de 5 OS pendentes
-                    if total_os_pendentes > 5:
-                        logger.warning(f"🚨 Execução de emergência: {total_os_pendentes} OS pendentes")
-                        self.executar_geracao_automatica()
-                        
-        except Exception as e:
-            logger.error(f"❌ Erro na verificação de emergência: {e}")
-    
+
+        # Reconciliação de OS pendentes (substitui a geração disparada pelos navegadores);
+        # os clientes acompanham as épocas pelo stream /api/ordens-servico/alteracoes
+        schedule.every(INTERVALO_RECONCILIACAO_OS_MINUTOS).minutes.do(self.reconciliar_pendencias_os)
+        logger.info(f"  🔁 Reconciliação de OS pendentes a cada {INTERVALO_RECONCILIACAO_OS_MINUTOS} minutos")
+
+        # Reconciliação incremental de atividades (só OS acima da marca d'água)
+        schedule.every(INTERVALO_RECONCILIACAO_MINUTOS).minutes.do(self.reconciliar_atividades)
+        logger.info(f"  🧩 Reconciliação de atividades a cada {INTERVALO_RECONCILIACAO_MINUTOS} minutos")
+
+        schedule.every().day.at(HORARIO_LIMPEZA).do(self.limpar_registros)
+
     def executar_loop(self):
-        """Loop principal do scheduler"""
+        """Loop principal do scheduler (executado apenas pelo líder)"""
         logger.info("🚀 Iniciando loop do scheduler automático")
-        
+
         while self.running:
             try:
                 schedule.run_pending()
-                time.sleep(60)  # Verificar a cada minuto
-                
-            except KeyboardInterrupt:
-                logger.info("⏹️ Interrupção manual recebida")
-                break
+                time.sleep(1)  # Curto para atender o SIGTERM rapidamente
             except Exception as e:
                 logger.error(f"❌ Erro no loop do scheduler: {e}")
                 time.sleep(60)  # Aguardar antes de tentar novamente
-        
+
         logger.info("🛑 Loop do scheduler finalizado")
-    
-    def iniciar(self):
-        """Inicia o scheduler em thread separada"""
-        if self.running:
-            logger.warning("⚠️ Scheduler já está executando")
-            return
-        
-        logger.info("🎬 Iniciando scheduler automático de PMPs")
-        
+
+    def executar(self):
+        """
+        Executa o scheduler até receber parada
+
+        Enquanto outro processo for o líder, este aguarda e tenta novamente.
+        """
+        from execucao_jobs import advisory_lock, garantir_tabela, CHAVE_LIDER
+        from reconciliacao_os import garantir_tabelas
+
         self.running = True
-        self.configurar_agendamentos()
-        
-        # Executar primeira verificação imediatamente
-        logger.info("🔄 Executando verificação inicial")
-        self.verificar_sistema()
-        
-        # Iniciar thread do loop
-        self.thread = Thread(target=self.executar_loop, daemon=True)
-        self.thread.start()
-        
-        logger.info("✅ Scheduler automático iniciado com sucesso")
-    
+
+        with self.app.app_context():
+            garantir_tabela()
+            garantir_tabelas()
+
+            while self.running:
+                with advisory_lock(CHAVE_LIDER) as lider:
+                    if lider:
+                        logger.info("👑 Este processo é o líder do scheduler")
+                        self.configurar_agendamentos()
+
+                        # Executar primeira verificação e reconciliação imediatamente
+                        logger.info("🔄 Executando verificação inicial")
+                        self.verificar_sistema()
+                        self.reconciliar_pendencias_os()
+
+                        self.executar_loop()
+                        schedule.clear()
+                        continue
+
+                logger.info(f"⏸️ Outro processo é o líder do scheduler; nova tentativa em {ESPERA_LIDER_SEGUNDOS}s")
+                for _ in range(ESPERA_LIDER_SEGUNDOS):
+                    if not self.running:
+                        break
+                    time.sleep(1)
+
     def parar(self):
         """Para o scheduler"""
         logger.info("🛑 Parando scheduler automático")
-        
         self.running = False
-        
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=5)
-        
-        logger.info("✅ Scheduler automático parado")
-    
-    def status(self):
-        """Retorna status do scheduler"""
-        return {
-            'running': self.running,
-            'last_execution': self.last_execution.isoformat() if self.last_execution else None,
-            'execution_count': self.execution_count,
-            'next_runs': [str(job.next_run) for job in schedule.jobs[:3]]
-        }
 
-# Instância global do scheduler
-scheduler_instance = None
-
-def iniciar_scheduler():
-    """Inicia o scheduler global"""
-    global scheduler_instance
-    
-    if scheduler_instance is None:
-        scheduler_instance = PMPSchedulerAutomatico()
-    
-    scheduler_instance.iniciar()
-    return scheduler_instance
-
-def parar_scheduler():
-    """Para o scheduler global"""
-    global scheduler_instance
-    
-    if scheduler_instance:
-        scheduler_instance.parar()
 
 def status_scheduler():
-    """Retorna status do scheduler global"""
-    global scheduler_instance
-    
-    if scheduler_instance:
-        return scheduler_instance.status()
+    """
+    Status do sistema automático válido para todo o cluster
+
+    Lido do banco (lock de líder em pg_locks e tabela execucoes_job), e não
+    do processo que atende a requisição. Requer contexto da aplicação.
+    """
+    from models import db
+    from execucao_jobs import scheduler_ativo, ultimas_execucoes, contar_execucoes
+
+    if db.inspect(db.engine).has_table('execucoes_job'):
+        execucoes = ultimas_execucoes()
+        execucoes_24h = contar_execucoes('geracao_os', datetime.utcnow() - timedelta(hours=24))
     else:
-        return {'running': False, 'message': 'Scheduler não inicializado'}
+        execucoes = {}
+        execucoes_24h = 0
+
+    ultima_geracao = execucoes.get('geracao_os') or {}
+    proxima = proxima_execucao_geracao()
+
+    return {
+        'running': scheduler_ativo(),
+        'last_execution': ultima_geracao.get('finalizado_em') or ultima_geracao.get('iniciado_em'),
+        'last_status': ultima_geracao.get('status'),
+        'next_execution': proxima.isoformat() if proxima else None,
+        'execution_count': execucoes_24h,
+        'jobs': execucoes
+    }
+
 
 if __name__ == "__main__":
-    # Execução direta do script
-    import signal
-    
+    # Configurar logging (arquivo com rotação por tamanho)
+    from logs_pmp import configurar_log_scheduler
+    configurar_log_scheduler()
+
+    scheduler = PMPSchedulerAutomatico(criar_app_scheduler())
+
     def signal_handler(sig, frame):
         logger.info("🛑 Sinal de interrupção recebido")
-        if scheduler_instance:
-            scheduler_instance.parar()
-        sys.exit(0)
-    
-    # Configurar handler para SIGINT (Ctrl+C)
+        scheduler.parar()
+
+    # SIGTERM é enviado pelo Heroku ao reiniciar o dyno
     signal.signal(signal.SIGINT, signal_handler)
-    
+    signal.signal(signal.SIGTERM, signal_handler)
+
     try:
-        # Iniciar scheduler
-        scheduler = iniciar_scheduler()
-        
         logger.info("🎯 Scheduler automático de PMPs em execução")
-        logger.info("   Pressione Ctrl+C para parar")
-        
-        # Manter o processo vivo
-        while scheduler.running:
-            time.sleep(1)
-            
+        scheduler.executar()
     except Exception as e:
         logger.error(f"❌ Erro fatal: {e}")
         sys.exit(1)
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Programação automática de OS por capacidade
+Distribui o backlog de OS abertas da empresa entre os técnicos, nos dias
+úteis do horizonte (uma ou mais semanas), respeitando a capacidade semanal
+de HH de cada técnico e de cada oficina. As OS são alocadas em ordem de
+prioridade (seguranca > alta > media > baixa > preventiva) e de data limite;
+cada uma vai para o primeiro dia da sua janela com capacidade, com o técnico
+de maior saldo no dia (heap por dia e oficina, com remoção preguiçosa).
+
+Para OS de PMP a data limite é a data_programada gerada e a janela começa
+dias_antecipacao dias antes; OS sem data entram desde o primeiro dia. A
+capacidade já tomada por OS programadas/em andamento no horizonte é
+descontada. O técnico responde pelas horas da OS (duração) e a oficina
+pelo HH (qtd_pessoas * horas).
+
+A prévia não grava nada; a aplicação usa programacao_lote (mesmos campos
+da programação manual: data_programada, usuario_responsavel e status).
+"""
+
+import os
+import time
+import heapq
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import select, func, or_
+
+from models import db, User
+from assets_models import OrdemServico
+from models.pmp_limpo import PMP
+
+logger = logging.getLogger(__name__)
+
+# Ordem de alocação: menor peso primeiro
+PESO_PRIORIDADE = {'seguranca': 0, 'alta': 1, 'media': 2, 'baixa': 3, 'preventiva': 4}
+
+# Capacidade semanal de um técnico sem capacidade informada
+HH_SEMANA_PADRAO = float(os.environ.get('PROGRAMACAO_HH_SEMANA_PADRAO', 44))
+
+DIAS_UTEIS_SEMANA = 5
+MAXIMO_SEMANAS = 8
+
+# OS que já ocupam capacidade no horizonte
+STATUS_OCUPAM_CAPACIDADE = ('programada', 'em_andamento')
+
+# Folga de arredondamento nas comparações de horas
+_TOLERANCIA = 1e-6
+
+
+def inicio_semana(dia):
+    """Segunda-feira da semana do dia"""
+    return dia - timedelta(days=dia.weekday())
+
+
+def _numero(valor, nome):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'{nome} deve ser numérico')
+    if numero < 0:
+        raise ValueError(f'{nome} não pode ser negativo')
+    return numero
+
+
+def normalizar_parametros(dados, empresa, hoje=None):
+    """
+    Valida os parâmetros da programação automática
+
+    Args:
+        dados (dict): semana (YYYY-MM-DD, qualquer dia; padrão: semana atual),
+                      semanas (1 a MAXIMO_SEMANAS), tecnicos
+                      ([{nome, hh_semana, oficinas}]; padrão: usuários ativos
+                      da empresa com HH_SEMANA_PADRAO e qualquer oficina) e
+                      oficinas ({oficina: hh_semana}; oficina ausente não
+                      tem limite próprio)
+        empresa (str): Empresa do usuário
+        hoje (date): Data de referência (dias anteriores não recebem OS)
+
+    Returns:
+        dict: semana, semanas, dias, tecnicos e oficinas normalizados
+
+    Raises:
+        ValueError: Parâmetro inválido
+    """
+    hoje = hoje or date.today()
+
+    try:
+        semana = date.fromisoformat(dados['semana']) if dados.get('semana') else hoje
+    except (TypeError, ValueError):
+        raise ValueError('Formato de semana inválido. Use YYYY-MM-DD')
+    semana = inicio_semana(semana)
+
+    try:
+        semanas = int(dados.get('semanas') or 1)
+    except (TypeError, ValueError):
+        raise ValueError('semanas deve ser inteiro')
+    if not 1 <= semanas <= MAXIMO_SEMANAS:
+        raise ValueError(f'semanas deve estar entre 1 e {MAXIMO_SEMANAS}')
+
+    dias = [
+        semana + timedelta(days=deslocamento)
+        for deslocamento in range(semanas * 7)
+        if (semana + timedelta(days=deslocamento)).weekday() < DIAS_UTEIS_SEMANA
+        and semana + timedelta(days=deslocamento) >= hoje
+    ]
+    if not dias:
+        raise ValueError('O horizonte não tem dias úteis a partir de hoje')
+
+    tecnicos = {}
+    if dados.get('tecnicos'):
+        if not isinstance(dados['tecnicos'], list):
+            raise ValueError('tecnicos deve ser uma lista')
+        for tecnico in dados['tecnicos']:
+            nome = str(tecnico.get('nome') or '').strip() if isinstance(tecnico, dict) else ''
+            if not nome:
+                raise ValueError('Todo técnico precisa de nome')
+            oficinas = tecnico.get('oficinas')
+            tecnicos[nome] = {
+                'hh_semana': _numero(tecnico.get('hh_semana', HH_SEMANA_PADRAO), f'hh_semana de {nome}'),
+                'oficinas': frozenset(oficinas) if oficinas else None
+            }
+    else:
+        usuarios = db.session.execute(
+            select(User.name, User.email).where(User.company == empresa, User.status == 'active')
+        ).all()
+        for nome, email in usuarios:
+            tecnicos[nome or email.split('@')[0]] = {'hh_semana': HH_SEMANA_PADRAO, 'oficinas': None}
+
+    if not tecnicos:
+        raise ValueError('Nenhum técnico disponível para a programação')
+
+    oficinas = {}
+    if dados.get('oficinas'):
+        if not isinstance(dados['oficinas'], dict):
+            raise ValueError('oficinas deve ser um objeto {oficina: hh_semana}')
+        oficinas = {
+            oficina: _numero(hh, f'hh_semana da oficina {oficina}') for oficina, hh in dados['oficinas'].items()
+        }
+
+    return {'semana': semana, 'semanas': semanas, 'dias': dias, 'tecnicos': tecnicos, 'oficinas': oficinas}
+
+
+def carregar_backlog(empresa, dias):
+    """
+    OS abertas da empresa cuja janela começa até o fim do horizonte
+
+    Returns:
+        list: dicts com id, prioridade, oficina, horas, hh, pmp_id, data_limite e inicio_janela
+    """
+    fim = dias[-1]
+    antecipacao_maxima = db.session.execute(select(func.max(PMP.dias_antecipacao))).scalar() or 0
+
+    linhas = db.session.execute(
+        select(OrdemServico.id, OrdemServico.prioridade, OrdemServico.oficina, OrdemServico.horas,
+               OrdemServico.hh, OrdemServico.pmp_id, OrdemServico.data_programada, PMP.dias_antecipacao)
+        .outerjoin(PMP, PMP.id == OrdemServico.pmp_id)
+        .where(OrdemServico.empresa == empresa, OrdemServico.status == 'aberta',
+               or_(OrdemServico.data_programada.is_(None),
+                   OrdemServico.data_programada <= fim + timedelta(days=max(antecipacao_maxima, 0))))
+    ).all()
+
+    backlog = []
+    for linha in linhas:
+        inicio_janela = None
+        if linha.data_programada:
+            inicio_janela = linha.data_programada - timedelta(days=max(linha.dias_antecipacao or 0, 0))
+            if inicio_janela > fim:
+                continue
+        backlog.append({
+            'id': linha.id,
+            'prioridade': linha.prioridade,
+            'oficina': linha.oficina,
+            'horas': max(linha.horas or 0, 0),
+            'hh': max(linha.hh or 0, 0),
+            'pmp_id': linha.pmp_id,
+            'data_limite': linha.data_programada,
+            'inicio_janela': inicio_janela
+        })
+    return backlog
+
+
+def carregar_datas_pmp(backlog, dias):
+    """
+    Datas do horizonte já tomadas pelas PMPs do backlog, por OS em qualquer status
+
+    O índice único (pmp_id, data_programada) vale para toda OS da PMP, não só
+    para as programadas: uma OS aberta, concluída ou cancelada na data também
+    a ocupa.
+
+    Returns:
+        list: dicts com id, pmp_id e data_programada
+    """
+    pmp_ids = sorted({os_aberta['pmp_id'] for os_aberta in backlog if os_aberta['pmp_id']})
+    if not pmp_ids:
+        return []
+    return [
+        dict(linha._mapping) for linha in db.session.execute(
+            select(OrdemServico.id, OrdemServico.pmp_id, OrdemServico.data_programada)
+            .where(OrdemServico.pmp_id.in_(pmp_ids),
+                   OrdemServico.data_programada >= dias[0],
+                   OrdemServico.data_programada <= dias[-1])
+        )
+    ]
+
+
+def carregar_ocupacao(empresa, semana, dias):
+    """OS programadas/em andamento no horizonte (capacidade já tomada e PMP + data ocupados)"""
+    return [
+        dict(linha._mapping) for linha in db.session.execute(
+            select(OrdemServico.usuario_responsavel, OrdemServico.data_programada, OrdemServico.oficina,
+                   OrdemServico.horas, OrdemServico.hh, OrdemServico.pmp_id)
+            .where(OrdemServico.empresa == empresa,
+                   OrdemServico.status.in_(STATUS_OCUPAM_CAPACIDADE),
+                   OrdemServico.data_programada >= semana,
+                   OrdemServico.data_programada <= dias[-1])
+        )
+    ]
+
+
+class _Capacidade:
+    """Saldo de horas por técnico e dia, com um max-heap por (dia, oficina)"""
+
+    def __init__(self, tecnicos, dias):
+        self.tecnicos = tecnicos
+        self.diaria = {nome: tecnico['hh_semana'] / DIAS_UTEIS_SEMANA for nome, tecnico in tecnicos.items()}
+        self.saldo = {(nome, dia): self.diaria[nome] for nome in tecnicos for dia in dias}
+        self.heaps = defaultdict(dict)  # {dia: {oficina: heap}}
+
+    def atende(self, nome, oficina):
+        oficinas = self.tecnicos[nome]['oficinas']
+        return oficinas is None or oficina in oficinas
+
+    def _heap(self, dia, oficina):
+        heap = self.heaps[dia].get(oficina)
+        if heap is None:
+            heap = [(-self.saldo[(nome, dia)], nome) for nome in self.tecnicos if self.atende(nome, oficina)]
+            heapq.heapify(heap)
+            self.heaps[dia][oficina] = heap
+        return heap
+
+    def consumir(self, nome, dia, horas):
+        """Desconta as horas do dia do técnico (um dia livre aceita OS maior que a capacidade diária)"""
+        self.saldo[(nome, dia)] = max(self.saldo[(nome, dia)] - horas, 0)
+        for oficina, heap in self.heaps[dia].items():
+            if self.atende(nome, oficina):
+                heapq.heappush(heap, (-self.saldo[(nome, dia)], nome))
+
+    def escolher(self, dia, oficina, horas):
+        """
+        Técnico da oficina com maior saldo no dia que comporta as horas
+
+        Returns:
+            str: Nome do técnico, ou None
+        """
+        heap = self._heap(dia, oficina)
+        # Remoção preguiçosa: entradas com saldo desatualizado
+        while heap and -heap[0][0] != self.saldo[(heap[0][1], dia)]:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+
+        saldo, nome = -heap[0][0], heap[0][1]
+        if saldo + _TOLERANCIA >= horas:
+            return nome
+
+        # OS maior que o saldo de todos: só cabe num dia inteiro livre
+        livres = [candidato for candidato in self.tecnicos
+                  if self.atende(candidato, oficina) and self.diaria[candidato] > 0
+                  and self.saldo[(candidato, dia)] == self.diaria[candidato]]
+        if livres:
+            return max(livres, key=lambda candidato: (self.diaria[candidato], candidato))
+        return None
+
+
+def alocar(backlog, parametros, ocupacao=(), datas_pmp=()):
+    """
+    Aloca o backlog no horizonte (sem acessar o banco)
+
+    Uma OS de PMP só vai para um dia livre na PMP ou que ela mesma já ocupa;
+    a data que ela deixa continua reservada, então a prévia nunca propõe uma
+    PMP + data repetida.
+
+    Args:
+        backlog (list): OS de carregar_backlog
+        parametros (dict): Resultado de normalizar_parametros
+        ocupacao (iterable): OS de carregar_ocupacao
+        datas_pmp (iterable): OS de carregar_datas_pmp
+
+    Returns:
+        dict: alocacoes, nao_alocadas e uso (capacidade x alocado por técnico e oficina)
+    """
+    dias = parametros['dias']
+    tecnicos = parametros['tecnicos']
+    capacidade = _Capacidade(tecnicos, dias)
+
+    capacidade_oficinas = parametros['oficinas']
+    saldo_oficina = {}
+    for dia in dias:
+        for oficina, hh_semana in capacidade_oficinas.items():
+            saldo_oficina[(inicio_semana(dia), oficina)] = hh_semana
+
+    uso_tecnicos = {nome: {'capacidade': round(capacidade.diaria[nome] * len(dias), 2),
+                           'programado': 0.0, 'alocado': 0.0} for nome in tecnicos}
+    uso_oficinas = defaultdict(lambda: {'programado': 0.0, 'alocado': 0.0})
+    # (pmp_id, dia) -> OS que ocupa a data (None: OS fora do backlog)
+    pmp_datas = {(os_pmp['pmp_id'], os_pmp['data_programada']): os_pmp['id'] for os_pmp in datas_pmp}
+
+    dias_horizonte = set(dias)
+    for os_existente in ocupacao:
+        dia = os_existente['data_programada']
+        if os_existente['pmp_id']:
+            pmp_datas.setdefault((os_existente['pmp_id'], dia), None)
+        chave_oficina = (inicio_semana(dia), os_existente['oficina'])
+        if chave_oficina in saldo_oficina:
+            saldo_oficina[chave_oficina] = max(saldo_oficina[chave_oficina] - (os_existente['hh'] or 0), 0)
+        uso_oficinas[os_existente['oficina']]['programado'] += os_existente['hh'] or 0
+
+        nome = os_existente['usuario_responsavel']
+        if nome in tecnicos and dia in dias_horizonte:
+            capacidade.saldo[(nome, dia)] = max(capacidade.saldo[(nome, dia)] - (os_existente['horas'] or 0), 0)
+            uso_tecnicos[nome]['programado'] += os_existente['horas'] or 0
+
+    ordem = [
+        (PESO_PRIORIDADE.get(os_aberta['prioridade'], len(PESO_PRIORIDADE)),
+         os_aberta['data_limite'] or date.max, os_aberta['id'], os_aberta)
+        for os_aberta in backlog
+    ]
+    heapq.heapify(ordem)
+
+    alocacoes = []
+    nao_alocadas = []
+    while ordem:
+        os_aberta = heapq.heappop(ordem)[-1]
+        oficina = os_aberta['oficina']
+        inicio = bisect_left(dias, os_aberta['inicio_janela']) if os_aberta['inicio_janela'] else 0
+
+        if not any(capacidade.atende(nome, oficina) for nome in tecnicos):
+            motivo = 'Nenhum técnico atende a oficina'
+        else:
+            motivo = 'Sem capacidade no horizonte'
+            for dia in dias[inicio:]:
+                if os_aberta['pmp_id'] and pmp_datas.get((os_aberta['pmp_id'], dia), os_aberta['id']) != os_aberta['id']:
+                    continue
+                chave_oficina = (inicio_semana(dia), oficina)
+                if chave_oficina in saldo_oficina and saldo_oficina[chave_oficina] + _TOLERANCIA < os_aberta['hh']:
+                    continue
+
+                nome = capacidade.escolher(dia, oficina, os_aberta['horas'])
+                if nome is None:
+                    continue
+
+                capacidade.consumir(nome, dia, os_aberta['horas'])
+                if chave_oficina in saldo_oficina:
+                    saldo_oficina[chave_oficina] -= os_aberta['hh']
+                if os_aberta['pmp_id']:
+                    pmp_datas[(os_aberta['pmp_id'], dia)] = os_aberta['id']
+                uso_tecnicos[nome]['alocado'] += os_aberta['horas']
+                uso_oficinas[oficina]['alocado'] += os_aberta['hh']
+
+                alocacoes.append({
+                    'os_id': os_aberta['id'],
+                    'data_programada': dia.isoformat(),
+                    'usuario_responsavel': nome,
+                    'prioridade': os_aberta['prioridade'],
+                    'oficina': oficina,
+                    'horas': os_aberta['horas'],
+                    'hh': os_aberta['hh'],
+                    'data_limite': os_aberta['data_limite'].isoformat() if os_aberta['data_limite'] else None,
+                    'atrasada': bool(os_aberta['data_limite'] and dia > os_aberta['data_limite'])
+                })
+                motivo = None
+                break
+
+        if motivo:
+            nao_alocadas.append({
+                'os_id': os_aberta['id'],
+                'prioridade': os_aberta['prioridade'],
+                'oficina': oficina,
+                'hh': os_aberta['hh'],
+                'data_limite': os_aberta['data_limite'].isoformat() if os_aberta['data_limite'] else None,
+                'motivo': motivo
+            })
+
+    for oficina, uso in uso_oficinas.items():
+        hh_semana = capacidade_oficinas.get(oficina)
+        uso['capacidade'] = round(hh_semana * parametros['semanas'], 2) if hh_semana is not None else None
+    for uso in list(uso_tecnicos.values()) + list(uso_oficinas.values()):
+        uso['programado'] = round(uso['programado'], 2)
+        uso['alocado'] = round(uso['alocado'], 2)
+
+    return {
+        'alocacoes': alocacoes,
+        'nao_alocadas': nao_alocadas,
+        'uso': {'tecnicos': uso_tecnicos, 'oficinas': dict(uso_oficinas)}
+    }
+
+
+def previa_programacao(empresa, dados, hoje=None):
+    """
+    Calcula a programação automática da empresa, sem gravar
+
+    Args:
+        empresa (str): Empresa do usuário
+        dados (dict): Parâmetros (ver normalizar_parametros)
+        hoje (date): Data de referência
+
+    Returns:
+        dict: semana_inicio, semana_fim, backlog, alocacoes, nao_alocadas, uso e tempo_ms
+
+    Raises:
+        ValueError: Parâmetro inválido
+    """
+    inicio = time.perf_counter()
+    parametros = normalizar_parametros(dados, empresa, hoje)
+    dias = parametros['dias']
+
+    backlog = carregar_backlog(empresa, dias)
+    ocupacao = carregar_ocupacao(empresa, parametros['semana'], dias)
+    datas_pmp = carregar_datas_pmp(backlog, dias)
+    carregado = time.perf_counter()
+
+    resultado = alocar(backlog, parametros, ocupacao, datas_pmp)
+    fim = time.perf_counter()
+
+    logger.info(f"🗓️ Programação automática ({empresa}): {len(resultado['alocacoes'])}/{len(backlog)} OS alocadas "
+                f"em {len(dias)} dias, {len(parametros['tecnicos'])} técnicos "
+                f"(consulta {(carregado - inicio) * 1000:.0f}ms, alocação {(fim - carregado) * 1000:.0f}ms)")
+
+    return dict(
+        resultado,
+        semana_inicio=parametros['semana'].isoformat(),
+        semana_fim=(parametros['semana'] + timedelta(days=parametros['semanas'] * 7 - 1)).isoformat(),
+        backlog=len(backlog),
+        tempo_ms={'consulta': round((carregado - inicio) * 1000, 1), 'alocacao': round((fim - carregado) * 1000, 1)}
+    )
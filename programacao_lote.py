@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Programação de OS em lote
+Recebe uma lista de {os_id, data_programada, usuario_responsavel, prioridade}
+e programa todas numa transação: as OS são lidas numa consulta (validando a
+empresa), os conflitos de PMP + data são resolvidos em memória, as OS aceitas
+são atualizadas com um único UPDATE ... FROM (VALUES ...) por lote e os
+chamados vinculados com um UPDATE por conjunto de IDs. Cada item recebe seu
+próprio resultado; itens rejeitados não impedem os demais. OS de PMP têm a
+data liberada antes do UPDATE, então trocas e ciclos de datas entre OS da
+mesma PMP no lote não esbarram no índice único.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import select, update, values, column, bindparam, cast, func, Integer
+
+from models import db
+from assets_models import OrdemServico, Chamado
+from alteracoes_os import registrar_os_alteradas
+from estatisticas_agregadas import invalidar_estatisticas
+
+logger = logging.getLogger(__name__)
+
+# Itens aceitos por requisição
+LIMITE_ITENS_LOTE = 500
+
+# Linhas por UPDATE ... FROM (VALUES ...)
+TAMANHO_LOTE_UPDATE = 1000
+
+PRIORIDADES_VALIDAS = ('baixa', 'media', 'alta', 'seguranca', 'preventiva')
+
+# Colunas do VALUES, com o tipo da coluna de ordens_servico
+COLUNAS_PROGRAMACAO = ('data_programada', 'usuario_responsavel', 'prioridade')
+
+
+def _em_lotes(itens, tamanho):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def validar_itens(itens):
+    """
+    Valida o formato de cada item, sem acessar o banco
+
+    Args:
+        itens (list): Itens da requisição
+
+    Returns:
+        tuple: (itens normalizados com 'indice', {indice: erro} dos inválidos)
+    """
+    validos = []
+    erros = {}
+    vistos = set()
+
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            erros[indice] = 'Item deve ser um objeto'
+            continue
+
+        os_id = item.get('os_id')
+        if isinstance(os_id, bool) or not isinstance(os_id, int):
+            erros[indice] = 'os_id inválido'
+            continue
+        if os_id in vistos:
+            erros[indice] = 'OS repetida no lote'
+            continue
+        vistos.add(os_id)
+
+        if not item.get('data_programada') or not item.get('usuario_responsavel'):
+            erros[indice] = 'Data programada e usuário responsável são obrigatórios'
+            continue
+
+        try:
+            data_programada = datetime.strptime(str(item['data_programada']), '%Y-%m-%d').date()
+        except ValueError:
+            erros[indice] = 'Formato de data inválido. Use YYYY-MM-DD'
+            continue
+
+        prioridade = item.get('prioridade') or None
+        if prioridade is not None and prioridade not in PRIORIDADES_VALIDAS:
+            erros[indice] = f'Prioridade inválida. Use: {", ".join(PRIORIDADES_VALIDAS)}'
+            continue
+
+        validos.append({
+            'indice': indice,
+            'id': os_id,
+            'data_programada': data_programada,
+            'usuario_responsavel': str(item['usuario_responsavel']),
+            'prioridade': prioridade
+        })
+
+    return validos, erros
+
+
+def _resolver_conflitos(aceitos, linhas):
+    """
+    Rejeita os itens que deixariam duas OS da mesma PMP na mesma data
+
+    O estado final considera as OS de fora do lote, as OS do lote já
+    rejeitadas (que ficam na data atual) e as aceitas (na data nova), na
+    ordem da requisição: a primeira fica com a data. Repete até estabilizar,
+    porque rejeitar um item mantém a OS na data antiga, que outro item do
+    lote podia estar ocupando. Trocas e ciclos entre OS aceitas são válidos
+    (ver _liberar_datas_pmp).
+
+    Args:
+        aceitos (list): Itens válidos e da empresa, na ordem da requisição
+        linhas (dict): {os_id: linha} das OS do lote
+
+    Returns:
+        tuple: (itens aceitos, itens em conflito)
+    """
+    com_pmp = [item for item in aceitos if linhas[item['id']].pmp_id is not None]
+    if not com_pmp:
+        return aceitos, []
+
+    pmp_ids = {linhas[item['id']].pmp_id for item in com_pmp}
+    datas = {item['data_programada'] for item in com_pmp}
+    ocupadas = db.session.execute(
+        select(OrdemServico.id, OrdemServico.pmp_id, OrdemServico.data_programada)
+        .where(OrdemServico.pmp_id.in_(pmp_ids), OrdemServico.data_programada.in_(datas))
+    ).all()
+
+    ids_aceitos = {item['id'] for item in aceitos}
+    conflitos = []
+    while True:
+        ocupado = {(linha.pmp_id, linha.data_programada) for linha in ocupadas if linha.id not in ids_aceitos}
+        rejeitados = []
+        for item in com_pmp:
+            if item['id'] not in ids_aceitos:
+                continue
+            chave = (linhas[item['id']].pmp_id, item['data_programada'])
+            if chave in ocupado:
+                rejeitados.append(item)
+            else:
+                ocupado.add(chave)
+
+        if not rejeitados:
+            break
+        for item in rejeitados:
+            ids_aceitos.discard(item['id'])
+        conflitos.extend(rejeitados)
+
+    return [item for item in aceitos if item['id'] in ids_aceitos], conflitos
+
+
+def _liberar_datas_pmp(os_ids):
+    """
+    Zera a data programada das OS de PMP do lote antes de programá-las (sem commit)
+
+    O índice único (pmp_id, data_programada) é checado linha a linha durante
+    o UPDATE; com as datas antigas liberadas antes, uma troca ou um ciclo de
+    datas entre OS da mesma PMP não colide no meio do lote. O estado final já
+    foi validado por _resolver_conflitos.
+    """
+    tabela = OrdemServico.__table__
+    for lote in _em_lotes(os_ids, TAMANHO_LOTE_UPDATE):
+        db.session.execute(update(tabela).where(tabela.c.id.in_(lote)).values(data_programada=None))
+
+
+def _atualizar_os(itens, agora):
+    """
+    Programa as OS dos itens (sem commit)
+
+    No PostgreSQL é um único UPDATE ... FROM (VALUES ...) por lote; nos
+    demais bancos, um executemany. Prioridade ausente mantém a atual.
+    """
+    tabela = OrdemServico.__table__
+    fixos = {'status': 'programada', 'data_atualizacao': agora}
+
+    if db.session.get_bind().dialect.name != 'postgresql':
+        db.session.execute(
+            update(tabela).where(tabela.c.id == bindparam('b_id')).values(
+                data_programada=bindparam('b_data_programada'),
+                usuario_responsavel=bindparam('b_usuario_responsavel'),
+                prioridade=func.coalesce(bindparam('b_prioridade'), tabela.c.prioridade),
+                **fixos
+            ),
+            [dict({'b_id': item['id']}, **{f"b_{coluna}": item[coluna] for coluna in COLUNAS_PROGRAMACAO})
+             for item in itens]
+        )
+        return
+
+    for lote in _em_lotes(itens, TAMANHO_LOTE_UPDATE):
+        valores = values(
+            column('id', Integer), *[column(coluna, tabela.c[coluna].type) for coluna in COLUNAS_PROGRAMACAO],
+            name='v'
+        ).data([(item['id'], *[item[coluna] for coluna in COLUNAS_PROGRAMACAO]) for item in lote])
+
+        # CAST: uma coluna só com NULL no VALUES seria inferida como text
+        colunas = {coluna: cast(valores.c[coluna], tabela.c[coluna].type) for coluna in COLUNAS_PROGRAMACAO}
+        colunas['prioridade'] = func.coalesce(colunas['prioridade'], tabela.c.prioridade)
+        db.session.execute(
+            update(tabela).where(tabela.c.id == valores.c.id).values(**colunas, **fixos)
+        )
+
+
+def programar_os_em_lote(itens, empresa):
+    """
+    Programa várias OS da empresa numa única transação
+
+    Um IntegrityError no UPDATE ou no commit (outra requisição ocupou a mesma PMP + data
+    entre a leitura e o UPDATE) desfaz o lote inteiro e é propagado. Trocas e
+    ciclos de datas entre OS da mesma PMP dentro do lote são aplicados.
+
+    Args:
+        itens (list): Itens {os_id, data_programada, usuario_responsavel, prioridade}
+        empresa (str): Empresa do usuário; OS de outras empresas são rejeitadas
+
+    Returns:
+        dict: resultados (um por item, na ordem da requisição), programadas e rejeitadas
+    """
+    validos, erros = validar_itens(itens)
+
+    linhas = {}
+    if validos:
+        linhas = {
+            linha.id: linha for linha in db.session.execute(
+                select(OrdemServico.id, OrdemServico.pmp_id, OrdemServico.chamado_id, OrdemServico.prioridade)
+                .where(OrdemServico.id.in_([item['id'] for item in validos]),
+                       OrdemServico.empresa == empresa)
+            )
+        }
+
+    aceitos = []
+    for item in validos:
+        if item['id'] in linhas:
+            aceitos.append(item)
+        else:
+            # OS de outra empresa é tratada como inexistente
+            erros[item['indice']] = 'OS não encontrada'
+
+    aceitos, conflitos = _resolver_conflitos(aceitos, linhas)
+    for item in conflitos:
+        erros[item['indice']] = 'Já existe uma OS desta PMP programada para esta data'
+
+    if aceitos:
+        _liberar_datas_pmp([item['id'] for item in aceitos if linhas[item['id']].pmp_id is not None])
+        _atualizar_os(aceitos, datetime.utcnow())
+
+        chamado_ids = sorted({linhas[item['id']].chamado_id for item in aceitos
+                              if linhas[item['id']].chamado_id})
+        for lote in _em_lotes(chamado_ids, TAMANHO_LOTE_UPDATE):
+            db.session.execute(
+                update(Chamado.__table__)
+                .where(Chamado.__table__.c.id.in_(lote), Chamado.__table__.c.empresa == empresa)
+                .values(status='os_programada')
+            )
+
+        registrar_os_alteradas(db.session, [item['id'] for item in aceitos])
+        db.session.commit()
+        invalidar_estatisticas(empresa)
+        logger.info(f"📅 {len(aceitos)} OS programadas em lote ({empresa}), "
+                    f"{len(chamado_ids)} chamados atualizados, {len(erros)} itens rejeitados")
+
+    programados = {item['indice']: item for item in aceitos}
+    resultados = []
+    for indice, item in enumerate(itens):
+        os_id = item.get('os_id') if isinstance(item, dict) else None
+        if indice in programados:
+            programado = programados[indice]
+            resultados.append({
+                'os_id': os_id,
+                'success': True,
+                'os': {
+                    'id': programado['id'],
+                    'usuario_responsavel': programado['usuario_responsavel'],
+                    'data_programada': programado['data_programada'].isoformat(),
+                    'prioridade': programado['prioridade'] or linhas[programado['id']].prioridade,
+                    'status': 'programada'
+                }
+            })
+        else:
+            resultados.append({'os_id': os_id, 'success': False, 'error': erros[indice]})
+
+    return {'resultados': resultados, 'programadas': len(aceitos), 'rejeitadas': len(erros)}
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Reconciliação de OS pendentes de PMP no servidor
+O scheduler calcula as pendências de todas as empresas em lote, gera as OS
+faltantes (job geracao_os, sob o mesmo advisory lock da geração agendada) e
+registra o resultado como uma época de geração. A época só muda quando o
+estado muda (OS novas de PMP ou pendências diferentes); rodar a
+reconciliação de novo sem mudanças só confirma a época atual.
+
+O resumo por empresa fica materializado em resumo_pendencias_os. Os
+navegadores leem esse resumo (GET barato) e acompanham a época pelo stream
+de alterações de OS (evento "epoca"), em vez de disparar a geração a cada
+aba aberta.
+"""
+
+import json
+import hashlib
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, insert, inspect
+
+from models import db
+from models.pmp_limpo import PMP
+from models.epoca_geracao_os import EpocaGeracaoOS, ResumoPendenciasOS
+from assets_models import OrdemServico, Equipamento
+from cache_ttl import CacheTTL
+from alteracoes_os import INTERVALO_EPOCA_SEGUNDOS
+
+logger = logging.getLogger('pmp_scheduler')
+
+# Época atual compartilhada pelas conexões SSE do processo: uma consulta por intervalo
+_cache_epoca = CacheTTL(ttl=INTERVALO_EPOCA_SEGUNDOS, maxsize=1)
+_tabelas_verificadas = False
+_ocorrencia_migrada = False
+
+# Índice criado por migrar_ocorrencia_os_pmp.py; sem ele a chave da geração não é confiável
+INDICE_OCORRENCIA = 'uq_os_pmp_ocorrencia'
+
+
+def garantir_tabelas():
+    """Cria as tabelas de épocas e do resumo de pendências se ainda não existirem"""
+    global _tabelas_verificadas
+    if not _tabelas_verificadas:
+        EpocaGeracaoOS.__table__.create(db.engine, checkfirst=True)
+        ResumoPendenciasOS.__table__.create(db.engine, checkfirst=True)
+        _tabelas_verificadas = True
+
+
+def ocorrencia_migrada():
+    """Indica se a migração de data_ocorrencia já criou o índice único da geração"""
+    global _ocorrencia_migrada
+    if not _ocorrencia_migrada:
+        indices = {indice['name'] for indice in inspect(db.engine).get_indexes('ordens_servico')}
+        _ocorrencia_migrada = INDICE_OCORRENCIA in indices
+    return _ocorrencia_migrada
+
+
+def calcular_pendencias():
+    """
+    OS pendentes de geração por empresa, em poucas consultas
+
+    Mesmas regras da geração: PMP válida, datas do cronograma até o limite
+    de antecipação e sem OS na chave (pmp_id, data_ocorrencia), que não muda
+    quando a OS é reprogramada ou desprogramada.
+
+    Returns:
+        dict: {empresa: {'pmps_com_pendencias', 'os_pendentes', 'proxima_data_pendente'}}
+    """
+    from sistema_geracao_os_pmp_aprimorado import GeradorOSPMPAprimorado
+
+    gerador = GeradorOSPMPAprimorado()
+    pmps = PMP.query.filter(
+        PMP.status == 'ativo',
+        PMP.data_inicio_plano.isnot(None)
+    ).all()
+    if not pmps:
+        return {}
+
+    chaves_existentes = set(
+        db.session.query(OrdemServico.pmp_id, OrdemServico.data_ocorrencia)
+        .filter(
+            OrdemServico.pmp_id.in_([pmp.id for pmp in pmps]),
+            OrdemServico.data_ocorrencia.isnot(None)
+        )
+    )
+    empresas = dict(
+        db.session.query(Equipamento.id, Equipamento.empresa)
+        .filter(Equipamento.id.in_({pmp.equipamento_id for pmp in pmps}))
+    )
+
+    pendencias = {}
+    for pmp in pmps:
+        valida, _ = gerador.validar_pmp(pmp)
+        if not valida:
+            continue
+
+        limite = gerador.limite_geracao(pmp)
+        faltantes = [
+            data for data in gerador.gerar_cronograma_os(pmp)
+            if data <= limite and (pmp.id, data) not in chaves_existentes
+        ]
+        if not faltantes:
+            continue
+
+        # Mesma empresa padrão da geração
+        empresa = empresas.get(pmp.equipamento_id) or 'Ativus'
+        resumo = pendencias.setdefault(empresa, {
+            'pmps_com_pendencias': 0,
+            'os_pendentes': 0,
+            'proxima_data_pendente': None
+        })
+        resumo['pmps_com_pendencias'] += 1
+        resumo['os_pendentes'] += len(faltantes)
+        if resumo['proxima_data_pendente'] is None or faltantes[0] < resumo['proxima_data_pendente']:
+            resumo['proxima_data_pendente'] = faltantes[0]
+
+    return pendencias
+
+
+def _gerar_pendentes():
+    """Executa a geração no job geracao_os; retorna as estatísticas ou None se não rodou"""
+    from execucao_jobs import executar_job
+    from sistema_geracao_os_pmp_aprimorado import gerar_todas_os_pmp
+
+    estatisticas = {}
+
+    def gerar():
+        resultado = gerar_todas_os_pmp()
+        if not resultado['success']:
+            raise RuntimeError(resultado.get('error', 'Erro na geração de OS'))
+        estatisticas.update(resultado['estatisticas'])
+        return resultado['estatisticas']
+
+    status = executar_job('geracao_os', gerar)
+    if status != 'sucesso':
+        logger.info(f"⏭️ Geração de OS da reconciliação não executada ({status})")
+        return None
+    return estatisticas
+
+
+def _assinatura(pendencias, ultima_os_pmp_id, total_os_pmp):
+    conteudo = json.dumps({
+        'pendencias': pendencias,
+        'ultima_os_pmp_id': ultima_os_pmp_id,
+        'total_os_pmp': total_os_pmp
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+
+def reconciliar(origem='scheduler'):
+    """
+    Reconcilia as OS pendentes de PMP e registra a época de geração
+
+    Idempotente: sem pendências novas nem OS novas, a época atual só é
+    confirmada (verificada_em) e o resumo não é regravado. Deve rodar sob o
+    advisory lock do job reconciliacao_os (um processo por vez). Não roda
+    antes da migração de data_ocorrencia (migrar_ocorrencia_os_pmp.py).
+
+    Args:
+        origem (str): Quem disparou (scheduler, manual)
+
+    Returns:
+        dict: Época, se ela é nova e os totais (vai para o registro do job)
+    """
+    from execucao_jobs import HOST
+
+    if not ocorrencia_migrada():
+        logger.warning(f"⚠️ Reconciliação ignorada: índice {INDICE_OCORRENCIA} ausente "
+                       f"(rode migrar_ocorrencia_os_pmp.py)")
+        return {'epoca': None, 'nova_epoca': False, 'ignorada': 'migracao_data_ocorrencia_pendente'}
+
+    garantir_tabelas()
+    anterior = EpocaGeracaoOS.query.order_by(EpocaGeracaoOS.id.desc()).first()
+
+    pendencias = calcular_pendencias()
+    estatisticas = None
+    if pendencias:
+        total = sum(resumo['os_pendentes'] for resumo in pendencias.values())
+        logger.info(f"🔄 Reconciliação: {total} OS pendentes em {len(pendencias)} empresa(s)")
+        estatisticas = _gerar_pendentes()
+        if estatisticas and estatisticas.get('os_geradas'):
+            pendencias = calcular_pendencias()
+
+    ultima_os_pmp_id, total_os_pmp = db.session.query(
+        func.max(OrdemServico.id), func.count(OrdemServico.id)
+    ).filter(OrdemServico.pmp_id.isnot(None)).one()
+    assinatura = _assinatura(pendencias, ultima_os_pmp_id, total_os_pmp)
+    agora = datetime.utcnow()
+
+    if anterior and anterior.assinatura == assinatura:
+        anterior.verificada_em = agora
+        db.session.commit()
+        return {'epoca': anterior.id, 'nova_epoca': False}
+
+    # OS de PMP criadas desde a época anterior, por qualquer caminho (na primeira época, nenhuma)
+    novas_por_empresa = {}
+    if anterior and anterior.ultima_os_pmp_id is not None:
+        novas_por_empresa = dict(
+            db.session.query(OrdemServico.empresa, func.count(OrdemServico.id))
+            .filter(
+                OrdemServico.pmp_id.isnot(None),
+                OrdemServico.id > anterior.ultima_os_pmp_id
+            )
+            .group_by(OrdemServico.empresa)
+        )
+
+    resumo_anterior = {
+        resumo.empresa: (resumo.pmps_com_pendencias, resumo.os_pendentes)
+        for resumo in ResumoPendenciasOS.query.all()
+    }
+    resumo_novo = {
+        empresa: (resumo['pmps_com_pendencias'], resumo['os_pendentes'])
+        for empresa, resumo in pendencias.items()
+    }
+    empresas_alteradas = sorted(
+        {empresa for empresa in resumo_anterior.keys() | resumo_novo.keys()
+         if resumo_anterior.get(empresa, (0, 0)) != resumo_novo.get(empresa, (0, 0))}
+        | set(novas_por_empresa)
+    )
+
+    epoca = EpocaGeracaoOS(
+        assinatura=assinatura,
+        origem=origem,
+        host=HOST,
+        os_geradas=sum(novas_por_empresa.values()) if anterior else (estatisticas or {}).get('os_geradas', 0),
+        pmps_processadas=(estatisticas or {}).get('pmps_processadas', 0),
+        total_os_pendentes=sum(resumo['os_pendentes'] for resumo in pendencias.values()),
+        total_pmps_com_pendencias=sum(resumo['pmps_com_pendencias'] for resumo in pendencias.values()),
+        ultima_os_pmp_id=ultima_os_pmp_id,
+        empresas_alteradas=json.dumps(empresas_alteradas),
+        aberta_em=agora,
+        verificada_em=agora
+    )
+    db.session.add(epoca)
+    db.session.flush()
+
+    # Resumo regravado na mesma transação da época
+    ResumoPendenciasOS.query.delete(synchronize_session=False)
+    linhas = [
+        {
+            'empresa': empresa,
+            'epoca_id': epoca.id,
+            'pmps_com_pendencias': pendencias.get(empresa, {}).get('pmps_com_pendencias', 0),
+            'os_pendentes': pendencias.get(empresa, {}).get('os_pendentes', 0),
+            'os_geradas_epoca': novas_por_empresa.get(empresa, 0),
+            'proxima_data_pendente': pendencias.get(empresa, {}).get('proxima_data_pendente'),
+            'atualizado_em': agora
+        }
+        for empresa in pendencias.keys() | novas_por_empresa.keys()
+    ]
+    if linhas:
+        db.session.execute(insert(ResumoPendenciasOS), linhas)
+    db.session.commit()
+
+    logger.info(f"🆕 Época de geração {epoca.id}: {epoca.os_geradas} OS novas, "
+                f"{epoca.total_os_pendentes} pendentes, {len(empresas_alteradas)} empresa(s) alterada(s)")
+    return {
+        'epoca': epoca.id,
+        'nova_epoca': True,
+        'os_geradas': epoca.os_geradas,
+        'total_os_pendentes': epoca.total_os_pendentes,
+        'empresas_alteradas': empresas_alteradas
+    }
+
+
+def epoca_atual_id():
+    """Número da época atual (cache de alguns segundos por processo)"""
+    garantir_tabelas()
+    return _cache_epoca.obter_ou_calcular(
+        'epoca', lambda: db.session.query(func.max(EpocaGeracaoOS.id)).scalar()
+    )
+
+
+def estado_reconciliacao(empresa=None):
+    """
+    Última época e pendências, lidas do resumo materializado
+
+    Args:
+        empresa (str): Empresa do usuário; None soma todas (usuário master)
+
+    Returns:
+        dict: {'epoca': dict ou None, 'pendencias': dict}
+    """
+    garantir_tabelas()
+    epoca = EpocaGeracaoOS.query.order_by(EpocaGeracaoOS.id.desc()).first()
+
+    if empresa is not None:
+        resumo = db.session.get(ResumoPendenciasOS, empresa)
+        pendencias = resumo.to_dict() if resumo else {
+            'empresa': empresa,
+            'epoca': epoca.id if epoca else None,
+            'pmps_com_pendencias': 0,
+            'os_pendentes': 0,
+            'os_geradas_epoca': 0,
+            'proxima_data_pendente': None,
+            'atualizado_em': None
+        }
+    else:
+        pmps, os_pendentes, os_geradas, proxima = db.session.query(
+            func.coalesce(func.sum(ResumoPendenciasOS.pmps_com_pendencias), 0),
+            func.coalesce(func.sum(ResumoPendenciasOS.os_pendentes), 0),
+            func.coalesce(func.sum(ResumoPendenciasOS.os_geradas_epoca), 0),
+            func.min(ResumoPendenciasOS.proxima_data_pendente)
+        ).one()
+        pendencias = {
+            'empresa': None,
+            'epoca': epoca.id if epoca else None,
+            'pmps_com_pendencias': int(pmps),
+            'os_pendentes': int(os_pendentes),
+            'os_geradas_epoca': int(os_geradas),
+            'proxima_data_pendente': proxima.isoformat() if proxima else None,
+            'atualizado_em': None
+        }
+
+    dados_epoca = None
+    if epoca:
+        dados_epoca = epoca.to_dict()
+        # Outras empresas não aparecem para quem não é master
+        alteradas = dados_epoca.pop('empresas_alteradas')
+        dados_epoca['alterada'] = empresa is None or empresa in alteradas
+        if empresa is None:
+            dados_epoca['empresas_alteradas'] = alteradas
+
+    return {'epoca': dados_epoca, 'pendencias': pendencias}
+
+
+def verificar_nova_epoca(empresa=None, ultima_epoca=None):
+    """
+    Estado da reconciliação se houver época diferente de ultima_epoca
+
+    Chamada periodicamente pelo stream de alterações de OS (evento "epoca").
+    A época vem do cache do processo; a sessão do banco é liberada em seguida
+    para não prender conexões do pool durante o stream.
+
+    Args:
+        empresa (str): Empresa do usuário (None = todas)
+        ultima_epoca (int): Última época já enviada à conexão
+
+    Returns:
+        tuple: (época, estado) ou None se a época não mudou
+    """
+    try:
+        atual = epoca_atual_id()
+        if atual is None or atual == ultima_epoca:
+            return None
+        return atual, estado_reconciliacao(empresa)
+    finally:
+        db.session.remove()
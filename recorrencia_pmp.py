@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Cálculo de recorrência das PMPs em forma fechada
+Responde "n-ésima ocorrência", "ocorrências em [a, b]" e "próxima ocorrência
+após d" sem percorrer as datas uma a uma. Usado por todos os geradores de OS
+e pelos relatórios, para que cronogramas e relatórios sempre concordem.
+"""
+
+import re
+import json
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from dateutil.relativedelta import relativedelta
+
+# Passo de cada frequência canônica: ('dias', n) ou ('meses', n)
+PASSOS_FREQUENCIA = {
+    'diaria': ('dias', 1),
+    'semanal': ('dias', 7),
+    'quinzenal': ('dias', 14),
+    'mensal': ('meses', 1),
+    'bimestral': ('meses', 2),
+    'trimestral': ('meses', 3),
+    'semestral': ('meses', 6),
+    'anual': ('meses', 12)
+}
+
+# Intervalos livres ("a cada 10 dias", "a cada 4 meses"): o passo fica em
+# PMP.frequencia_intervalo
+FREQUENCIA_DIAS = 'dias'
+FREQUENCIA_MESES = 'meses'
+
+FREQUENCIAS_CANONICAS = tuple(PASSOS_FREQUENCIA) + (FREQUENCIA_DIAS, FREQUENCIA_MESES)
+
+# Semanas entre execuções, para a estimativa do relatório de 52 semanas
+# quando a PMP ainda não tem data de início
+SEMANAS_POR_FREQUENCIA = {
+    'diaria': 1,
+    'semanal': 1,
+    'quinzenal': 2,
+    'mensal': 4,
+    'bimestral': 8,
+    'trimestral': 12,
+    'semestral': 26,
+    'anual': 52
+}
+
+# Mapeamento de variações de texto para a frequência canônica
+MAPEAMENTO_FREQUENCIAS = {
+    'diaria': 'diaria',
+    'diária': 'diaria',
+    'diário': 'diaria',
+    'diario': 'diaria',
+    'daily': 'diaria',
+
+    'semanal': 'semanal',
+    'semana': 'semanal',
+    'weekly': 'semanal',
+
+    'quinzenal': 'quinzenal',
+    'quinzena': 'quinzenal',
+    'biweekly': 'quinzenal',
+
+    'mensal': 'mensal',
+    'mês': 'mensal',
+    'mes': 'mensal',
+    'monthly': 'mensal',
+
+    'bimestral': 'bimestral',
+    'bimestre': 'bimestral',
+    'bimonthly': 'bimestral',
+
+    'trimestral': 'trimestral',
+    'trimestre': 'trimestral',
+    'quarterly': 'trimestral',
+
+    'semestral': 'semestral',
+    'semestre': 'semestral',
+    'semiannual': 'semestral',
+
+    'anual': 'anual',
+    'ano': 'anual',
+    'yearly': 'anual',
+    'annual': 'anual'
+}
+
+# Dias da semana como gravados em PMP.dias_semana (segunda = 0, como date.weekday())
+DIAS_SEMANA = {
+    'segunda': 0,
+    'terca': 1,
+    'terça': 1,
+    'quarta': 2,
+    'quinta': 3,
+    'sexta': 4,
+    'sabado': 5,
+    'sábado': 5,
+    'domingo': 6
+}
+
+FREQUENCIA_PADRAO = 'semanal'
+
+
+# Palavras do mapeamento numa única expressão; as mais longas primeiro, para
+# que "bimestral" não seja lido como "mes"
+_REGEX_PALAVRAS = re.compile('|'.join(
+    re.escape(palavra) for palavra in sorted(MAPEAMENTO_FREQUENCIAS, key=len, reverse=True)
+))
+
+_REGEX_INTERVALO = re.compile(r'(\d+)\s*(dias?|semanas?|m[eê]s(?:es)?|anos?)\b')
+
+# Intervalos equivalentes a uma frequência canônica
+_INTERVALOS_CANONICOS = {
+    (FREQUENCIA_DIAS, 1): 'diaria',
+    (FREQUENCIA_DIAS, 7): 'semanal',
+    (FREQUENCIA_DIAS, 14): 'quinzenal',
+    (FREQUENCIA_DIAS, 15): 'quinzenal',
+    (FREQUENCIA_MESES, 1): 'mensal',
+    (FREQUENCIA_MESES, 2): 'bimestral',
+    (FREQUENCIA_MESES, 3): 'trimestral',
+    (FREQUENCIA_MESES, 6): 'semestral',
+    (FREQUENCIA_MESES, 12): 'anual'
+}
+
+
+@lru_cache(maxsize=1024)
+def interpretar_frequencia(frequencia):
+    """
+    Interpreta o texto livre de frequência
+
+    Chamada quando a PMP é gravada (o resultado fica em
+    PMP.frequencia_canonica / PMP.frequencia_intervalo) e, em cache, para
+    PMPs ainda não migradas.
+
+    Args:
+        frequencia (str): Frequência original (texto livre)
+
+    Returns:
+        tuple: (frequência canônica, intervalo); intervalo só para 'dias'/'meses'.
+               (None, None) se o texto não for reconhecido
+    """
+    if not frequencia:
+        return None, None
+
+    freq_lower = frequencia.lower().strip()
+
+    if freq_lower in MAPEAMENTO_FREQUENCIAS:
+        return MAPEAMENTO_FREQUENCIAS[freq_lower], None
+
+    intervalo = _REGEX_INTERVALO.search(freq_lower)
+    if intervalo and int(intervalo.group(1)) == 0:
+        intervalo = None
+
+    # Uma palavra fora do trecho do intervalo prevalece ("Trimestral (90 dias)")
+    for palavra in _REGEX_PALAVRAS.finditer(freq_lower):
+        if not intervalo or palavra.end() <= intervalo.start() or palavra.start() >= intervalo.end():
+            return MAPEAMENTO_FREQUENCIAS[palavra.group(0)], None
+
+    if intervalo:
+        quantidade, unidade = int(intervalo.group(1)), intervalo.group(2)
+        if unidade.startswith('dia'):
+            chave = (FREQUENCIA_DIAS, quantidade)
+        elif unidade.startswith('semana'):
+            chave = (FREQUENCIA_DIAS, quantidade * 7)
+        elif unidade.startswith('ano'):
+            chave = (FREQUENCIA_MESES, quantidade * 12)
+        else:
+            chave = (FREQUENCIA_MESES, quantidade)
+        return (_INTERVALOS_CANONICOS[chave], None) if chave in _INTERVALOS_CANONICOS else chave
+
+    return None, None
+
+
+def normalizar_frequencia(frequencia):
+    """
+    Normaliza a frequência para um dos valores de FREQUENCIAS_CANONICAS
+
+    Args:
+        frequencia (str): Frequência original (texto livre)
+
+    Returns:
+        str: Frequência canônica ('semanal' se não reconhecida)
+    """
+    return interpretar_frequencia(frequencia)[0] or FREQUENCIA_PADRAO
+
+
+def frequencia_da_pmp(pmp):
+    """
+    Frequência canônica e intervalo da PMP
+
+    Usa as colunas gravadas (frequencia_canonica, frequencia_intervalo);
+    só interpreta o texto de PMPs que ainda não foram migradas.
+
+    Returns:
+        tuple: (frequência canônica ou None, intervalo ou None)
+    """
+    canonica = getattr(pmp, 'frequencia_canonica', None)
+    if canonica:
+        return canonica, getattr(pmp, 'frequencia_intervalo', None)
+    return interpretar_frequencia(getattr(pmp, 'frequencia', None))
+
+
+def passo_frequencia(frequencia, intervalo=None):
+    """
+    Passo da recorrência: ('dias', n) ou ('meses', n)
+
+    Args:
+        frequencia (str): Frequência canônica
+        intervalo (int): Passo das frequências 'dias'/'meses'
+    """
+    if frequencia in PASSOS_FREQUENCIA:
+        return PASSOS_FREQUENCIA[frequencia]
+    if frequencia in (FREQUENCIA_DIAS, FREQUENCIA_MESES) and intervalo:
+        return frequencia, int(intervalo)
+    return PASSOS_FREQUENCIA[FREQUENCIA_PADRAO]
+
+
+def semanas_estimadas(frequencia, intervalo=None, total_semanas=52):
+    """
+    Semanas (1..total_semanas) de execução estimadas só pela frequência
+
+    Returns:
+        list: Números das semanas; vazia se a frequência é desconhecida
+    """
+    if frequencia in SEMANAS_POR_FREQUENCIA:
+        passo = SEMANAS_POR_FREQUENCIA[frequencia]
+    elif frequencia == FREQUENCIA_DIAS and intervalo:
+        passo = max(1, round(int(intervalo) / 7))
+    elif frequencia == FREQUENCIA_MESES and intervalo:
+        passo = max(1, round(int(intervalo) * 52 / 12))
+    else:
+        return []
+    return list(range(1, total_semanas + 1, passo))
+
+
+def converter_data(valor):
+    """Converte str (YYYY-MM-DD), datetime ou date para date"""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(str(valor)[:10], '%Y-%m-%d').date()
+
+
+def converter_dias_semana(dias_semana):
+    """
+    Converte o campo dias_semana (JSON ou lista) em tupla ordenada de weekdays
+
+    Returns:
+        tuple: weekdays (0 = segunda) ou tupla vazia se não definido
+    """
+    if not dias_semana:
+        return ()
+
+    if isinstance(dias_semana, str):
+        try:
+            dias_semana = json.loads(dias_semana)
+        except ValueError:
+            dias_semana = [d.strip() for d in dias_semana.split(',')]
+
+    weekdays = set()
+    for dia in dias_semana or []:
+        if isinstance(dia, int) and 0 <= dia <= 6:
+            weekdays.add(dia)
+        elif isinstance(dia, str) and dia.lower().strip() in DIAS_SEMANA:
+            weekdays.add(DIAS_SEMANA[dia.lower().strip()])
+
+    return tuple(sorted(weekdays))
+
+
+class Recorrencia:
+    """
+    Recorrência imutável de uma PMP, ancorada em data_inicio
+
+    Frequências em dias são um padrão periódico: em cada período de
+    `periodo` dias a partir de data_inicio existem as ocorrências dadas por
+    `deslocamentos` (um só deslocamento 0 quando não há dias_semana).
+    Frequências em meses são sempre calculadas a partir de data_inicio
+    (data_inicio + n * passo meses), o que evita o arrasto de dias do fim do
+    mês; com dias_semana a data é adiada para o próximo dia permitido.
+    """
+
+    def __init__(self, data_inicio, frequencia, dias_semana=(), intervalo=None):
+        self.data_inicio = data_inicio
+        if frequencia not in FREQUENCIAS_CANONICAS:
+            frequencia, intervalo = interpretar_frequencia(frequencia)
+        self.frequencia = frequencia or FREQUENCIA_PADRAO
+        self.dias_semana = dias_semana
+        self.unidade, self.passo = passo_frequencia(self.frequencia, intervalo)
+
+        if self.unidade == 'dias':
+            self.periodo = self.passo
+            if dias_semana:
+                # Dias permitidos dentro da primeira semana de cada período
+                self.deslocamentos = [
+                    d for d in range(7)
+                    if (data_inicio.weekday() + d) % 7 in dias_semana
+                ]
+                if self.periodo == 1:
+                    self.periodo = 7
+            else:
+                self.deslocamentos = [0]
+
+    def _ajustar_dia_semana(self, data):
+        """Adia a data para o próximo dia da semana permitido"""
+        if not self.dias_semana:
+            return data
+        return data + timedelta(days=min((d - data.weekday()) % 7 for d in self.dias_semana))
+
+    def enesima(self, n):
+        """
+        Retorna a n-ésima ocorrência (n = 0 é a primeira)
+
+        Args:
+            n (int): Índice da ocorrência
+
+        Returns:
+            date: Data da ocorrência
+        """
+        if self.unidade == 'dias':
+            q, r = divmod(n, len(self.deslocamentos))
+            return self.data_inicio + timedelta(days=q * self.periodo + self.deslocamentos[r])
+
+        return self._ajustar_dia_semana(self.data_inicio + relativedelta(months=n * self.passo))
+
+    def contar_ate(self, data):
+        """
+        Conta as ocorrências com data <= data
+
+        Args:
+            data (date): Data limite (inclusiva)
+
+        Returns:
+            int: Quantidade de ocorrências até a data
+        """
+        if data < self.data_inicio:
+            return 0
+
+        if self.unidade == 'dias':
+            q, r = divmod((data - self.data_inicio).days, self.periodo)
+            return q * len(self.deslocamentos) + bisect_right(self.deslocamentos, r)
+
+        # Estimativa pela diferença de meses, corrigida em no máximo alguns passos
+        meses = (data.year - self.data_inicio.year) * 12 + data.month - self.data_inicio.month
+        n = max(0, meses // self.passo)
+        while n > 0 and self.enesima(n) > data:
+            n -= 1
+        while self.enesima(n + 1) <= data:
+            n += 1
+        return n + 1 if self.enesima(n) <= data else 0
+
+    def contar_entre(self, inicio, fim):
+        """Conta as ocorrências no intervalo [inicio, fim]"""
+        if fim < inicio:
+            return 0
+        return self.contar_ate(fim) - self.contar_ate(inicio - timedelta(days=1))
+
+    def ocorrencias_entre(self, inicio, fim):
+        """
+        Retorna as ocorrências no intervalo [inicio, fim]
+
+        Args:
+            inicio (date): Início do intervalo (inclusivo)
+            fim (date): Fim do intervalo (inclusivo)
+
+        Returns:
+            list: Datas das ocorrências, em ordem
+        """
+        if fim < inicio:
+            return []
+        primeiro = self.contar_ate(inicio - timedelta(days=1))
+        ultimo = self.contar_ate(fim)
+        return [self.enesima(n) for n in range(primeiro, ultimo)]
+
+    def proxima_apos(self, data):
+        """Retorna a primeira ocorrência estritamente posterior à data"""
+        return self.enesima(self.contar_ate(data))
+
+    def indice_de(self, data):
+        """Retorna o índice (0-based) da ocorrência na data, ou None se não houver"""
+        n = self.contar_ate(data) - 1
+        if n >= 0 and self.enesima(n) == data:
+            return n
+        return None
+
+
+@lru_cache(maxsize=4096)
+def obter_recorrencia(data_inicio, frequencia, dias_semana=None, intervalo=None):
+    """
+    Retorna a Recorrencia (em cache LRU) para (data_inicio, frequencia, dias_semana, intervalo)
+
+    Args:
+        data_inicio (date): Data de início do plano
+        frequencia (str): Frequência canônica (ou texto livre, que será interpretado)
+        dias_semana (str): Campo dias_semana da PMP (JSON) ou None
+        intervalo (int): Passo das frequências 'dias'/'meses'
+
+    Returns:
+        Recorrencia: Objeto imutável compartilhado entre requisições
+    """
+    return Recorrencia(data_inicio, frequencia, converter_dias_semana(dias_semana), intervalo)
+
+
+def recorrencia_da_pmp(pmp):
+    """Retorna a Recorrencia da PMP, ou None se ela não tiver data de início"""
+    data_inicio = converter_data(getattr(pmp, 'data_inicio_plano', None))
+    if not data_inicio:
+        return None
+    frequencia, intervalo = frequencia_da_pmp(pmp)
+    return obter_recorrencia(data_inicio, frequencia or FREQUENCIA_PADRAO,
+                             getattr(pmp, 'dias_semana', None) or None, intervalo)
+
+
+def datas_execucao(pmp, inicio, fim):
+    """
+    Datas de execução da PMP em [inicio, fim], respeitando data_inicio_plano e data_fim_plano
+
+    Returns:
+        list: Datas das ocorrências
+    """
+    recorrencia = recorrencia_da_pmp(pmp)
+    if not recorrencia:
+        return []
+    data_fim = converter_data(getattr(pmp, 'data_fim_plano', None))
+    if data_fim:
+        fim = min(fim, data_fim)
+    return recorrencia.ocorrencias_entre(inicio, fim)
+
+
+def datas_geracao(pmp, inicio, fim):
+    """
+    Pares (data_geracao, data_execucao) cuja data de geração cai em [inicio, fim]
+
+    A data de geração é a data de execução antecipada em pmp.dias_antecipacao dias.
+
+    Returns:
+        list: Tuplas (data_geracao, data_execucao)
+    """
+    antecipacao = timedelta(days=getattr(pmp, 'dias_antecipacao', None) or 0)
+    return [
+        (data - antecipacao, data)
+        for data in datas_execucao(pmp, inicio + antecipacao, fim + antecipacao)
+    ]
+
+
+def proxima_execucao(pmp, data):
+    """Próxima data de execução da PMP após a data, ou None se não houver (plano encerrado)"""
+    recorrencia = recorrencia_da_pmp(pmp)
+    if not recorrencia:
+        return None
+    proxima = recorrencia.proxima_apos(data)
+    data_fim = converter_data(getattr(pmp, 'data_fim_plano', None))
+    if data_fim and proxima > data_fim:
+        return None
+    return proxima
+
+
+def semanas_com_ocorrencia(pmp, semanas):
+    """
+    Números das semanas (do relatório de 52 semanas) que têm ao menos uma execução
+
+    Args:
+        pmp: PMP (ou objeto com data_inicio_plano, data_fim_plano, frequencia, dias_semana)
+        semanas (list): Dicts com 'numero', 'inicio' e 'fim'
+
+    Returns:
+        set: Números das semanas planejadas
+    """
+    if not semanas:
+        return set()
+
+    recorrencia = recorrencia_da_pmp(pmp)
+    if not recorrencia:
+        return set()
+
+    fim = semanas[-1]['fim']
+    data_fim = converter_data(getattr(pmp, 'data_fim_plano', None))
+    if data_fim:
+        fim = min(fim, data_fim)
+
+    planejadas = set()
+    inicios = [semana['inicio'] for semana in semanas]
+    for data in recorrencia.ocorrencias_entre(semanas[0]['inicio'], fim):
+        indice = bisect_right(inicios, data) - 1
+        if indice >= 0 and data <= semanas[indice]['fim']:
+            planejadas.add(semanas[indice]['numero'])
+    return planejadas
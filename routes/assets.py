@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from models import db
 from models.user import User
@@ -8,6 +8,7 @@ import traceback
 # Importação segura dos modelos de ativos
 try:
     from assets_models import Filial, Setor, Equipamento, Categoria
+    from arvore_ativos import etag_arvore, montar_arvore, listar_filiais, listar_setores, listar_equipamentos
     ASSETS_AVAILABLE = True
 except ImportError as e:
     print(f"Erro ao importar modelos de ativos: {e}")
@@ -332,36 +333,114 @@ def create_categoria():
 # ==================== ÁRVORE DE ATIVOS ====================
 
 @assets_bp.route('/api/arvore-ativos', methods=['GET'])
+@login_required
 def get_arvore_ativos():
-    """Obter árvore hierárquica de ativos"""
-    user = current_user #get_current_user()
-    if not user:
-        return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-    
+    """
+    Obter árvore hierárquica de ativos
+
+    Sem parâmetros retorna a árvore completa. Para expandir um nível por vez:
+        ?nivel=filiais  -> filiais com total_setores
+        ?filial_id=<id> -> setores da filial com total_equipamentos
+        ?setor_id=<id>  -> equipamentos do setor
+    A resposta tem ETag (versão dos ativos da empresa); com If-None-Match
+    igual e sem alterações desde então, retorna 304 sem corpo.
+    """
+    if not ASSETS_AVAILABLE:
+        return jsonify({'success': False, 'message': 'Funcionalidade de ativos não disponível'}), 503
+
+    user = current_user
+    empresa = None if user.profile == 'master' else user.company
+
     try:
-        # Filtrar por empresa do usuário
-        if user.profile == 'master':
-            filiais = Filial.query.all()
+        etag = etag_arvore(empresa, request.query_string.decode('utf-8'))
+        if request.if_none_match.contains_weak(etag):
+            resposta = current_app.response_class(status=304)
         else:
-            filiais = Filial.query.filter_by(empresa=user.company).all()
-        
-        arvore = []
-        for filial in filiais:
-            filial_data = filial.to_dict()
-            filial_data['setores'] = []
-            
-            for setor in filial.setores:
-                setor_data = setor.to_dict()
-                setor_data['equipamentos'] = [eq.to_dict() for eq in setor.equipamentos]
-                filial_data['setores'].append(setor_data)
-            
-            arvore.append(filial_data)
-        
-        return jsonify({
-            'success': True,
-            'arvore': arvore
-        })
+            filial_id = request.args.get('filial_id', type=int)
+            setor_id = request.args.get('setor_id', type=int)
+
+            if setor_id is not None:
+                equipamentos = listar_equipamentos(setor_id, empresa)
+                if equipamentos is None:
+                    return jsonify({'success': False, 'message': 'Setor não encontrado'}), 404
+                resposta = jsonify({'success': True, 'setor_id': setor_id, 'equipamentos': equipamentos})
+            elif filial_id is not None:
+                setores = listar_setores(filial_id, empresa)
+                if setores is None:
+                    return jsonify({'success': False, 'message': 'Filial não encontrada'}), 404
+                resposta = jsonify({'success': True, 'filial_id': filial_id, 'setores': setores})
+            elif request.args.get('nivel') == 'filiais':
+                resposta = jsonify({'success': True, 'filiais': listar_filiais(empresa)})
+            else:
+                resposta = jsonify({'success': True, 'arvore': montar_arvore(empresa)})
+
+        resposta.set_etag(etag, weak=True)
+        # O navegador guarda a resposta, mas revalida (If-None-Match) a cada uso
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        return resposta
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao montar árvore de ativos: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ==================== IMPORTAÇÃO EM LOTE ====================
+
+def _parametro_booleano(nome):
+    valor = request.args.get(nome, request.form.get(nome, ''))
+    return str(valor).lower() in ('1', 'true', 'sim')
+
+@assets_bp.route('/api/ativos/importar', methods=['POST'])
+@login_required
+def importar_ativos_lote():
+    """
+    Importar filiais, setores e equipamentos em lote
+
+    Multipart com os arquivos (CSV ou JSON) nos campos filiais, setores e
+    equipamentos, ou corpo JSON {"filiais": [...], "setores": [...], "equipamentos": [...]}.
+    Setores referenciam a filial por filial_tag (ou filial_id) e equipamentos
+    o setor por setor_tag (ou setor_id). ?simular=1 só valida;
+    ?ignorar_existentes=1 ignora tags já cadastradas. Com qualquer erro nada é
+    gravado e a resposta traz os erros por linha.
+    """
+    if not ASSETS_AVAILABLE:
+        return jsonify({'success': False, 'message': 'Funcionalidade de ativos não disponível'}), 503
+
+    has_permission, user_or_message = check_admin_permission()
+    if not has_permission:
+        return jsonify({'success': False, 'message': user_or_message}), 403
+
+    from importacao_ativos import TIPOS_ATIVO, ler_registros, registros_por_tipo, importar_ativos
+
+    empresa = current_user.company
+    if current_user.profile == 'master':
+        empresa = request.args.get('empresa') or request.form.get('empresa') or empresa
+
+    try:
+        if request.files:
+            dados = {
+                tipo: ler_registros(request.files[tipo].read(), request.files[tipo].filename or '')
+                for tipo in TIPOS_ATIVO if tipo in request.files
+            }
+        else:
+            dados = registros_por_tipo(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if not any(dados.values()):
+        return jsonify({'success': False, 'message': 'Nenhum registro para importar'}), 400
+
+    try:
+        resultado = importar_ativos(
+            dados, empresa, current_user.email,
+            simular=_parametro_booleano('simular'),
+            ignorar_existentes=_parametro_booleano('ignorar_existentes')
+        )
+        if not resultado['success']:
+            resultado['message'] = f"{resultado['total_erros']} registros com erro; nada foi importado"
+            return jsonify(resultado), 400
+        return jsonify(resultado)
     except Exception as e:
+        current_app.logger.error(f"❌ Erro na importação de ativos: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
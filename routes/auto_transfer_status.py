@@ -10,7 +10,7 @@ auto_transfer_status_bp = Blueprint('auto_transfer_status', __name__)
 @auto_transfer_status_bp.route('/api/auto-transfer/status', methods=['GET'])
 @login_required
 def get_auto_transfer_status():
-    """Retorna status da transferência automática"""
+    """Retorna status do reconciliador de atividades (job do scheduler)"""
     try:
         from auto_transferir_atividades import verificar_status
         status = verificar_status()
@@ -31,7 +31,7 @@ def get_auto_transfer_status():
 @auto_transfer_status_bp.route('/api/auto-transfer/force', methods=['POST'])
 @login_required
 def force_auto_transfer():
-    """Força execução da transferência automática"""
+    """Força uma reconciliação completa das atividades (em background)"""
     try:
         # Só admins podem forçar
         if current_user.profile not in ['master', 'admin']:
@@ -40,11 +40,20 @@ def force_auto_transfer():
                 'message': 'Permissão negada'
             }), 403
         
-        from auto_transferir_atividades import auto_transferir
+        import threading
+        from auto_transferir_atividades import executar_reconciliacao
+        from execucao_jobs import garantir_tabela
         
-        # Resetar controle para permitir execução
-        auto_transferir.ultima_execucao = None
-        auto_transferir.executar_em_background()
+        app = current_app._get_current_object()
+        
+        def reconciliar_tudo():
+            with app.app_context():
+                garantir_tabela()
+                # Desde o ID 0: revisa todas as OS (anti-join, em lotes)
+                executar_reconciliacao(desde=0)
+        
+        thread = threading.Thread(target=reconciliar_tudo, daemon=True)
+        thread.start()
         
         return jsonify({
             'success': True,
@@ -64,23 +73,21 @@ def get_transfer_stats():
     """Retorna estatísticas das atividades"""
     try:
         from models import db
+        from sqlalchemy import text
         
-        # Contar OS sem atividades
-        result = db.engine.execute('''
-            SELECT COUNT(*) 
-            FROM ordens_servico os 
-            WHERE os.pmp_id IS NOT NULL 
-            AND os.id NOT IN (SELECT DISTINCT os_id FROM atividades_os WHERE os_id IS NOT NULL)
-        ''')
-        os_sem_atividades = result.fetchone()[0]
+        # Contar OS sem atividades (anti-join)
+        os_sem_atividades = db.session.execute(text('''
+            SELECT COUNT(*)
+            FROM ordens_servico os
+            WHERE os.pmp_id IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM atividades_os a WHERE a.os_id = os.id)
+        ''')).scalar()
         
         # Contar total de atividades_os
-        result = db.engine.execute('SELECT COUNT(*) FROM atividades_os')
-        total_atividades_os = result.fetchone()[0]
+        total_atividades_os = db.session.execute(text('SELECT COUNT(*) FROM atividades_os')).scalar()
         
         # Contar total de OS com PMP
-        result = db.engine.execute('SELECT COUNT(*) FROM ordens_servico WHERE pmp_id IS NOT NULL')
-        total_os_pmp = result.fetchone()[0]
+        total_os_pmp = db.session.execute(text('SELECT COUNT(*) FROM ordens_servico WHERE pmp_id IS NOT NULL')).scalar()
         
         return jsonify({
             'success': True,
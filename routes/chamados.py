@@ -7,6 +7,7 @@ import os
 # Importação segura dos modelos de ativos
 try:
     from assets_models import Chamado, Filial, Setor, Equipamento
+    from estatisticas_agregadas import estatisticas_chamados as calcular_estatisticas_chamados
     CHAMADOS_AVAILABLE = True
 except ImportError as e:
     print(f"Erro ao importar modelos de chamados: {e}")
@@ -163,27 +164,21 @@ def estatisticas_chamados():
         
         user_info = get_current_user()
         
-        # Contar chamados por status
-        total = Chamado.query.filter_by(empresa=user_info['company']).count()
-        abertos = Chamado.query.filter_by(empresa=user_info['company'], status='aberto').count()
-        em_andamento = Chamado.query.filter_by(empresa=user_info['company'], status='em_andamento').count()
-        resolvidos = Chamado.query.filter_by(empresa=user_info['company'], status='resolvido').count()
-        fechados = Chamado.query.filter_by(empresa=user_info['company'], status='fechado').count()
-        
-        # Contar por prioridade
-        alta_prioridade = Chamado.query.filter_by(empresa=user_info['company'], prioridade='alta').count()
-        seguranca = Chamado.query.filter_by(empresa=user_info['company'], prioridade='seguranca').count()
+        # Contadores por status e prioridade (consulta agrupada em cache)
+        stats = calcular_estatisticas_chamados(user_info['company'])
+        por_status = stats['por_status']
+        por_prioridade = stats['por_prioridade']
         
         return jsonify({
             'success': True,
             'estatisticas': {
-                'total': total,
-                'abertos': abertos,
-                'em_andamento': em_andamento,
-                'resolvidos': resolvidos,
-                'fechados': fechados,
-                'alta_prioridade': alta_prioridade,
-                'seguranca': seguranca
+                'total': stats['total'],
+                'abertos': por_status.get('aberto', 0),
+                'em_andamento': por_status.get('em_andamento', 0),
+                'resolvidos': por_status.get('resolvido', 0),
+                'fechados': por_status.get('fechado', 0),
+                'alta_prioridade': por_prioridade.get('alta', 0),
+                'seguranca': por_prioridade.get('seguranca', 0)
             }
         })
         
@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 from flask_login import current_user, login_required
+from sqlalchemy import and_, or_, select, func
+from sqlalchemy.exc import IntegrityError
 from models import db
+from cache_ttl import CacheTTL
+from estatisticas_agregadas import estatisticas_os
 from datetime import datetime, date
+import base64
+import json
 import os
 
 # Importação segura dos modelos
 try:
     from assets_models import OrdemServico, Chamado, Filial, Setor, Equipamento
+    from serializacao_os import perfil_os, resposta_json, serializar_os_por_ids
+    from alteracoes_os import eventos_alteracoes_os, garantir_ouvinte
+    from reconciliacao_os import verificar_nova_epoca
     OS_AVAILABLE = True
 except ImportError as e:
     print(f"Erro ao importar modelos de OS: {e}")
@@ -29,6 +38,63 @@ def get_current_user():
             'profile': session.get('user_profile', 'user')
         }
 
+# Paginação da listagem de OS
+LIMITE_PADRAO_PAGINA = 100
+LIMITE_MAXIMO_PAGINA = 500
+
+# Máximo de IDs no filtro ?ids= (OS novas recebidas pelo feed de alterações)
+LIMITE_FILTRO_IDS = 500
+
+# Contagens totais da listagem, por (empresa, status, prioridade)
+_cache_contagem_os = CacheTTL(ttl=int(os.environ.get('OS_CONTAGEM_CACHE_TTL', 30)), maxsize=512)
+
+def invalidar_contagem_os(empresa):
+    """Descarta as contagens em cache da empresa (chamar após criar/alterar OS)"""
+    _cache_contagem_os.invalidar(lambda chave: chave[0] == empresa)
+
+def expandir_filtro_status(status):
+    """
+    Converte o parâmetro status da listagem na lista de status do banco.
+
+    Returns:
+        list: Status aceitos, ou None para 'todos'
+    """
+    if not status or status == 'todos':
+        return None
+
+    expandido = []
+    for s in status.split(','):
+        s = s.strip()
+        if s == 'abertas':
+            expandido.extend(['aberta', 'programada'])
+        elif s == 'concluidas':
+            expandido.extend(['concluida', 'cancelada'])
+        elif s:
+            expandido.append(s)
+    return expandido
+
+def codificar_cursor(ordem_servico):
+    """Gera o cursor opaco (data_criacao, id) da última OS (ou Row) da página"""
+    data = ordem_servico.data_criacao.isoformat() if ordem_servico.data_criacao else None
+    token = json.dumps([data, ordem_servico.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii')
+
+def decodificar_cursor(cursor):
+    """
+    Decodifica o cursor da listagem.
+
+    Returns:
+        tuple: (data_criacao ou None, id)
+
+    Raises:
+        ValueError: Cursor inválido
+    """
+    try:
+        data, os_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(data) if data else None), int(os_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
 @ordens_servico_bp.route('/api/ordens-servico', methods=['POST'])
 @login_required
 def criar_ordem_servico():
@@ -148,6 +214,7 @@ def criar_ordem_servico():
             chamado.status = 'os_criada'
 
         db.session.commit()
+        invalidar_contagem_os(nova_os.empresa)
 
         return jsonify({
             'success': True,
@@ -189,46 +256,162 @@ def listar_ordens_servico():
 
         status = request.args.get('status', 'todos')
         prioridade = request.args.get('prioridade')
+        cursor = request.args.get('cursor')
+        limite = request.args.get('limit', type=int)
+        campos = [c.strip() for c in request.args.get('fields', '').split(',') if c.strip()]
 
-        query = OrdemServico.query.filter_by(empresa=user_info['company'])
-
-        if status != 'todos':
-            # Suportar múltiplos status separados por vírgula
-            if ',' in status:
-                status_list = [s.strip() for s in status.split(',')]
-                # Expandir status especiais
-                expanded_status = []
-                for s in status_list:
-                    if s == 'abertas':
-                        expanded_status.extend(['aberta', 'programada'])
-                    elif s == 'concluidas':
-                        expanded_status.extend(['concluida', 'cancelada'])
-                    else:
-                        expanded_status.append(s)
-                query = query.filter(OrdemServico.status.in_(expanded_status))
-            elif status == 'abertas':
-                query = query.filter(OrdemServico.status.in_(['aberta', 'programada']))
-            elif status == 'em_andamento':
-                query = query.filter_by(status='em_andamento')
-            elif status == 'concluidas':
-                query = query.filter(OrdemServico.status.in_(['concluida', 'cancelada']))
-            else:
-                query = query.filter_by(status=status)
+        # Projeção: perfil nomeado (lista, quadro, detalhe) ou campos de to_dict()
+        try:
+            perfil = perfil_os(request.args.get('perfil'), campos)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        status_list = expandir_filtro_status(status)
 
+        try:
+            ids = sorted({int(i) for i in request.args.get('ids', '').split(',') if i.strip()})
+        except ValueError:
+            return jsonify({'error': 'ids deve ser uma lista de números separados por vírgula'}), 400
+        if len(ids) > LIMITE_FILTRO_IDS:
+            return jsonify({'error': f'Máximo de {LIMITE_FILTRO_IDS} ids por consulta'}), 400
+
+        filtros = [OrdemServico.empresa == user_info['company']]
+        if status_list is not None:
+            filtros.append(OrdemServico.status.in_(status_list))
         if prioridade:
-            query = query.filter_by(prioridade=prioridade)
+            filtros.append(OrdemServico.prioridade == prioridade)
+        if ids:
+            filtros.append(OrdemServico.id.in_(ids))
+
+        # Total da listagem (sem cursor), em cache por alguns segundos
+        chave_contagem = (user_info['company'], tuple(sorted(status_list or [])), prioridade, tuple(ids))
+        total = _cache_contagem_os.obter_ou_calcular(
+            chave_contagem,
+            lambda: db.session.scalar(select(func.count(OrdemServico.id)).where(*filtros))
+        )
 
-        ordens_servico = query.order_by(OrdemServico.data_criacao.desc()).all()
+        # Tuplas de uma única consulta com as junções do perfil, sem objetos ORM
+        consulta = perfil.consulta().where(*filtros).order_by(
+            OrdemServico.data_criacao.desc().nulls_last(),
+            OrdemServico.id.desc()
+        )
 
-        return jsonify({
+        # Sem limit/cursor: lista completa (compatibilidade com telas antigas)
+        if not limite and not cursor:
+            linhas = db.session.execute(consulta).all()
+            return resposta_json({
+                'success': True,
+                'ordens_servico': perfil.serializar_linhas(linhas),
+                'total': total
+            })
+
+        limite = max(1, min(limite or LIMITE_PADRAO_PAGINA, LIMITE_MAXIMO_PAGINA))
+
+        # Keyset: próxima página começa depois de (data_criacao, id) do cursor
+        if cursor:
+            try:
+                data_cursor, id_cursor = decodificar_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            if data_cursor is None:
+                consulta = consulta.where(
+                    OrdemServico.data_criacao.is_(None),
+                    OrdemServico.id < id_cursor
+                )
+            else:
+                consulta = consulta.where(or_(
+                    OrdemServico.data_criacao < data_cursor,
+                    and_(OrdemServico.data_criacao == data_cursor, OrdemServico.id < id_cursor),
+                    OrdemServico.data_criacao.is_(None)
+                ))
+
+        linhas = db.session.execute(consulta.limit(limite + 1)).all()
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+
+        return resposta_json({
             'success': True,
-            'ordens_servico': [os.to_dict() for os in ordens_servico]
+            'ordens_servico': perfil.serializar_linhas(linhas),
+            'total': total,
+            'paginacao': {
+                'limit': limite,
+                'tem_mais': tem_mais,
+                'proximo_cursor': codificar_cursor(linhas[-1]) if tem_mais else None
+            }
         })
 
     except Exception as e:
         print(f"Erro ao listar OS: {e}")
         return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
 
+@ordens_servico_bp.route('/api/ordens-servico/alteracoes', methods=['GET'])
+@login_required
+def feed_alteracoes_os():
+    """
+    Feed Server-Sent Events das alterações de OS da empresa (quadro de programação)
+
+    Eventos "os" com deltas compactos (id, status, prioridade, data_programada,
+    usuario_responsavel, nova/removida), "recarregar" quando o quadro precisa
+    da lista inteira e "epoca" com o estado da reconciliação de OS de PMP a
+    cada época de geração nova. O navegador reconecta com Last-Event-ID.
+    """
+    if not OS_AVAILABLE:
+        return jsonify({'error': 'Funcionalidade de OS não disponível'}), 503
+
+    empresa = current_user.company
+    if current_user.profile == 'master':
+        empresa = request.args.get('empresa') or None
+
+    garantir_ouvinte(db.engine)
+    resposta = Response(
+        stream_with_context(eventos_alteracoes_os(
+            empresa, request.headers.get('Last-Event-ID'),
+            verificar_epoca=lambda ultima_epoca: verificar_nova_epoca(empresa, ultima_epoca)
+        )),
+        mimetype='text/event-stream'
+    )
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+@ordens_servico_bp.route('/api/ordens-servico/exportar', methods=['GET'])
+@login_required
+def exportar_ordens_servico():
+    """
+    Exporta as OS da empresa em CSV (padrão) ou XLSX, em streaming
+
+    Aceita os mesmos filtros de status e prioridade da listagem; ?formato=csv|xlsx.
+    """
+    if not OS_AVAILABLE:
+        return jsonify({'error': 'Funcionalidade de OS não disponível'}), 503
+
+    from exportacao_os import FORMATOS_EXPORTACAO, consulta_exportacao, linhas_exportacao, gerar_exportacao
+
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'error': f'Formato inválido: {formato}. Use csv ou xlsx'}), 400
+
+    user_info = get_current_user()
+    consulta = consulta_exportacao(
+        user_info['company'],
+        expandir_filtro_status(request.args.get('status', 'todos')),
+        request.args.get('prioridade')
+    )
+
+    mimetype, extensao = FORMATOS_EXPORTACAO[formato]
+    nome_arquivo = f"ordens_servico_{datetime.now().strftime('%Y%m%d_%H%M')}.{extensao}"
+
+    # O contexto fica ativo enquanto o gerador lê o cursor e grava a resposta
+    resposta = Response(
+        stream_with_context(gerar_exportacao(formato, linhas_exportacao(consulta))),
+        mimetype=mimetype
+    )
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    resposta.headers['Cache-Control'] = 'no-store'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
 @ordens_servico_bp.route('/api/ordens-servico/<int:os_id>', methods=['GET'])
 @login_required
 def obter_ordem_servico(os_id):
@@ -239,13 +422,16 @@ def obter_ordem_servico(os_id):
         if not current_user.is_authenticated:
             return jsonify({'error': 'Usuário não autenticado'}), 401
 
-        ordem_servico = OrdemServico.query.filter_by(id=os_id).first()
-        if not ordem_servico:
+        try:
+            encontradas = serializar_os_por_ids([os_id], request.args.get('perfil'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not encontradas:
             return jsonify({'error': 'Ordem de Serviço não encontrada'}), 404
 
-        return jsonify({
+        return resposta_json({
             'success': True,
-            'ordem_servico': ordem_servico.to_dict()
+            'ordem_servico': encontradas[0]
         })
 
     except Exception as e:
@@ -287,7 +473,12 @@ def programar_ordem_servico(os_id):
             if chamado:
                 chamado.status = 'os_programada'
 
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Já existe uma OS desta PMP programada para esta data'}), 409
+        invalidar_contagem_os(ordem_servico.empresa)
 
         return jsonify({
             'success': True,
@@ -312,27 +503,22 @@ def estatisticas_ordens_servico():
 
         user_info = get_current_user()
 
-        total = OrdemServico.query.filter_by(empresa=user_info['company']).count()
-        abertas = OrdemServico.query.filter_by(empresa=user_info['company'], status='aberta').count()
-        programadas = OrdemServico.query.filter_by(empresa=user_info['company'], status='programada').count()
-        em_andamento = OrdemServico.query.filter_by(empresa=user_info['company'], status='em_andamento').count()
-        concluidas = OrdemServico.query.filter_by(empresa=user_info['company'], status='concluida').count()
-
-        alta_prioridade = OrdemServico.query.filter_by(empresa=user_info['company'], prioridade='alta').count()
-        seguranca = OrdemServico.query.filter_by(empresa=user_info['company'], prioridade='seguranca').count()
-        preventivas = OrdemServico.query.filter_by(empresa=user_info['company'], prioridade='preventiva').count()
+        stats = estatisticas_os(user_info['company'])
+        por_status = stats['por_status']
+        por_prioridade = stats['por_prioridade']
 
         return jsonify({
             'success': True,
             'estatisticas': {
-                'total': total,
-                'abertas': abertas,
-                'programadas': programadas,
-                'em_andamento': em_andamento,
-                'concluidas': concluidas,
-                'alta_prioridade': alta_prioridade,
-                'seguranca': seguranca,
-                'preventivas': preventivas
+                'total': stats['total'],
+                'abertas': por_status.get('aberta', 0),
+                'programadas': por_status.get('programada', 0),
+                'em_andamento': por_status.get('em_andamento', 0),
+                'concluidas': por_status.get('concluida', 0),
+                'alta_prioridade': por_prioridade.get('alta', 0),
+                'seguranca': por_prioridade.get('seguranca', 0),
+                'preventivas': por_prioridade.get('preventiva', 0),
+                'por_oficina': stats['por_oficina']
             }
         })
 
@@ -2,27 +2,28 @@
 Endpoints para monitoramento do sistema automático de PMPs
 """
 
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, request, Response
 from datetime import datetime
+import os
+import json
 import logging
 
 pmp_auto_status_bp = Blueprint('pmp_auto_status', __name__)
 
 @pmp_auto_status_bp.route('/api/pmp/auto/status', methods=['GET'])
 def status_sistema_automatico():
-    """Retorna status do sistema automático de PMPs"""
+    """Retorna status do sistema automático de PMPs (estado do cluster, lido do banco)"""
     try:
-        # Importar scheduler
         from pmp_scheduler_automatico import status_scheduler
         
-        # Obter status do scheduler
+        # Lock de líder do scheduler + últimas execuções registradas por job
         scheduler_status = status_scheduler()
         
         # Informações adicionais do sistema
         sistema_info = {
             'timestamp': datetime.now().isoformat(),
             'sistema_ativo': True,
-            'modo_automatico': scheduler_status.get('running', False),
+            'modo_automatico': bool(scheduler_status.get('running')),
             'scheduler': scheduler_status
         }
         
@@ -44,6 +45,31 @@ def status_sistema_automatico():
             }
         }), 500
 
+@pmp_auto_status_bp.route('/api/pmp/auto/jobs', methods=['GET'])
+def historico_jobs():
+    """Histórico de execuções dos jobs do scheduler (?nome=&limit=)"""
+    try:
+        from models.execucao_job import ExecucaoJob
+        
+        limite = min(request.args.get('limit', 50, type=int), 500)
+        query = ExecucaoJob.query
+        if request.args.get('nome'):
+            query = query.filter(ExecucaoJob.nome == request.args['nome'])
+        execucoes = query.order_by(ExecucaoJob.id.desc()).limit(limite).all()
+        
+        return jsonify({
+            'success': True,
+            'execucoes': [execucao.to_dict() for execucao in execucoes]
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter histórico de jobs: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'execucoes': []
+        }), 500
+
 @pmp_auto_status_bp.route('/api/pmp/auto/heartbeat', methods=['GET'])
 def heartbeat_sistema():
     """Endpoint simples para verificar se o sistema está respondendo"""
@@ -55,21 +81,20 @@ def heartbeat_sistema():
 
 @pmp_auto_status_bp.route('/api/pmp/auto/logs', methods=['GET'])
 def logs_sistema():
-    """Retorna logs recentes do sistema (se disponível)"""
+    """Retorna as últimas linhas do log do scheduler (?linhas=50)"""
     try:
-        import os
-        log_file = 'pmp_scheduler.log'
-        
-        if os.path.exists(log_file):
-            # Ler últimas 50 linhas do log
-            with open(log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                recent_lines = lines[-50:] if len(lines) > 50 else lines
+        from logs_pmp import ler_ultimas_linhas, LOG_ARQUIVO
+        
+        quantidade = max(1, min(request.args.get('linhas', 50, type=int), 1000))
+        
+        if os.path.exists(LOG_ARQUIVO):
+            # Leitura reversa em blocos: só os bytes das últimas linhas
+            linhas = ler_ultimas_linhas(LOG_ARQUIVO, quantidade)
             
             return jsonify({
                 'success': True,
-                'logs': [line.strip() for line in recent_lines],
-                'total_lines': len(recent_lines)
+                'logs': [linha.strip() for linha in linhas],
+                'total_lines': len(linhas)
             })
         else:
             return jsonify({
@@ -86,3 +111,63 @@ def logs_sistema():
             'logs': [],
             'total_lines': 0
         }), 500
+
+def _parse_data_evento(valor):
+    """Converte o parâmetro ISO (data ou data/hora) em datetime"""
+    if not valor:
+        return None
+    return datetime.fromisoformat(valor.replace('Z', '+00:00')).replace(tzinfo=None)
+
+@pmp_auto_status_bp.route('/api/pmp/auto/eventos', methods=['GET'])
+def eventos_sistema():
+    """
+    Eventos estruturados do sistema automático, mais recentes primeiro
+    
+    Parâmetros: inicio, fim (ISO, UTC), nivel (ex.: WARNING,ERROR), tipo,
+    cursor (id do último evento da página anterior), limit e
+    formato=jsonl (um evento JSON por linha)
+    """
+    try:
+        from logs_pmp import consultar_eventos, NIVEIS
+        
+        try:
+            inicio = _parse_data_evento(request.args.get('inicio'))
+            fim = _parse_data_evento(request.args.get('fim'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Data inválida (use ISO 8601)'}), 400
+        
+        niveis = [n.strip().upper() for n in request.args.get('nivel', '').split(',') if n.strip()]
+        if any(nivel not in NIVEIS for nivel in niveis):
+            return jsonify({'success': False, 'error': f'Nível inválido (use {", ".join(NIVEIS)})'}), 400
+        
+        limite = max(1, min(request.args.get('limit', 50, type=int), 500))
+        
+        eventos, proximo_cursor = consultar_eventos(
+            inicio=inicio,
+            fim=fim,
+            niveis=niveis or None,
+            tipo=request.args.get('tipo'),
+            antes_id=request.args.get('cursor', type=int),
+            limite=limite
+        )
+        
+        if request.args.get('formato') == 'jsonl':
+            corpo = ''.join(json.dumps(evento.to_dict(), ensure_ascii=False) + '\n' for evento in eventos)
+            resposta = Response(corpo, mimetype='application/x-ndjson')
+            if proximo_cursor:
+                resposta.headers['X-Proximo-Cursor'] = str(proximo_cursor)
+            return resposta
+        
+        return jsonify({
+            'success': True,
+            'eventos': [evento.to_dict() for evento in eventos],
+            'proximo_cursor': proximo_cursor
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter eventos: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'eventos': []
+        }), 500
@@ -111,19 +111,13 @@ def api_limpar_duplicatas():
                 'timestamp': datetime.now().isoformat()
             })
         else:
-            # Limpar duplicatas de todas as PMPs
-            pmps = PMP.query.filter(PMP.status == 'ativo').all()
-            total_removidas = 0
-            
-            for pmp in pmps:
-                removidas = limpar_os_duplicadas_pmp(pmp.id, OrdemServico, db)
-                total_removidas += removidas
+            # Limpar duplicatas de todas as PMPs (uma única limpeza em conjunto)
+            total_removidas = limpar_os_duplicadas_pmp(None, OrdemServico, db)
             
             return jsonify({
                 'success': True,
-                'message': f'{total_removidas} OS duplicadas removidas de {len(pmps)} PMPs',
+                'message': f'{total_removidas} OS duplicadas removidas',
                 'os_removidas': total_removidas,
-                'pmps_processadas': len(pmps),
                 'timestamp': datetime.now().isoformat()
             })
         
@@ -6,233 +6,94 @@ from models.plano_mestre import PlanoMestre, AtividadePlanoMestre
 from models import db
 import logging
 from datetime import datetime, date
+from recorrencia_pmp import obter_recorrencia, frequencia_da_pmp
+from geracao_pmps_lote import gerar_pmps_equipamentos, resolver_equipamentos
+from sqlalchemy import func
 
 pmp_limpo_bp = Blueprint('pmp_limpo_bp', __name__)
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO)
 
+MENSAGENS_STATUS_GERACAO = {
+    'sem_plano_mestre': 'Nenhum plano mestre encontrado para este equipamento',
+    'sem_atividades': 'Nenhuma atividade encontrada no plano mestre deste equipamento',
+    'equipamento_nao_encontrado': 'Equipamento não encontrado'
+}
+
+
+def _usuario_geracao():
+    """ID gravado em criado_por nas PMPs novas"""
+    return current_user.id if current_user.is_authenticated else 1
+
+
+def _pmps_com_contagem(pmp_ids):
+    """PMPs (na ordem dos IDs) com atividades_count, em duas consultas"""
+    if not pmp_ids:
+        return []
+
+    pmps = {pmp.id: pmp for pmp in PMP.query.filter(PMP.id.in_(pmp_ids)).all()}
+    contagens = dict(
+        db.session.query(AtividadePMP.pmp_id, func.count(AtividadePMP.id))
+        .filter(AtividadePMP.pmp_id.in_(pmp_ids))
+        .group_by(AtividadePMP.pmp_id)
+        .all()
+    )
+
+    resultado = []
+    for pmp_id in pmp_ids:
+        if pmp_id in pmps:
+            pmp_dict = pmps[pmp_id].to_dict()
+            pmp_dict['atividades_count'] = contagens.get(pmp_id, 0)
+            resultado.append(pmp_dict)
+    return resultado
+
+
 @pmp_limpo_bp.route('/api/pmp/equipamento/<int:equipamento_id>/gerar', methods=['POST'])
 def gerar_pmps_limpo(equipamento_id):
     """
     Gera PMPs agrupando atividades do plano mestre por:
     - Oficina + Frequência + Tipo de manutenção + Condição
-    
-    CORRIGIDO: Usa estrutura real do banco com atividade_plano_mestre_id
+
+    PMPs existentes preservam os dados personalizados; PMPs órfãs sem
+    personalização são removidas (ver geracao_pmps_lote).
     """
     try:
         current_app.logger.info(f"🔧 Iniciando geração de PMPs para equipamento {equipamento_id}")
-        
-        # 1. Buscar plano mestre para este equipamento
-        plano_mestre = PlanoMestre.query.filter_by(equipamento_id=equipamento_id).first()
-        
-        if not plano_mestre:
-            return jsonify({
-                'success': False,
-                'message': 'Nenhum plano mestre encontrado para este equipamento'
-            }), 404
-        
-        # 2. Buscar atividades do plano mestre
-        atividades = AtividadePlanoMestre.query.filter_by(plano_mestre_id=plano_mestre.id).all()
-        
-        if not atividades:
+
+        resultado = gerar_pmps_equipamentos([equipamento_id], criado_por=_usuario_geracao())
+        resumo = resultado['equipamentos'][equipamento_id]
+
+        if resumo['status'] in MENSAGENS_STATUS_GERACAO:
             return jsonify({
                 'success': False,
-                'message': 'Nenhuma atividade encontrada no plano mestre deste equipamento'
+                'message': MENSAGENS_STATUS_GERACAO[resumo['status']]
             }), 404
-        
-        # 3. Buscar informações do equipamento
-        equipamento = Equipamento.query.get(equipamento_id)
-        if not equipamento:
+
+        if resumo['status'] == 'erro':
             return jsonify({
                 'success': False,
-                'message': 'Equipamento não encontrado'
-            }), 404
-        
-        # 4. Agrupar atividades por critérios
-        grupos = {}
-        for atividade in atividades:
-            # Criar chave de agrupamento
-            chave = (
-                atividade.oficina or 'Não definida',
-                atividade.frequencia or 'Não definida', 
-                atividade.tipo_manutencao or 'Não definida',
-                atividade.condicao or 'funcionando'
-            )
-            
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(atividade)
-        
-        current_app.logger.info(f"📊 Encontrados {len(grupos)} grupos de atividades para equipamento {equipamento_id}")
-        
-        # 5. PRESERVAR PMPs existentes com dados personalizados
-        pmps_existentes = PMP.query.filter_by(equipamento_id=equipamento_id).all()
-        pmps_existentes_dict = {}
-        
-        # Mapear PMPs existentes por critérios de agrupamento
-        for pmp_existente in pmps_existentes:
-            chave_existente = (pmp_existente.oficina, pmp_existente.frequencia, 
-                             pmp_existente.tipo, pmp_existente.condicao)
-            pmps_existentes_dict[chave_existente] = pmp_existente
-            current_app.logger.info(f"📋 PMP existente preservada: {pmp_existente.codigo} - {chave_existente}")
-        
-        # 6. Criar/atualizar PMPs (preservando dados personalizados)
-        contador = len(pmps_existentes) + 1
-        pmps_processadas = []
-        
-        for chave, atividades_grupo in grupos.items():
-            oficina, frequencia, tipo_manutencao, condicao = chave
-            
-            # Verificar se já existe PMP com esses critérios
-            if chave in pmps_existentes_dict:
-                # PMP JÁ EXISTE - PRESERVAR dados personalizados
-                pmp_existente = pmps_existentes_dict[chave]
-                current_app.logger.info(f"✅ PMP existente preservada: {pmp_existente.codigo}")
-                
-                # Apenas atualizar atividades se necessário (sem tocar nos dados personalizados)
-                atividades_existentes = AtividadePMP.query.filter_by(pmp_id=pmp_existente.id).all()
-                
-                # Verificar se precisa atualizar atividades
-                if len(atividades_existentes) != len(atividades_grupo):
-                    current_app.logger.info(f"🔄 Atualizando atividades da PMP {pmp_existente.codigo}")
-                    
-                    # Deletar apenas atividades antigas
-                    AtividadePMP.query.filter_by(pmp_id=pmp_existente.id).delete()
-                    
-                    # Recriar atividades
-                    ordem = 1
-                    for atividade_plano in atividades_grupo:
-                        nova_atividade_pmp = AtividadePMP(
-                            pmp_id=pmp_existente.id,
-                            atividade_plano_mestre_id=atividade_plano.id,
-                            ordem=ordem,
-                            status='ativo',
-                            descricao=atividade_plano.descricao,
-                            oficina=atividade_plano.oficina,
-                            frequencia=atividade_plano.frequencia,
-                            tipo_manutencao=atividade_plano.tipo_manutencao,
-                            conjunto=atividade_plano.conjunto,
-                            ponto_controle=atividade_plano.ponto_controle,
-                            valor_frequencia=atividade_plano.valor_frequencia,
-                            condicao=atividade_plano.condicao
-                        )
-                        db.session.add(nova_atividade_pmp)
-                        ordem += 1
-                
-                pmps_processadas.append(pmp_existente)
-                
-            else:
-                # PMP NÃO EXISTE - CRIAR NOVA com valores padrão
-                current_app.logger.info(f"🆕 Criando nova PMP para: {chave}")
-                
-                # Gerar código único da PMP
-                codigo_pmp = f"PMP-{contador:02d}-{equipamento.tag}"
-                
-                # Gerar descrição baseada nos critérios de agrupamento
-                descricao_pmp = f"PREVENTIVA {frequencia.upper()} - {oficina.upper()}"
-                
-                # Criar nova PMP com valores padrão
-                nova_pmp = PMP(
-                    equipamento_id=equipamento_id,
-                    codigo=codigo_pmp,
-                    descricao=descricao_pmp,
-                    tipo=tipo_manutencao,
-                    oficina=oficina,
-                    frequencia=frequencia,
-                    condicao=condicao,
-                    status='ativo',
-                    criado_por=1,  # TODO: usar current_user.id
-                    # Valores padrão para novos campos (serão personalizados pelo usuário)
-                    num_pessoas=2,
-                    dias_antecipacao=2,
-                    tempo_pessoa=5.0,
-                    forma_impressao='digital'
-                )
-                
-                db.session.add(nova_pmp)
-                db.session.flush()  # Para obter o ID da nova PMP
-                
-                current_app.logger.info(f"✅ Nova PMP criada: {codigo_pmp} (ID: {nova_pmp.id})")
-                
-                # Criar atividades da nova PMP
-                ordem = 1
-                for atividade_plano in atividades_grupo:
-                    nova_atividade_pmp = AtividadePMP(
-                        pmp_id=nova_pmp.id,
-                        atividade_plano_mestre_id=atividade_plano.id,
-                        ordem=ordem,
-                        status='ativo',
-                        descricao=atividade_plano.descricao,
-                        oficina=atividade_plano.oficina,
-                        frequencia=atividade_plano.frequencia,
-                        tipo_manutencao=atividade_plano.tipo_manutencao,
-                        conjunto=atividade_plano.conjunto,
-                        ponto_controle=atividade_plano.ponto_controle,
-                        valor_frequencia=atividade_plano.valor_frequencia,
-                        condicao=atividade_plano.condicao
-                    )
-                    db.session.add(nova_atividade_pmp)
-                    ordem += 1
-                
-                pmps_processadas.append(nova_pmp)
-                contador += 1
-        
-        # 7. Remover PMPs órfãs (que não têm mais atividades correspondentes no plano mestre)
-        chaves_atuais = set(grupos.keys())
-        pmps_para_remover = []
-        
-        for pmp_existente in pmps_existentes:
-            chave_existente = (pmp_existente.oficina, pmp_existente.frequencia, 
-                             pmp_existente.tipo, pmp_existente.condicao)
-            
-            if chave_existente not in chaves_atuais:
-                # Esta PMP não tem mais atividades correspondentes no plano mestre
-                # Só remover se não tiver dados personalizados importantes
-                if (not pmp_existente.data_inicio_plano and 
-                    not pmp_existente.usuarios_responsaveis and
-                    pmp_existente.num_pessoas == 2 and 
-                    pmp_existente.dias_antecipacao == 2):
-                    
-                    current_app.logger.info(f"🗑️ Removendo PMP órfã sem dados personalizados: {pmp_existente.codigo}")
-                    pmps_para_remover.append(pmp_existente)
-                else:
-                    current_app.logger.info(f"⚠️ PMP órfã mantida (tem dados personalizados): {pmp_existente.codigo}")
-                    pmps_processadas.append(pmp_existente)  # Manter na lista
-        
-        # Remover PMPs órfãs sem dados personalizados
-        for pmp_remover in pmps_para_remover:
-            AtividadePMP.query.filter_by(pmp_id=pmp_remover.id).delete()
-            HistoricoExecucaoPMP.query.filter_by(pmp_id=pmp_remover.id).delete()
-            db.session.delete(pmp_remover)
-        
-        # 8. Commit das alterações
-        db.session.commit()
-        
+                'message': f"Erro interno: {resumo['erro']}"
+            }), 500
+
+        preservadas = resumo['preservadas'] + resumo['orfas_mantidas']
+
         current_app.logger.info(f"🎉 Processamento concluído:")
-        current_app.logger.info(f"   - PMPs preservadas: {len([p for p in pmps_processadas if p in pmps_existentes])}")
-        current_app.logger.info(f"   - PMPs criadas: {len([p for p in pmps_processadas if p not in pmps_existentes])}")
-        current_app.logger.info(f"   - PMPs removidas: {len(pmps_para_remover)}")
-        
-        # 9. Retornar PMPs processadas com contagem de atividades
-        resultado = []
-        for pmp in pmps_processadas:
-            pmp_dict = pmp.to_dict()
-            # Contar atividades da PMP
-            pmp_dict['atividades_count'] = AtividadePMP.query.filter_by(pmp_id=pmp.id).count()
-            resultado.append(pmp_dict)
-        
+        current_app.logger.info(f"   - PMPs preservadas: {preservadas}")
+        current_app.logger.info(f"   - PMPs criadas: {resumo['criadas']}")
+        current_app.logger.info(f"   - PMPs removidas: {resumo['removidas']}")
+
         return jsonify({
             'success': True,
-            'message': f'Processadas {len(pmps_processadas)} PMPs (preservando dados personalizados)',
-            'pmps': resultado,
+            'message': f"Processadas {len(resumo['pmp_ids'])} PMPs (preservando dados personalizados)",
+            'pmps': _pmps_com_contagem(resumo['pmp_ids']),
             'estatisticas': {
-                'preservadas': len([p for p in pmps_processadas if p in pmps_existentes]),
-                'criadas': len([p for p in pmps_processadas if p not in pmps_existentes]),
-                'removidas': len(pmps_para_remover)
+                'preservadas': preservadas,
+                'criadas': resumo['criadas'],
+                'removidas': resumo['removidas']
             }
         }), 200
-        
+
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao gerar PMPs: {e}", exc_info=True)
         db.session.rollback()
@@ -241,6 +102,73 @@ def gerar_pmps_limpo(equipamento_id):
             'message': f'Erro interno: {str(e)}'
         }), 500
 
+
+@pmp_limpo_bp.route('/api/pmp/gerar-lote', methods=['POST'])
+def gerar_pmps_lote():
+    """
+    Gera PMPs de vários equipamentos numa única chamada
+
+    Corpo (JSON), um dos critérios:
+    - equipamento_ids: lista de IDs
+    - setor_id: todos os equipamentos do setor
+    - filial_id: todos os equipamentos da filial
+
+    Retorna um resumo por equipamento e os totais.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
+
+    try:
+        data = request.get_json(silent=True) or {}
+        equipamento_ids = data.get('equipamento_ids')
+        setor_id = data.get('setor_id')
+        filial_id = data.get('filial_id')
+
+        if equipamento_ids is None and setor_id is None and filial_id is None:
+            return jsonify({
+                'success': False,
+                'message': 'Informe equipamento_ids, setor_id ou filial_id'
+            }), 400
+
+        try:
+            if equipamento_ids is not None:
+                equipamento_ids = [int(equipamento_id) for equipamento_id in equipamento_ids]
+            setor_id = int(setor_id) if setor_id is not None else None
+            filial_id = int(filial_id) if filial_id is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'IDs inválidos'}), 400
+
+        empresa = None if current_user.profile == 'master' else current_user.company
+        ids = resolver_equipamentos(equipamento_ids, setor_id, filial_id, empresa)
+
+        current_app.logger.info(f"🔧 Geração de PMPs em lote: {len(ids)} equipamentos")
+        resultado = gerar_pmps_equipamentos(ids, criado_por=current_user.id)
+
+        totais = resultado['totais']
+        current_app.logger.info(
+            f"🎉 Lote concluído: {totais['criadas']} PMPs criadas, {totais['preservadas']} preservadas, "
+            f"{totais['removidas']} removidas em {totais['equipamentos']} equipamentos"
+        )
+
+        # Equipamentos informados mas não encontrados (ou de outra empresa)
+        nao_encontrados = sorted(set(equipamento_ids or []) - set(ids))
+
+        return jsonify({
+            'success': True,
+            'equipamentos': [dict(resumo, equipamento_id=equipamento_id)
+                             for equipamento_id, resumo in resultado['equipamentos'].items()],
+            'nao_encontrados': nao_encontrados,
+            'totais': totais
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro na geração de PMPs em lote: {e}", exc_info=True)
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Erro interno: {str(e)}'
+        }), 500
+
 @pmp_limpo_bp.route('/api/pmp/equipamento/<int:equipamento_id>', methods=['GET'])
 def get_pmps_por_equipamento_limpo(equipamento_id):
     """
@@ -457,21 +385,8 @@ def atualizar_pmp_limpo(pmp_id):
                                 filial = Filial.query.get(setor.filial_id) if setor and setor.filial_id else None
                                 
                                 # Calcular próxima data baseada na frequência
-                                frequencia = pmp.frequencia or 'mensal'
-                                if frequencia == 'diario':
-                                    proxima_data = nova_data_inicio + timedelta(days=1)
-                                elif frequencia == 'semanal':
-                                    proxima_data = nova_data_inicio + timedelta(weeks=1)
-                                elif frequencia == 'mensal':
-                                    proxima_data = nova_data_inicio + timedelta(days=30)
-                                elif frequencia == 'trimestral':
-                                    proxima_data = nova_data_inicio + timedelta(days=90)
-                                elif frequencia == 'semestral':
-                                    proxima_data = nova_data_inicio + timedelta(days=180)
-                                elif frequencia == 'anual':
-                                    proxima_data = nova_data_inicio + timedelta(days=365)
-                                else:
-                                    proxima_data = nova_data_inicio + timedelta(days=30)
+                                frequencia, intervalo = frequencia_da_pmp(pmp)
+                                proxima_data = obter_recorrencia(nova_data_inicio, frequencia or 'mensal', pmp.dias_semana or None, intervalo).enesima(1)
                                 
                                 # Verificar se já existe OS para esta PMP
                                 os_existente = OrdemServico.query.filter_by(pmp_id=pmp.id).first()
@@ -505,7 +420,7 @@ def atualizar_pmp_limpo(pmp_id):
                                         data_atualizacao=None,
                                         pmp_id=pmp.id,
                                         data_proxima_geracao=proxima_data,
-                                        frequencia_origem=frequencia,
+                                        frequencia_origem=pmp.frequencia or 'mensal',
                                         numero_sequencia=1
                                     )
                                     
@@ -526,7 +441,10 @@ def atualizar_pmp_limpo(pmp_id):
                                         db.session.add(nova_os)
                                         db.session.flush()  # Para obter o ID
                                         
-                                        current_app.logger.info(f"✅ OS #{nova_os.id} gerada automaticamente para PMP {pmp.id}")
+                                        from auto_transferir_atividades import criar_atividades_os
+                                        atividades_criadas = criar_atividades_os([nova_os.id])
+                                        
+                                        current_app.logger.info(f"✅ OS #{nova_os.id} gerada automaticamente para PMP {pmp.id} ({atividades_criadas} atividades)")
                                         current_app.logger.info(f"   📝 Descrição: {nova_os.descricao}")
                                         current_app.logger.info(f"   📅 Data programada: {nova_os.data_programada}")
                                         current_app.logger.info(f"   📅 Próxima geração: {nova_os.data_proxima_geracao}")
@@ -14,6 +14,7 @@ from sistema_geracao_os_pmp_aprimorado import (
     gerar_os_pmp_codigo,
     verificar_pendencias_os_pmp
 )
+from reconciliacao_os import estado_reconciliacao
 
 # Importações dos modelos
 try:
@@ -62,6 +63,37 @@ def api_verificar_pendencias():
             'error': f'Erro interno: {str(e)}'
         }), 500
 
+def _empresa_reconciliacao():
+    """Empresa das pendências: a do usuário, ou a pedida (ou todas) para o master"""
+    if getattr(current_user, 'profile', None) == 'master':
+        return request.args.get('empresa') or None
+    return current_user.company
+
+@pmp_os_api_bp.route('/api/pmp/os/reconciliacao', methods=['GET'])
+@login_required
+def api_estado_reconciliacao():
+    """
+    Última época de geração e pendências de OS da empresa
+
+    Leitura do resumo materializado pela reconciliação do scheduler; não
+    calcula pendências nem gera OS.
+    """
+    try:
+        estado = estado_reconciliacao(_empresa_reconciliacao())
+        return jsonify({
+            'success': True,
+            'epoca': estado['epoca'],
+            'pendencias': estado['pendencias'],
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro na API de estado da reconciliação: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'Erro interno: {str(e)}'
+        }), 500
+
 @pmp_os_api_bp.route('/api/pmp/os/gerar-todas', methods=['POST'])
 @login_required
 def api_gerar_todas_os():
@@ -7,6 +7,8 @@ from flask import Blueprint, request, jsonify, current_app, session
 from datetime import datetime, date, timedelta
 from sqlalchemy import text
 from models import db
+from recorrencia_pmp import obter_recorrencia, converter_data, frequencia_da_pmp
+from auto_transferir_atividades import criar_atividades_os
 
 # Importações dos modelos
 try:
@@ -42,49 +44,11 @@ def get_current_user_id():
         current_app.logger.error(f"Erro ao obter usuário da sessão: {e}")
         return None
 
-def calcular_proxima_data(data_inicio, frequencia):
+def calcular_proxima_data(data_inicio, frequencia, dias_semana=None, intervalo=None):
     """Calcula a próxima data baseada na frequência"""
     try:
-        if isinstance(data_inicio, str):
-            data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-        elif isinstance(data_inicio, datetime):
-            data_inicio = data_inicio.date()
-        
-        if frequencia == 'diaria':
-            return data_inicio + timedelta(days=1)
-        elif frequencia == 'semanal':
-            return data_inicio + timedelta(weeks=1)
-        elif frequencia == 'quinzenal':
-            return data_inicio + timedelta(weeks=2)
-        elif frequencia == 'mensal':
-            # Próximo mês, mesmo dia
-            if data_inicio.month == 12:
-                return data_inicio.replace(year=data_inicio.year + 1, month=1)
-            else:
-                try:
-                    return data_inicio.replace(month=data_inicio.month + 1)
-                except ValueError:
-                    # Caso o dia não exista no próximo mês (ex: 31/01 -> 28/02)
-                    next_month = data_inicio.replace(month=data_inicio.month + 1, day=1)
-                    return next_month.replace(day=min(data_inicio.day, 
-                        (next_month.replace(month=next_month.month + 1) - timedelta(days=1)).day))
-        elif frequencia == 'bimestral':
-            return calcular_proxima_data(calcular_proxima_data(data_inicio, 'mensal'), 'mensal')
-        elif frequencia == 'trimestral':
-            # 3 meses
-            for _ in range(3):
-                data_inicio = calcular_proxima_data(data_inicio, 'mensal')
-            return data_inicio
-        elif frequencia == 'semestral':
-            # 6 meses
-            for _ in range(6):
-                data_inicio = calcular_proxima_data(data_inicio, 'mensal')
-            return data_inicio
-        elif frequencia == 'anual':
-            return data_inicio.replace(year=data_inicio.year + 1)
-        else:
-            # Frequência desconhecida, assumir semanal
-            return data_inicio + timedelta(weeks=1)
+        data_inicio = converter_data(data_inicio)
+        return obter_recorrencia(data_inicio, frequencia, dias_semana or None, intervalo).enesima(1)
             
     except Exception as e:
         current_app.logger.error(f"Erro ao calcular próxima data: {e}")
@@ -167,12 +131,12 @@ def gerar_os_from_pmp():
             current_app.logger.info("📋 OS será adicionada aos chamados por prioridade")
         
         # Calcular próxima data baseada na frequência
-        frequencia = pmp.frequencia or 'semanal'
-        proxima_data = calcular_proxima_data(data_inicio, frequencia)
+        frequencia, intervalo = frequencia_da_pmp(pmp)
+        proxima_data = calcular_proxima_data(data_inicio, frequencia or 'semanal', pmp.dias_semana, intervalo)
         
-        # Contar quantas OS já foram geradas para esta PMP
-        count_os = OrdemServico.query.filter_by(pmp_id=pmp_id).count()
-        numero_sequencia = count_os + 1
+        # Próxima sequência após a última OS da PMP (mesma regra da geração em lote)
+        from routes.verificador_duplicatas_os import proxima_sequencia_pmp
+        numero_sequencia = proxima_sequencia_pmp(pmp_id, OrdemServico, db)
         
         # Criar OS
         nova_os = OrdemServico(
@@ -202,18 +166,20 @@ def gerar_os_from_pmp():
             
             # Campos PMP
             data_proxima_geracao=proxima_data,
-            frequencia_origem=frequencia,
+            frequencia_origem=pmp.frequencia or 'semanal',
             numero_sequencia=numero_sequencia
         )
         
         # Calcular HH
         nova_os.calcular_hh()
         
-        # Salvar no banco
+        # Salvar no banco, já com as atividades da PMP
         db.session.add(nova_os)
+        db.session.flush()
+        atividades_criadas = criar_atividades_os([nova_os.id])
         db.session.commit()
         
-        current_app.logger.info(f"✅ OS criada com sucesso: ID {nova_os.id}")
+        current_app.logger.info(f"✅ OS criada com sucesso: ID {nova_os.id} ({atividades_criadas} atividades)")
         
         return jsonify({
             'success': True,
@@ -8,6 +8,7 @@ from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, date, timedelta
 from sqlalchemy import text, and_, or_
 from models import db
+from recorrencia_pmp import obter_recorrencia, converter_data, frequencia_da_pmp
 
 # Importações dos modelos
 try:
@@ -20,100 +21,20 @@ except ImportError as e:
 
 pmp_scheduler_bp = Blueprint('pmp_scheduler', __name__)
 
-def calcular_todas_datas_geracao(data_inicio, frequencia, data_fim=None):
+def calcular_todas_datas_geracao(data_inicio, frequencia, data_fim=None, dias_semana=None, intervalo=None):
     """
     Calcula todas as datas de geração baseado na frequência
     """
     try:
-        if isinstance(data_inicio, str):
-            data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-        elif isinstance(data_inicio, datetime):
-            data_inicio = data_inicio.date()
-        
-        if data_fim and isinstance(data_fim, str):
-            data_fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
-        elif isinstance(data_fim, datetime):
-            data_fim = data_fim.date()
+        data_inicio = converter_data(data_inicio)
+        data_fim = converter_data(data_fim)
         
         # Se não tem data fim, calcular até 1 ano no futuro
         if not data_fim:
             data_fim = data_inicio + timedelta(days=365)
         
-        datas = []
-        data_atual = data_inicio
-        
-        # Primeira data sempre é a data de início
-        datas.append(data_atual)
-        
-        # Calcular próximas datas baseado na frequência
-        while data_atual < data_fim:
-            if frequencia == 'diaria':
-                data_atual += timedelta(days=1)
-            elif frequencia == 'semanal':
-                data_atual += timedelta(weeks=1)
-            elif frequencia == 'quinzenal':
-                data_atual += timedelta(weeks=2)
-            elif frequencia == 'mensal':
-                # Próximo mês, mesmo dia
-                if data_atual.month == 12:
-                    try:
-                        data_atual = data_atual.replace(year=data_atual.year + 1, month=1)
-                    except ValueError:
-                        data_atual = data_atual.replace(year=data_atual.year + 1, month=1, day=1)
-                else:
-                    try:
-                        data_atual = data_atual.replace(month=data_atual.month + 1)
-                    except ValueError:
-                        # Dia não existe no próximo mês (ex: 31/01 -> 28/02)
-                        next_month = data_atual.replace(month=data_atual.month + 1, day=1)
-                        last_day = (next_month.replace(month=next_month.month + 1) - timedelta(days=1)).day
-                        data_atual = next_month.replace(day=min(data_atual.day, last_day))
-            elif frequencia == 'bimestral':
-                # 2 meses
-                for _ in range(2):
-                    if data_atual.month == 12:
-                        data_atual = data_atual.replace(year=data_atual.year + 1, month=1)
-                    else:
-                        try:
-                            data_atual = data_atual.replace(month=data_atual.month + 1)
-                        except ValueError:
-                            next_month = data_atual.replace(month=data_atual.month + 1, day=1)
-                            last_day = (next_month.replace(month=next_month.month + 1) - timedelta(days=1)).day
-                            data_atual = next_month.replace(day=min(data_atual.day, last_day))
-            elif frequencia == 'trimestral':
-                # 3 meses
-                for _ in range(3):
-                    if data_atual.month == 12:
-                        data_atual = data_atual.replace(year=data_atual.year + 1, month=1)
-                    else:
-                        try:
-                            data_atual = data_atual.replace(month=data_atual.month + 1)
-                        except ValueError:
-                            next_month = data_atual.replace(month=data_atual.month + 1, day=1)
-                            last_day = (next_month.replace(month=next_month.month + 1) - timedelta(days=1)).day
-                            data_atual = next_month.replace(day=min(data_atual.day, last_day))
-            elif frequencia == 'semestral':
-                # 6 meses
-                for _ in range(6):
-                    if data_atual.month == 12:
-                        data_atual = data_atual.replace(year=data_atual.year + 1, month=1)
-                    else:
-                        try:
-                            data_atual = data_atual.replace(month=data_atual.month + 1)
-                        except ValueError:
-                            next_month = data_atual.replace(month=data_atual.month + 1, day=1)
-                            last_day = (next_month.replace(month=next_month.month + 1) - timedelta(days=1)).day
-                            data_atual = next_month.replace(day=min(data_atual.day, last_day))
-            elif frequencia == 'anual':
-                data_atual = data_atual.replace(year=data_atual.year + 1)
-            else:
-                # Frequência desconhecida, assumir semanal
-                data_atual += timedelta(weeks=1)
-            
-            if data_atual <= data_fim:
-                datas.append(data_atual)
-        
-        return datas
+        # Cálculo em forma fechada compartilhado com os geradores e relatórios
+        return obter_recorrencia(data_inicio, frequencia, dias_semana or None, intervalo).ocorrencias_entre(data_inicio, data_fim)
         
     except Exception as e:
         current_app.logger.error(f"Erro ao calcular datas de geração: {e}")
@@ -139,10 +60,13 @@ def obter_cronograma_geracao(pmp_id):
             return jsonify({'error': 'PMP não possui data de início definida'}), 400
         
         # Calcular todas as datas de geração
+        frequencia, intervalo = frequencia_da_pmp(pmp)
         datas_geracao = calcular_todas_datas_geracao(
             pmp.data_inicio_plano,
-            pmp.frequencia or 'semanal',
-            pmp.data_fim_plano
+            frequencia or 'semanal',
+            pmp.data_fim_plano,
+            pmp.dias_semana,
+            intervalo
         )
         
         # Buscar OS já geradas para esta PMP
@@ -222,10 +146,13 @@ def verificar_pendencias_hoje():
         for pmp in pmps_ativas:
             try:
                 # Calcular datas de geração até hoje
+                frequencia, intervalo = frequencia_da_pmp(pmp)
                 datas_geracao = calcular_todas_datas_geracao(
                     pmp.data_inicio_plano,
-                    pmp.frequencia or 'semanal',
-                    hoje
+                    frequencia or 'semanal',
+                    min(hoje, pmp.data_fim_plano) if pmp.data_fim_plano else hoje,
+                    pmp.dias_semana,
+                    intervalo
                 )
                 
                 # Verificar quais datas não têm OS gerada
@@ -2,11 +2,13 @@
 API Simplificada para PMP - Versão Final com Busca de Filiais/Setores Válidos
 """
 
+import json
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
-from dateutil.relativedelta import relativedelta
 from models import db
+from recorrencia_pmp import obter_recorrencia, datas_execucao
+from logs_pmp import registrar_evento
 
 # Importações dos modelos
 try:
@@ -19,75 +21,16 @@ except ImportError as e:
 
 pmp_simple_api_bp = Blueprint('pmp_simple_api', __name__)
 
-def normalizar_frequencia(frequencia):
-    """Normaliza frequência para padrão"""
-    if not frequencia:
-        return 'semanal'
-    
-    freq_lower = frequencia.lower().strip()
-    
-    mapeamento = {
-        'diario': 'diaria',
-        'diária': 'diaria',
-        'daily': 'diaria',
-        'semanal': 'semanal',
-        'weekly': 'semanal',
-        'quinzenal': 'quinzenal',
-        'biweekly': 'quinzenal',
-        'mensal': 'mensal',
-        'monthly': 'mensal',
-        'mês': 'mensal',
-        'bimestral': 'bimestral',
-        'trimestral': 'trimestral',
-        'quarterly': 'trimestral',
-        'semestral': 'semestral',
-        'anual': 'anual',
-        'yearly': 'anual',
-        'ano': 'anual'
-    }
-    
-    return mapeamento.get(freq_lower, 'semanal')
-
 def calcular_proxima_data(data_base, frequencia):
     """Calcula próxima data baseada na frequência"""
-    freq_normalizada = normalizar_frequencia(frequencia)
-    
-    if freq_normalizada == 'diaria':
-        return data_base + timedelta(days=1)
-    elif freq_normalizada == 'semanal':
-        return data_base + timedelta(weeks=1)
-    elif freq_normalizada == 'quinzenal':
-        return data_base + timedelta(weeks=2)
-    elif freq_normalizada == 'mensal':
-        return data_base + relativedelta(months=1)
-    elif freq_normalizada == 'bimestral':
-        return data_base + relativedelta(months=2)
-    elif freq_normalizada == 'trimestral':
-        return data_base + relativedelta(months=3)
-    elif freq_normalizada == 'semestral':
-        return data_base + relativedelta(months=6)
-    elif freq_normalizada == 'anual':
-        return data_base + relativedelta(years=1)
-    else:
-        return data_base + timedelta(weeks=1)
+    return obter_recorrencia(data_base, frequencia).enesima(1)
 
 def gerar_cronograma_os(pmp):
     """Gera cronograma de OS para uma PMP até hoje"""
     if not pmp.data_inicio_plano:
         return []
     
-    datas = []
-    data_atual = pmp.data_inicio_plano
-    hoje = date.today()
-    
-    # Gerar datas até hoje
-    contador = 0
-    while data_atual <= hoje and contador < 1000:
-        datas.append(data_atual)
-        data_atual = calcular_proxima_data(data_atual, pmp.frequencia)
-        contador += 1
-    
-    return datas
+    return datas_execucao(pmp, pmp.data_inicio_plano, date.today())
 
 def obter_dados_validos_equipamento(equipamento_id):
     """Obtém dados válidos do equipamento e relacionamentos"""
@@ -222,17 +165,42 @@ def api_gerar_todas_os_simples():
                 'error': 'Modelos não disponíveis'
             }), 500
         
+        from routes.usuario_helper import buscar_nomes_usuarios, buscar_nome_usuario_por_id
+        from routes.verificador_duplicatas_os import (
+            carregar_estado_os_pmp, datas_os_ocorrencia, inserir_os_ignorando_duplicatas
+        )
+        from auto_transferir_atividades import criar_atividades_os
+        
         # Buscar PMPs ativas com data de início
         pmps = PMP.query.filter(
             PMP.status == 'ativo',
             PMP.data_inicio_plano.isnot(None)
         ).all()
         
-        os_geradas = []
-        total_os_geradas = 0
         pmps_processadas = 0
         erros = 0
         
+        # Carregar de uma vez os nomes dos responsáveis de todas as PMPs (ficam em cache)
+        responsaveis_pmp = {}
+        for pmp in pmps:
+            try:
+                responsaveis = json.loads(pmp.usuarios_responsaveis) if pmp.usuarios_responsaveis else []
+            except (TypeError, ValueError):
+                responsaveis = []
+            responsaveis_pmp[pmp.id] = responsaveis
+        buscar_nomes_usuarios([r[0] for r in responsaveis_pmp.values() if r])
+        
+        usuario_criacao = getattr(current_user, 'username', 'sistema')
+        agora = datetime.now()
+        
+        # Montar as OS das ocorrências do cronograma que ainda não têm OS, numeradas
+        # a partir da última sequência da PMP; uma ocorrência gerada por outro
+        # processo no meio tempo é descartada pelo ON CONFLICT (pmp_id, data_ocorrencia)
+        estado = carregar_estado_os_pmp([pmp.id for pmp in pmps], OrdemServico, db)
+        linhas_os = []
+        resumo_os = {}
+        datas_existentes = 0
+        
         for pmp in pmps:
             try:
                 # Verificar se PMP não expirou
@@ -255,144 +223,102 @@ def api_gerar_todas_os_simples():
                 
                 pmps_processadas += 1
                 
-                # Gerar OS para cada data do cronograma
-                for i, data_programada in enumerate(cronograma, 1):
-                    try:
-                        # Verificação robusta de OS existente
-                        from routes.verificador_duplicatas_os import verificar_os_existente_robusta
-                        
-                        os_existente = verificar_os_existente_robusta(
-                            pmp=pmp,
-                            data_programada=data_programada,
-                            numero_sequencia=i,
-                            OrdemServico=OrdemServico
-                        )
-                        
-                        if os_existente:
-                            current_app.logger.info(f"⚠️ OS já existe para PMP {pmp.codigo} sequência {i}: ID {os_existente.id}")
-                            continue  # OS já existe
-                        
-                        # Criar nova OS com todos os campos obrigatórios
-                        sequencia = f"#{i:03d}"
-                        descricao = f"PMP: {pmp.descricao} - Sequência {sequencia}"
-                        
-                        # Calcular hh (horas-homem)
-                        qtd_pessoas = pmp.num_pessoas or 1
-                        horas = pmp.tempo_pessoa or 1.0
-                        hh = qtd_pessoas * horas
-                        
-                        # Verificar se PMP tem usuários responsáveis
-                        usuarios_responsaveis = []
-                        if pmp.usuarios_responsaveis:
-                            try:
-                                import json
-                                usuarios_responsaveis = json.loads(pmp.usuarios_responsaveis)
-                            except:
-                                usuarios_responsaveis = []
-                        
-                        # Determinar status e usuário responsável
-                        if usuarios_responsaveis and len(usuarios_responsaveis) > 0:
-                            # PMP tem usuário designado - criar como programada
-                            status_os = 'programada'
-                            
-                            # Buscar nome do usuário pelo ID
-                            from routes.usuario_helper import buscar_nome_usuario_por_id
-                            user_id = usuarios_responsaveis[0]  # Primeiro usuário da lista
-                            usuario_responsavel = buscar_nome_usuario_por_id(user_id)
-                            
-                            current_app.logger.info(f"📋 OS {sequencia} para PMP {pmp.codigo}: PROGRAMADA para usuário ID {user_id} → Nome: {usuario_responsavel} em {data_programada}")
-                        else:
-                            # PMP sem usuário designado - criar como aberta
-                            status_os = 'aberta'
-                            usuario_responsavel = None
-                            current_app.logger.info(f"📋 OS {sequencia} para PMP {pmp.codigo}: ABERTA (sem usuário) em {data_programada}")
-                        
-                        current_app.logger.info(f"🔧 Criando OS: Status={status_os}, Usuário={usuario_responsavel}, Data={data_programada}")
-                        
-                        nova_os = OrdemServico(
-                            # Campos obrigatórios básicos
-                            descricao=descricao,
-                            tipo_manutencao='preventiva-periodica',
-                            oficina=pmp.oficina or 'mecanica',
-                            condicao_ativo='funcionando',
-                            qtd_pessoas=qtd_pessoas,
-                            horas=horas,
-                            hh=hh,
-                            prioridade='media',
-                            status=status_os,  # ← CORRIGIDO: aberta ou programada conforme PMP
-                            
-                            # Campos de relacionamento obrigatórios (VALIDADOS)
-                            equipamento_id=pmp.equipamento_id,
-                            filial_id=dados_equipamento['filial_id'],
-                            setor_id=dados_equipamento['setor_id'],
-                            
-                            # Campos de empresa e usuário obrigatórios
-                            empresa=dados_equipamento['empresa'],
-                            usuario_criacao=getattr(current_user, 'username', 'sistema'),
-                            usuario_responsavel=usuario_responsavel,  # ← CORRIGIDO: usuário da PMP ou None
-                            
-                            # Campos de data
-                            data_programada=data_programada if status_os == 'programada' else None,  # ← CORRIGIDO: só se programada
-                            data_criacao=datetime.now(),
-                            
-                            # Campos específicos de PMP
-                            pmp_id=pmp.id,
-                            frequencia_origem=pmp.frequencia,
-                            numero_sequencia=i
-                        )
-                        
-                        db.session.add(nova_os)
-                        db.session.flush()  # Garante que nova_os.id esteja disponível
+                # Calcular hh (horas-homem)
+                qtd_pessoas = pmp.num_pessoas or 1
+                horas = pmp.tempo_pessoa or 1.0
+                hh = qtd_pessoas * horas
+                
+                # Determinar status e usuário responsável
+                usuarios_responsaveis = responsaveis_pmp.get(pmp.id) or []
+                if usuarios_responsaveis:
+                    # PMP tem usuário designado - criar como programada
+                    status_os = 'programada'
+                    usuario_responsavel = buscar_nome_usuario_por_id(usuarios_responsaveis[0])
+                else:
+                    # PMP sem usuário designado - criar como aberta
+                    status_os = 'aberta'
+                    usuario_responsavel = None
+                
+                current_app.logger.info(f"📋 PMP {pmp.codigo}: {len(cronograma)} OS no cronograma, status {status_os}, usuário {usuario_responsavel}")
+                
+                sequencia = estado['sequencias'].get(pmp.id, 0)
+                for data_ocorrencia in cronograma:
+                    if (pmp.id, data_ocorrencia) in estado['ocorrencias']:
+                        datas_existentes += 1
+                        continue
+                    
+                    sequencia += 1
+                    descricao = f"PMP: {pmp.descricao} - Sequência #{sequencia:03d}"
+                    
+                    linhas_os.append({
+                        # Campos obrigatórios básicos
+                        'descricao': descricao,
+                        'tipo_manutencao': 'preventiva-periodica',
+                        'oficina': pmp.oficina or 'mecanica',
+                        'condicao_ativo': 'funcionando',
+                        'qtd_pessoas': qtd_pessoas,
+                        'horas': horas,
+                        'hh': hh,
+                        'prioridade': 'media',
+                        'status': status_os,
                         
-                        # 🔧 TRANSFERIR ATIVIDADES DA PMP PARA A OS
-                        try:
-                            from models.pmp_limpo import AtividadePMP
-                            from models.atividade_os import AtividadeOS
-                            
-                            # Buscar atividades da PMP
-                            atividades_pmp = AtividadePMP.query.filter_by(pmp_id=pmp.id).order_by(AtividadePMP.ordem).all()
-                            
-                            atividades_criadas = 0
-                            for atividade_pmp in atividades_pmp:
-                                nova_atividade_os = AtividadeOS(
-                                    os_id=nova_os.id,
-                                    atividade_pmp_id=atividade_pmp.id,
-                                    descricao=atividade_pmp.descricao,
-                                    ordem=atividade_pmp.ordem,
-                                    status='pendente'
-                                )
-                                db.session.add(nova_atividade_os)
-                                atividades_criadas += 1
-                            
-                            current_app.logger.info(f"✅ {atividades_criadas} atividades transferidas da PMP {pmp.codigo} para OS {nova_os.id}")
-                            
-                        except Exception as atividade_error:
-                            current_app.logger.warning(f"⚠️ Erro ao transferir atividades da PMP {pmp.codigo}: {atividade_error}")
-                            # Não falhar a criação da OS por causa das atividades
+                        # Campos de relacionamento obrigatórios (VALIDADOS)
+                        'equipamento_id': pmp.equipamento_id,
+                        'filial_id': dados_equipamento['filial_id'],
+                        'setor_id': dados_equipamento['setor_id'],
                         
-                        # Commit individual para evitar rollback em massa
-                        db.session.commit()
+                        # Campos de empresa e usuário obrigatórios
+                        'empresa': dados_equipamento['empresa'],
+                        'usuario_criacao': usuario_criacao,
+                        'usuario_responsavel': usuario_responsavel,
                         
-                        os_geradas.append({
-                            'descricao': descricao,
-                            'data_programada': data_programada.isoformat(),
-                            'pmp_codigo': pmp.codigo,
-                            'sequencia': i
-                        })
-                        total_os_geradas += 1
+                        # Campos de data (a ocorrência do cronograma identifica a OS da PMP)
+                        **datas_os_ocorrencia(estado, pmp.id, data_ocorrencia),
+                        'data_criacao': agora,
                         
-                    except Exception as e:
-                        db.session.rollback()
-                        current_app.logger.error(f"❌ Erro ao criar OS {i} para PMP {pmp.codigo}: {e}")
-                        erros += 1
-                        continue
+                        # Campos específicos de PMP
+                        'pmp_id': pmp.id,
+                        'frequencia_origem': pmp.frequencia,
+                        'numero_sequencia': sequencia
+                    })
+                    resumo_os[(pmp.id, sequencia)] = {
+                        'descricao': descricao,
+                        'data_programada': data_ocorrencia.isoformat(),
+                        'pmp_codigo': pmp.codigo,
+                        'sequencia': sequencia
+                    }
                 
             except Exception as e:
                 current_app.logger.error(f"❌ Erro ao processar PMP {pmp.codigo}: {e}")
                 erros += 1
                 continue
         
-        current_app.logger.info(f"✅ Geração concluída: {total_os_geradas} OS geradas, {erros} erros")
+        inseridas = inserir_os_ignorando_duplicatas(linhas_os, OrdemServico, db)
+        
+        # 🔧 TRANSFERIR ATIVIDADES DAS PMPs PARA AS OS NOVAS (um único INSERT ... SELECT)
+        if inseridas:
+            atividades_criadas = criar_atividades_os([os_id for os_id, _, _ in inseridas])
+            current_app.logger.info(f"✅ {atividades_criadas} atividades transferidas para {len(inseridas)} OS")
+        
+        db.session.commit()
+        
+        os_geradas = [resumo_os[(pmp_id, sequencia)] for _, pmp_id, sequencia in inseridas]
+        total_os_geradas = len(os_geradas)
+        os_ja_existentes = datas_existentes + len(linhas_os) - total_os_geradas
+        
+        current_app.logger.info(f"✅ Geração concluída: {total_os_geradas} OS geradas, {os_ja_existentes} já existentes, {erros} erros")
+        registrar_evento(
+            'geracao_os',
+            f"{total_os_geradas} OS geradas, {os_ja_existentes} já existentes, {erros} erros",
+            nivel='WARNING' if erros else 'INFO',
+            dados={
+                'pmps_processadas': pmps_processadas,
+                'os_geradas': total_os_geradas,
+                'os_ja_existentes': os_ja_existentes,
+                'erros': erros,
+                'usuario': usuario_criacao
+            }
+        )
         
         return jsonify({
             'success': True,
@@ -400,7 +326,7 @@ def api_gerar_todas_os_simples():
             'estatisticas': {
                 'pmps_processadas': pmps_processadas,
                 'os_geradas': total_os_geradas,
-                'os_ja_existentes': 0,
+                'os_ja_existentes': os_ja_existentes,
                 'erros': erros
             },
             'os_geradas': os_geradas,
@@ -410,6 +336,7 @@ def api_gerar_todas_os_simples():
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"❌ Erro na API simples de geração: {e}")
+        registrar_evento('geracao_os', f"Erro na geração de OS: {e}", nivel='ERROR')
         return jsonify({
             'success': False,
             'error': f'Erro interno: {str(e)}'
@@ -454,32 +381,6 @@ def api_executar_automatico_simples():
             'error': f'Erro interno: {str(e)}'
         }), 500
 
-@pmp_simple_api_bp.route('/api/pmp/auto/status', methods=['GET'])
-def api_status_simples():
-    """Status simplificado do sistema automático"""
-    try:
-        return jsonify({
-            'success': True,
-            'status': {
-                'timestamp': datetime.now().isoformat(),
-                'sistema_ativo': True,
-                'modo_automatico': True,
-                'versao': 'final_com_validacao_fk',
-                'scheduler': {
-                    'running': True,
-                    'last_execution': datetime.now().isoformat(),
-                    'next_execution': (datetime.now() + timedelta(hours=1)).isoformat()
-                }
-            }
-        })
-        
-    except Exception as e:
-        current_app.logger.error(f"❌ Erro no status simples: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'Erro interno: {str(e)}'
-        }), 500
-
 @pmp_simple_api_bp.route('/debug/filiais-setores', methods=['GET'])
 def debug_filiais_setores():
     """Endpoint de debug para verificar filiais e setores disponíveis"""
@@ -4,14 +4,19 @@ API para programação de OS via drag and drop
 Atualiza usuário responsável e data programada
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, session
+from flask_login import current_user, login_required
 from datetime import datetime, date
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from models import db
 
 # Importações dos modelos
 try:
     from assets_models import OrdemServico
+    from estatisticas_agregadas import estatisticas_os
+    from programacao_lote import programar_os_em_lote, LIMITE_ITENS_LOTE
+    from programacao_automatica import previa_programacao
     OS_AVAILABLE = True
 except ImportError as e:
     current_app.logger.error(f"Erro ao importar modelo OrdemServico: {e}")
@@ -19,6 +24,12 @@ except ImportError as e:
 
 programacao_api_bp = Blueprint('programacao_api', __name__)
 
+def obter_empresa_usuario():
+    """Empresa do usuário logado (None se não houver usuário: estatísticas de todas as empresas)"""
+    if current_user.is_authenticated:
+        return current_user.company
+    return session.get('user_company')
+
 @programacao_api_bp.route('/api/ordens-servico/<int:os_id>/programar', methods=['POST'])
 def programar_os(os_id):
     """
@@ -58,7 +69,12 @@ def programar_os(os_id):
         os.status = 'programada'  # Mudar status para programada
         
         # Salvar no banco
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            current_app.logger.warning(f"⚠️ PMP {os.pmp_id} já tem OS programada em {data_programada}")
+            return jsonify({'error': 'Já existe uma OS desta PMP programada para esta data'}), 409
         
         current_app.logger.info(f"✅ OS {os_id} programada para {usuario_responsavel} em {data_programada}")
         
@@ -78,6 +94,127 @@ def programar_os(os_id):
         db.session.rollback()
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@programacao_api_bp.route('/api/ordens-servico/programar-lote', methods=['POST'])
+@login_required
+def programar_os_lote():
+    """
+    Programa várias OS numa única transação
+    Corpo: {"itens": [{"os_id", "data_programada", "usuario_responsavel", "prioridade"}]}
+    (prioridade opcional). Retorna um resultado por item, na mesma ordem.
+    """
+    if not OS_AVAILABLE:
+        return jsonify({'error': 'Funcionalidade de OS não disponível'}), 503
+
+    try:
+        data = request.get_json(silent=True) or {}
+        itens = data.get('itens')
+
+        if not isinstance(itens, list) or not itens:
+            return jsonify({'error': 'Informe a lista de itens'}), 400
+        if len(itens) > LIMITE_ITENS_LOTE:
+            return jsonify({'error': f'Máximo de {LIMITE_ITENS_LOTE} OS por lote'}), 400
+
+        empresa = obter_empresa_usuario()
+        current_app.logger.info(f"📅 Programando {len(itens)} OS em lote ({empresa})")
+        return _programar_lote(itens, empresa)
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao programar OS em lote: {e}", exc_info=True)
+        db.session.rollback()
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+def _programar_lote(itens, empresa, **extras):
+    """Programa os itens numa transação e monta a resposta (409 se o lote inteiro conflitar)"""
+    try:
+        resultado = programar_os_em_lote(itens, empresa)
+    except IntegrityError:
+        db.session.rollback()
+        current_app.logger.warning("⚠️ Conflito de PMP + data ao programar OS em lote; nenhuma OS alterada")
+        return jsonify({'error': 'Já existe uma OS de uma destas PMPs programada para a data; '
+                                 'nenhuma OS foi alterada'}), 409
+
+    if resultado['programadas']:
+        from routes.ordens_servico import invalidar_contagem_os
+        invalidar_contagem_os(empresa)
+
+    current_app.logger.info(f"✅ {resultado['programadas']} OS programadas, {resultado['rejeitadas']} rejeitadas")
+
+    return jsonify({
+        'success': True,
+        'message': f"{resultado['programadas']} de {len(itens)} OS programadas",
+        **resultado,
+        **extras
+    }), 200
+
+@programacao_api_bp.route('/api/programacao/automatica/previa', methods=['POST'])
+@login_required
+def previa_programacao_automatica():
+    """
+    Prévia da programação automática por capacidade (não grava)
+    Corpo: {"semana", "semanas", "tecnicos": [{"nome", "hh_semana", "oficinas"}],
+    "oficinas": {oficina: hh_semana}}, todos opcionais
+    """
+    if not OS_AVAILABLE:
+        return jsonify({'error': 'Funcionalidade de OS não disponível'}), 503
+
+    try:
+        dados = request.get_json(silent=True) or {}
+        try:
+            previa = previa_programacao(obter_empresa_usuario(), dados)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({'success': True, **previa}), 200
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro na prévia da programação automática: {e}", exc_info=True)
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@programacao_api_bp.route('/api/programacao/automatica/aplicar', methods=['POST'])
+@login_required
+def aplicar_programacao_automatica():
+    """
+    Aplica a programação automática
+    Com "alocacoes" (as da prévia, revisadas pelo planejador) grava exatamente
+    essas; sem elas, recalcula com os mesmos parâmetros da prévia e grava o
+    resultado. OS que mudaram desde a prévia são revalidadas item a item.
+    """
+    if not OS_AVAILABLE:
+        return jsonify({'error': 'Funcionalidade de OS não disponível'}), 503
+
+    try:
+        dados = request.get_json(silent=True) or {}
+        empresa = obter_empresa_usuario()
+        extras = {}
+
+        alocacoes = dados.get('alocacoes')
+        if alocacoes is None:
+            try:
+                previa = previa_programacao(empresa, dados)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            alocacoes = previa['alocacoes']
+            extras = {'nao_alocadas': previa['nao_alocadas'], 'uso': previa['uso']}
+        elif not isinstance(alocacoes, list):
+            return jsonify({'error': 'alocacoes deve ser uma lista'}), 400
+
+        if not alocacoes:
+            return jsonify({'success': True, 'message': 'Nenhuma OS para programar', 'resultados': [],
+                            'programadas': 0, 'rejeitadas': 0, **extras}), 200
+
+        itens = [
+            {campo: alocacao.get(campo) for campo in ('os_id', 'data_programada', 'usuario_responsavel')}
+            if isinstance(alocacao, dict) else alocacao
+            for alocacao in alocacoes
+        ]
+        current_app.logger.info(f"🗓️ Aplicando programação automática: {len(itens)} OS ({empresa})")
+        return _programar_lote(itens, empresa, **extras)
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao aplicar programação automática: {e}", exc_info=True)
+        db.session.rollback()
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
 @programacao_api_bp.route('/api/ordens-servico/<int:os_id>/desprogramar', methods=['POST'])
 def desprogramar_os(os_id):
     """
@@ -190,63 +327,26 @@ def obter_estatisticas_programacao():
         
         hoje = date.today()
         
-        # Contar OS por status
-        query_status = text("""
-            SELECT 
-                status,
-                COUNT(*) as total
-            FROM ordens_servico 
-            WHERE status IN ('aberta', 'programada', 'em_execucao', 'concluida')
-            GROUP BY status
-        """)
-        
-        result_status = db.session.execute(query_status)
-        stats_status = {row[0]: row[1] for row in result_status}
-        
-        # Contar OS por prioridade (apenas abertas)
-        query_prioridade = text("""
-            SELECT 
-                prioridade,
-                COUNT(*) as total
-            FROM ordens_servico 
-            WHERE status = 'aberta'
-            GROUP BY prioridade
-        """)
-        
-        result_prioridade = db.session.execute(query_prioridade)
-        stats_prioridade = {row[0]: row[1] for row in result_prioridade}
-        
-        # Contar OS programadas por usuário
-        query_usuarios = text("""
-            SELECT 
-                usuario_responsavel,
-                COUNT(*) as total
-            FROM ordens_servico 
-            WHERE status = 'programada' 
-            AND usuario_responsavel IS NOT NULL
-            GROUP BY usuario_responsavel
-            ORDER BY total DESC
-        """)
-        
-        result_usuarios = db.session.execute(query_usuarios)
-        stats_usuarios = [{'usuario': row[0], 'total_os': row[1]} for row in result_usuarios]
-        
-        # Contar OS de PMP
-        query_pmp = text("""
-            SELECT 
-                COUNT(*) as total_pmp,
-                COUNT(CASE WHEN status = 'aberta' THEN 1 END) as pmp_abertas,
-                COUNT(CASE WHEN status = 'programada' THEN 1 END) as pmp_programadas
-            FROM ordens_servico 
-            WHERE pmp_id IS NOT NULL
-        """)
-        
-        result_pmp = db.session.execute(query_pmp)
-        pmp_row = result_pmp.fetchone()
+        # Todos os contadores saem da mesma consulta agrupada (em cache)
+        stats = estatisticas_os(obter_empresa_usuario())
+        
+        stats_status = {
+            status: total for status, total in stats['por_status'].items()
+            if status in ('aberta', 'programada', 'em_execucao', 'concluida')
+        }
+        stats_prioridade = stats['por_status_prioridade'].get('aberta', {})
+        
+        usuarios_programados = stats['por_status_usuario'].get('programada', {})
+        stats_usuarios = [
+            {'usuario': usuario, 'total_os': total}
+            for usuario, total in sorted(usuarios_programados.items(), key=lambda item: item[1], reverse=True)
+        ]
+        
+        pmp_por_status = stats['pmp_por_status']
         stats_pmp = {
-            'total': pmp_row[0] if pmp_row else 0,
-            'abertas': pmp_row[1] if pmp_row else 0,
-            'programadas': pmp_row[2] if pmp_row else 0
+            'total': sum(pmp_por_status.values()),
+            'abertas': pmp_por_status.get('aberta', 0),
+            'programadas': pmp_por_status.get('programada', 0)
         }
         
         return jsonify({
@@ -8,8 +8,12 @@ import io
 import logging
 from datetime import datetime, timedelta
 from collections import defaultdict
-from flask import Blueprint, current_app, send_file, jsonify
+from flask import Blueprint, current_app, request, send_file, jsonify
 from flask_login import login_required, current_user
+from recorrencia_pmp import (
+    semanas_com_ocorrencia, converter_data, semanas_estimadas,
+    interpretar_frequencia, frequencia_da_pmp
+)
 from sqlalchemy import text
 
 
@@ -72,13 +76,44 @@ def buscar_equipamentos(empresa):
 def buscar_pmps(equipamento_id):
     """Busca PMPs de um equipamento usando SQL direto."""
     query = """
-    SELECT id, codigo, descricao, frequencia
+    SELECT id, codigo, descricao, frequencia, frequencia_canonica, frequencia_intervalo,
+           data_inicio_plano, data_fim_plano, dias_semana
     FROM pmps 
     WHERE equipamento_id = :equipamento_id
     ORDER BY codigo
     """
     return executar_sql(query, {'equipamento_id': equipamento_id})
 
+def buscar_pmps_empresa(empresa):
+    """Busca todas as PMPs dos equipamentos da empresa em uma única consulta."""
+    query = """
+    SELECT p.id, p.codigo, p.descricao, p.frequencia, p.frequencia_canonica, p.frequencia_intervalo,
+           p.data_inicio_plano, p.data_fim_plano, p.dias_semana, p.equipamento_id
+    FROM pmps p
+    JOIN equipamentos e ON e.id = p.equipamento_id
+    WHERE e.empresa = :empresa
+    ORDER BY p.codigo
+    """
+    return executar_sql(query, {'empresa': empresa})
+
+def buscar_os_pmps_empresa(empresa, data_inicio, data_fim):
+    """Busca todas as OS de PMPs da empresa no período, da mais recente para a mais antiga."""
+    query = """
+    SELECT os.pmp_id, os.id, os.status, os.data_criacao
+    FROM ordens_servico os
+    JOIN pmps p ON p.id = os.pmp_id
+    JOIN equipamentos e ON e.id = p.equipamento_id
+    WHERE e.empresa = :empresa
+    AND os.data_criacao >= :data_inicio
+    AND os.data_criacao <= :data_fim
+    ORDER BY os.data_criacao DESC, os.id DESC
+    """
+    return executar_sql(query, {
+        'empresa': empresa,
+        'data_inicio': data_inicio,
+        'data_fim': data_fim
+    })
+
 def buscar_os_semana(pmp_id, data_inicio, data_fim):
     """Busca OS de uma PMP em uma semana específica usando SQL direto."""
     query = """
@@ -166,26 +201,21 @@ def calcular_semanas_ano(ano):
 # ---------- Frequências de PMP ----------
 def semanas_planejadas(frequencia):
     """Retorna as semanas em que a PMP deve ser executada baseado na frequência."""
-    freq = (frequencia or "").lower().strip()
-    
-    if "diario" in freq or "diária" in freq:
-        return list(range(1, 53))  # Todas as semanas
-    elif "semanal" in freq:
-        return list(range(1, 53))  # Todas as semanas
-    elif "quinzenal" in freq:
-        return list(range(1, 53, 2))  # A cada 2 semanas
-    elif "mensal" in freq:
-        return list(range(1, 53, 4))  # A cada 4 semanas
-    elif "bimestral" in freq:
-        return list(range(1, 53, 8))  # A cada 8 semanas
-    elif "trimestral" in freq:
-        return list(range(1, 53, 12))  # A cada 12 semanas
-    elif "semestral" in freq:
-        return list(range(1, 53, 26))  # A cada 26 semanas
-    elif "anual" in freq:
-        return [1]  # Apenas primeira semana
-    else:
-        return []  # Frequência desconhecida
+    # Frequência desconhecida: nenhuma semana
+    return semanas_estimadas(*interpretar_frequencia(frequencia))
+
+def semanas_planejadas_pmp(pmp, semanas_ano):
+    """
+    Retorna as semanas planejadas da PMP usando o mesmo cálculo de recorrência
+    dos geradores de OS; sem data de início, usa a estimativa por frequência.
+    """
+    if getattr(pmp, "data_inicio_plano", None):
+        return semanas_com_ocorrencia(pmp, semanas_ano)
+    if not pmp.frequencia:
+        return set(semanas_estimadas("mensal"))
+    return set(semanas_estimadas(*frequencia_da_pmp(pmp)))
+
+STATUS_VAZIO = ("nao_gerada", None)
 
 # ---------- Função: status_os_na_semana ----------
 def status_os_na_semana(pmp_id, semana):
@@ -223,15 +253,52 @@ def status_os_na_semana(pmp_id, semana):
         logger.exception(f"[REL52] ❌ Erro ao consultar OS (PMP={pmp_id}): {e}")
         return "erro", None
 
+# ---------- Matriz de status (PMP x semana) ----------
+def construir_matriz_status(empresa, semanas_ano):
+    """
+    Monta a matriz de status das OS de PMP da empresa no ano com uma única consulta.
+
+    Args:
+        empresa (str): Empresa do usuário
+        semanas_ano (list): Semanas retornadas por calcular_semanas_ano
+
+    Returns:
+        dict: {pmp_id: [(status, os_id), ...]} com uma posição por semana;
+              PMPs sem OS no ano não aparecem (usar linha_matriz_status)
+    """
+    primeira_segunda = semanas_ano[0]["inicio"]
+    ini = datetime.combine(primeira_segunda, datetime.min.time())
+    fim = datetime.combine(semanas_ano[-1]["fim"], datetime.max.time())
+
+    linhas = buscar_os_pmps_empresa(empresa, ini, fim)
+    matriz = {}
+
+    # Ordenado da mais recente para a mais antiga: a primeira OS de cada célula prevalece
+    for pmp_id, os_id, status, data_criacao in linhas:
+        indice = (converter_data(data_criacao) - primeira_segunda).days // 7
+        if not 0 <= indice < len(semanas_ano):
+            continue
+        linha = matriz.setdefault(pmp_id, [STATUS_VAZIO] * len(semanas_ano))
+        if linha[indice] is STATUS_VAZIO:
+            status = (status or "").lower()
+            linha[indice] = ("concluida" if "concl" in status or "final" in status else "gerada", os_id)
+
+    logger.info(f"[REL52] 📊 Matriz de status: {len(matriz)} PMPs com OS, {len(linhas)} OS no ano")
+    return matriz
+
+def linha_matriz_status(matriz, pmp_id, semanas_ano):
+    """Retorna a linha da matriz para a PMP (todas 'nao_gerada' se não houver OS)."""
+    return matriz.get(pmp_id) or [STATUS_VAZIO] * len(semanas_ano)
+
 # ---------- Função: status_os_na_semanahh_por_mes_oficina ----------
-def hh_por_mes_oficina(ano):
+def hh_por_mes_oficina(ano, empresa):
     """
-    Calcula HH por mês e por oficina com base nas OS concluídas,
+    Calcula HH por mês e por oficina com base nas OS concluídas da empresa,
     considerando o valor de HH armazenado em 'ordens_servico.hh'
     e a oficina associada à PMP.
     """
     try:
-        logger.info(f"[REL52] 🚀 Iniciando cálculo de HH por mês/oficina para o ano {ano}")
+        logger.info(f"[REL52] 🚀 Iniciando cálculo de HH por mês/oficina para o ano {ano} ({empresa})")
 
         # Consulta SQL corrigida (usa os.hh)
         query = """
@@ -244,9 +311,10 @@ def hh_por_mes_oficina(ano):
         FROM ordens_servico os
         LEFT JOIN pmps p ON os.pmp_id = p.id
         WHERE EXTRACT(YEAR FROM os.data_criacao) = :ano
+          AND os.empresa = :empresa
         ORDER BY os.data_criacao
         """
-        os_detalhadas = executar_sql(query, {'ano': ano})
+        os_detalhadas = executar_sql(query, {'ano': ano, 'empresa': empresa})
 
         if not os_detalhadas:
             logger.warning(f"[REL52] ⚠️ Nenhuma OS encontrada para o ano {ano}.")
@@ -308,16 +376,30 @@ def hh_por_mes_oficina(ano):
 
 
 # ---------- Geração do PDF ----------
-def gerar_pdf_52_semanas(ano):
-    """Gera PDF com 1 equipamento por página, 2 tabelas (1–26 e 27–52), conforme modelo visual."""
-    logger.info("[REL52] 🚀 Gerando plano de 52 semanas (ano=%s)", ano)
+def gerar_pdf_52_semanas(ano, empresa=None):
+    """
+    Gera PDF com 1 equipamento por página, 2 tabelas (1–26 e 27–52), conforme modelo visual.
+
+    Args:
+        ano (int): Ano do plano
+        empresa (str): Empresa do relatório (padrão: empresa do usuário logado);
+                       obrigatória fora de uma requisição, como nos jobs em background
+    """
+    empresa = empresa or current_user.company
+    logger.info("[REL52] 🚀 Gerando plano de 52 semanas (ano=%s, empresa=%s)", ano, empresa)
 
     try:
         verificar_estrutura_tabelas()
         semanas_ano = calcular_semanas_ano(ano)
-        equipamentos = buscar_equipamentos(current_user.company)
+        equipamentos = buscar_equipamentos(empresa)
         logger.info(f"[REL52] 🔧 {len(equipamentos)} equipamentos encontrados.")
 
+        # PMPs e status de todas as células (PMP x semana) em duas consultas
+        pmps_por_equipamento = defaultdict(list)
+        for pmp in buscar_pmps_empresa(empresa):
+            pmps_por_equipamento[pmp[7]].append(pmp)
+        matriz_status = construir_matriz_status(empresa, semanas_ano)
+
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(
             buffer,
@@ -350,7 +432,7 @@ def gerar_pdf_52_semanas(ano):
         for equipamento in equipamentos:
             equipamento_id = equipamento[0]
             equipamento_nome = equipamento[1]
-            pmps = buscar_pmps(equipamento_id)
+            pmps = pmps_por_equipamento.get(equipamento_id, [])
             logger.info(f"[REL52] 📋 Equipamento {equipamento_nome}: {len(pmps)} PMPs")
 
             if not pmps:
@@ -360,31 +442,16 @@ def gerar_pdf_52_semanas(ano):
             elements.append(Paragraph(f"Equipamento: {equipamento_nome}", heading_style))
             elements.append(Spacer(1, 5))
 
+            linhas_pmp = [
+                (pmp, semanas_planejadas_pmp(pmp, semanas_ano),
+                 linha_matriz_status(matriz_status, pmp[0], semanas_ano))
+                for pmp in pmps
+            ]
+
             def gerar_tabela(inicio, fim):
                 header = ["PMP"] + [str(i) for i in range(inicio, fim + 1)]
                 table_data = [header]
 
-                for pmp in pmps:
-                    pmp_id = pmp[0]
-                    pmp_codigo = pmp[1] or f"PMP-{pmp_id}"
-                    pmp_freq = pmp[3] or "mensal"
-                    semanas_exec = semanas_planejadas(pmp_freq)
-
-                    row = [pmp_codigo]
-                    for semana in semanas_ano[inicio - 1:fim]:
-                        status, os_num = status_os_na_semana(pmp_id, semana)
-                        if os_num:
-                            texto = str(os_num)
-                        elif semana["numero"] in semanas_exec:
-                            texto = "*"
-                        else:
-                            texto = ""
-                        row.append(texto)
-                    table_data.append(row)
-
-                col_widths = [30 * mm] + [6 * mm] * (fim - inicio + 1)
-                table = Table(table_data, colWidths=col_widths)
-
                 # Estilo
                 estilo = TableStyle([
                     ('GRID', (0, 0), (-1, -1), 0.4, colors.black),
@@ -395,32 +462,32 @@ def gerar_pdf_52_semanas(ano):
                     ('FONTNAME', (0, 1), (-1, -1), 'Helvetica-Bold'),
                 ])
 
-                # Colorir conforme status
-                for row_idx in range(1, len(table_data)):
-                    pmp = pmps[row_idx - 1]
-                    pmp_id = pmp[0]
-                    pmp_freq = pmp[3] or "mensal"
-                    semanas_exec = semanas_planejadas(pmp_freq)
+                # Texto e cor de cada célula saem da mesma linha da matriz
+                for row_idx, (pmp, semanas_exec, statuses) in enumerate(linhas_pmp, start=1):
+                    row = [pmp[1] or f"PMP-{pmp[0]}"]
+                    for col_idx, semana_num in enumerate(range(inicio, fim + 1), start=1):
+                        status, os_num = statuses[semana_num - 1]
+                        celula = (col_idx, row_idx)
 
-                    for col_idx in range(1, len(table_data[row_idx])):
-                        semana_num = inicio + col_idx - 1
-                        if semana_num > fim:
-                            continue
-                        semana = semanas_ano[semana_num - 1]
-                        status, _ = status_os_na_semana(pmp_id, semana)
+                        if os_num:
+                            row.append(str(os_num))
+                        elif semana_num in semanas_exec:
+                            row.append("*")
+                        else:
+                            row.append("")
 
                         if status == "concluida":
-                            estilo.add('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx),
-                                       colors.Color(0.2, 0.8, 0.2))  # Verde
-                            estilo.add('TEXTCOLOR', (col_idx, row_idx), (col_idx, row_idx), colors.white)
+                            estilo.add('BACKGROUND', celula, celula, colors.Color(0.2, 0.8, 0.2))  # Verde
+                            estilo.add('TEXTCOLOR', celula, celula, colors.white)
                         elif status == "gerada":
-                            estilo.add('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx),
-                                       colors.Color(0.4, 0.4, 0.4))  # Cinza escuro
-                            estilo.add('TEXTCOLOR', (col_idx, row_idx), (col_idx, row_idx), colors.white)
+                            estilo.add('BACKGROUND', celula, celula, colors.Color(0.4, 0.4, 0.4))  # Cinza escuro
+                            estilo.add('TEXTCOLOR', celula, celula, colors.white)
                         elif semana_num in semanas_exec:
-                            estilo.add('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx),
-                                       colors.Color(0.95, 0.95, 0.95))  # Cinza claro
+                            estilo.add('BACKGROUND', celula, celula, colors.Color(0.95, 0.95, 0.95))  # Cinza claro
+                    table_data.append(row)
 
+                col_widths = [30 * mm] + [6 * mm] * (fim - inicio + 1)
+                table = Table(table_data, colWidths=col_widths)
                 table.setStyle(estilo)
                 return table
 
@@ -435,7 +502,7 @@ def gerar_pdf_52_semanas(ano):
             elements.append(PageBreak())
 
         # ---------- Resumo HH ----------
-        oficinas, tabela_hh = hh_por_mes_oficina(ano)
+        oficinas, tabela_hh = hh_por_mes_oficina(ano, empresa)
         if tabela_hh:
             elements.append(Paragraph("RESUMO DE HORAS-HOMEM POR MÊS E OFICINA", heading_style))
             header_hh = ['Mês'] + oficinas
@@ -472,7 +539,7 @@ def gerar_pdf_52_semanas(ano):
 def gerar_relatorio_52_semanas():
     """Endpoint para gerar o relatório de 52 semanas."""
     try:
-        ano = datetime.now().year
+        ano = request.args.get('ano', datetime.now().year, type=int)
         
         # Gerar PDF
         pdf_buffer = gerar_pdf_52_semanas(ano)
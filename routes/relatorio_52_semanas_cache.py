@@ -10,6 +10,10 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 from flask import Blueprint, current_app, send_file, jsonify
 from flask_login import login_required, current_user
+from recorrencia_pmp import (
+    semanas_com_ocorrencia, converter_data, semanas_estimadas,
+    interpretar_frequencia, frequencia_da_pmp
+)
 
 # ReportLab imports
 from reportlab.lib.pagesizes import A4, landscape
@@ -111,26 +115,17 @@ def calcular_semanas_ano(ano):
 # ---------- Frequências de PMP ----------
 def semanas_planejadas(frequencia):
     """Retorna as semanas em que a PMP deve ser executada baseado na frequência."""
-    freq = (frequencia or "").lower().strip()
-    
-    if "diario" in freq or "diária" in freq:
-        return list(range(1, 53))  # Todas as semanas
-    elif "semanal" in freq:
-        return list(range(1, 53))  # Todas as semanas
-    elif "quinzenal" in freq:
-        return list(range(1, 53, 2))  # A cada 2 semanas
-    elif "mensal" in freq:
-        return list(range(1, 53, 4))  # A cada 4 semanas
-    elif "bimestral" in freq:
-        return list(range(1, 53, 8))  # A cada 8 semanas
-    elif "trimestral" in freq:
-        return list(range(1, 53, 12))  # A cada 12 semanas
-    elif "semestral" in freq:
-        return list(range(1, 53, 26))  # A cada 26 semanas
-    elif "anual" in freq:
-        return [1]  # Apenas primeira semana
-    else:
-        return []  # Frequência desconhecida
+    # Frequência desconhecida: nenhuma semana
+    return semanas_estimadas(*interpretar_frequencia(frequencia))
+
+def semanas_planejadas_pmp(pmp, semanas_ano):
+    """
+    Retorna as semanas planejadas da PMP usando o mesmo cálculo de recorrência
+    dos geradores de OS; sem data de início, usa a estimativa por frequência.
+    """
+    if getattr(pmp, "data_inicio_plano", None):
+        return semanas_com_ocorrencia(pmp, semanas_ano)
+    return set(semanas_estimadas(*frequencia_da_pmp(pmp)))
 
 # ---------- Status da OS ----------
 def status_os_na_semana(pmp_id, semana):
@@ -162,6 +157,61 @@ def status_os_na_semana(pmp_id, semana):
         logger.error("[REL52] Erro ao consultar OS (%s): %s", pmp_id, e)
         return "erro", None
 
+# ---------- Matriz de status (PMP x semana) ----------
+def classificar_status_os(status):
+    """Classifica o status da OS como 'concluida' ou 'gerada'."""
+    status = (status or "").lower()
+    if "conclu" in status or "final" in status:
+        return "concluida"
+    return "gerada"
+
+def construir_matriz_status(pmp_ids, semanas_ano):
+    """
+    Monta a matriz de status das OS de todas as PMPs no ano com uma única consulta.
+
+    Args:
+        pmp_ids (list): IDs das PMPs do relatório
+        semanas_ano (list): Semanas retornadas por calcular_semanas_ano
+
+    Returns:
+        dict: {pmp_id: [(status, os_id), ...]} com uma posição por semana;
+              semanas sem OS ficam como ("nao_gerada", None)
+    """
+    vazio = ("nao_gerada", None)
+    matriz = {pmp_id: [vazio] * len(semanas_ano) for pmp_id in pmp_ids}
+
+    OrdemServico = get_model_safe('OrdemServico')
+    if not OrdemServico or not pmp_ids or not semanas_ano:
+        return matriz
+
+    primeira_segunda = semanas_ano[0]["inicio"]
+    ini = datetime.combine(primeira_segunda, datetime.min.time())
+    fim = datetime.combine(semanas_ano[-1]["fim"], datetime.max.time())
+
+    try:
+        linhas = OrdemServico.query.with_entities(
+            OrdemServico.pmp_id,
+            OrdemServico.id,
+            OrdemServico.status,
+            OrdemServico.data_criacao
+        ).filter(
+            OrdemServico.pmp_id.in_(pmp_ids),
+            OrdemServico.data_criacao >= ini,
+            OrdemServico.data_criacao <= fim
+        ).order_by(OrdemServico.data_criacao.desc(), OrdemServico.id.desc()).all()
+    except Exception as e:
+        logger.error("[REL52] Erro ao montar matriz de status: %s", e)
+        return matriz
+
+    # Ordenado da mais recente para a mais antiga: a primeira OS de cada célula prevalece
+    for pmp_id, os_id, status, data_criacao in linhas:
+        indice = (converter_data(data_criacao) - primeira_segunda).days // 7
+        if 0 <= indice < len(semanas_ano) and matriz[pmp_id][indice] is vazio:
+            matriz[pmp_id][indice] = (classificar_status_os(status), os_id)
+
+    logger.info(f"[REL52] 📊 Matriz de status: {len(pmp_ids)} PMPs, {len(linhas)} OS no ano")
+    return matriz
+
 # ---------- HH por oficina ----------
 def hh_por_mes_oficina(ano):
     """Calcula HH por mês e oficina baseado nas OS concluídas."""
@@ -263,8 +313,20 @@ def gerar_pdf_52_semanas(ano):
         # Calcular semanas do ano
         semanas_ano = calcular_semanas_ano(ano)
         
-        # Buscar equipamentos e suas PMPs
+        # Buscar equipamentos e todas as PMPs da empresa de uma vez
         equipamentos = Equipamento.query.filter_by(empresa=current_user.company).all()
+        pmps_por_equipamento = defaultdict(list)
+        if equipamentos:
+            for pmp in PMP.query.filter(
+                PMP.equipamento_id.in_([e.id for e in equipamentos])
+            ).all():
+                pmps_por_equipamento[pmp.equipamento_id].append(pmp)
+
+        # Status de todas as células (PMP x semana) em uma única consulta
+        matriz_status = construir_matriz_status(
+            [pmp.id for pmps in pmps_por_equipamento.values() for pmp in pmps],
+            semanas_ano
+        )
         
         # Criar PDF
         buffer = io.BytesIO()
@@ -298,8 +360,7 @@ def gerar_pdf_52_semanas(ano):
         
         # Para cada equipamento
         for equipamento in equipamentos:
-            # Buscar PMPs do equipamento
-            pmps = PMP.query.filter_by(equipamento_id=equipamento.id).all()
+            pmps = pmps_por_equipamento.get(equipamento.id)
             
             if not pmps:
                 continue
@@ -312,35 +373,6 @@ def gerar_pdf_52_semanas(ano):
             header = ['Equipamento', 'PMP'] + [str(i) for i in range(1, 53)]
             table_data = [header]
             
-            # Para cada PMP do equipamento
-            for i, pmp in enumerate(pmps):
-                row = [equipamento.descricao if i == 0 else '', pmp.codigo]
-                
-                # Determinar semanas de execução
-                semanas_execucao = semanas_planejadas(pmp.frequencia)
-                
-                # Para cada semana do ano
-                for semana in semanas_ano:
-                    status, os_num = status_os_na_semana(pmp.id, semana)
-                    
-                    # Determinar texto da célula
-                    if status == "concluida" and os_num:
-                        texto = f"{os_num}"  # Apenas o número da OS
-                    elif status == "gerada" and os_num:
-                        texto = f"{os_num}"  # Apenas o número da OS
-                    elif semana['numero'] in semanas_execucao:
-                        texto = "●"  # Planejada mas não gerada
-                    else:
-                        texto = ""  # Não planejada
-                    
-                    row.append(texto)
-                
-                table_data.append(row)
-            
-            # Criar tabela com larguras
-            col_widths = [40*mm, 30*mm] + [6*mm] * 52
-            table = Table(table_data, colWidths=col_widths)
-            
             # Estilo da tabela
             table_style = TableStyle([
                 ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
@@ -355,31 +387,40 @@ def gerar_pdf_52_semanas(ano):
                 ('FONTNAME', (2, 1), (-1, -1), 'Helvetica-Bold'),
             ])
             
-            # Aplicar cores baseadas no status
-            for row_idx in range(1, len(table_data)):
-                pmp = pmps[row_idx - 1]
-                semanas_execucao = semanas_planejadas(pmp.frequencia)
+            # Texto e cor de cada célula saem da mesma linha da matriz
+            for row_idx, pmp in enumerate(pmps, start=1):
+                row = [equipamento.descricao if row_idx == 1 else '', pmp.codigo]
                 
-                for col_idx in range(2, len(table_data[row_idx])):
-                    semana_num = col_idx - 1  # col_idx 2 = semana 1, col_idx 3 = semana 2, etc.
-                    semana_index = semana_num - 1  # Índice no array (0-based)
+                # Determinar semanas de execução
+                semanas_execucao = semanas_planejadas_pmp(pmp, semanas_ano)
+                
+                for semana, (status, os_num) in zip(semanas_ano, matriz_status[pmp.id]):
+                    col_idx = semana['numero'] + 1  # col_idx 2 = semana 1
+                    celula = (col_idx, row_idx)
                     
-                    if 0 <= semana_index < len(semanas_ano):
-                        semana = semanas_ano[semana_index]
-                        status, os_num = status_os_na_semana(pmp.id, semana)
-                        
-                        if status == "concluida":
-                            # Verde para OS concluída
-                            table_style.add('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), colors.Color(0.2, 0.8, 0.2))
-                            table_style.add('TEXTCOLOR', (col_idx, row_idx), (col_idx, row_idx), colors.white)
-                        elif status == "gerada":
-                            # Cinza escuro para OS gerada mas não concluída
-                            table_style.add('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), colors.Color(0.3, 0.3, 0.3))
-                            table_style.add('TEXTCOLOR', (col_idx, row_idx), (col_idx, row_idx), colors.white)
-                        elif semana_num in semanas_execucao:
-                            # Cinza claro para OS planejada mas não gerada
-                            table_style.add('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), colors.Color(0.8, 0.8, 0.8))
-                            table_style.add('TEXTCOLOR', (col_idx, row_idx), (col_idx, row_idx), colors.black)
+                    if status == "concluida":
+                        # Verde para OS concluída
+                        row.append(f"{os_num}")
+                        table_style.add('BACKGROUND', celula, celula, colors.Color(0.2, 0.8, 0.2))
+                        table_style.add('TEXTCOLOR', celula, celula, colors.white)
+                    elif status == "gerada":
+                        # Cinza escuro para OS gerada mas não concluída
+                        row.append(f"{os_num}")
+                        table_style.add('BACKGROUND', celula, celula, colors.Color(0.3, 0.3, 0.3))
+                        table_style.add('TEXTCOLOR', celula, celula, colors.white)
+                    elif semana['numero'] in semanas_execucao:
+                        # Cinza claro para OS planejada mas não gerada
+                        row.append("●")
+                        table_style.add('BACKGROUND', celula, celula, colors.Color(0.8, 0.8, 0.8))
+                        table_style.add('TEXTCOLOR', celula, celula, colors.black)
+                    else:
+                        row.append("")  # Não planejada
+                
+                table_data.append(row)
+            
+            # Criar tabela com larguras
+            col_widths = [40*mm, 30*mm] + [6*mm] * 52
+            table = Table(table_data, colWidths=col_widths)
             
             table.setStyle(table_style)
             elements.append(table)
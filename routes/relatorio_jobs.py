@@ -0,0 +1,399 @@
+"""
+Jobs assíncronos de relatórios
+Gera o PDF do plano de 52 semanas em um pool de workers fora da requisição HTTP
+e guarda o arquivo em disco com TTL. Pedidos repetidos para a mesma
+(empresa, ano, data_version) devolvem o arquivo já gerado na hora.
+
+O estado de cada job também é gravado em disco ({job_id}.estado.json, ao
+lado do PDF), então o status pode ser consultado em qualquer processo do
+gunicorn, não só no que recebeu o pedido. O estado em memória dos jobs
+finalizados (concluídos ou com erro) expira após RELATORIOS_JOBS_TTL
+segundos e o registro é limitado a RELATORIOS_JOBS_MAX entradas; jobs
+concluídos continuam disponíveis pelo cache em disco.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, current_app, request, send_file, jsonify
+from flask_login import login_required, current_user
+
+from routes.relatorio_52_semanas import executar_sql, gerar_pdf_52_semanas
+
+logger = logging.getLogger(__name__)
+
+# Blueprint
+relatorio_jobs_bp = Blueprint('relatorio_jobs', __name__)
+
+# Configuração (variáveis de ambiente)
+RELATORIOS_DIR = os.environ.get(
+    'RELATORIOS_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'relatorios')
+)
+RELATORIOS_TTL = int(os.environ.get('RELATORIOS_CACHE_TTL', 6 * 3600))
+RELATORIOS_WORKERS = int(os.environ.get('RELATORIOS_WORKERS', 2))
+RELATORIOS_JOBS_TTL = int(os.environ.get('RELATORIOS_JOBS_TTL', 3600))
+RELATORIOS_JOBS_MAX = int(os.environ.get('RELATORIOS_JOBS_MAX', 256))
+
+# Status possíveis de um job
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+_executor = ThreadPoolExecutor(max_workers=RELATORIOS_WORKERS, thread_name_prefix='relatorio')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+# job_id -> time.monotonic() da finalização, do mais antigo para o mais novo
+_jobs_finalizados = OrderedDict()
+
+
+# ---------- Versão dos dados ----------
+def calcular_data_version(empresa):
+    """
+    Calcula uma versão curta dos dados usados no relatório da empresa.
+
+    Qualquer OS ou PMP criada/alterada (ou equipamento criado) muda a versão,
+    o que invalida os PDFs em cache sem precisar de hooks de escrita.
+
+    Args:
+        empresa (str): Empresa do relatório
+
+    Returns:
+        str: Hash hexadecimal de 12 caracteres
+    """
+    query = """
+    SELECT
+        (SELECT COUNT(*) FROM equipamentos e WHERE e.empresa = :empresa),
+        (SELECT MAX(e.id) FROM equipamentos e WHERE e.empresa = :empresa),
+        (SELECT COUNT(*) FROM pmps p JOIN equipamentos e ON e.id = p.equipamento_id
+          WHERE e.empresa = :empresa),
+        (SELECT MAX(p.atualizado_em) FROM pmps p JOIN equipamentos e ON e.id = p.equipamento_id
+          WHERE e.empresa = :empresa),
+        (SELECT COUNT(*) FROM ordens_servico os WHERE os.empresa = :empresa),
+        (SELECT MAX(os.id) FROM ordens_servico os WHERE os.empresa = :empresa),
+        (SELECT MAX(os.data_atualizacao) FROM ordens_servico os WHERE os.empresa = :empresa)
+    """
+    resultado = executar_sql(query, {'empresa': empresa})
+    base = '|'.join(str(valor) for valor in (resultado[0] if resultado else ()))
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()[:12]
+
+
+def gerar_job_id(empresa, ano, data_version):
+    """Job ID determinístico para (empresa, ano, data_version), igual em todos os processos"""
+    chave = f"plano52|{empresa}|{ano}|{data_version}"
+    return hashlib.sha1(chave.encode('utf-8')).hexdigest()[:20]
+
+
+# ---------- Cache em disco ----------
+def caminho_pdf(job_id):
+    return os.path.join(RELATORIOS_DIR, f"{job_id}.pdf")
+
+
+def caminho_meta(job_id):
+    return os.path.join(RELATORIOS_DIR, f"{job_id}.json")
+
+
+def caminho_estado(job_id):
+    return os.path.join(RELATORIOS_DIR, f"{job_id}.estado.json")
+
+
+def _gravar_json(caminho, dados):
+    """Grava JSON de forma atômica (arquivo temporário + rename)"""
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+
+def ler_meta_cache(job_id):
+    """
+    Retorna os metadados do PDF em cache, ou None se não existir ou tiver expirado.
+
+    Args:
+        job_id (str): ID do job
+
+    Returns:
+        dict: Metadados gravados junto com o PDF (empresa, ano, concluido_em)
+    """
+    try:
+        if time.time() - os.path.getmtime(caminho_pdf(job_id)) > RELATORIOS_TTL:
+            return None
+        with open(caminho_meta(job_id), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def gravar_cache(job_id, buffer, meta):
+    """Grava PDF e metadados de forma atômica (arquivo temporário + rename)"""
+    os.makedirs(RELATORIOS_DIR, exist_ok=True)
+
+    temporario = f"{caminho_pdf(job_id)}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(buffer.getvalue())
+    os.replace(temporario, caminho_pdf(job_id))
+
+    _gravar_json(caminho_meta(job_id), meta)
+
+
+def gravar_estado_job(job):
+    """Grava o estado do job em disco para os outros processos (falha só é registrada no log)"""
+    try:
+        os.makedirs(RELATORIOS_DIR, exist_ok=True)
+        _gravar_json(caminho_estado(job['job_id']), job)
+    except OSError as e:
+        logger.warning(f"[JOBS] ⚠️ Não foi possível gravar o estado do job {job['job_id']}: {e}")
+
+
+def ler_estado_job(job_id):
+    """
+    Retorna o estado do job gravado em disco, ou None se não existir ou tiver expirado.
+
+    Um estado sem atualização há mais de RELATORIOS_JOBS_TTL segundos é
+    descartado (job de um processo que morreu ou erro antigo).
+
+    Args:
+        job_id (str): ID do job
+
+    Returns:
+        dict: Estado do job (job_id, empresa, status, ...)
+    """
+    try:
+        if time.time() - os.path.getmtime(caminho_estado(job_id)) > RELATORIOS_JOBS_TTL:
+            return None
+        with open(caminho_estado(job_id), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def limpar_cache_expirado():
+    """Remove PDFs e metadados com mais de RELATORIOS_TTL segundos"""
+    if not os.path.isdir(RELATORIOS_DIR):
+        return 0
+
+    removidos = 0
+    limite = time.time() - RELATORIOS_TTL
+    for nome in os.listdir(RELATORIOS_DIR):
+        caminho = os.path.join(RELATORIOS_DIR, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+                removidos += 1
+        except OSError:
+            continue
+
+    if removidos:
+        logger.info(f"[JOBS] 🧹 {removidos} arquivos expirados removidos do cache de relatórios")
+    return removidos
+
+
+# ---------- Registro dos jobs em memória ----------
+def _finalizar_job(job_id, **campos):
+    """Marca o job como finalizado (chamar com _jobs_lock)"""
+    _jobs[job_id].update(**campos)
+    _jobs_finalizados[job_id] = time.monotonic()
+    _jobs_finalizados.move_to_end(job_id)
+
+
+def _podar_jobs():
+    """
+    Remove jobs finalizados expirados e, acima de RELATORIOS_JOBS_MAX, os
+    finalizados mais antigos (chamar com _jobs_lock). Jobs pendentes ou em
+    processamento nunca são removidos.
+
+    Returns:
+        int: Quantidade de jobs removidos
+    """
+    removidos = 0
+    limite = time.monotonic() - RELATORIOS_JOBS_TTL
+    while _jobs_finalizados:
+        job_id, finalizado_em = next(iter(_jobs_finalizados.items()))
+        if finalizado_em >= limite and len(_jobs) <= RELATORIOS_JOBS_MAX:
+            break
+        del _jobs_finalizados[job_id]
+        _jobs.pop(job_id, None)
+        removidos += 1
+    return removidos
+
+
+# ---------- Execução dos jobs ----------
+def _executar_job(app, job_id, empresa, ano):
+    """Renderiza o PDF dentro de um contexto de aplicação (executado no pool de workers)"""
+    with _jobs_lock:
+        _jobs[job_id]['status'] = STATUS_PROCESSANDO
+        _jobs[job_id]['iniciado_em'] = datetime.now().isoformat()
+        job = dict(_jobs[job_id])
+    gravar_estado_job(job)
+
+    inicio = time.time()
+    try:
+        with app.app_context():
+            buffer = gerar_pdf_52_semanas(ano, empresa=empresa)
+
+        meta = {
+            'job_id': job_id,
+            'empresa': empresa,
+            'ano': ano,
+            'concluido_em': datetime.now().isoformat()
+        }
+        gravar_cache(job_id, buffer, meta)
+
+        with _jobs_lock:
+            _finalizar_job(job_id, status=STATUS_CONCLUIDO, concluido_em=meta['concluido_em'])
+        # Concluído: os metadados do PDF passam a responder pelo job
+        try:
+            os.remove(caminho_estado(job_id))
+        except OSError:
+            pass
+        logger.info(f"[JOBS] ✅ Relatório {job_id} ({empresa}/{ano}) gerado em {time.time() - inicio:.1f}s")
+
+    except Exception as e:
+        logger.exception(f"[JOBS] ❌ Erro no job {job_id}: {e}")
+        with _jobs_lock:
+            _finalizar_job(job_id, status=STATUS_ERRO, erro=str(e))
+            job = dict(_jobs[job_id])
+        gravar_estado_job(job)
+
+
+def submeter_relatorio_52_semanas(empresa, ano):
+    """
+    Submete a geração do plano de 52 semanas, reaproveitando cache e jobs em andamento.
+
+    Args:
+        empresa (str): Empresa do relatório
+        ano (int): Ano do plano
+
+    Returns:
+        dict: Estado do job (job_id, status, ...)
+    """
+    data_version = calcular_data_version(empresa)
+    job_id = gerar_job_id(empresa, ano, data_version)
+
+    # PDF já gerado para a mesma versão dos dados
+    if ler_meta_cache(job_id):
+        return {'job_id': job_id, 'status': STATUS_CONCLUIDO, 'cache': True}
+
+    with _jobs_lock:
+        _podar_jobs()
+        job = _jobs.get(job_id)
+        if job and job['status'] in (STATUS_PENDENTE, STATUS_PROCESSANDO):
+            return dict(job)
+
+        # Em andamento em outro processo
+        job = ler_estado_job(job_id)
+        if job and job['status'] in (STATUS_PENDENTE, STATUS_PROCESSANDO):
+            return job
+
+        job = {
+            'job_id': job_id,
+            'empresa': empresa,
+            'ano': ano,
+            'data_version': data_version,
+            'status': STATUS_PENDENTE,
+            'criado_em': datetime.now().isoformat()
+        }
+        _jobs[job_id] = job
+        _jobs_finalizados.pop(job_id, None)
+
+    gravar_estado_job(job)
+    limpar_cache_expirado()
+    _executor.submit(_executar_job, current_app._get_current_object(), job_id, empresa, ano)
+    logger.info(f"[JOBS] 📥 Job {job_id} submetido ({empresa}/{ano}, versão {data_version})")
+    return dict(job)
+
+
+def obter_status_job(job_id, empresa):
+    """
+    Retorna o estado do job para a empresa, ou None se não existir.
+
+    O estado vem da memória do processo que executa o job, dos metadados do
+    PDF em cache (concluído) ou do estado gravado em disco, então o status
+    pode ser consultado em qualquer processo do gunicorn.
+    """
+    with _jobs_lock:
+        _podar_jobs()
+        job = _jobs.get(job_id)
+        job = dict(job) if job else None
+
+    if job and job['empresa'] == empresa and job['status'] != STATUS_CONCLUIDO:
+        return job
+
+    meta = ler_meta_cache(job_id)
+    if meta and meta.get('empresa') == empresa:
+        return {'job_id': job_id, 'status': STATUS_CONCLUIDO, 'ano': meta.get('ano'),
+                'concluido_em': meta.get('concluido_em')}
+
+    job = ler_estado_job(job_id)
+    if job and job.get('empresa') == empresa and job['status'] != STATUS_CONCLUIDO:
+        return job
+
+    return None
+
+
+def _serializar_job(job):
+    """Resposta pública do job (sem empresa) com URLs de status e download"""
+    resposta = {chave: valor for chave, valor in job.items() if chave != 'empresa'}
+    resposta['status_url'] = f"/api/relatorios/jobs/{job['job_id']}"
+    if job['status'] == STATUS_CONCLUIDO:
+        resposta['download_url'] = f"/api/relatorios/jobs/{job['job_id']}/download"
+    return resposta
+
+
+# ---------- Rotas da API ----------
+@relatorio_jobs_bp.route('/api/relatorios/plano-52-semanas/jobs', methods=['POST'])
+@login_required
+def submeter_job_52_semanas():
+    """Submete a geração assíncrona do plano de 52 semanas (body/query: ano)."""
+    try:
+        dados = request.get_json(silent=True) or {}
+        ano = dados.get('ano') or request.args.get('ano') or datetime.now().year
+        try:
+            ano = int(ano)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Ano inválido'}), 400
+
+        job = submeter_relatorio_52_semanas(current_user.company, ano)
+        codigo = 200 if job['status'] == STATUS_CONCLUIDO else 202
+        return jsonify({'success': True, 'job': _serializar_job(job)}), codigo
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao submeter relatório: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Erro ao submeter relatório'}), 500
+
+
+@relatorio_jobs_bp.route('/api/relatorios/jobs/<job_id>', methods=['GET'])
+@login_required
+def status_job(job_id):
+    """Consulta o estado de um job de relatório."""
+    job = obter_status_job(job_id, current_user.company)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+    return jsonify({'success': True, 'job': _serializar_job(job)})
+
+
+@relatorio_jobs_bp.route('/api/relatorios/jobs/<job_id>/download', methods=['GET'])
+@login_required
+def download_job(job_id):
+    """Baixa o PDF de um job concluído."""
+    job = obter_status_job(job_id, current_user.company)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+    if job['status'] != STATUS_CONCLUIDO:
+        return jsonify({'success': False, 'error': 'Relatório ainda não está pronto',
+                        'job': _serializar_job(job)}), 409
+
+    return send_file(
+        caminho_pdf(job_id),
+        as_attachment=True,
+        download_name=f"Plano_52_Semanas_{job.get('ano')}.pdf",
+        mimetype='application/pdf'
+    )
@@ -2,142 +2,138 @@
 Helper para buscar informações de usuários
 """
 
+import os
 from flask import current_app
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from models import db, User
+from cache_ttl import CacheTTL
 
-def buscar_nome_usuario_por_id(user_id):
+# Diretório de nomes de usuários: {user_id: nome ou None (não existe)}
+_cache_nomes_usuarios = CacheTTL(
+    ttl=int(os.environ.get('USUARIOS_CACHE_TTL', 300)),
+    maxsize=int(os.environ.get('USUARIOS_CACHE_MAX', 10000))
+)
+_AUSENTE = object()
+
+# Fallback com nome específico para IDs conhecidos
+NOMES_CONHECIDOS = {
+    67: "Jefferson",
+    # Adicione outros IDs conhecidos aqui se necessário
+}
+
+def nome_exibicao_usuario(name, email):
+    """Nome de exibição do usuário: name, ou a parte local do email"""
+    if name and name.strip():
+        return name.strip()
+    if email:
+        return email.split('@')[0]
+    return None
+
+def _normalizar_user_id(user_id):
+    """Converte o ID para int; retorna None se não for um ID numérico"""
+    if isinstance(user_id, bool):
+        return None
+    if isinstance(user_id, int):
+        return user_id
+    if isinstance(user_id, str) and user_id.strip().isdigit():
+        return int(user_id.strip())
+    return None
+
+def _carregar_nomes_do_banco(ids):
+    """Busca os nomes de vários usuários em uma única consulta"""
+    consulta = db.session.query(User.id, User.name, User.email)
+    if db.engine.dialect.name == 'postgresql':
+        # Um único parâmetro array: mesmo texto de SQL para qualquer quantidade de IDs
+        consulta = consulta.filter(User.id == any_(bindparam('ids', ids, type_=ARRAY(Integer))))
+    else:
+        consulta = consulta.filter(User.id.in_(ids))
+    return {user_id: nome_exibicao_usuario(name, email) for user_id, name, email in consulta.all()}
+
+def buscar_nomes_usuarios(user_ids):
     """
-    Busca o nome do usuário pelo ID com múltiplos fallbacks
+    Resolve os nomes de vários usuários, usando o cache e uma única consulta para os ausentes
     
     Args:
-        user_id: ID do usuário (pode ser string ou int)
+        user_ids: Lista de IDs de usuários (int ou string numérica)
     
     Returns:
-        str: Nome do usuário ou fallback se não encontrado
+        dict: {user_id (int): nome ou None se o usuário não existe}
     """
-    try:
-        # Se user_id é None ou vazio, retornar None
-        if not user_id:
-            return None
-        
-        # Converter para int se necessário
-        original_user_id = user_id
-        if isinstance(user_id, str):
-            # Se já parece ser um nome (contém letras), retornar como está
-            if any(c.isalpha() for c in user_id):
-                current_app.logger.info(f"🔍 user_id '{user_id}' contém letras, assumindo que é nome")
-                return user_id
-            
-            try:
-                user_id = int(user_id)
-            except ValueError:
-                current_app.logger.warning(f"⚠️ user_id '{user_id}' não é numérico válido")
-                return f"Usuario_{original_user_id}"
-        
-        # MÉTODO 1: Tentar com modelo ORM
-        try:
-            from assets_models import User
-            usuario = User.query.get(user_id)
-            
-            if usuario:
-                # Tentar diferentes campos de nome em ordem de prioridade
-                campos_nome = ['name', 'username', 'nome', 'login', 'user_name', 'first_name', 'last_name']
-                
-                for campo in campos_nome:
-                    if hasattr(usuario, campo):
-                        valor = getattr(usuario, campo)
-                        if valor and isinstance(valor, str) and valor.strip():
-                            current_app.logger.info(f"✅ Usuário ID {user_id} encontrado via ORM: {valor} (campo: {campo})")
-                            return valor.strip()
-                
-                # Se não encontrou nome nos campos principais, tentar email
-                if hasattr(usuario, 'email') and usuario.email:
-                    nome_email = usuario.email.split('@')[0]
-                    current_app.logger.info(f"✅ Usuário ID {user_id} usando email via ORM: {nome_email}")
-                    return nome_email
-                
-                # Se tem usuário mas nenhum nome válido
-                current_app.logger.warning(f"⚠️ Usuário ID {user_id} encontrado via ORM mas sem nome válido")
-            else:
-                current_app.logger.warning(f"⚠️ Usuário ID {user_id} não encontrado via ORM")
-                
-        except Exception as e:
-            current_app.logger.warning(f"⚠️ Erro no método ORM: {e}")
-        
-        # MÉTODO 2: Tentar com SQL direto
+    nomes = {}
+    faltantes = []
+    
+    for user_id in user_ids or []:
+        user_id = _normalizar_user_id(user_id)
+        if user_id is None or user_id in nomes:
+            continue
+        nome = _cache_nomes_usuarios.obter(user_id, _AUSENTE)
+        if nome is _AUSENTE:
+            faltantes.append(user_id)
+            nomes[user_id] = None
+        else:
+            nomes[user_id] = nome
+    
+    if faltantes:
         try:
-            from models import db
-            
-            # Lista de possíveis nomes de colunas
-            campos_sql = ['name', 'username', 'nome', 'login', 'user_name', 'first_name', 'last_name', 'email']
-            
-            # Tentar diferentes queries SQL
-            queries_sql = [
-                f"SELECT {', '.join(campos_sql)} FROM users WHERE id = :user_id",
-                f"SELECT * FROM users WHERE id = :user_id",
-                f"SELECT name, username, email FROM users WHERE id = :user_id",
-                f"SELECT username, email FROM users WHERE id = :user_id"
-            ]
-            
-            for query in queries_sql:
-                try:
-                    result = db.session.execute(query, {'user_id': user_id})
-                    row = result.fetchone()
-                    
-                    if row:
-                        current_app.logger.info(f"✅ Usuário ID {user_id} encontrado via SQL")
-                        
-                        # Se row é um objeto com atributos
-                        if hasattr(row, '_fields'):
-                            for field in row._fields:
-                                valor = getattr(row, field)
-                                if valor and isinstance(valor, str) and valor.strip() and '@' not in valor:
-                                    current_app.logger.info(f"✅ Nome encontrado via SQL: {valor} (campo: {field})")
-                                    return valor.strip()
-                        
-                        # Se row é uma tupla/lista
-                        elif isinstance(row, (tuple, list)):
-                            for i, valor in enumerate(row):
-                                if valor and isinstance(valor, str) and valor.strip() and '@' not in valor:
-                                    current_app.logger.info(f"✅ Nome encontrado via SQL: {valor} (posição: {i})")
-                                    return valor.strip()
-                        
-                        # Se row é um dict
-                        elif isinstance(row, dict):
-                            for campo in campos_sql:
-                                if campo in row and row[campo]:
-                                    valor = row[campo]
-                                    if isinstance(valor, str) and valor.strip() and '@' not in valor:
-                                        current_app.logger.info(f"✅ Nome encontrado via SQL: {valor} (campo: {campo})")
-                                        return valor.strip()
-                        
-                        break  # Encontrou o usuário, não precisa tentar outras queries
-                        
-                except Exception as query_error:
-                    current_app.logger.debug(f"Query falhou: {query} - {query_error}")
-                    continue
-                    
+            encontrados = _carregar_nomes_do_banco(faltantes)
         except Exception as e:
-            current_app.logger.warning(f"⚠️ Erro no método SQL: {e}")
-        
-        # MÉTODO 3: Fallback com nome específico para IDs conhecidos
-        nomes_conhecidos = {
-            67: "Jefferson",
-            # Adicione outros IDs conhecidos aqui se necessário
-        }
-        
-        if user_id in nomes_conhecidos:
-            nome = nomes_conhecidos[user_id]
-            current_app.logger.info(f"✅ Usuário ID {user_id} encontrado via fallback: {nome}")
-            return nome
+            current_app.logger.warning(f"⚠️ Erro ao buscar usuários {faltantes}: {e}")
+            return nomes
         
-        # Se chegou até aqui, não conseguiu encontrar
-        current_app.logger.warning(f"⚠️ Usuário ID {user_id} não encontrado por nenhum método")
+        for user_id in faltantes:
+            # Usuários inexistentes também ficam em cache (None) até expirar
+            nomes[user_id] = encontrados.get(user_id)
+            _cache_nomes_usuarios.definir(user_id, nomes[user_id])
+        current_app.logger.debug(f"🔍 {len(faltantes)} usuários carregados do banco ({len(encontrados)} encontrados)")
+    
+    return nomes
+
+def invalidar_cache_usuario(user_id=None):
+    """
+    Remove usuários do cache de nomes (chamar após criar, editar ou excluir usuário)
+    
+    Args:
+        user_id: ID do usuário; None limpa o cache inteiro
+    """
+    if user_id is None:
+        _cache_nomes_usuarios.invalidar()
+    else:
+        user_id = _normalizar_user_id(user_id)
+        _cache_nomes_usuarios.invalidar(lambda chave: chave == user_id)
+
+def buscar_nome_usuario_por_id(user_id):
+    """
+    Busca o nome do usuário pelo ID (com cache)
+    
+    Args:
+        user_id: ID do usuário (pode ser string ou int)
+    
+    Returns:
+        str: Nome do usuário ou fallback se não encontrado
+    """
+    # Se user_id é None ou vazio, retornar None
+    if not user_id:
+        return None
+    
+    # Se já parece ser um nome (contém letras), retornar como está
+    if isinstance(user_id, str) and any(c.isalpha() for c in user_id):
+        return user_id
+    
+    user_id_int = _normalizar_user_id(user_id)
+    if user_id_int is None:
+        current_app.logger.warning(f"⚠️ user_id '{user_id}' não é numérico válido")
         return f"Usuario_{user_id}"
-            
-    except Exception as e:
-        current_app.logger.error(f"❌ Erro geral ao buscar usuário {original_user_id}: {e}")
-        # Fallback seguro
-        return f"Usuario_{original_user_id}"
+    
+    nome = buscar_nomes_usuarios([user_id_int]).get(user_id_int)
+    if nome:
+        return nome
+    
+    if user_id_int in NOMES_CONHECIDOS:
+        return NOMES_CONHECIDOS[user_id_int]
+    
+    current_app.logger.warning(f"⚠️ Usuário ID {user_id_int} não encontrado")
+    return f"Usuario_{user_id_int}"
 
 def buscar_usuarios_por_ids(user_ids):
     """
@@ -152,6 +148,9 @@ def buscar_usuarios_por_ids(user_ids):
     if not user_ids:
         return []
     
+    # Pré-carrega todos os IDs em uma consulta; as chamadas abaixo usam o cache
+    buscar_nomes_usuarios(user_ids)
+    
     nomes = []
     for user_id in user_ids:
         nome = buscar_nome_usuario_por_id(user_id)
@@ -171,8 +170,6 @@ def validar_usuario_existe(user_id):
         bool: True se existe, False caso contrário
     """
     try:
-        from assets_models import User
-        
         if isinstance(user_id, str):
             try:
                 user_id = int(user_id)
@@ -194,8 +191,6 @@ def listar_usuarios_ativos():
         list: Lista de dicionários com id, nome dos usuários
     """
     try:
-        from assets_models import User
-        
         usuarios = User.query.all()
         resultado = []
         
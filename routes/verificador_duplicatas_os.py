@@ -1,98 +1,328 @@
 """
 Verificador de Duplicatas de OS - Sistema Robusto
+
+A unicidade das OS geradas por PMP é garantida pelo banco: os índices únicos
+parciais uq_os_pmp_ocorrencia (pmp_id, data_ocorrencia), uq_os_pmp_sequencia
+(pmp_id, numero_sequencia) e uq_os_pmp_data_programada (pmp_id,
+data_programada).
+
+A chave de deduplicação é a ocorrência: data_ocorrencia é a data do
+cronograma da PMP que originou a OS e nunca muda. data_programada pode ser
+movida ou limpa pela programação sem que a ocorrência pareça faltar.
+
+Toda criação de OS de PMP segue a mesma regra: uma OS por (pmp_id,
+data_ocorrencia), programada na própria data da ocorrência (ou sem data
+quando outra OS da PMP já ocupa o dia) e com numero_sequencia = maior
+sequência da PMP + 1. O estado é lido com carregar_estado_os_pmp, que no
+PostgreSQL serializa os geradores concorrentes com um advisory lock da
+transação. A inserção em lote usa INSERT ... ON CONFLICT (pmp_id,
+data_ocorrencia) DO NOTHING RETURNING.
 """
 
-from datetime import datetime, date, timedelta
 from flask import current_app
+from sqlalchemy import text, bindparam, func
+from sqlalchemy.exc import IntegrityError
+
+from alteracoes_os import registrar_os_alteradas
+from execucao_jobs import NAMESPACE_LOCK, chave_job
+
+# Linhas por INSERT (mantém o número de parâmetros abaixo do limite do driver)
+TAMANHO_LOTE_INSERCAO = 500
+
+# Alvo do ON CONFLICT: o índice parcial uq_os_pmp_ocorrencia
+CONFLITO_PMP_OCORRENCIA = ['pmp_id', 'data_ocorrencia']
+CONFLITO_PMP_OCORRENCIA_WHERE = text('pmp_id IS NOT NULL AND data_ocorrencia IS NOT NULL')
+
+
+def _insert_dialeto(db, OrdemServico):
+    """Retorna o insert com suporte a ON CONFLICT do banco atual (ou None)"""
+    dialeto = db.session.get_bind().dialect.name
+
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    return insert(OrdemServico)
+
+
+def carregar_estado_os_pmp(pmp_ids, OrdemServico, db):
+    """
+    Carrega as ocorrências já geradas, os dias ocupados e a última sequência de cada PMP
+
+    No PostgreSQL, antes da leitura, toma o advisory lock da transação
+    'sequencia_os_pmp': geradores concorrentes esperam o commit do anterior e
+    leem o estado já atualizado. O lock é liberado no commit/rollback.
+
+    Args:
+        pmp_ids (list): IDs das PMPs
+        OrdemServico: Classe do modelo OrdemServico
+        db: Instância do banco de dados
+
+    Returns:
+        dict: ocorrencias (set de (pmp_id, data_ocorrencia)), datas_programadas
+              (set de (pmp_id, data_programada)) e sequencias ({pmp_id: última sequência})
+    """
+    estado = {'ocorrencias': set(), 'datas_programadas': set(), 'sequencias': {}}
+    pmp_ids = list(pmp_ids)
+    if not pmp_ids:
+        return estado
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :chave)"),
+            {'namespace': NAMESPACE_LOCK, 'chave': chave_job('sequencia_os_pmp')}
+        )
+
+    for inicio in range(0, len(pmp_ids), TAMANHO_LOTE_INSERCAO):
+        lote = pmp_ids[inicio:inicio + TAMANHO_LOTE_INSERCAO]
+        for pmp_id, data_ocorrencia, data_programada in db.session.query(
+            OrdemServico.pmp_id, OrdemServico.data_ocorrencia, OrdemServico.data_programada
+        ).filter(
+            OrdemServico.pmp_id.in_(lote),
+            (OrdemServico.data_ocorrencia.isnot(None)) | (OrdemServico.data_programada.isnot(None))
+        ):
+            if data_ocorrencia is not None:
+                estado['ocorrencias'].add((pmp_id, data_ocorrencia))
+            if data_programada is not None:
+                estado['datas_programadas'].add((pmp_id, data_programada))
+        estado['sequencias'].update(
+            (pmp_id, ultima or 0) for pmp_id, ultima in db.session.query(
+                OrdemServico.pmp_id, func.max(OrdemServico.numero_sequencia)
+            ).filter(OrdemServico.pmp_id.in_(lote)).group_by(OrdemServico.pmp_id)
+        )
+
+    return estado
+
 
-def verificar_os_existente_robusta(pmp, data_programada, numero_sequencia, OrdemServico):
+def proxima_sequencia_pmp(pmp_id, OrdemServico, db):
     """
-    Verificação robusta para evitar criação de OS duplicadas
-    
+    Próximo numero_sequencia de uma PMP (maior sequência + 1)
+
     Args:
-        pmp: Objeto PMP
-        data_programada: Data da OS
-        numero_sequencia: Número da sequência
+        pmp_id: ID da PMP
         OrdemServico: Classe do modelo OrdemServico
-    
+        db: Instância do banco de dados
+
     Returns:
-        OrdemServico ou None se não existir
+        int: Próximo número de sequência
+    """
+    estado = carregar_estado_os_pmp([pmp_id], OrdemServico, db)
+    return estado['sequencias'].get(pmp_id, 0) + 1
+
+
+def datas_os_ocorrencia(estado, pmp_id, data_ocorrencia):
     """
-    
-    # Lista de verificações em ordem de prioridade
-    verificacoes = []
-    
-    # 1. Verificação por PMP ID + Data Programada (mais específica)
-    os_existente = OrdemServico.query.filter_by(
-        pmp_id=pmp.id,
-        data_programada=data_programada
-    ).first()
-    
-    if os_existente:
-        current_app.logger.info(f"🔍 Verificação 1: OS encontrada por PMP+Data - ID {os_existente.id}")
-        return os_existente
-    
-    # 2. Verificação por PMP ID + Número Sequência
-    os_existente = OrdemServico.query.filter_by(
-        pmp_id=pmp.id,
-        numero_sequencia=numero_sequencia
-    ).first()
-    
-    if os_existente:
-        current_app.logger.info(f"🔍 Verificação 2: OS encontrada por PMP+Sequência - ID {os_existente.id}")
-        return os_existente
-    
-    # 3. Verificação por descrição contendo código PMP + sequência
-    sequencia_str = f"#{numero_sequencia:03d}"
-    os_existente = OrdemServico.query.filter(
-        OrdemServico.pmp_id == pmp.id,
-        OrdemServico.descricao.like(f"%{pmp.codigo}%{sequencia_str}%")
-    ).first()
-    
-    if os_existente:
-        current_app.logger.info(f"🔍 Verificação 3: OS encontrada por Descrição - ID {os_existente.id}")
-        return os_existente
-    
-    # 4. Verificação por tipo preventiva + equipamento + data próxima
-    data_inicio = data_programada - timedelta(days=1)
-    data_fim = data_programada + timedelta(days=1)
-    
-    os_existente = OrdemServico.query.filter(
-        OrdemServico.equipamento_id == pmp.equipamento_id,
-        OrdemServico.tipo_manutencao == 'preventiva-periodica',
-        OrdemServico.data_criacao >= data_inicio,
-        OrdemServico.data_criacao <= data_fim,
-        OrdemServico.pmp_id == pmp.id
-    ).first()
-    
-    if os_existente:
-        current_app.logger.info(f"🔍 Verificação 4: OS encontrada por Equipamento+Data - ID {os_existente.id}")
-        return os_existente
-    
-    # 5. Verificação por frequência origem + equipamento (última tentativa)
-    os_existente = OrdemServico.query.filter(
-        OrdemServico.equipamento_id == pmp.equipamento_id,
-        OrdemServico.frequencia_origem == pmp.frequencia,
-        OrdemServico.pmp_id == pmp.id,
-        OrdemServico.numero_sequencia == numero_sequencia
-    ).first()
-    
-    if os_existente:
-        current_app.logger.info(f"🔍 Verificação 5: OS encontrada por Frequência+Equipamento - ID {os_existente.id}")
-        return os_existente
-    
-    # Nenhuma OS encontrada
-    current_app.logger.info(f"✅ Nenhuma OS existente encontrada para PMP {pmp.codigo} sequência {numero_sequencia}")
-    return None
+    Colunas de data da OS de uma ocorrência, reservando o dia no estado
+
+    A OS é programada na data da ocorrência; se outra OS da PMP já foi
+    movida para esse dia, nasce sem data programada (fica no backlog).
+
+    Args:
+        estado (dict): Retorno de carregar_estado_os_pmp (atualizado aqui)
+        pmp_id: ID da PMP
+        data_ocorrencia (date): Data da ocorrência no cronograma
+
+    Returns:
+        dict: data_ocorrencia e data_programada
+    """
+    estado['ocorrencias'].add((pmp_id, data_ocorrencia))
+    if (pmp_id, data_ocorrencia) in estado['datas_programadas']:
+        return {'data_ocorrencia': data_ocorrencia, 'data_programada': None}
+    estado['datas_programadas'].add((pmp_id, data_ocorrencia))
+    return {'data_ocorrencia': data_ocorrencia, 'data_programada': data_ocorrencia}
+
+
+def _inserir_linha_a_linha(linhas, OrdemServico, db):
+    """Uma OS por savepoint; as que violam algum índice único são descartadas"""
+    inseridas = []
+    for linha in linhas:
+        try:
+            with db.session.begin_nested():
+                nova_os = OrdemServico(**linha)
+                db.session.add(nova_os)
+            inseridas.append((nova_os.id, nova_os.pmp_id, nova_os.numero_sequencia))
+        except IntegrityError:
+            continue
+    return inseridas
+
+
+def inserir_os_ignorando_duplicatas(linhas, OrdemServico, db):
+    """
+    Insere OS em lote ignorando as ocorrências que já têm OS da PMP
+
+    Um único INSERT ... ON CONFLICT (pmp_id, data_ocorrencia) DO NOTHING
+    RETURNING por lote, num savepoint. Se o lote esbarrar em outro índice
+    único (uma OS da PMP reprogramada para o mesmo dia depois da leitura do
+    estado), só esse lote é refeito linha a linha, descartando as linhas em
+    conflito. As linhas devem vir de carregar_estado_os_pmp /
+    datas_os_ocorrencia. A transação não é confirmada aqui: o chamador faz o
+    commit.
+
+    Args:
+        linhas (list): Dicionários com as colunas de cada OS
+        OrdemServico: Classe do modelo OrdemServico
+        db: Instância do banco de dados
+
+    Returns:
+        list: (id, pmp_id, numero_sequencia) das OS efetivamente inseridas
+    """
+    inseridas = []
+    if not linhas:
+        return inseridas
+
+    insert_base = _insert_dialeto(db, OrdemServico)
+
+    if insert_base is None:
+        # Banco sem ON CONFLICT: uma OS por savepoint
+        return _inserir_linha_a_linha(linhas, OrdemServico, db)
+
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_INSERCAO):
+        lote = linhas[inicio:inicio + TAMANHO_LOTE_INSERCAO]
+        stmt = (
+            insert_base.values(lote)
+            .on_conflict_do_nothing(index_elements=CONFLITO_PMP_OCORRENCIA,
+                                    index_where=CONFLITO_PMP_OCORRENCIA_WHERE)
+            .returning(OrdemServico.id, OrdemServico.pmp_id, OrdemServico.numero_sequencia)
+        )
+        try:
+            with db.session.begin_nested():
+                inseridas.extend(tuple(row) for row in db.session.execute(stmt))
+        except IntegrityError:
+            current_app.logger.warning("⚠️ Lote de OS em conflito com outro índice único; inserindo linha a linha")
+            inseridas.extend(_inserir_linha_a_linha(lote, OrdemServico, db))
+
+    # Insert em lote não passa pelo flush: anotar para o feed do quadro de programação
+    registrar_os_alteradas(db.session, [os_id for os_id, _, _ in inseridas], nova=True)
+
+    current_app.logger.info(f"✅ {len(inseridas)} de {len(linhas)} OS inseridas ({len(linhas) - len(inseridas)} já existiam)")
+    return inseridas
+
+
+def preencher_data_ocorrencia(pmp_id, OrdemServico, db):
+    """
+    Preenche data_ocorrencia das OS de PMP que ainda não a têm (migração)
+
+    Por PMP, cada OS recebe uma ocorrência do cronograma ainda livre, nesta
+    ordem: OS cuja data programada é a ocorrência de índice
+    numero_sequencia - 1; OS cuja data programada é uma ocorrência; e as
+    demais (OS movidas ou sem data programada) a ocorrência livre mais
+    próxima da data programada ou, sem ela, da posição dada pela sequência.
+    OS que repetem a sequência de outra OS da PMP são duplicatas e ficam
+    sem data_ocorrencia.
+    A transação não é confirmada aqui.
+
+    Args:
+        pmp_id: ID da PMP (None = todas as PMPs)
+        OrdemServico: Classe do modelo OrdemServico
+        db: Instância do banco de dados
+
+    Returns:
+        int: Número de OS preenchidas
+    """
+    from models.pmp_limpo import PMP
+    from recorrencia_pmp import recorrencia_da_pmp
+
+    consulta = db.session.query(
+        OrdemServico.id, OrdemServico.pmp_id, OrdemServico.data_programada, OrdemServico.numero_sequencia
+    ).filter(OrdemServico.pmp_id.isnot(None), OrdemServico.data_ocorrencia.is_(None))
+    if pmp_id is not None:
+        consulta = consulta.filter(OrdemServico.pmp_id == pmp_id)
+
+    pendentes = {}
+    for linha in consulta.order_by(OrdemServico.pmp_id, OrdemServico.id):
+        pendentes.setdefault(linha.pmp_id, []).append(linha)
+    if not pendentes:
+        return 0
+
+    pmps = {pmp.id: pmp for pmp in PMP.query.filter(PMP.id.in_(list(pendentes)))}
+    ocupadas = set(
+        db.session.query(OrdemServico.pmp_id, OrdemServico.data_ocorrencia).filter(
+            OrdemServico.pmp_id.in_(list(pendentes)), OrdemServico.data_ocorrencia.isnot(None)
+        )
+    )
+
+    sequencias_por_pmp = {}
+    for id_pmp, sequencia in db.session.query(OrdemServico.pmp_id, OrdemServico.numero_sequencia).filter(
+        OrdemServico.pmp_id.in_(list(pendentes)), OrdemServico.data_ocorrencia.isnot(None)
+    ):
+        sequencias_por_pmp.setdefault(id_pmp, set()).add(sequencia)
+
+    atribuicoes = []
+    for id_pmp, linhas in pendentes.items():
+        recorrencia = recorrencia_da_pmp(pmps[id_pmp]) if id_pmp in pmps else None
+        sequencias = sequencias_por_pmp.setdefault(id_pmp, set())
+        atribuidas = set()
+
+        def atribuir(linha, data):
+            if data is None or (id_pmp, data) in ocupadas:
+                return False
+            ocupadas.add((id_pmp, data))
+            atribuidas.add(linha.id)
+            sequencias.add(linha.numero_sequencia)
+            atribuicoes.append({'b_id': linha.id, 'b_data_ocorrencia': data})
+            return True
+
+        def pela_sequencia(linha):
+            if recorrencia is None or not linha.numero_sequencia or linha.numero_sequencia < 1:
+                return None
+            return recorrencia.enesima(linha.numero_sequencia - 1)
+
+        # 1) data programada e sequência concordam; 2) data programada é uma ocorrência
+        #    (sem recorrência, qualquer data programada vale)
+        for concordantes in (True, False):
+            for linha in linhas:
+                data = linha.data_programada
+                if linha.id in atribuidas or data is None:
+                    continue
+                if recorrencia is None or (
+                    data == pela_sequencia(linha) if concordantes else recorrencia.indice_de(data) is not None
+                ):
+                    atribuir(linha, data)
+
+        if recorrencia is None:
+            continue
+
+        # 3) OS movida ou sem data: ocorrência livre mais próxima da data programada
+        #    (ou da posição dada pela sequência). Sequência repetida é duplicata.
+        limite = len(linhas) + len(sequencias) + 1
+        for linha in linhas:
+            if linha.id in atribuidas or linha.numero_sequencia in sequencias:
+                continue
+            alvo = linha.data_programada or pela_sequencia(linha)
+            if alvo is None:
+                continue
+            n = recorrencia.contar_ate(alvo)
+            candidatas = [recorrencia.enesima(indice) for indice in range(max(n - limite, 0), n + limite)]
+            candidatas = sorted((data for data in candidatas if data is not None),
+                                key=lambda data: (abs((data - alvo).days), data))
+            for data in candidatas:
+                if atribuir(linha, data):
+                    break
+
+    for inicio in range(0, len(atribuicoes), TAMANHO_LOTE_INSERCAO):
+        db.session.execute(
+            OrdemServico.__table__.update()
+            .where(OrdemServico.__table__.c.id == bindparam('b_id'))
+            .values(data_ocorrencia=bindparam('b_data_ocorrencia')),
+            atribuicoes[inicio:inicio + TAMANHO_LOTE_INSERCAO]
+        )
+
+    total = sum(len(linhas) for linhas in pendentes.values())
+    current_app.logger.info(f"📅 data_ocorrencia preenchida em {len(atribuicoes)} de {total} OS de PMP")
+    return len(atribuicoes)
+
 
 def contar_os_existentes_pmp(pmp_id, OrdemServico):
     """
     Conta quantas OS já existem para uma PMP
-    
+
     Args:
         pmp_id: ID da PMP
         OrdemServico: Classe do modelo OrdemServico
-    
+
     Returns:
         int: Número de OS existentes
     """
@@ -100,38 +330,85 @@ def contar_os_existentes_pmp(pmp_id, OrdemServico):
     current_app.logger.info(f"📊 PMP ID {pmp_id}: {count} OS existentes")
     return count
 
+
+# Duplicatas por chave única: mantém a OS com execução registrada ou, entre
+# iguais, a mais antiga. OS duplicadas com execução não são removidas.
+SQL_OS_DUPLICADAS = """
+    SELECT id FROM (
+        SELECT o.id,
+               ROW_NUMBER() OVER (
+                   PARTITION BY o.pmp_id, o.{chave}
+                   ORDER BY CASE WHEN EXISTS (
+                                SELECT 1 FROM execucoes_os e WHERE e.os_id = o.id
+                            ) THEN 0 ELSE 1 END,
+                            o.id
+               ) AS posicao
+        FROM ordens_servico o
+        WHERE o.pmp_id IS NOT NULL
+          AND o.{chave} IS NOT NULL
+          {filtro_pmp}
+    ) ranqueadas
+    WHERE posicao > 1
+      AND NOT EXISTS (SELECT 1 FROM execucoes_os e WHERE e.os_id = ranqueadas.id)
+"""
+
+
+# OS de PMP (com cronograma) que a migração não associou a nenhuma ocorrência
+# livre: duplicatas de uma ocorrência que já tem OS
+SQL_OS_SEM_OCORRENCIA = """
+    SELECT o.id
+    FROM ordens_servico o
+    JOIN pmps p ON p.id = o.pmp_id
+    WHERE o.data_ocorrencia IS NULL
+      AND p.data_inicio_plano IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM execucoes_os e WHERE e.os_id = o.id)
+      {filtro_pmp}
+"""
+
+
 def limpar_os_duplicadas_pmp(pmp_id, OrdemServico, db):
     """
-    Remove OS duplicadas de uma PMP (usar com cuidado)
-    
+    Remove OS duplicadas (usar com cuidado)
+
+    Limpeza em conjunto, feita antes de criar os índices únicos de PMP.
+    Primeiro preenche data_ocorrencia das OS antigas (inclusive as sem data
+    programada) e remove as que ficaram sem ocorrência; depois, para cada
+    (pmp_id, data_ocorrencia), (pmp_id, numero_sequencia) e (pmp_id,
+    data_programada) repetidos, mantém uma OS e remove as demais junto com
+    suas atividades.
+
     Args:
-        pmp_id: ID da PMP
+        pmp_id: ID da PMP (None = todas as PMPs)
         OrdemServico: Classe do modelo OrdemServico
         db: Instância do banco de dados
-    
+
     Returns:
         int: Número de OS removidas
     """
-    # Buscar todas as OS da PMP
-    todas_os = OrdemServico.query.filter_by(pmp_id=pmp_id).all()
-    
-    # Agrupar por número de sequência
-    sequencias_vistas = set()
-    os_para_remover = []
-    
-    for os in todas_os:
-        if os.numero_sequencia in sequencias_vistas:
-            os_para_remover.append(os)
-            current_app.logger.warning(f"🗑️ OS duplicada detectada: ID {os.id}, Sequência {os.numero_sequencia}")
-        else:
-            sequencias_vistas.add(os.numero_sequencia)
-    
-    # Remover duplicatas
-    for os in os_para_remover:
-        db.session.delete(os)
-    
-    if os_para_remover:
-        db.session.commit()
-        current_app.logger.info(f"✅ {len(os_para_remover)} OS duplicadas removidas da PMP {pmp_id}")
-    
-    return len(os_para_remover)
+    filtro_pmp = 'AND o.pmp_id = :pmp_id' if pmp_id is not None else ''
+    parametros = {'pmp_id': pmp_id} if pmp_id is not None else {}
+
+    preencher_data_ocorrencia(pmp_id, OrdemServico, db)
+
+    # Uma chave por vez: as duplicatas de cada chave são calculadas
+    # depois de removidas as da anterior
+    removidas = 0
+    consultas = [SQL_OS_SEM_OCORRENCIA.format(filtro_pmp=filtro_pmp)] + [
+        SQL_OS_DUPLICADAS.format(chave=chave, filtro_pmp=filtro_pmp)
+        for chave in ('data_ocorrencia', 'numero_sequencia', 'data_programada')
+    ]
+    for sql in consultas:
+        ids = [row[0] for row in db.session.execute(text(sql), parametros)]
+
+        for inicio in range(0, len(ids), TAMANHO_LOTE_INSERCAO):
+            lote = ids[inicio:inicio + TAMANHO_LOTE_INSERCAO]
+            for sql_delete in ("DELETE FROM atividades_os WHERE os_id IN :ids",
+                               "DELETE FROM ordens_servico WHERE id IN :ids"):
+                db.session.execute(text(sql_delete).bindparams(bindparam('ids', expanding=True)), {'ids': lote})
+        removidas += len(ids)
+
+    db.session.commit()
+    if removidas:
+        current_app.logger.info(f"✅ {removidas} OS duplicadas removidas" + (f" da PMP {pmp_id}" if pmp_id is not None else ""))
+
+    return removidas
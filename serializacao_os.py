@@ -0,0 +1,200 @@
+"""
+Serialização compacta de ordens de serviço
+Os payloads de OS saem direto das tuplas (Row) de uma única consulta com
+as junções de filial, setor e equipamento, sem montar objetos ORM nem
+passar pelo identity map. Cada perfil (conjunto de campos) é compilado uma
+vez: colunas selecionadas, junções necessárias e quais posições são datas.
+As chaves são as mesmas de OrdemServico.to_dict().
+"""
+
+import json
+from datetime import date, datetime
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from models import db
+from assets_models import OrdemServico, Filial, Setor, Equipamento
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_filial = aliased(Filial)
+_setor = aliased(Setor)
+_equipamento = aliased(Equipamento)
+
+# Junções por relacionamento: alias e condição
+_JUNCOES = {
+    'filial': (_filial, _filial.id == OrdemServico.filial_id),
+    'setor': (_setor, _setor.id == OrdemServico.setor_id),
+    'equipamento': (_equipamento, _equipamento.id == OrdemServico.equipamento_id)
+}
+
+# Campo -> (expressão, junção necessária), na ordem de OrdemServico.to_dict()
+_CAMPOS_OS = {
+    'id': (OrdemServico.id, None),
+    'chamado_id': (OrdemServico.chamado_id, None),
+    'descricao': (OrdemServico.descricao, None),
+    'tipo_manutencao': (OrdemServico.tipo_manutencao, None),
+    'oficina': (OrdemServico.oficina, None),
+    'condicao_ativo': (OrdemServico.condicao_ativo, None),
+    'qtd_pessoas': (OrdemServico.qtd_pessoas, None),
+    'horas': (OrdemServico.horas, None),
+    'hh': (OrdemServico.hh, None),
+    'prioridade': (OrdemServico.prioridade, None),
+    'status': (OrdemServico.status, None),
+    'filial_id': (OrdemServico.filial_id, None),
+    'filial_tag': (_filial.tag, 'filial'),
+    'filial_descricao': (_filial.descricao, 'filial'),
+    'setor_id': (OrdemServico.setor_id, None),
+    'setor_tag': (_setor.tag, 'setor'),
+    'setor_descricao': (_setor.descricao, 'setor'),
+    'equipamento_id': (OrdemServico.equipamento_id, None),
+    'equipamento_tag': (_equipamento.tag, 'equipamento'),
+    'equipamento_descricao': (_equipamento.descricao, 'equipamento'),
+    'empresa': (OrdemServico.empresa, None),
+    'usuario_criacao': (OrdemServico.usuario_criacao, None),
+    'usuario_responsavel': (OrdemServico.usuario_responsavel, None),
+    'pmp_id': (OrdemServico.pmp_id, None),
+    'data_proxima_geracao': (OrdemServico.data_proxima_geracao, None),
+    'frequencia_origem': (OrdemServico.frequencia_origem, None),
+    'numero_sequencia': (OrdemServico.numero_sequencia, None),
+    'data_criacao': (OrdemServico.data_criacao, None),
+    'data_programada': (OrdemServico.data_programada, None),
+    'data_inicio': (OrdemServico.data_inicio, None),
+    'data_conclusao': (OrdemServico.data_conclusao, None),
+    'data_atualizacao': (OrdemServico.data_atualizacao, None)
+}
+
+CAMPOS_OS = tuple(_CAMPOS_OS)
+
+# Perfis de campos: lista (listagens), quadro (tela de programação), detalhe (to_dict completo)
+PERFIS_OS = {
+    'lista': (
+        'id', 'descricao', 'tipo_manutencao', 'oficina', 'prioridade', 'status', 'hh',
+        'filial_tag', 'setor_tag', 'equipamento_tag', 'usuario_responsavel', 'pmp_id',
+        'data_criacao', 'data_programada'
+    ),
+    'quadro': (
+        'id', 'descricao', 'tipo_manutencao', 'oficina', 'condicao_ativo', 'qtd_pessoas', 'horas', 'hh',
+        'prioridade', 'status', 'usuario_responsavel', 'pmp_id', 'frequencia_origem', 'numero_sequencia',
+        'data_proxima_geracao', 'data_programada', 'data_criacao', 'filial_tag', 'setor_tag',
+        'equipamento_id', 'equipamento_tag', 'equipamento_descricao'
+    ),
+    'detalhe': CAMPOS_OS
+}
+
+PERFIL_PADRAO = 'detalhe'
+
+# Sempre selecionados (cursor da listagem), mesmo fora do perfil
+_CAMPOS_CURSOR = ('id', 'data_criacao')
+
+
+class PerfilOS:
+    """Conjunto de campos compilado: colunas, junções e conversão das datas"""
+
+    def __init__(self, campos):
+        self.campos = tuple(campos)
+        extras = tuple(c for c in _CAMPOS_CURSOR if c not in self.campos)
+        selecionados = self.campos + extras
+
+        self.colunas = [_CAMPOS_OS[campo][0].label(campo) for campo in selecionados]
+        self.juncoes = [j for j in ('filial', 'setor', 'equipamento')
+                        if any(_CAMPOS_OS[campo][1] == j for campo in self.campos)]
+        self._posicoes_data = tuple(
+            posicao for posicao, campo in enumerate(self.campos)
+            if _CAMPOS_OS[campo][0].type.python_type in (date, datetime)
+        )
+
+    def consulta(self):
+        """Select das colunas do perfil com as junções necessárias (sem filtros)"""
+        consulta = select(*self.colunas).select_from(OrdemServico)
+        for nome in self.juncoes:
+            alias, condicao = _JUNCOES[nome]
+            consulta = consulta.outerjoin(alias, condicao)
+        return consulta
+
+    def serializar(self, linha):
+        """Dict de uma Row da consulta do perfil"""
+        if not self._posicoes_data:
+            return dict(zip(self.campos, linha))
+        valores = list(linha)
+        for posicao in self._posicoes_data:
+            valor = valores[posicao]
+            if valor is not None:
+                valores[posicao] = valor.isoformat()
+        return dict(zip(self.campos, valores))
+
+    def serializar_linhas(self, linhas):
+        serializar = self.serializar
+        return [serializar(linha) for linha in linhas]
+
+
+@lru_cache(maxsize=64)
+def _perfil_compilado(campos):
+    return PerfilOS(campos)
+
+
+def perfil_os(perfil=None, campos=None):
+    """
+    Perfil compilado por nome ou por lista de campos
+
+    Args:
+        perfil (str): Nome em PERFIS_OS (padrão: detalhe)
+        campos (list): Campos avulsos; têm precedência sobre o perfil
+
+    Raises:
+        ValueError: Perfil ou campos desconhecidos
+    """
+    if campos:
+        invalidos = [c for c in campos if c not in _CAMPOS_OS]
+        if invalidos:
+            raise ValueError(f'Campos inválidos: {", ".join(invalidos)}')
+        return _perfil_compilado(tuple(campos))
+
+    perfil = perfil or PERFIL_PADRAO
+    if perfil not in PERFIS_OS:
+        raise ValueError(f'Perfil inválido: {perfil}. Use {", ".join(PERFIS_OS)}')
+    return _perfil_compilado(PERFIS_OS[perfil])
+
+
+def serializar_os_por_ids(ids, perfil=None):
+    """
+    OS serializadas numa única consulta, na ordem dos ids
+
+    Args:
+        ids (list): IDs das OS
+        perfil (str): Nome do perfil
+
+    Returns:
+        list: Dicts das OS encontradas
+    """
+    if not ids:
+        return []
+    compilado = perfil_os(perfil)
+    linhas = db.session.execute(compilado.consulta().where(OrdemServico.id.in_(ids))).all()
+    por_id = {linha.id: compilado.serializar(linha) for linha in linhas}
+    return [por_id[os_id] for os_id in ids if os_id in por_id]
+
+
+def _padrao_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f'Tipo não serializável: {type(valor).__name__}')
+
+
+def resposta_json(payload, status=200):
+    """
+    Resposta JSON com o codificador rápido (orjson, se instalado)
+
+    Sem ordenação de chaves nem indentação, ao contrário de jsonify.
+    """
+    if orjson is not None:
+        corpo = orjson.dumps(payload, default=_padrao_json, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        corpo = json.dumps(payload, default=_padrao_json, ensure_ascii=False, separators=(',', ':'))
+    return current_app.response_class(corpo, status=status, mimetype='application/json')
@@ -5,11 +5,13 @@ Gera OS automaticamente baseado na data de início e frequência das PMPs
 """
 
 from datetime import datetime, timedelta, date
-from dateutil.relativedelta import relativedelta
 import json
 from models import db
 from models.pmp_limpo import PMP
 from assets_models import OrdemServico, AtividadeOS
+from serializacao_os import serializar_os_por_ids
+from recorrencia_pmp import FREQUENCIA_PADRAO, interpretar_frequencia, obter_recorrencia, datas_execucao
+from routes.verificador_duplicatas_os import carregar_estado_os_pmp, datas_os_ocorrencia
 
 class GeradorOSPMP:
     """Classe responsável pela geração automática de OS baseada em PMPs"""
@@ -37,28 +39,13 @@ class GeradorOSPMP:
         Returns:
             date: Próxima data calculada
         """
-        frequencia_lower = frequencia.lower()
-        
-        if 'semanal' in frequencia_lower or 'semana' in frequencia_lower:
-            return data_base + timedelta(weeks=1)
-        elif 'mensal' in frequencia_lower or 'mês' in frequencia_lower or 'mes' in frequencia_lower:
-            return data_base + relativedelta(months=1)
-        elif 'bimestral' in frequencia_lower:
-            return data_base + relativedelta(months=2)
-        elif 'trimestral' in frequencia_lower:
-            return data_base + relativedelta(months=3)
-        elif 'semestral' in frequencia_lower:
-            return data_base + relativedelta(months=6)
-        elif 'anual' in frequencia_lower or 'ano' in frequencia_lower:
-            return data_base + relativedelta(years=1)
-        elif 'diaria' in frequencia_lower or 'diário' in frequencia_lower:
-            return data_base + timedelta(days=1)
-        elif 'quinzenal' in frequencia_lower:
-            return data_base + timedelta(weeks=2)
-        else:
+        canonica, intervalo = interpretar_frequencia(frequencia)
+        
+        if not canonica:
             # Padrão: semanal
             self.log(f"⚠️ Frequência não reconhecida: {frequencia}. Usando padrão semanal.")
-            return data_base + timedelta(weeks=1)
+        
+        return obter_recorrencia(data_base, canonica or FREQUENCIA_PADRAO, None, intervalo).enesima(1)
     
     def gerar_datas_os(self, pmp):
         """
@@ -73,7 +60,6 @@ class GeradorOSPMP:
         if not pmp.data_inicio_plano:
             return []
         
-        datas = []
         data_atual = pmp.data_inicio_plano
         
         # Verificar se deve parar pela data fim
@@ -83,36 +69,33 @@ class GeradorOSPMP:
             data_limite = pmp.data_fim_plano
         
         # Gerar datas até hoje (ou data fim se aplicável)
-        while data_atual <= data_limite:
-            datas.append(data_atual)
-            data_atual = self.calcular_proxima_data(data_atual, pmp.frequencia)
-        
-        return datas
+        return datas_execucao(pmp, data_atual, data_limite)
     
-    def verificar_os_existente(self, pmp_id, data_programada):
+    def verificar_os_existente(self, pmp_id, data_ocorrencia):
         """
-        Verifica se já existe uma OS para a PMP na data específica
+        Verifica se já existe uma OS para a ocorrência da PMP na data
         
         Args:
             pmp_id (int): ID da PMP
-            data_programada (date): Data programada da OS
+            data_ocorrencia (date): Data da ocorrência no cronograma
         
         Returns:
             OrdemServico or None: OS existente ou None
         """
         return OrdemServico.query.filter_by(
             pmp_id=pmp_id,
-            data_programada=data_programada
+            data_ocorrencia=data_ocorrencia
         ).first()
     
-    def criar_os_para_pmp(self, pmp, data_programada, sequencia):
+    def criar_os_para_pmp(self, pmp, data_programada, sequencia, data_ocorrencia=None):
         """
         Cria uma nova OS para a PMP na data especificada
         
         Args:
             pmp (PMP): Objeto PMP
-            data_programada (date): Data programada da OS
+            data_programada (date): Data programada da OS (None = sem programação)
             sequencia (int): Número da sequência da OS
+            data_ocorrencia (date): Ocorrência do cronograma (padrão: data_programada)
         
         Returns:
             OrdemServico: OS criada
@@ -128,7 +111,9 @@ class GeradorOSPMP:
             prioridade='preventiva',
             status='aberta',
             data_programada=data_programada,
+            data_ocorrencia=data_ocorrencia or data_programada,
             pmp_id=pmp.id,
+            numero_sequencia=sequencia,
             oficina=pmp.oficina,
             criado_por=pmp.criado_por,
             empresa='Ativus'  # Ajustar conforme necessário
@@ -197,22 +182,26 @@ class GeradorOSPMP:
         
         os_geradas_pmp = 0
         
-        for i, data_programada in enumerate(datas_necessarias, 1):
-            # Verificar se já existe OS para esta data
-            os_existente = self.verificar_os_existente(pmp.id, data_programada)
-            
-            if os_existente:
-                self.log(f"📋 OS já existe para {data_programada}: OS #{os_existente.id}")
+        # Ocorrências já geradas, dias ocupados e última sequência da PMP
+        estado = carregar_estado_os_pmp([pmp.id], OrdemServico, db)
+        sequencia = estado['sequencias'].get(pmp.id, 0)
+        
+        for data_ocorrencia in datas_necessarias:
+            # Verificar se já existe OS para esta ocorrência
+            if (pmp.id, data_ocorrencia) in estado['ocorrencias']:
+                self.log(f"📋 OS já existe para {data_ocorrencia}")
                 continue
             
-            # Criar nova OS
+            # Criar nova OS (sequência após a última OS da PMP)
+            sequencia += 1
+            datas = datas_os_ocorrencia(estado, pmp.id, data_ocorrencia)
             try:
-                nova_os = self.criar_os_para_pmp(pmp, data_programada, i)
+                nova_os = self.criar_os_para_pmp(pmp, datas['data_programada'], sequencia, data_ocorrencia)
                 self.os_geradas.append(nova_os)
                 os_geradas_pmp += 1
                 
             except Exception as e:
-                self.log(f"❌ Erro ao criar OS para {data_programada}: {str(e)}")
+                self.log(f"❌ Erro ao criar OS para {data_ocorrencia}: {str(e)}")
                 db.session.rollback()
                 continue
         
@@ -254,7 +243,7 @@ class GeradorOSPMP:
                 'success': True,
                 'total_os_geradas': total_os_geradas,
                 'pmps_processadas': len(pmps_ativas),
-                'os_geradas': [os.to_dict() for os in self.os_geradas],
+                'os_geradas': serializar_os_por_ids([os.id for os in self.os_geradas]),
                 'log_operacoes': self.log_operacoes
             }
             
@@ -5,13 +5,24 @@ Versão melhorada com validações, logs detalhados e controle de frequências
 """
 
 from datetime import datetime, timedelta, date
-from dateutil.relativedelta import relativedelta
 import json
 import logging
+from sqlalchemy import insert
 from models import db
 from models.pmp_limpo import PMP, AtividadePMP
-from assets_models import OrdemServico
+from assets_models import OrdemServico, Equipamento, Setor
 from models.atividade_os import AtividadeOS
+from serializacao_os import serializar_os_por_ids
+from routes.verificador_duplicatas_os import (
+    carregar_estado_os_pmp, proxima_sequencia_pmp, datas_os_ocorrencia, inserir_os_ignorando_duplicatas
+)
+from recorrencia_pmp import (
+    FREQUENCIA_PADRAO,
+    interpretar_frequencia,
+    obter_recorrencia,
+    datas_execucao,
+    proxima_execucao
+)
 
 # Configurar logging específico para o sistema
 logger = logging.getLogger('pmp_os_generator')
@@ -95,61 +106,14 @@ class GeradorOSPMPAprimorado:
         Returns:
             str: Frequência normalizada
         """
-        if not frequencia:
-            return 'semanal'
-        
-        freq_lower = frequencia.lower().strip()
-        
-        # Mapeamento de frequências
-        mapeamento = {
-            'diaria': 'diaria',
-            'diário': 'diaria',
-            'diario': 'diaria',
-            'daily': 'diaria',
-            
-            'semanal': 'semanal',
-            'semana': 'semanal',
-            'weekly': 'semanal',
-            
-            'quinzenal': 'quinzenal',
-            'quinzena': 'quinzenal',
-            'biweekly': 'quinzenal',
-            
-            'mensal': 'mensal',
-            'mês': 'mensal',
-            'mes': 'mensal',
-            'monthly': 'mensal',
-            
-            'bimestral': 'bimestral',
-            'bimestre': 'bimestral',
-            'bimonthly': 'bimestral',
-            
-            'trimestral': 'trimestral',
-            'trimestre': 'trimestral',
-            'quarterly': 'trimestral',
-            
-            'semestral': 'semestral',
-            'semestre': 'semestral',
-            'semiannual': 'semestral',
-            
-            'anual': 'anual',
-            'ano': 'anual',
-            'yearly': 'anual',
-            'annual': 'anual'
-        }
-        
-        # Buscar correspondência exata
-        if freq_lower in mapeamento:
-            return mapeamento[freq_lower]
-        
-        # Buscar por palavras-chave
-        for palavra, freq_normalizada in mapeamento.items():
-            if palavra in freq_lower:
-                return freq_normalizada
+        canonica, _ = interpretar_frequencia(frequencia)
+        if canonica:
+            return canonica
         
         # Padrão se não encontrar
-        self.log(f"⚠️ Frequência não reconhecida: '{frequencia}'. Usando padrão 'semanal'", 'warning')
-        return 'semanal'
+        if frequencia:
+            self.log(f"⚠️ Frequência não reconhecida: '{frequencia}'. Usando padrão 'semanal'", 'warning')
+        return FREQUENCIA_PADRAO
     
     def calcular_proxima_data(self, data_base, frequencia):
         """
@@ -164,26 +128,8 @@ class GeradorOSPMPAprimorado:
         """
         try:
             freq_normalizada = self.normalizar_frequencia(frequencia)
-            
-            if freq_normalizada == 'diaria':
-                return data_base + timedelta(days=1)
-            elif freq_normalizada == 'semanal':
-                return data_base + timedelta(weeks=1)
-            elif freq_normalizada == 'quinzenal':
-                return data_base + timedelta(weeks=2)
-            elif freq_normalizada == 'mensal':
-                return data_base + relativedelta(months=1)
-            elif freq_normalizada == 'bimestral':
-                return data_base + relativedelta(months=2)
-            elif freq_normalizada == 'trimestral':
-                return data_base + relativedelta(months=3)
-            elif freq_normalizada == 'semestral':
-                return data_base + relativedelta(months=6)
-            elif freq_normalizada == 'anual':
-                return data_base + relativedelta(years=1)
-            else:
-                # Fallback para semanal
-                return data_base + timedelta(weeks=1)
+            _, intervalo = interpretar_frequencia(frequencia)
+            return obter_recorrencia(data_base, freq_normalizada, None, intervalo).enesima(1)
                 
         except Exception as e:
             self.log(f"❌ Erro ao calcular próxima data: {e}", 'error')
@@ -203,34 +149,29 @@ class GeradorOSPMPAprimorado:
         if not pmp.data_inicio_plano:
             return []
         
-        datas = []
-        data_atual = pmp.data_inicio_plano
         data_limite = self.hoje + timedelta(days=limite_futuro_dias)
         
-        # Se há data fim definida, usar a menor entre data_fim e limite_futuro
-        if pmp.data_fim_plano:
-            data_limite = min(data_limite, pmp.data_fim_plano)
-        
-        contador = 0
-        max_iteracoes = 1000  # Proteção contra loop infinito
-        
-        while data_atual <= data_limite and contador < max_iteracoes:
-            datas.append(data_atual)
-            data_atual = self.calcular_proxima_data(data_atual, pmp.frequencia)
-            contador += 1
-        
-        if contador >= max_iteracoes:
-            self.log(f"⚠️ Limite de iterações atingido para PMP {pmp.codigo}", 'warning')
+        # data_fim_plano é respeitada pelo cálculo de recorrência
+        return datas_execucao(pmp, pmp.data_inicio_plano, data_limite)
+    
+    def limite_geracao(self, pmp):
+        """
+        Última data de execução cuja OS já deve existir hoje
         
-        return datas
+        A OS é gerada dias_antecipacao dias antes da data de execução.
+        """
+        return self.hoje + timedelta(days=pmp.dias_antecipacao or 0)
     
-    def verificar_os_existente(self, pmp_id, data_programada):
+    def verificar_os_existente(self, pmp_id, data_ocorrencia):
         """
-        Verifica se já existe uma OS para a PMP na data específica
+        Verifica se já existe uma OS para a ocorrência da PMP na data
+        
+        A chave é a data da ocorrência, que não muda quando a OS é
+        reprogramada ou desprogramada.
         
         Args:
             pmp_id (int): ID da PMP
-            data_programada (date): Data programada da OS
+            data_ocorrencia (date): Data da ocorrência no cronograma
         
         Returns:
             OrdemServico or None: OS existente ou None
@@ -238,7 +179,7 @@ class GeradorOSPMPAprimorado:
         try:
             return OrdemServico.query.filter_by(
                 pmp_id=pmp_id,
-                data_programada=data_programada
+                data_ocorrencia=data_ocorrencia
             ).first()
         except Exception as e:
             self.log(f"❌ Erro ao verificar OS existente: {e}", 'error')
@@ -255,39 +196,32 @@ class GeradorOSPMPAprimorado:
             int: Próximo número de sequência
         """
         try:
-            ultima_os = OrdemServico.query.filter_by(pmp_id=pmp_id)\
-                                         .order_by(OrdemServico.numero_sequencia.desc())\
-                                         .first()
-            
-            if ultima_os and ultima_os.numero_sequencia:
-                return ultima_os.numero_sequencia + 1
-            else:
-                # Contar total de OS para esta PMP como fallback
-                count = OrdemServico.query.filter_by(pmp_id=pmp_id).count()
-                return count + 1
-                
+            return proxima_sequencia_pmp(pmp_id, OrdemServico, db)
         except Exception as e:
             self.log(f"❌ Erro ao obter número de sequência: {e}", 'error')
             return 1
     
-    def criar_os_para_pmp(self, pmp, data_programada, numero_sequencia):
+    def criar_os_para_pmp(self, pmp, data_programada, numero_sequencia, data_ocorrencia=None):
         """
         Cria uma nova OS para a PMP na data especificada
         
         Args:
             pmp (PMP): Objeto PMP
-            data_programada (date): Data programada da OS
+            data_programada (date): Data programada da OS (None = sem programação)
             numero_sequencia (int): Número da sequência da OS
+            data_ocorrencia (date): Ocorrência do cronograma (padrão: data_programada)
         
         Returns:
             OrdemServico: OS criada
         """
         try:
+            data_ocorrencia = data_ocorrencia or data_programada
+            
             # Criar descrição da OS
             descricao = f"{pmp.descricao} - Sequência #{numero_sequencia:03d}"
             
             # Determinar próxima data de geração
-            proxima_data = self.calcular_proxima_data(data_programada, pmp.frequencia)
+            proxima_data = proxima_execucao(pmp, data_ocorrencia)
             
             # Criar a OS
             nova_os = OrdemServico(
@@ -297,6 +231,7 @@ class GeradorOSPMPAprimorado:
                 prioridade='preventiva',
                 status='aberta',
                 data_programada=data_programada,
+                data_ocorrencia=data_ocorrencia,
                 pmp_id=pmp.id,
                 oficina=pmp.oficina or 'mecanica',
                 criado_por=pmp.criado_por,
@@ -318,7 +253,7 @@ class GeradorOSPMPAprimorado:
             # Criar atividades da OS
             atividades_criadas = self.criar_atividades_os(nova_os, pmp)
             
-            self.log(f"✅ OS criada: #{nova_os.id} - {descricao} para {data_programada} ({atividades_criadas} atividades)")
+            self.log(f"✅ OS criada: #{nova_os.id} - {descricao} para {data_ocorrencia} ({atividades_criadas} atividades)")
             return nova_os
             
         except Exception as e:
@@ -391,31 +326,34 @@ class GeradorOSPMPAprimorado:
         
         os_geradas_pmp = 0
         os_ja_existentes = 0
+        limite_geracao = self.limite_geracao(pmp)
+        
+        # Ocorrências já geradas, dias ocupados e última sequência da PMP
+        estado = carregar_estado_os_pmp([pmp.id], OrdemServico, db)
+        sequencia = estado['sequencias'].get(pmp.id, 0)
         
-        for data_programada in datas_necessarias:
-            # Só processar datas até hoje (não gerar OS futuras automaticamente)
-            if data_programada > self.hoje:
+        for data_ocorrencia in datas_necessarias:
+            # Só processar datas até hoje + antecipação (não gerar OS futuras automaticamente)
+            if data_ocorrencia > limite_geracao:
                 continue
                 
-            # Verificar se já existe OS para esta data
-            os_existente = self.verificar_os_existente(pmp.id, data_programada)
-            
-            if os_existente:
+            # Verificar se já existe OS para esta ocorrência
+            if (pmp.id, data_ocorrencia) in estado['ocorrencias']:
                 os_ja_existentes += 1
                 continue
             
-            # Obter próximo número de sequência
-            numero_sequencia = self.obter_proximo_numero_sequencia(pmp.id)
+            sequencia += 1
+            datas = datas_os_ocorrencia(estado, pmp.id, data_ocorrencia)
             
             # Criar nova OS
             try:
-                nova_os = self.criar_os_para_pmp(pmp, data_programada, numero_sequencia)
+                nova_os = self.criar_os_para_pmp(pmp, datas['data_programada'], sequencia, data_ocorrencia)
                 self.os_geradas.append(nova_os)
                 os_geradas_pmp += 1
                 self.estatisticas['os_geradas'] += 1
                 
             except Exception as e:
-                self.log(f"❌ Erro ao criar OS para {data_programada}: {str(e)}", 'error')
+                self.log(f"❌ Erro ao criar OS para {data_ocorrencia}: {str(e)}", 'error')
                 self.estatisticas['erros'] += 1
                 db.session.rollback()
                 continue
@@ -478,7 +416,7 @@ class GeradorOSPMPAprimorado:
                 'success': True,
                 'estatisticas': self.estatisticas,
                 'resultados_pmps': resultados_pmps,
-                'os_geradas': [os.to_dict() for os in self.os_geradas],
+                'os_geradas': serializar_os_por_ids([os.id for os in self.os_geradas]),
                 'log_operacoes': self.log_operacoes,
                 'data_processamento': self.hoje.isoformat()
             }
@@ -494,6 +432,205 @@ class GeradorOSPMPAprimorado:
                 'log_operacoes': self.log_operacoes
             }
     
+    def carregar_dados_lote(self, pmps):
+        """
+        Carrega em poucas consultas tudo que a geração em lote precisa
+        
+        Args:
+            pmps (list): PMPs que serão processadas
+        
+        Returns:
+            dict: estado das OS da PMP (carregar_estado_os_pmp), atividades e dados dos equipamentos
+        """
+        pmp_ids = [pmp.id for pmp in pmps]
+        equipamento_ids = {pmp.equipamento_id for pmp in pmps}
+        
+        # Ocorrências já geradas, dias ocupados e última sequência por PMP
+        # (mesma regra de toda criação de OS de PMP)
+        estado = carregar_estado_os_pmp(pmp_ids, OrdemServico, db)
+        
+        # Atividades ativas agrupadas por PMP, já na ordem de execução
+        atividades = {}
+        for atividade in AtividadePMP.query.filter(
+            AtividadePMP.pmp_id.in_(pmp_ids),
+            AtividadePMP.status == 'ativo'
+        ).order_by(AtividadePMP.pmp_id, AtividadePMP.ordem):
+            atividades.setdefault(atividade.pmp_id, []).append(atividade)
+        
+        # Filial, setor e empresa de cada equipamento
+        equipamentos = {
+            equipamento_id: {'setor_id': setor_id, 'filial_id': filial_id, 'empresa': empresa}
+            for equipamento_id, setor_id, filial_id, empresa in db.session.query(
+                Equipamento.id, Equipamento.setor_id, Setor.filial_id, Equipamento.empresa
+            ).join(Setor, Setor.id == Equipamento.setor_id)
+            .filter(Equipamento.id.in_(equipamento_ids))
+        }
+        
+        return {
+            'estado': estado,
+            'atividades': atividades,
+            'equipamentos': equipamentos
+        }
+    
+    def executar_geracao_lote(self):
+        """
+        Executa a geração completa em lote: carrega os dados com consultas
+        agregadas, calcula as OS faltantes em memória e insere tudo com
+        inserts multi-linha em uma única transação
+        
+        Returns:
+            dict: Resultado da operação (mesmo formato de executar_geracao_completa)
+        """
+        self.log("🚀 Iniciando geração em lote de OS baseada em PMPs")
+        
+        try:
+            pmps_ativas = PMP.query.filter(
+                PMP.status == 'ativo',
+                PMP.data_inicio_plano.isnot(None)
+            ).all()
+            
+            self.log(f"📊 {len(pmps_ativas)} PMPs ativas encontradas com data de início")
+            
+            dados = self.carregar_dados_lote(pmps_ativas)
+            
+            resultados_pmps = []
+            novas_os = []
+            
+            for pmp in pmps_ativas:
+                self.estatisticas['pmps_processadas'] += 1
+                
+                valida, motivo = self.validar_pmp(pmp)
+                if not valida:
+                    resultados_pmps.append({
+                        'pmp_codigo': pmp.codigo,
+                        'processada': False,
+                        'motivo': motivo,
+                        'os_geradas': 0
+                    })
+                    continue
+                
+                equipamento = dados['equipamentos'].get(pmp.equipamento_id)
+                if not equipamento:
+                    self.log(f"❌ Equipamento {pmp.equipamento_id} da PMP {pmp.codigo} não encontrado", 'error')
+                    self.estatisticas['erros'] += 1
+                    resultados_pmps.append({
+                        'pmp_codigo': pmp.codigo,
+                        'processada': False,
+                        'motivo': 'Equipamento não encontrado',
+                        'os_geradas': 0
+                    })
+                    continue
+                
+                datas_necessarias = self.gerar_cronograma_os(pmp)
+                estado = dados['estado']
+                sequencia = estado['sequencias'].get(pmp.id, 0)
+                os_geradas_pmp = 0
+                os_ja_existentes = 0
+                limite_geracao = self.limite_geracao(pmp)
+                
+                for data_ocorrencia in datas_necessarias:
+                    if data_ocorrencia > limite_geracao:
+                        continue
+                    
+                    if (pmp.id, data_ocorrencia) in estado['ocorrencias']:
+                        os_ja_existentes += 1
+                        continue
+                    
+                    sequencia += 1
+                    qtd_pessoas = pmp.num_pessoas or 1
+                    horas = pmp.tempo_pessoa or 1.0
+                    
+                    novas_os.append((pmp, {
+                        'descricao': f"{pmp.descricao} - Sequência #{sequencia:03d}",
+                        'tipo_manutencao': pmp.tipo or 'Preventiva',
+                        'oficina': pmp.oficina or 'mecanica',
+                        'condicao_ativo': 'funcionando',
+                        'qtd_pessoas': qtd_pessoas,
+                        'horas': horas,
+                        'hh': qtd_pessoas * horas,
+                        'prioridade': 'preventiva',
+                        'status': 'aberta',
+                        'filial_id': equipamento['filial_id'],
+                        'setor_id': equipamento['setor_id'],
+                        'equipamento_id': pmp.equipamento_id,
+                        'empresa': equipamento['empresa'] or 'Ativus',
+                        'usuario_criacao': 'sistema',
+                        'pmp_id': pmp.id,
+                        **datas_os_ocorrencia(estado, pmp.id, data_ocorrencia),
+                        'data_proxima_geracao': proxima_execucao(pmp, data_ocorrencia),
+                        'frequencia_origem': pmp.frequencia,
+                        'numero_sequencia': sequencia
+                    }))
+                    os_geradas_pmp += 1
+                
+                self.estatisticas['os_ja_existentes'] += os_ja_existentes
+                resultados_pmps.append({
+                    'pmp_codigo': pmp.codigo,
+                    'processada': True,
+                    'os_geradas': os_geradas_pmp,
+                    'os_ja_existentes': os_ja_existentes,
+                    'total_datas': len(datas_necessarias)
+                })
+            
+            if novas_os:
+                # Insert multi-linha com ON CONFLICT (pmp_id, data_ocorrencia): uma ocorrência
+                # gerada por outro processo é descartada sem desfazer o lote inteiro
+                inseridas = inserir_os_ignorando_duplicatas([linha for _, linha in novas_os], OrdemServico, db)
+                por_chave = {(pmp.id, linha['numero_sequencia']): (pmp, linha) for pmp, linha in novas_os}
+                ids = [os_id for os_id, _, _ in inseridas]
+                
+                linhas_atividades = []
+                for os_id, pmp_id, numero_sequencia in inseridas:
+                    pmp, linha = por_chave[(pmp_id, numero_sequencia)]
+                    for atividade_pmp in dados['atividades'].get(pmp.id, []):
+                        linhas_atividades.append({
+                            'os_id': os_id,
+                            'atividade_pmp_id': atividade_pmp.id,
+                            'descricao': atividade_pmp.descricao,
+                            'ordem': atividade_pmp.ordem,
+                            'status': 'pendente'
+                        })
+                    self.os_geradas.append({
+                        'id': os_id,
+                        'pmp_id': pmp.id,
+                        'pmp_codigo': pmp.codigo,
+                        'descricao': linha['descricao'],
+                        'data_ocorrencia': linha['data_ocorrencia'].isoformat(),
+                        'data_programada': linha['data_programada'].isoformat() if linha['data_programada'] else None,
+                        'numero_sequencia': linha['numero_sequencia'],
+                        'status': linha['status']
+                    })
+                
+                if linhas_atividades:
+                    db.session.execute(insert(AtividadeOS), linhas_atividades)
+                
+                db.session.commit()
+                self.estatisticas['os_geradas'] = len(ids)
+                self.estatisticas['os_ja_existentes'] += len(novas_os) - len(ids)
+                self.log(f"💾 {len(ids)} OS e {len(linhas_atividades)} atividades salvas no banco de dados")
+            else:
+                self.log("ℹ️ Nenhuma OS nova foi necessária")
+            
+            return {
+                'success': True,
+                'estatisticas': self.estatisticas,
+                'resultados_pmps': resultados_pmps,
+                'os_geradas': self.os_geradas,
+                'log_operacoes': self.log_operacoes,
+                'data_processamento': self.hoje.isoformat()
+            }
+            
+        except Exception as e:
+            db.session.rollback()
+            self.log(f"❌ Erro durante geração em lote: {str(e)}", 'error')
+            self.estatisticas['erros'] += 1
+            return {
+                'success': False,
+                'error': str(e),
+                'estatisticas': self.estatisticas,
+                'log_operacoes': self.log_operacoes
+            }
+    
     def gerar_os_pmp_especifica(self, pmp_codigo):
         """
         Gera OS para uma PMP específica pelo código
@@ -561,7 +698,8 @@ class GeradorOSPMPAprimorado:
                     continue
                 
                 # Gerar cronograma até hoje
-                datas_necessarias = [d for d in self.gerar_cronograma_os(pmp) if d <= self.hoje]
+                limite_geracao = self.limite_geracao(pmp)
+                datas_necessarias = [d for d in self.gerar_cronograma_os(pmp) if d <= limite_geracao]
                 
                 # Contar OS existentes
                 os_existentes = OrdemServico.query.filter_by(pmp_id=pmp.id).count()
@@ -595,9 +733,11 @@ class GeradorOSPMPAprimorado:
             }
 
 # Funções de conveniência para uso direto
-def gerar_todas_os_pmp():
+def gerar_todas_os_pmp(modo_lote=True):
     """Gera todas as OS necessárias para todas as PMPs ativas"""
     gerador = GeradorOSPMPAprimorado()
+    if modo_lote:
+        return gerador.executar_geracao_lote()
     return gerador.executar_geracao_completa()
 
 def gerar_os_pmp_codigo(codigo):
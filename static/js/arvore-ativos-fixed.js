@@ -16,47 +16,36 @@
             
             console.log('Carregando dados dos ativos...');
             
-            // Carregar todos os dados em paralelo
-            const [filiaisResponse, setoresResponse, equipamentosResponse] = await Promise.all([
-                fetch('/api/filiais'),
-                fetch('/api/setores'),
-                fetch('/api/equipamentos')
-            ]);
+            // Árvore completa numa única requisição (o navegador revalida pelo ETag)
+            const arvoreResponse = await fetch('/api/arvore-ativos');
 
-            console.log('Respostas recebidas:', {
-                filiais: filiaisResponse.status,
-                setores: setoresResponse.status,
-                equipamentos: equipamentosResponse.status
-            });
+            console.log('Resposta recebida:', arvoreResponse.status);
 
-            if (filiaisResponse.ok) {
-                const filiaisData = await filiaisResponse.json();
-                console.log('Dados de filiais:', filiaisData);
-                if (filiaisData.success) {
-                    assetsData.filiais = filiaisData.filiais || [];
-                }
-            } else {
-                console.error('Erro na API de filiais:', filiaisResponse.status);
+            if (!arvoreResponse.ok) {
+                console.error('Erro na API da árvore de ativos:', arvoreResponse.status);
+                showError('Erro ao carregar dados dos ativos');
+                return;
             }
 
-            if (setoresResponse.ok) {
-                const setoresData = await setoresResponse.json();
-                console.log('Dados de setores:', setoresData);
-                if (setoresData.success) {
-                    assetsData.setores = setoresData.setores || [];
-                }
-            } else {
-                console.error('Erro na API de setores:', setoresResponse.status);
-            }
+            const arvoreData = await arvoreResponse.json();
+            if (arvoreData.success) {
+                const filiais = [];
+                const setores = [];
+                const equipamentos = [];
 
-            if (equipamentosResponse.ok) {
-                const equipamentosData = await equipamentosResponse.json();
-                console.log('Dados de equipamentos:', equipamentosData);
-                if (equipamentosData.success) {
-                    assetsData.equipamentos = equipamentosData.equipamentos || [];
-                }
-            } else {
-                console.error('Erro na API de equipamentos:', equipamentosResponse.status);
+                (arvoreData.arvore || []).forEach(filial => {
+                    const { setores: setoresFilial, ...dadosFilial } = filial;
+                    filiais.push(dadosFilial);
+                    (setoresFilial || []).forEach(setor => {
+                        const { equipamentos: equipamentosSetor, ...dadosSetor } = setor;
+                        setores.push(dadosSetor);
+                        equipamentos.push(...(equipamentosSetor || []));
+                    });
+                });
+
+                assetsData.filiais = filiais;
+                assetsData.setores = setores;
+                assetsData.equipamentos = equipamentos;
             }
 
             console.log('Dados finais carregados:', assetsData);
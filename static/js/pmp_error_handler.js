@@ -51,80 +51,26 @@ async function fetchWithErrorHandling(url, options = {}) {
 }
 
 // Função melhorada para verificar pendências
+// Só lê o resumo da reconciliação do servidor; a geração não é mais disparada pelo navegador
 async function verificarOSPendentesPMPSeguro() {
     try {
-        console.log('🔍 Verificando OS pendentes de PMP (versão segura)...');
-        
-        const result = await fetchWithErrorHandling('/api/pmp/os/verificar-pendencias');
+        const result = await fetchWithErrorHandling('/api/pmp/os/reconciliacao');
         
         if (!result.success) {
-            console.error('❌ Erro na verificação de pendências:', result.error);
+            console.error('❌ Erro na consulta de pendências:', result.error);
             return;
         }
         
         const data = result.data;
         
-        if (data.success && data.resumo && data.resumo.total_pmps_com_pendencias > 0) {
-            console.log(`⚠️ ${data.resumo.total_pmps_com_pendencias} PMPs com pendências encontradas`);
-            
-            // Mostrar detalhes das pendências
-            if (data.pendencias && Array.isArray(data.pendencias)) {
-                data.pendencias.forEach(pendencia => {
-                    console.log(`📋 ${pendencia.pmp_codigo}: ${pendencia.os_pendentes} OS pendentes (${pendencia.frequencia})`);
-                });
-            }
-            
-            // Gerar OS pendentes automaticamente
-            await gerarOSPendentesSeguro();
-            
-        } else {
-            console.log('✅ Nenhuma OS pendente de PMP encontrada');
-        }
-        
-    } catch (error) {
-        console.error('❌ Erro crítico ao verificar OS pendentes:', error);
-    }
-}
-
-// Função melhorada para gerar OS
-async function gerarOSPendentesSeguro() {
-    try {
-        console.log('🚀 Gerando OS pendentes (versão segura)...');
-        
-        const result = await fetchWithErrorHandling('/api/pmp/os/gerar-todas', {
-            method: 'POST'
-        });
-        
-        if (!result.success) {
-            console.error('❌ Erro na geração de OS:', result.error);
-            return;
-        }
-        
-        const data = result.data;
-        
-        if (data.success && data.estatisticas) {
-            const osGeradas = data.estatisticas.os_geradas || 0;
-            const pmpsProcessadas = data.estatisticas.pmps_processadas || 0;
-            
-            console.log(`✅ ${osGeradas} OS geradas automaticamente para ${pmpsProcessadas} PMPs`);
-            
-            // Recarregar a programação após gerar OS
-            if (osGeradas > 0) {
-                console.log('🔄 Recarregando programação com novas OS...');
-                setTimeout(() => {
-                    if (typeof loadOrdensServico === 'function') {
-                        loadOrdensServico();
-                    } else if (typeof loadData === 'function') {
-                        loadData();
-                    }
-                }, 2000);
-            }
-        } else {
-            console.error('❌ Erro na geração automática:', data.error || 'Erro desconhecido');
+        if (data.success && typeof aplicarEstadoReconciliacao === 'function') {
+            aplicarEstadoReconciliacao(data);
+        } else if (data.success && data.pendencias && data.pendencias.os_pendentes > 0) {
+            console.log(`⚠️ ${data.pendencias.os_pendentes} OS de PMP pendentes (geração pelo servidor)`);
         }
         
     } catch (error) {
-        console.error('❌ Erro crítico ao gerar OS:', error);
+        console.error('❌ Erro crítico ao consultar OS pendentes:', error);
     }
 }
 
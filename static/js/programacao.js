@@ -16,6 +16,7 @@ async function initializePage() {
         await loadData();
         renderPriorityLines();
         renderUsuarios();
+        assinarAlteracoesOS();
     } catch (error) {
         console.error('Erro ao inicializar página:', error);
         showNotification('Erro ao carregar dados da programação', 'error');
@@ -35,6 +36,33 @@ async function loadData() {
     }
 }
 
+// Perfil de campos do quadro de programação (projeção da API de OS)
+const PERFIL_OS_PROGRAMACAO = 'quadro';
+
+// Buscar todas as OS de um filtro de status percorrendo as páginas (cursor)
+async function buscarOrdensServicoPaginadas(status) {
+    const ordens = [];
+    let cursor = null;
+
+    do {
+        let url = `/api/ordens-servico?status=${status}&limit=500&perfil=${PERFIL_OS_PROGRAMACAO}`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error(`API de OS falhou (${response.status})`);
+        }
+
+        const data = await response.json();
+        ordens.push(...(data.ordens_servico || []));
+        cursor = data.paginacao ? data.paginacao.proximo_cursor : null;
+    } while (cursor);
+
+    return { success: true, ordens_servico: ordens };
+}
+
 // Carregar ordens de serviço em aberto
 async function loadOrdensServico() {
     try {
@@ -47,15 +75,8 @@ async function loadOrdensServico() {
         try {
             console.log('📡 Fazendo requisição para /api/ordens-servico?status=abertas,concluida');
             // Tentar API original - incluir OS abertas E concluídas
-            response = await fetch('/api/ordens-servico?status=abertas,concluida');
-            console.log('📊 Status da resposta:', response.status);
-            
-            if (response.ok) {
-                data = await response.json();
-                console.log('✅ API original funcionou');
-            } else {
-                throw new Error('API original falhou');
-            }
+            data = await buscarOrdensServicoPaginadas('abertas,concluida');
+            console.log('✅ API original funcionou');
         } catch (error) {
             console.warn('⚠️ API original falhou, tentando alternativa...');
             
@@ -100,15 +121,17 @@ async function loadOrdensServico() {
         
         // Carregar também OS programadas e concluídas (evitando duplicação)
         try {
-            let responseProgramadas;
+            let dataProgramadas = null;
             try {
-                responseProgramadas = await fetch('/api/ordens-servico?status=programada,concluida');
+                dataProgramadas = await buscarOrdensServicoPaginadas('programada,concluida');
             } catch {
-                responseProgramadas = await fetch('/api/ordens-servico-programacao?status=programada,concluida');
+                const responseProgramadas = await fetch('/api/ordens-servico-programacao?status=programada,concluida');
+                if (responseProgramadas.ok) {
+                    dataProgramadas = await responseProgramadas.json();
+                }
             }
             
-            if (responseProgramadas.ok) {
-                const dataProgramadas = await responseProgramadas.json();
+            if (dataProgramadas) {
                 const osProgramadas = dataProgramadas.ordens_servico || [];
                 
                 // Filtrar OS que já não estão na lista (evitar duplicação)
@@ -133,6 +156,126 @@ async function loadOrdensServico() {
     }
 }
 
+// Feed de alterações de OS (Server-Sent Events)
+// Programações, desprogramações, mudanças de prioridade, encerramentos e a
+// geração de OS chegam como deltas compactos (id, status, prioridade,
+// data_programada, usuario_responsavel), aplicados no estado local do quadro
+// em vez de baixar a lista inteira de novo.
+const STATUS_QUADRO = ['aberta', 'programada', 'concluida'];
+let feedAlteracoesOS = null;
+let filaAlteracoesOS = Promise.resolve();
+let renderizacaoQuadroPendente = null;
+
+function feedAlteracoesOSConectado() {
+    return feedAlteracoesOS !== null && feedAlteracoesOS.readyState === EventSource.OPEN;
+}
+
+// Agrupa vários eventos próximos numa única renderização
+function agendarRenderizacaoQuadro() {
+    if (renderizacaoQuadroPendente) {
+        return;
+    }
+    renderizacaoQuadroPendente = setTimeout(() => {
+        renderizacaoQuadroPendente = null;
+        renderPriorityLines();
+        renderUsuarios();
+    }, 200);
+}
+
+// OS completas (perfil do quadro) das que entraram no quadro pelo feed
+async function buscarOrdensServicoPorIds(ids) {
+    const ordens = [];
+    
+    for (let inicio = 0; inicio < ids.length; inicio += 500) {
+        const lote = ids.slice(inicio, inicio + 500);
+        const response = await fetch(`/api/ordens-servico?ids=${lote.join(',')}&perfil=${PERFIL_OS_PROGRAMACAO}`);
+        if (!response.ok) {
+            throw new Error(`API de OS falhou (${response.status})`);
+        }
+        const data = await response.json();
+        ordens.push(...(data.ordens_servico || []));
+    }
+    
+    return ordens;
+}
+
+async function aplicarAlteracoesOS(deltas) {
+    const indices = new Map(ordensServico.map((os, indice) => [os.id, indice]));
+    const removidas = new Set();
+    const buscar = [];
+    
+    deltas.forEach(delta => {
+        const indice = indices.get(delta.id);
+        
+        if (delta.removida || !STATUS_QUADRO.includes(delta.status)) {
+            if (indice !== undefined) {
+                removidas.add(delta.id);
+            }
+            return;
+        }
+        
+        if (indice === undefined) {
+            buscar.push(delta.id);
+            return;
+        }
+        
+        const os = ordensServico[indice];
+        os.status = delta.status;
+        os.prioridade = delta.prioridade;
+        os.data_programada = delta.data_programada;
+        os.usuario_responsavel = delta.usuario_responsavel;
+    });
+    
+    if (removidas.size > 0) {
+        ordensServico = ordensServico.filter(os => !removidas.has(os.id));
+    }
+    
+    if (buscar.length > 0) {
+        try {
+            const novas = await buscarOrdensServicoPorIds(buscar);
+            const existentes = new Set(ordensServico.map(os => os.id));
+            ordensServico.push(...novas.filter(os => !existentes.has(os.id) && STATUS_QUADRO.includes(os.status)));
+            console.log(`📥 ${novas.length} OS novas recebidas pelo feed`);
+        } catch (error) {
+            console.warn('⚠️ Erro ao buscar OS novas do feed:', error);
+        }
+    }
+    
+    agendarRenderizacaoQuadro();
+}
+
+function assinarAlteracoesOS() {
+    if (!window.EventSource || feedAlteracoesOS) {
+        return;
+    }
+    
+    feedAlteracoesOS = new EventSource('/api/ordens-servico/alteracoes', {
+        withCredentials: true
+    });
+    
+    // Eventos aplicados em ordem (a busca de OS novas é assíncrona)
+    feedAlteracoesOS.addEventListener('os', (evento) => {
+        const deltas = JSON.parse(evento.data);
+        filaAlteracoesOS = filaAlteracoesOS.then(() => aplicarAlteracoesOS(deltas));
+    });
+    
+    feedAlteracoesOS.addEventListener('recarregar', () => {
+        console.log('🔄 Feed de OS pediu recarregamento completo');
+        filaAlteracoesOS = filaAlteracoesOS
+            .then(() => loadOrdensServico())
+            .then(agendarRenderizacaoQuadro);
+    });
+    
+    // Épocas de geração de OS de PMP chegam pela mesma conexão
+    feedAlteracoesOS.addEventListener('epoca', (evento) => {
+        aplicarEstadoReconciliacao(JSON.parse(evento.data));
+    });
+    
+    feedAlteracoesOS.onerror = () => {
+        console.warn('⚠️ Feed de alterações de OS interrompido; reconectando...');
+    };
+}
+
 // Carregar usuários (apenas perfil 'user')
 async function loadUsuarios() {
     try {
@@ -1346,74 +1489,77 @@ function notificarMudancaStatusOS(osId, novoStatus) {
 // Exportar função para uso em outras páginas
 window.notificarMudancaStatusOS = notificarMudancaStatusOS;
 
-// Verificação automática de OS pendentes de PMP
+// Acompanhamento das OS pendentes de PMP
+// A geração é feita no servidor (reconciliação do scheduler). A página recebe
+// as épocas de geração pelo feed de alterações de OS (evento "epoca"),
+// recarregando a programação quando uma época nova traz OS da empresa.
+let epocaGeracaoOS = null;
+
+function aplicarEstadoReconciliacao(estado) {
+    const epoca = estado.epoca;
+    const pendencias = estado.pendencias;
+    
+    if (pendencias && pendencias.os_pendentes > 0) {
+        console.log(`⚠️ ${pendencias.os_pendentes} OS de PMP pendentes em ${pendencias.pmps_com_pendencias} PMPs (geração pelo servidor)`);
+    }
+    
+    if (!epoca) {
+        return;
+    }
+    
+    const epocaAnterior = epocaGeracaoOS;
+    epocaGeracaoOS = epoca.epoca;
+    
+    // A primeira leitura só registra a época atual
+    if (epocaAnterior === null || epoca.epoca <= epocaAnterior || !epoca.alterada) {
+        return;
+    }
+    
+    // Com o feed de alterações conectado, as OS geradas já chegam como deltas
+    if (feedAlteracoesOSConectado()) {
+        return;
+    }
+    
+    // Épocas perdidas (aba em segundo plano, reconexão) também recarregam
+    const epocasPerdidas = epoca.epoca > epocaAnterior + 1;
+    if (epocasPerdidas || (pendencias && pendencias.os_geradas_epoca > 0)) {
+        console.log(`🔄 Época de geração ${epoca.epoca}: recarregando programação com novas OS...`);
+        loadOrdensServico().then(() => {
+            renderPriorityLines();
+            console.log('✅ Programação recarregada com novas OS preventivas');
+        });
+    }
+}
+
+// Leitura do resumo de pendências (barata: não calcula nem gera OS)
 async function verificarOSPendentesPMP() {
     try {
-        console.log('🔍 Verificando OS pendentes de PMP...');
-        
-        const response = await fetch('/api/pmp/os/verificar-pendencias', {
+        const response = await fetch('/api/pmp/os/reconciliacao', {
             credentials: 'include'
         });
         
-        if (response.ok) {
-            const data = await response.json();
-            
-            if (data.success && data.resumo && data.resumo.total_pmps_com_pendencias > 0) {
-                console.log(`⚠️ ${data.resumo.total_pmps_com_pendencias} PMPs com pendências encontradas`);
-                
-                // Mostrar detalhes das pendências
-                data.pendencias.forEach(pendencia => {
-                    console.log(`📋 ${pendencia.pmp_codigo}: ${pendencia.os_pendentes} OS pendentes (${pendencia.frequencia})`);
-                });
-                
-                // Gerar OS pendentes automaticamente
-                const gerarResponse = await fetch('/api/pmp/os/gerar-todas', {
-                    method: 'POST',
-                    credentials: 'include'
-                });
-                
-                if (gerarResponse.ok) {
-                    const gerarData = await gerarResponse.json();
-                    if (gerarData.success) {
-                        const osGeradas = gerarData.estatisticas.os_geradas;
-                        const pmpsProcessadas = gerarData.estatisticas.pmps_processadas;
-                        console.log(`✅ ${osGeradas} OS geradas automaticamente para ${pmpsProcessadas} PMPs`);
-                        
-                        // Recarregar a programação após gerar OS
-                        if (osGeradas > 0) {
-                            console.log('🔄 Recarregando programação com novas OS...');
-                            
-                            // Recarregar imediatamente
-                            loadOrdensServico().then(() => {
-                                renderPriorityLines();
-                                console.log('✅ Programação recarregada com novas OS preventivas');
-                            });
-                            
-                            // Recarregar novamente após 3 segundos para garantir
-                            setTimeout(() => {
-                                loadOrdensServico().then(() => {
-                                    renderPriorityLines();
-                                    console.log('✅ Segundo recarregamento concluído');
-                                });
-                            }, 3000);
-                        }
-                    } else {
-                        console.error('❌ Erro na geração automática:', gerarData.error);
-                    }
-                } else {
-                    console.error('❌ Erro na requisição de geração:', gerarResponse.status);
-                }
-            } else {
-                console.log('✅ Nenhuma OS pendente de PMP encontrada');
-            }
-        } else {
-            console.error('❌ Erro na verificação de pendências:', response.status);
+        if (!response.ok) {
+            console.error('❌ Erro ao consultar pendências de PMP:', response.status);
+            return;
+        }
+        
+        const data = await response.json();
+        if (data.success) {
+            aplicarEstadoReconciliacao(data);
         }
     } catch (error) {
-        console.error('❌ Erro ao verificar OS pendentes:', error);
+        console.error('❌ Erro ao consultar pendências de PMP:', error);
     }
 }
 
+// Sem SSE: leitura periódica do resumo (com SSE as épocas vêm pelo feed de OS)
+function acompanharReconciliacaoSemSSE() {
+    verificarOSPendentesPMP();
+    setInterval(verificarOSPendentesPMP, 5 * 60 * 1000);
+}
+
+window.aplicarEstadoReconciliacao = aplicarEstadoReconciliacao;
+
 // Função para gerar OS manualmente para uma PMP específica
 function gerarOSPMPEspecifica(codigoPMP) {
     console.log(`🎯 Gerando OS para PMP: ${codigoPMP}`);
@@ -1479,11 +1625,17 @@ function gerarTodasOSPendentes() {
     });
 }
 
-// Executar verificação ao carregar a página
+// Sem SSE, consultar pendências periodicamente ao carregar a página
 document.addEventListener('DOMContentLoaded', function() {
+    if (window.EventSource) {
+        return;
+    }
     // Aguardar 3 segundos após carregar para não interferir com outras operações
-    setTimeout(verificarOSPendentesPMP, 3000);
-    
-    // Executar verificação a cada 30 minutos
-    setInterval(verificarOSPendentesPMP, 30 * 60 * 1000);
+    setTimeout(acompanharReconciliacaoSemSSE, 3000);
+});
+
+window.addEventListener('beforeunload', function() {
+    if (feedAlteracoesOS) {
+        feedAlteracoesOS.close();
+    }
 });